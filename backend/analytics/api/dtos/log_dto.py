@@ -11,6 +11,7 @@ class ActivityLogItemInput(BaseModel):
     entity_id: Optional[str] = None
     payload: Dict[str, Any] = Field(default_factory=dict, description="Metadata bổ sung (timestamp, scroll_depth...)")
     session_id: Optional[str] = None
+    course_id: Optional[str] = None
     is_critical: bool = False
 
 
@@ -246,6 +246,11 @@ class InstructorCourseStudentsRiskListView(RoleBasedOutputMixin, AutoPermissionC
     output_dto_instructor = StudentRiskInfoOutput
     output_dto_admin = StudentRiskInfoOutput
 
+    # ?pagination=cursor -> Keyset theo đúng thứ tự của service (+ id để ổn định).
+    # Chế độ số trang giữ COUNT(*) chính xác như cũ; cursor dùng ước lượng khi không lọc (xem get)
+    cursor_ordering = ('engagement_score', '-days_inactive', 'id')
+    cursor_count_mode = 'estimated'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.analytics_service = course_dashboard_service
@@ -289,6 +294,10 @@ class InstructorCourseStudentsRiskListView(RoleBasedOutputMixin, AutoPermissionC
                     Q(user__email__icontains=search_term) | 
                     Q(user__username__icontains=search_term)
                 )
+
+            # Ước lượng của planner sai nhiều trên tập đã lọc -> Đếm chính xác
+            if (risk_filter and risk_filter != 'all') or search_term:
+                self.cursor_count_mode = 'exact'
                 
             # ---------------------------------------------------------
             # 4. PAGINATION & EXECUTION (Mixin Logic)
@@ -324,6 +333,9 @@ class InstructorCourseStudentsRiskListView(RoleBasedOutputMixin, AutoPermissionC
             # và map từng Domain Object sang DTO (StudentRiskInfoOutput)
             return Response(paginated_result, status=status.HTTP_200_OK)
 
+        except DRFValidationError as e:
+            # Cursor sai/giả mạo
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error fetching student risks: {e}", exc_info=True)
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
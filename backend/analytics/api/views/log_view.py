@@ -1,7 +1,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from pydantic import ValidationError as PydanticValidationError
 import logging
@@ -9,6 +9,7 @@ import logging
 from analytics.api.dtos.log_dto import ActivityBatchInput
 from analytics.serializers import ActivityBatchSerializer
 from analytics.services.log_service import record_batch
+from analytics.services import activity_buffer_service
 
 
 
@@ -65,4 +66,22 @@ class AnalyticsBatchView(APIView):
             return Response(
                 {"detail": f"Lỗi máy chủ khi xử lý log - {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class ActivityIngestionMetricsView(APIView):
+    """
+    GET /api/analytics/ingestion/metrics/
+    Theo dõi pipeline log buffered: độ dài buffer, size/thời gian/độ trễ của lần flush gần nhất.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            return Response(activity_buffer_service.get_metrics(), status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"Lỗi trong ActivityIngestionMetricsView (GET): {e}", exc_info=True)
+            return Response(
+                {"detail": f"Lỗi máy chủ khi lấy metrics - {str(e)}"}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
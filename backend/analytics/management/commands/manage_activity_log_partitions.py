@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from analytics.services import log_partition_service
+
+
+
+class Command(BaseCommand):
+    help = 'Tạo trước partition theo tháng cho UserActivityLog và áp dụng retention (detach + archive/drop partition cũ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=log_partition_service.DEFAULT_MONTHS_AHEAD, help='Số tháng tạo trước (mặc định 3)')
+        parser.add_argument('--retention-months', type=int, default=None, help='Giữ lại bao nhiêu tháng (mặc định settings.ACTIVITY_LOG_RETENTION_MONTHS)')
+        parser.add_argument('--skip-retention', action='store_true', help='Chỉ tạo partition, không detach partition cũ')
+        parser.add_argument('--drop', action='store_true', help='DROP partition cũ thay vì chuyển sang schema archive')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ liệt kê partition sẽ bị detach')
+
+    def handle(self, *args, **options):
+        if not log_partition_service.is_partitioned():
+            self.stdout.write(self.style.ERROR(f"❌ {log_partition_service.PARENT_TABLE} chưa được partition (chạy migrate trước)."))
+            return
+
+        self.stdout.write(self.style.WARNING("--- BƯỚC 1: TẠO PARTITION ---"))
+        if options['dry_run']:
+            self.stdout.write("Dry-run: bỏ qua tạo partition.")
+        else:
+            created = log_partition_service.ensure_partitions(months_ahead=options['months_ahead'])
+            for name in created:
+                self.stdout.write(f"✅ Tạo {name}")
+            if not created:
+                self.stdout.write("Không có partition mới cần tạo.")
+
+        if options['skip_retention']:
+            return
+
+        self.stdout.write(self.style.WARNING("--- BƯỚC 2: RETENTION ---"))
+        results = log_partition_service.apply_retention(
+            retention_months=options['retention_months'],
+            drop=options['drop'],
+            dry_run=options['dry_run'],
+        )
+        for item in results:
+            prefix = "(dry-run) " if options['dry_run'] else ""
+            self.stdout.write(f"🗄️ {prefix}{item['partition']} ({item['month']}) -> {item['action']}")
+        if not results:
+            self.stdout.write("Không có partition nào quá hạn.")
+
+        self.stdout.write(self.style.SUCCESS("--- HOÀN TẤT ---"))
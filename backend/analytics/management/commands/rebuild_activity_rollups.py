@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from analytics.services import activity_rollup_service
+
+
+
+class Command(BaseCommand):
+    help = 'Tính lại (backfill) bảng rollup UserDailyActivity từ UserActivityLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Số ngày gần nhất cần tính lại (mặc định 30, tính cả hôm nay)')
+        parser.add_argument('--course', type=str, default=None, help='Chỉ tính lại cho 1 khóa học (course_id)')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start_day = today - timedelta(days=max(options['days'], 1) - 1)
+        course_id = options['course']
+
+        self.stdout.write(self.style.WARNING(f"--- REBUILD ROLLUP {start_day} -> {today} ---"))
+
+        total = 0
+        day = start_day
+        while day <= today:
+            # Từng ngày một: mỗi câu GROUP BY chỉ quét 1 ngày dữ liệu
+            count = activity_rollup_service.rebuild(day, course_id=course_id)
+            total += count
+            self.stdout.write(f"📅 {day}: {count} dòng")
+            day += timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"--- HOÀN TẤT: {total} dòng rollup ---"))
@@ -0,0 +1,206 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:10
+
+import re
+from datetime import date, datetime, time as dt_time
+
+from django.db import migrations, transaction
+from django.utils import timezone
+
+
+TABLE = 'analytics_useractivitylog'
+STAGING = 'analytics_useractivitylog_partitioned'
+LEGACY = 'analytics_useractivitylog_legacy'
+MONTHS_AHEAD = 3
+COPY_BATCH_SIZE = 50_000
+
+
+def _add_months(d, months):
+    month_index = d.year * 12 + (d.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _bound(month):
+    return timezone.make_aware(datetime.combine(month, dt_time.min))
+
+
+def _staging_name(index):
+    """Tên tạm cho index/constraint của bảng staging (tên gốc vẫn đang thuộc bảng cũ tới bước swap)."""
+    return f'{STAGING}_obj{index}'
+
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [f'public.{name}'])
+    return cursor.fetchone()[0]
+
+
+def _renames(cursor):
+    """
+    [(tên tạm, tên gốc, loại)] cho PK, FK/check và index của bảng cũ.
+    Thứ tự ổn định (theo tên) -> Lần chạy lại sau khi bị ngắt vẫn ra cùng tên tạm.
+    """
+    cursor.execute(
+        "SELECT conname, contype FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'f', 'c') "
+        "ORDER BY conname",
+        [TABLE]
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT indexname FROM pg_indexes WHERE tablename = %s AND schemaname = 'public' AND indexname NOT IN ("
+        "  SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u')) "
+        "ORDER BY indexname",
+        [TABLE, TABLE]
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+
+    objects = [(name, 'constraint' if contype != 'p' else 'pk') for name, contype in constraints]
+    objects += [(name, 'index') for name in indexes]
+    return [(_staging_name(i), name, kind) for i, (name, kind) in enumerate(objects)]
+
+
+def _create_staging(cursor, renames):
+    """
+    Bảng cha partition theo tháng (RANGE trên "timestamp") cùng cột/default/index/FK với bảng cũ.
+    PK đổi thành (id, timestamp) vì Postgres bắt buộc khóa partition nằm trong PK.
+    """
+    cursor.execute(
+        f'CREATE TABLE "{STAGING}" (LIKE "{TABLE}" INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")'
+    )
+
+    temp_names = {original: temp for temp, original, _ in renames}
+    for temp, original, kind in renames:
+        if kind == 'pk':
+            cursor.execute(f'ALTER TABLE "{STAGING}" ADD CONSTRAINT "{temp}" PRIMARY KEY ("id", "timestamp")')
+        elif kind == 'constraint':
+            cursor.execute("SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s", [TABLE, original])
+            cursor.execute(f'ALTER TABLE "{STAGING}" ADD CONSTRAINT "{temp}" {cursor.fetchone()[0]}')
+
+    cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND schemaname = 'public'", [TABLE])
+    for index_name, index_def in cursor.fetchall():
+        if index_name not in temp_names or not index_def.startswith(('CREATE INDEX', 'CREATE UNIQUE INDEX')):
+            continue
+        # Giữ nguyên phần "USING ... (cột)", chỉ đổi tên index và bảng
+        cursor.execute(re.sub(
+            r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ ',
+            lambda m: f'{m.group(1)} "{temp_names[index_name]}" ON "{STAGING}" ',
+            index_def
+        ))
+
+    # Partition theo tháng: Từ tháng của dòng cũ nhất tới MONTHS_AHEAD tháng sau + partition default
+    cursor.execute(f'SELECT MIN("timestamp") FROM "{TABLE}"')
+    oldest = cursor.fetchone()[0]
+    current = timezone.localdate().replace(day=1)
+    month = timezone.localtime(oldest).date().replace(day=1) if oldest else current
+    last = _add_months(current, MONTHS_AHEAD)
+
+    while month <= last:
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}_p{month.year}{month.month:02d}" PARTITION OF "{STAGING}" FOR VALUES FROM (%s) TO (%s)',
+            [_bound(month), _bound(_add_months(month, 1))]
+        )
+        month = _add_months(month, 1)
+
+    cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{STAGING}" DEFAULT')
+
+
+def partition_activity_log(apps, schema_editor):
+    """
+    Chuyển analytics_useractivitylog thành bảng partition theo tháng mà không khóa bảng suốt lúc copy.
+    Migration chạy ngoài transaction (atomic = False):
+    1. Tạo bảng staging đã partition (1 transaction ngắn).
+    2. Copy theo lô COPY_BATCH_SIZE id, mỗi lô tự commit -> Bảng cũ vẫn nhận ghi bình thường.
+       Bị ngắt giữa chừng -> Chạy lại migrate sẽ copy tiếp từ MAX(id) đã có trong staging.
+    3. Swap (1 transaction ngắn): Khóa bảng cũ, copy nốt dòng mới ghi trong lúc copy, đổi tên bảng/index/constraint,
+       chuyển sequence, xóa bảng cũ.
+    Log chỉ được INSERT (không UPDATE/DELETE) nên copy theo khoảng id không bỏ sót thay đổi.
+    Giữ nguyên tên bảng, cột, index, FK -> Model/ORM không đổi.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        # Đã partition rồi -> bỏ qua
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+            [TABLE]
+        )
+        if cursor.fetchone():
+            return
+
+        renames = _renames(cursor)
+
+        # 1. Bảng staging (all-or-nothing -> Đã tồn tại nghĩa là đã dựng xong, chỉ còn copy tiếp)
+        if not _table_exists(cursor, STAGING):
+            with transaction.atomic(using=connection.alias):
+                _create_staging(cursor, renames)
+
+        # 2. Copy theo lô tới MAX(id) tại thời điểm bắt đầu
+        cursor.execute(f'SELECT COALESCE(MAX("id"), 0) FROM "{TABLE}"')
+        high = cursor.fetchone()[0]
+        cursor.execute(f'SELECT COALESCE(MAX("id"), 0) FROM "{STAGING}"')
+        copied = cursor.fetchone()[0]
+
+        while copied < high:
+            upper = min(copied + COPY_BATCH_SIZE, high)
+            cursor.execute(
+                f'INSERT INTO "{STAGING}" SELECT * FROM "{TABLE}" WHERE "id" > %s AND "id" <= %s',
+                [copied, upper]
+            )
+            copied = upper
+
+        # 3. Swap
+        with transaction.atomic(using=connection.alias):
+            cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'INSERT INTO "{STAGING}" SELECT * FROM "{TABLE}" WHERE "id" > %s', [copied])
+
+            cursor.execute(
+                "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+                [TABLE]
+            )
+            is_identity = bool(cursor.fetchone()[0])
+            sequence = None
+            if not is_identity:
+                # Bảng tạo từ thời serial: Staging dùng chung sequence (default copy từ bảng cũ)
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+                sequence = cursor.fetchone()[0]
+
+            cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY}"')
+            cursor.execute(f'ALTER TABLE "{STAGING}" RENAME TO "{TABLE}"')
+
+            if not is_identity:
+                # Chuyển quyền sở hữu sequence trước khi xóa bảng cũ (không thì sequence bị xóa theo)
+                cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{TABLE}"."id"')
+
+            cursor.execute(f'DROP TABLE "{LEGACY}"')
+
+            if is_identity:
+                # Sequence identity bị xóa cùng bảng cũ. Postgres < 17 không cho identity trên bảng partition
+                # -> Dùng sequence thường (như serial), setval bên dưới
+                cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}"."id"')
+                cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{TABLE}_id_seq"\')')
+
+            for temp, original, kind in renames:
+                if kind == 'index':
+                    cursor.execute(f'ALTER INDEX "{temp}" RENAME TO "{original}"')
+                else:
+                    cursor.execute(f'ALTER TABLE "{TABLE}" RENAME CONSTRAINT "{temp}" TO "{original}"')
+
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM \"{TABLE}\"), 0) + 1, false)",
+                [TABLE]
+            )
+
+
+class Migration(migrations.Migration):
+
+    # Copy theo lô phải commit từng lô -> Không bọc cả migration trong 1 transaction
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0008_alter_useractivitylog_action'),
+    ]
+
+    operations = [
+        # Không hỗ trợ rollback tự động: gộp partition lại cần copy toàn bộ dữ liệu
+        migrations.RunPython(partition_activity_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0009_partition_useractivitylog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyActivity',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('course_id', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('total_actions', models.IntegerField(default=0)),
+                ('high_value_actions', models.IntegerField(default=0)),
+                ('last_access', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course_id', 'day'], name='analytics_u_course__91cbd2_idx')],
+                'unique_together': {('course_id', 'user', 'day')},
+            },
+        ),
+    ]
@@ -63,6 +63,13 @@ class UserActivityLog(models.Model):
     """
     Bảng lưu vết chân số (Digital Footprint).
     Dữ liệu này sẽ rất lớn, cần đánh index kỹ.
+
+    Trên Postgres bảng được partition theo tháng (migration 0009) -> PK thật trong DB là (id, timestamp),
+    còn model vẫn khai báo PK là `id`. Cố ý giữ lệch như vậy:
+    - `id` lấy từ 1 sequence chung cho mọi partition nên vẫn duy nhất -> get/update/delete theo pk đúng như cũ.
+    - Django không migrate được PK đơn sang CompositePrimaryKey, và BigAutoField bắt buộc primary_key=True.
+    - Không model nào FK tới bảng này.
+    Không được sinh `id` thủ công khi insert (luôn để sequence cấp), nếu không tính duy nhất của id không còn được đảm bảo.
     """
     id = models.BigAutoField(primary_key=True) # Dùng BigInt thay vì UUID để insert nhanh hơn và tiết kiệm dung lượng index
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activity_logs')
@@ -110,6 +117,31 @@ class UserActivityLog(models.Model):
         return f"{self.user.username} - {self.action} - {self.timestamp}"
     
 
+class UserDailyActivity(models.Model):
+    """
+    Rollup theo ngày của UserActivityLog cho từng (course, user, day).
+    Dùng cho _calculate_engagement_metrics: 30 dòng/học viên thay vì quét hàng nghìn dòng log.
+    Được tính lại (ghi đè, idempotent) từ log gốc bởi activity_rollup_service.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_activities')
+    course_id = models.CharField(max_length=100)    # Cùng kiểu với UserActivityLog.course_id
+    day = models.DateField()                        # Ngày theo TIME_ZONE của project
+
+    total_actions = models.IntegerField(default=0)
+    high_value_actions = models.IntegerField(default=0)   # QUIZ_SUBMIT, VIDEO_COMPLETE
+    last_access = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('course_id', 'user', 'day')
+        indexes = [
+            models.Index(fields=['course_id', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.course_id} - {self.day}"
+
+
 class StudentSnapshot(models.Model):
     """
     Bảng lưu kết quả 'khám sức khỏe' học tập định kỳ.
@@ -8,6 +8,7 @@ class ActivityLogItemSerializer(serializers.Serializer):
     entity_id = serializers.CharField(max_length=100, required=False, allow_null=True)
     payload = serializers.DictField(required=False, default=dict)
     session_id = serializers.CharField(max_length=50, required=False, allow_null=True)
+    course_id = serializers.CharField(max_length=100, required=False, allow_null=True)
     is_critical = serializers.BooleanField(required=False, default=False)
 
 
@@ -0,0 +1,305 @@
+import json
+import time
+import uuid
+import logging
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from custom_account.models import UserModel
+from analytics.models import UserActivityLog
+from analytics.services import activity_rollup_service
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'analytics:activity'
+BUFFER_KEY = f'{KEY_PREFIX}:buffer'        # Redis List: mỗi phần tử là 1 event (JSON)
+METRICS_KEY = f'{KEY_PREFIX}:metrics'      # Redis Hash: số liệu của lần flush gần nhất + tổng
+FLUSH_LOCK_KEY = f'{KEY_PREFIX}:flush_lock'
+DEAD_LETTER_KEY = f'{KEY_PREFIX}:dead_letter'  # Redis List: event không ghi được (dữ liệu lỗi), chờ xử lý tay
+
+# Khi buffer dài quá ngưỡng này -> Kích hoạt flush ngay, không chờ Celery Beat
+FLUSH_SIZE_THRESHOLD = 1000
+FLUSH_BATCH_SIZE = 1000
+FLUSH_LOCK_TTL_SECONDS = 60
+
+# Dedupe streak: mỗi user chỉ update streak tối đa 1 lần/ngày
+STREAK_MARK_TTL_SECONDS = 2 * 24 * 60 * 60
+
+# Hành động không tính streak (giữ đồng bộ với async_log_activity)
+STREAK_IGNORE_ACTIONS = {'SEARCH', 'LOGOUT'}
+
+# Chỉ xóa lock khi token còn khớp (lock hết hạn rồi bị worker khác giành -> Không xóa nhầm)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def is_enabled() -> bool:
+    return getattr(settings, 'ACTIVITY_LOG_BUFFERED', False)
+
+
+def _get_redis():
+    return get_redis_connection('default')
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _streak_mark_key(user_id, day) -> str:
+    return f'{KEY_PREFIX}:streak:{user_id}:{day.isoformat()}'
+
+
+def _pop_batch(redis_conn, batch_size: int) -> List[bytes]:
+    """Lấy và xóa tối đa batch_size phần tử đầu list (LRANGE + LTRIM trong 1 MULTI -> atomic)."""
+    pipe = redis_conn.pipeline()
+    pipe.lrange(BUFFER_KEY, 0, batch_size - 1)
+    pipe.ltrim(BUFFER_KEY, batch_size, -1)
+    items, _ = pipe.execute()
+    return items
+
+
+def _build_log(event: Dict[str, Any]) -> UserActivityLog:
+    return UserActivityLog(
+        user_id=event['user_id'],
+        action=event['action'],
+        entity_type=event.get('entity_type'),
+        entity_id=event.get('entity_id'),
+        course_id=event.get('course_id'),
+        payload=event.get('payload') or {},
+        session_id=event.get('session_id'),
+    )
+
+
+def _dead_letter(redis_conn, raw, error: Exception) -> None:
+    redis_conn.rpush(DEAD_LETTER_KEY, json.dumps({
+        'event': _decode(raw),
+        'error': str(error)[:500],
+        'failed_at': timezone.now().isoformat(),
+    }))
+    logger.error(f"⚠️ Activity event dead-lettered: {error}")
+
+
+def _insert_rows(redis_conn, rows: List[tuple]) -> List[UserActivityLog]:
+    """
+    Ghi từng dòng khi bulk_create cả batch thất bại: Dòng lỗi dữ liệu (user đã bị xóa, giá trị sai kiểu...)
+    -> Dead-letter, các dòng còn lại vẫn được ghi. Trả về các log đã ghi.
+    Mất kết nối DB (lỗi tạm thời) -> Raise để flush trả phần còn lại về buffer.
+    """
+    inserted = []
+    for index, (raw, log) in enumerate(rows):
+        try:
+            UserActivityLog.objects.bulk_create([log])
+        except (OperationalError, InterfaceError):
+            redis_conn.rpush(BUFFER_KEY, *[item for item, _ in rows[index:]])
+            raise
+        except Exception as e:
+            _dead_letter(redis_conn, raw, e)
+            continue
+        inserted.append(log)
+    return inserted
+
+
+def release_flush_lock(token: str) -> bool:
+    """Compare-and-delete: Chỉ người giữ token mới xóa được lock."""
+    return bool(_get_redis().eval(RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token))
+
+
+def _update_streaks(events: List[Dict[str, Any]]) -> int:
+    """
+    Update streak cho các user trong batch, tối đa 1 lần/user/ngày.
+    - Trong batch: gom theo user_id.
+    - Giữa các batch: đánh dấu bằng key Redis SET NX (ngày hôm nay).
+    """
+    from analytics.tasks import update_streak_on_activity_logic
+
+    user_ids = {e['user_id'] for e in events if e.get('action') not in STREAK_IGNORE_ACTIONS}
+    if not user_ids:
+        return 0
+
+    redis_conn = _get_redis()
+    today = timezone.now().date()
+
+    pipe = redis_conn.pipeline(transaction=False)
+    ordered_ids = list(user_ids)
+    for user_id in ordered_ids:
+        pipe.set(_streak_mark_key(user_id, today), 1, nx=True, ex=STREAK_MARK_TTL_SECONDS)
+    results = pipe.execute()
+
+    to_update = [user_id for user_id, is_new in zip(ordered_ids, results) if is_new]
+    if not to_update:
+        return 0
+
+    updated = 0
+    for user in UserModel.objects.filter(pk__in=to_update):
+        try:
+            update_streak_on_activity_logic(user)
+            updated += 1
+        except Exception as e:
+            # Bỏ đánh dấu để event sau trong ngày thử lại
+            redis_conn.delete(_streak_mark_key(user.pk, today))
+            logger.error(f"⚠️ Streak update failed for user {user.pk}: {e}")
+
+    return updated
+
+
+def _record_metrics(redis_conn, size: int, duration_ms: float, oldest_enqueued_at: Optional[float]) -> None:
+    lag_ms = (time.time() - oldest_enqueued_at) * 1000 if oldest_enqueued_at else 0
+
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.hset(METRICS_KEY, mapping={
+        'last_flush_size': size,
+        'last_flush_ms': round(duration_ms, 2),
+        'last_flush_lag_ms': round(lag_ms, 2),
+        'last_flush_at': timezone.now().isoformat(),
+    })
+    pipe.hincrby(METRICS_KEY, 'total_flushed', size)
+    pipe.hincrby(METRICS_KEY, 'flush_count', 1)
+    pipe.execute()
+
+
+# ==========================================
+# PUBLIC INTERFACE (ENQUEUE)
+# ==========================================
+
+def enqueue(user_id, data: Dict[str, Any]) -> int:
+    """
+    Đẩy 1 event (đã được validate bởi log_service) vào buffer.
+    Trả về độ dài buffer hiện tại.
+    """
+    return enqueue_many(user_id, [data])
+
+
+def enqueue_many(user_id, data_list: List[Dict[str, Any]]) -> int:
+    """Bản batch của enqueue (1 round-trip Redis cho cả list)."""
+    now = time.time()
+    events = [
+        json.dumps({
+            'user_id': str(user_id),
+            'action': data.get('action'),
+            'entity_type': data.get('entity_type'),
+            'entity_id': data.get('entity_id'),
+            'course_id': data.get('course_id'),
+            'payload': data.get('payload') or {},
+            'session_id': data.get('session_id'),
+            '_enqueued_at': now,
+        }, default=str)
+        for data in data_list
+    ]
+    return _get_redis().rpush(BUFFER_KEY, *events)
+
+
+def should_flush(buffer_length: int) -> Optional[str]:
+    """
+    Buffer đầy -> Giành lock để chỉ 1 request kích hoạt flush sớm.
+    Trả về token của lock (truyền cho flush để nhả lock) hoặc None.
+    """
+    if buffer_length < FLUSH_SIZE_THRESHOLD:
+        return None
+    token = uuid.uuid4().hex
+    if _get_redis().set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TTL_SECONDS):
+        return token
+    return None
+
+
+# ==========================================
+# PUBLIC INTERFACE (FLUSH)
+# ==========================================
+
+def flush(batch_size: int = FLUSH_BATCH_SIZE, max_batches: Optional[int] = None, lock_token: Optional[str] = None) -> int:
+    """
+    Đẩy event trong buffer xuống DB:
+    - bulk_create UserActivityLog (1 INSERT / batch). Lỗi -> Ghi lại từng dòng, dòng lỗi vào dead-letter.
+    - Streak: tối đa 1 lần/user/ngày.
+    - Ghi metrics (size, thời gian flush, độ trễ của event cũ nhất).
+    lock_token: Token từ should_flush (flush sớm) -> Nhả lock khi xong.
+    Trả về số log đã ghi.
+    """
+    redis_conn = _get_redis()
+    total = 0
+    batches = 0
+
+    try:
+        while max_batches is None or batches < max_batches:
+            raw_items = _pop_batch(redis_conn, batch_size)
+            if not raw_items:
+                break
+
+            started = time.perf_counter()
+            rows = []
+            events = []
+            for raw in raw_items:
+                try:
+                    event = json.loads(_decode(raw))
+                    rows.append((raw, _build_log(event)))
+                    events.append(event)
+                except Exception as e:
+                    # Event hỏng (JSON sai, thiếu user_id...) -> Không bao giờ ghi được, không trả về buffer
+                    _dead_letter(redis_conn, raw, e)
+
+            logs = [log for _, log in rows]
+            try:
+                UserActivityLog.objects.bulk_create(logs, batch_size=500)
+            except (OperationalError, InterfaceError):
+                # DB tạm thời không dùng được -> Trả event về buffer để lần sau flush tiếp, không mất log
+                redis_conn.rpush(BUFFER_KEY, *[raw for raw, _ in rows])
+                raise
+            except Exception as e:
+                logger.warning(f"Activity buffer: bulk insert failed ({e}), retrying row by row")
+                logs = _insert_rows(redis_conn, rows)
+
+            activity_rollup_service.mark_dirty(logs)
+            # Streak chỉ tính cho log đã ghi được (bỏ các dòng vào dead-letter)
+            _update_streaks([{'user_id': log.user_id, 'action': log.action} for log in logs])
+
+            oldest = min((e.get('_enqueued_at') or 0 for e in events), default=None)
+            _record_metrics(redis_conn, len(logs), (time.perf_counter() - started) * 1000, oldest)
+
+            total += len(logs)
+            batches += 1
+    finally:
+        if lock_token:
+            release_flush_lock(lock_token)
+
+    if total:
+        logger.info(f"Activity buffer: flushed {total} logs ({batches} batches)")
+
+    return total
+
+
+# ==========================================
+# PUBLIC INTERFACE (METRICS)
+# ==========================================
+
+def get_metrics() -> Dict[str, Any]:
+    """Số liệu của pipeline: độ dài buffer hiện tại + thống kê flush."""
+    redis_conn = _get_redis()
+    raw = redis_conn.hgetall(METRICS_KEY)
+    metrics = {_decode(k): _decode(v) for k, v in raw.items()}
+
+    return {
+        'buffer_length': redis_conn.llen(BUFFER_KEY),
+        'dead_letter_length': redis_conn.llen(DEAD_LETTER_KEY),
+        'last_flush_size': int(metrics.get('last_flush_size', 0)),
+        'last_flush_ms': float(metrics.get('last_flush_ms', 0)),
+        'last_flush_lag_ms': float(metrics.get('last_flush_lag_ms', 0)),
+        'last_flush_at': metrics.get('last_flush_at'),
+        'total_flushed': int(metrics.get('total_flushed', 0)),
+        'flush_count': int(metrics.get('flush_count', 0)),
+    }
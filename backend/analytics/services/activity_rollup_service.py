@@ -0,0 +1,175 @@
+import logging
+from datetime import date, datetime, timedelta, time as dt_time
+from typing import Iterable, List, Optional, Tuple
+from django.db.models import Count, Max, Q, Sum, QuerySet
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from analytics.models import UserActivityLog, UserDailyActivity
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+DIRTY_SET_KEY = 'analytics:rollup:dirty'    # Set các "course_id|YYYY-MM-DD" có log mới, chờ tính lại
+
+# Hành động "giá trị cao" (x4 điểm Engagement)
+HIGH_VALUE_ACTIONS = ['QUIZ_SUBMIT', 'VIDEO_COMPLETE']
+
+UPSERT_BATCH_SIZE = 1000
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _get_redis():
+    return get_redis_connection('default')
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _bound(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+
+def _upsert(rows: List[UserDailyActivity]) -> None:
+    UserDailyActivity.objects.bulk_create(
+        rows,
+        batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['course_id', 'user', 'day'],
+        update_fields=['total_actions', 'high_value_actions', 'last_access'],
+    )
+
+
+# ==========================================
+# PUBLIC INTERFACE (MARK DIRTY) - Gọi từ luồng ghi log
+# ==========================================
+
+def mark_dirty(logs: Iterable[UserActivityLog]) -> None:
+    """
+    Đánh dấu (course, ngày) có log mới để refresh_dirty tính lại.
+    Log không gắn course_id thì không ảnh hưởng rollup.
+    Redis lỗi -> Bỏ qua, job hằng đêm sẽ tính lại.
+    """
+    members = {
+        f'{log.course_id}|{timezone.localtime(log.timestamp).date().isoformat()}'
+        for log in logs
+        if log.course_id and log.timestamp
+    }
+    if not members:
+        return
+
+    try:
+        _get_redis().sadd(DIRTY_SET_KEY, *members)
+    except Exception as e:
+        logger.error(f"⚠️ Không đánh dấu được rollup dirty: {e}")
+
+
+# ==========================================
+# PUBLIC INTERFACE (REBUILD)
+# ==========================================
+
+def rebuild(start_day: date, end_day: Optional[date] = None, course_id: Optional[str] = None) -> int:
+    """
+    Tính lại rollup từ log gốc cho các ngày [start_day, end_day] (ghi đè, idempotent).
+    1 câu GROUP BY (course_id, user_id, ngày) trên khoảng thời gian -> chỉ quét partition liên quan.
+    Trả về số dòng rollup đã ghi.
+    """
+    end_day = end_day or start_day
+
+    logs = UserActivityLog.objects.filter(
+        timestamp__gte=_bound(start_day),
+        timestamp__lt=_bound(end_day + timedelta(days=1)),
+        course_id__isnull=False,
+    )
+    if course_id:
+        logs = logs.filter(course_id=str(course_id))
+
+    stats = (
+        logs.annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+        .values('course_id', 'user_id', 'day')
+        .annotate(
+            total_actions=Count('id'),
+            high_value_actions=Count('id', filter=Q(action__in=HIGH_VALUE_ACTIONS)),
+            last_access=Max('timestamp'),
+        )
+        .order_by()
+    )
+
+    rows = [
+        UserDailyActivity(
+            course_id=row['course_id'],
+            user_id=row['user_id'],
+            day=row['day'],
+            total_actions=row['total_actions'],
+            high_value_actions=row['high_value_actions'],
+            last_access=row['last_access'],
+        )
+        for row in stats.iterator(chunk_size=UPSERT_BATCH_SIZE)
+    ]
+
+    _upsert(rows)
+    return len(rows)
+
+
+def refresh_dirty(max_items: int = 500) -> int:
+    """
+    Celery Beat: Tính lại các (course, ngày) vừa có log mới.
+    Trả về số cặp (course, ngày) đã xử lý.
+    """
+    redis_conn = _get_redis()
+    members = redis_conn.spop(DIRTY_SET_KEY, max_items)
+    if not members:
+        return 0
+
+    pending: List[Tuple[str, date]] = []
+    for member in members:
+        course_id, _, day = _decode(member).rpartition('|')
+        pending.append((course_id, date.fromisoformat(day)))
+
+    done = 0
+    try:
+        for course_id, day in pending:
+            rebuild(day, course_id=course_id)
+            done += 1
+    except Exception:
+        # Trả phần chưa xử lý về lại set
+        redis_conn.sadd(DIRTY_SET_KEY, *[f'{c}|{d.isoformat()}' for c, d in pending[done:]])
+        raise
+
+    logger.info(f"Activity rollup: refreshed {done} (course, day) pairs")
+    return done
+
+
+# ==========================================
+# PUBLIC INTERFACE (READ)
+# ==========================================
+
+def get_engagement_stats(course_id: str, student_ids: list, since: date) -> QuerySet:
+    """
+    Tổng hợp engagement theo user từ rollup (thay cho GROUP BY trên log gốc).
+    Mỗi học viên tối đa ~30 dòng.
+    """
+    return (
+        UserDailyActivity.objects.filter(
+            course_id=str(course_id),
+            day__gte=since,
+            user_id__in=student_ids,
+        )
+        .values('user_id')
+        .annotate(
+            last_access=Max('last_access'),
+            total_actions=Sum('total_actions'),
+            high_value_actions=Sum('high_value_actions'),
+        )
+        .order_by()
+    )
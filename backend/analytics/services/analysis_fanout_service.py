@@ -0,0 +1,229 @@
+import json
+import time
+import uuid
+import logging
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from content.models import Course
+from analytics.models import CourseAnalyticsLog, UserDailyActivity
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'analytics:fanout'
+ACTIVE_RUN_KEY = f'{KEY_PREFIX}:active'      # Chỉ 1 lượt fan-out chạy tại 1 thời điểm
+LAST_RUN_KEY = f'{KEY_PREFIX}:last_run'      # run_id của lượt gần nhất (để xem metrics)
+
+# Hết hạn các key của 1 lượt (kể cả khi worker chết giữa chừng và lượt không bao giờ "kết thúc")
+RUN_TTL_SECONDS = 6 * 60 * 60
+
+# Chỉ xét khóa học có hoạt động trong N ngày gần nhất
+ACTIVITY_LOOKBACK_DAYS = 7
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _get_redis():
+    return get_redis_connection('default')
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _run_key(run_id: str) -> str:
+    return f'{KEY_PREFIX}:{run_id}'
+
+
+def _queue_key(run_id: str) -> str:
+    return f'{KEY_PREFIX}:{run_id}:queue'
+
+
+def _timings_key(run_id: str) -> str:
+    return f'{KEY_PREFIX}:{run_id}:timings'
+
+
+def get_max_concurrency() -> int:
+    return max(getattr(settings, 'COURSE_ANALYSIS_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY), 1)
+
+
+# ==========================================
+# PUBLIC INTERFACE (SELECT)
+# ==========================================
+
+def find_courses_to_analyze(lookback_days: int = ACTIVITY_LOOKBACK_DAYS) -> List[Tuple[str, int]]:
+    """
+    Danh sách (course_id, sĩ số) cần phân tích lại, sĩ số lớn xếp trước.
+    Bỏ qua khóa học KHÔNG có hoạt động mới kể từ lần phân tích thành công gần nhất (CourseAnalyticsLog).
+    Hoạt động lấy từ rollup UserDailyActivity (1 dòng/user/ngày) thay vì quét UserActivityLog.
+    """
+    since = timezone.localdate() - timedelta(days=lookback_days)
+
+    activity_rows = UserDailyActivity.objects.filter(day__gte=since) \
+        .values('course_id') \
+        .annotate(last_activity=Max('last_access')) \
+        .order_by()
+
+    # course_id trong log là CharField -> Bỏ các giá trị không phải UUID
+    last_activity_map = {}
+    for row in activity_rows:
+        try:
+            last_activity_map[uuid.UUID(row['course_id'])] = row['last_activity']
+        except (TypeError, ValueError):
+            continue
+
+    if not last_activity_map:
+        return []
+
+    last_success = CourseAnalyticsLog.objects.filter(
+        course_id=OuterRef('pk'),
+        status='success'
+    ).order_by('-created_at').values('created_at')[:1]
+
+    courses = Course.objects.filter(id__in=list(last_activity_map.keys())).annotate(
+        class_size=Count('enrollments'),
+        last_analyzed_at=Subquery(last_success),
+    ).values('id', 'class_size', 'last_analyzed_at')
+
+    candidates = [
+        (str(course['id']), course['class_size'])
+        for course in courses
+        if course['class_size'] > 0 and (
+            course['last_analyzed_at'] is None
+            or last_activity_map[course['id']] > course['last_analyzed_at']
+        )
+    ]
+    candidates.sort(key=lambda item: item[1], reverse=True)
+    return candidates
+
+
+# ==========================================
+# PUBLIC INTERFACE (RUN)
+# ==========================================
+
+def start_run(max_concurrency: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Mở 1 lượt fan-out:
+    - Đẩy toàn bộ course cần phân tích vào hàng đợi Redis (đã sắp theo sĩ số).
+    - Lấy ra `max_concurrency` course đầu tiên để dispatch ngay.
+    Mỗi task khi xong sẽ tự lấy course tiếp theo (next_course) -> Số task chạy song song không vượt quá giới hạn.
+    Trả về None nếu lượt trước vẫn đang chạy.
+    """
+    max_concurrency = max_concurrency or get_max_concurrency()
+    redis_conn = _get_redis()
+
+    run_id = uuid.uuid4().hex
+    if not redis_conn.set(ACTIVE_RUN_KEY, run_id, nx=True, ex=RUN_TTL_SECONDS):
+        logger.info(f"Course analysis fan-out: run {_decode(redis_conn.get(ACTIVE_RUN_KEY))} vẫn đang chạy, bỏ qua.")
+        return None
+
+    try:
+        candidates = find_courses_to_analyze()
+    except Exception:
+        redis_conn.delete(ACTIVE_RUN_KEY)
+        raise
+
+    if not candidates:
+        redis_conn.delete(ACTIVE_RUN_KEY)
+        return {'run_id': run_id, 'total': 0, 'dispatch': []}
+
+    course_ids = [course_id for course_id, _ in candidates]
+
+    pipe = redis_conn.pipeline()
+    pipe.hset(_run_key(run_id), mapping={
+        'started_at': time.time(),
+        'total': len(course_ids),
+        'remaining': len(course_ids),
+        'max_concurrency': max_concurrency,
+    })
+    if len(course_ids) > max_concurrency:
+        pipe.rpush(_queue_key(run_id), *course_ids[max_concurrency:])
+    pipe.set(LAST_RUN_KEY, run_id)
+    for key in (_run_key(run_id), _queue_key(run_id)):
+        pipe.expire(key, RUN_TTL_SECONDS)
+    pipe.execute()
+
+    logger.info(f"Course analysis fan-out {run_id}: {len(course_ids)} courses, concurrency {max_concurrency}")
+    return {'run_id': run_id, 'total': len(course_ids), 'dispatch': course_ids[:max_concurrency]}
+
+
+def next_course(run_id: str) -> Optional[str]:
+    """Lấy course tiếp theo trong hàng đợi của lượt (None nếu đã hết)."""
+    value = _get_redis().lpop(_queue_key(run_id))
+    return _decode(value) if value else None
+
+
+def record_course_done(run_id: str, course_id: str, seconds: float, status: str, total_students: int = 0) -> None:
+    """
+    Ghi thời gian chạy của 1 course. Course cuối cùng của lượt -> Chốt tổng thời gian (wall time)
+    và nhả ACTIVE_RUN_KEY để lượt sau được phép chạy.
+    """
+    redis_conn = _get_redis()
+    run_key = _run_key(run_id)
+
+    pipe = redis_conn.pipeline()
+    pipe.hset(_timings_key(run_id), course_id, json.dumps({
+        'seconds': round(seconds, 3),
+        'status': status,
+        'total_students': total_students,
+    }))
+    pipe.expire(_timings_key(run_id), RUN_TTL_SECONDS)
+    pipe.hincrby(run_key, 'remaining', -1)
+    remaining = pipe.execute()[2]
+
+    if remaining > 0:
+        return
+
+    started_at = float(_decode(redis_conn.hget(run_key, 'started_at')) or time.time())
+    wall_time = round(time.time() - started_at, 3)
+    redis_conn.hset(run_key, mapping={'finished_at': time.time(), 'wall_time_seconds': wall_time})
+
+    # Chỉ nhả lock nếu nó vẫn thuộc về lượt này
+    if _decode(redis_conn.get(ACTIVE_RUN_KEY)) == run_id:
+        redis_conn.delete(ACTIVE_RUN_KEY)
+
+    logger.info(f"Course analysis fan-out {run_id} finished: wall time {wall_time}s")
+
+
+# ==========================================
+# PUBLIC INTERFACE (METRICS)
+# ==========================================
+
+def get_run_summary(run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Tổng quan 1 lượt (mặc định: lượt gần nhất): tổng wall time + thời gian từng course."""
+    redis_conn = _get_redis()
+    run_id = run_id or _decode(redis_conn.get(LAST_RUN_KEY))
+    if not run_id:
+        return None
+
+    raw = {_decode(k): _decode(v) for k, v in redis_conn.hgetall(_run_key(run_id)).items()}
+    if not raw:
+        return None
+
+    timings = {
+        _decode(course_id): json.loads(_decode(value))
+        for course_id, value in redis_conn.hgetall(_timings_key(run_id)).items()
+    }
+
+    return {
+        'run_id': run_id,
+        'total': int(raw.get('total', 0)),
+        'remaining': int(raw.get('remaining', 0)),
+        'max_concurrency': int(raw.get('max_concurrency', 0)),
+        'wall_time_seconds': float(raw['wall_time_seconds']) if 'wall_time_seconds' in raw else None,
+        'courses': timings,
+    }
@@ -3,7 +3,7 @@ import pandas as pd
 import time
 from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Count, Avg, Max, F, Q
 from django.utils import timezone
 from datetime import timedelta
@@ -19,6 +19,8 @@ from analytics.domains.risk_distribution_domain import RiskDistributionDomain
 from analytics.domains.paginated_student_list_domain import PaginatedStudentListDomain
 from analytics.domains.student_risk_info_domain import StudentRiskInfoDomain
 from analytics.domains.analytics_log_domain import AnalyticsLogDomain
+from analytics.services import activity_rollup_service
+from core.services import bulk_update_service
 
 
 
@@ -31,6 +33,15 @@ RISK_CONFIG = {
     'HIGH_PERFORMANCE_THRESHOLD': 8.0,
 } 
 
+# Ghi snapshot theo chunk, mỗi chunk commit riêng
+SNAPSHOT_CHUNK_SIZE = 2000
+SNAPSHOT_SYNC_FIELDS = [
+    'current_engagement_score',
+    'current_performance_score',
+    'current_days_inactive',
+    'current_risk_level',
+]
+
 # ---------------------------------------------------------
 # PRIVATE HELPER METHODS 
 # ---------------------------------------------------------
@@ -45,19 +56,11 @@ def _fetch_enrolled_students(course_id: str) -> pd.DataFrame:
 
 
 def _calculate_engagement_metrics(course_id: str, student_ids: list) -> pd.DataFrame:
-    """Tính toán chỉ số tương tác từ UserActivityLog"""
-    thirty_days_ago = timezone.now() - timedelta(days=30)
+    """Tính toán chỉ số tương tác từ rollup theo ngày (UserDailyActivity)"""
+    thirty_days_ago = timezone.localdate() - timedelta(days=30)
     
-    # Query Aggregate trực tiếp từ DB (Tối ưu RAM)
-    log_stats_qs = UserActivityLog.objects.filter(
-        course_id=course_id,
-        timestamp__gte=thirty_days_ago,
-        user_id__in=student_ids
-    ).values('user_id').annotate(
-        last_access=Max('timestamp'),
-        total_actions=Count('id'),
-        high_value_actions=Count('id', filter=Q(action__in=['QUIZ_SUBMIT', 'VIDEO_COMPLETE']))
-    )
+    # Đọc từ bảng rollup (~30 dòng/học viên) thay vì GROUP BY trên hàng nghìn dòng UserActivityLog
+    log_stats_qs = activity_rollup_service.get_engagement_stats(course_id, student_ids, since=thirty_days_ago)
 
     if not log_stats_qs:
         # Trả về DataFrame rỗng nhưng có đúng cột để join không bị lỗi
@@ -153,7 +156,6 @@ def _assess_risk_matrix(df: pd.DataFrame) -> pd.DataFrame:
 # ANALYZE
 # ==========================================
 
-@transaction.atomic
 def analyze_course_health_bulk(course_id: str) -> AnalyticsJobResultDomain:
     start_time = time.time()
     
@@ -198,12 +200,81 @@ def analyze_course_health_bulk(course_id: str) -> AnalyticsJobResultDomain:
 # SNAPSHOT
 # ==========================================
 
-@transaction.atomic
-def save_snapshots(course_id, df_result):
+def _snapshot_columns(df_result: pd.DataFrame) -> dict:
+    """Tách DataFrame thành các list cột thuần Python (vectorized, không iterrows)."""
+    return {
+        'user_id': df_result.index.tolist(),
+        'eng_score': df_result['eng_score'].astype(float).tolist(),
+        'perf_score': df_result['perf_score'].astype(float).tolist(),
+        'days_inactive': df_result['days_inactive'].astype(int).tolist(),
+        'risk_level': df_result['risk_level'].astype(str).tolist(),
+        'message': df_result['message'].astype(str).tolist(),
+    }
+
+
+def _insert_snapshot_chunk(course_id, cols: dict, start: int, end: int) -> int:
+    snapshots = [
+        StudentSnapshot(
+            user_id=user_id,
+            course_id=course_id,
+            engagement_score=eng,
+            performance_score=perf,
+            days_inactive=days,
+            risk_level=risk,
+            ai_message=message,
+        )
+        for user_id, eng, perf, days, risk, message in zip(
+            cols['user_id'][start:end], cols['eng_score'][start:end], cols['perf_score'][start:end],
+            cols['days_inactive'][start:end], cols['risk_level'][start:end], cols['message'][start:end],
+        )
+    ]
+    StudentSnapshot.objects.bulk_create(snapshots, batch_size=len(snapshots) or 1)
+    return len(snapshots)
+
+
+def _update_enrollment_chunk(course_id, cols: dict, start: int, end: int) -> int:
+    """
+    Đồng bộ chỉ số hiện tại vào Enrollment bằng 1 câu UPDATE ... FROM (VALUES ...) cho cả chunk
+    (không load Enrollment lên RAM).
+    """
+    rows = list(zip(
+        cols['user_id'][start:end], cols['eng_score'][start:end], cols['perf_score'][start:end],
+        cols['days_inactive'][start:end], cols['risk_level'][start:end],
+    ))
+    if not rows:
+        return 0
+
+    if connection.vendor != 'postgresql':
+        # Fallback (SQLite khi dev/test): bulk_update theo ORM
+        enrollments = list(Enrollment.objects.filter(course_id=course_id, user_id__in=[r[0] for r in rows]))
+        by_user = {r[0]: r for r in rows}
+        for enrollment in enrollments:
+            _, eng, perf, days, risk = by_user[enrollment.user_id]
+            enrollment.current_engagement_score = eng
+            enrollment.current_performance_score = perf
+            enrollment.current_days_inactive = days
+            enrollment.current_risk_level = risk
+        Enrollment.objects.bulk_update(enrollments, fields=SNAPSHOT_SYNC_FIELDS)
+        return len(enrollments)
+
+    user_type = Enrollment._meta.get_field('user').target_field.db_type(connection)
+    return bulk_update_service.update_from_values(
+        Enrollment,
+        [('user_id', user_type)],
+        [('current_engagement_score', 'float8'), ('current_performance_score', 'float8'),
+         ('current_days_inactive', 'integer'), ('current_risk_level', 'varchar')],
+        rows,
+        where={'course_id': course_id},
+    )
+
+
+def save_snapshots(course_id, df_result, chunk_size: int = SNAPSHOT_CHUNK_SIZE):
     """
     Lưu kết quả phân tích.
     LOGIC MỚI: Giữ lại lịch sử (Append-only), không xóa cái cũ.
-    Để tránh spam DB, ta có thể check xem hôm nay đã chạy chưa (Optional).
+    Ghi theo chunk, MỖI CHUNK 1 TRANSACTION riêng (INSERT snapshot + UPDATE enrollment)
+    -> Không giữ lock trên cả lớp 50k học viên, RAM chỉ tốn cho 1 chunk object.
+    Chạy lại trong ngày sẽ xóa snapshot hôm nay trước -> Idempotent kể cả khi lần trước dừng giữa chừng.
     """
     
     # [OPTIONAL]: Xóa bản ghi CỦA NGÀY HÔM NAY để tránh duplicate nếu chạy job nhiều lần trong ngày
@@ -218,73 +289,18 @@ def save_snapshots(course_id, df_result):
     if deleted_count > 0:
         print(f"🔄 Re-running analytics for today. Deleted {deleted_count} partial records.")
 
-    # Chuẩn bị list object
-    snapshots = []
-    for user_id, row in df_result.iterrows():
-        snapshots.append(StudentSnapshot(
-            user_id=user_id,
-            course_id=course_id,
-            
-            # Các chỉ số
-            engagement_score=row['eng_score'],
-            performance_score=row['perf_score'],
-            days_inactive=int(row['days_inactive']),
-            
-            # Kết luận
-            risk_level=row['risk_level'],
-            ai_message=row['message'],
-            
-            # [QUAN TRỌNG] Lưu ý: created_at sẽ tự động lấy giờ hiện tại (auto_now_add)
-        ))
-    
-    # Bulk Create (Insert 1 cục)
-    StudentSnapshot.objects.bulk_create(snapshots, batch_size=500)
-    print(f"✅ Saved history for {len(snapshots)} students in Course {course_id}")
-
-    # ---------------------------------------------------------
-    # 3. [NEW] UPDATE ENROLLMENT (SYNC STATE) - Dùng bulk_update
-    # ---------------------------------------------------------
-    print("⏳ Syncing to Enrollment table...")
-
-    # Bước A: Lấy tất cả enrollment cần update lên RAM (1 Query)
-    # df_result.index chính là list các user_id vừa được tính toán
-    enrollments_to_update = Enrollment.objects.filter(
-        course_id=course_id,
-        user_id__in=df_result.index
-    )
+    cols = _snapshot_columns(df_result)
+    total = len(cols['user_id'])
+    saved, synced = 0, 0
 
-    # Bước B: Map dữ liệu từ DataFrame vào Object (In-Memory)
-    update_list = []
-    
-    for enrollment in enrollments_to_update:
-        # Lấy row tương ứng từ DataFrame (O(1) lookup vì dùng index)
-        try:
-            row = df_result.loc[enrollment.user_id]
-            
-            # Gán giá trị mới vào object Enrollment
-            enrollment.current_engagement_score = float(row['eng_score'])
-            enrollment.current_performance_score = float(row['perf_score'])
-            enrollment.current_days_inactive = int(row['days_inactive'])
-            enrollment.current_risk_level = row['risk_level']
-            
-            update_list.append(enrollment)
-        except KeyError:
-            # Phòng trường hợp data bị lệch (hiếm khi xảy ra nếu logic chuẩn)
-            continue
-
-    # Bước C: Bắn 1 query UPDATE xuống DB
-    if update_list:
-        Enrollment.objects.bulk_update(
-            update_list,
-            fields=[
-                'current_engagement_score', 
-                'current_performance_score', 
-                'current_days_inactive', 
-                'current_risk_level'
-            ],
-            batch_size=500
-        )
-        print(f"✅ Synced current state for {len(update_list)} enrollments.")
+    for start in range(0, total, chunk_size):
+        end = min(start + chunk_size, total)
+        with transaction.atomic():
+            saved += _insert_snapshot_chunk(course_id, cols, start, end)
+            synced += _update_enrollment_chunk(course_id, cols, start, end)
+
+    print(f"✅ Saved history for {saved} students in Course {course_id}")
+    print(f"✅ Synced current state for {synced} enrollments.")
     
     instructor_id = Course.objects.filter(id=course_id).values_list('owner_id', flat=True).first()
 
@@ -0,0 +1,185 @@
+import logging
+from datetime import date, datetime, time as dt_time
+from typing import List, Dict, Any
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from analytics.models import UserActivityLog
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+PARENT_TABLE = UserActivityLog._meta.db_table          # analytics_useractivitylog
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'          # Hứng các dòng nằm ngoài mọi partition (an toàn)
+ARCHIVE_SCHEMA = 'analytics_archive'                   # Partition cũ sau khi detach sẽ được chuyển sang đây
+
+DEFAULT_MONTHS_AHEAD = 3
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _add_months(d: date, months: int) -> date:
+    month_index = d.year * 12 + (d.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f'{PARENT_TABLE}_p{month.year}{month.month:02d}'
+
+
+def _month_from_name(name: str):
+    """analytics_useractivitylog_p202501 -> date(2025, 1, 1). Không đúng format -> None."""
+    suffix = name.rsplit('_p', 1)[-1]
+    if len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def _bound(month: date) -> datetime:
+    """Mốc partition theo timezone của project (timestamp là timestamptz)."""
+    return timezone.make_aware(datetime.combine(month, dt_time.min))
+
+
+def is_partitioned() -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = 'public'::regnamespace",
+            [PARENT_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions() -> List[str]:
+    """Tên các partition tháng đang gắn vào bảng cha (không gồm partition default)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s ORDER BY child.relname",
+            [PARENT_TABLE]
+        )
+        return [row[0] for row in cursor.fetchall() if row[0] != DEFAULT_PARTITION]
+
+
+# ==========================================
+# PUBLIC INTERFACE (CREATE)
+# ==========================================
+
+@transaction.atomic
+def _create_partition(month: date) -> None:
+    """
+    Tạo partition cho 1 tháng.
+    Nếu partition default đang chứa dòng thuộc tháng này (do tạo partition trễ),
+    Postgres không cho tạo trực tiếp -> detach default, tạo partition, chuyển dòng sang, attach lại.
+    """
+    name = _partition_name(month)
+    start, end = _bound(month), _bound(_add_months(month, 1))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [start, end]
+        )
+        has_stray_rows = cursor.fetchone()[0]
+
+        if has_stray_rows:
+            cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{PARENT_TABLE}" FOR VALUES FROM (%s) TO (%s)',
+            [start, end]
+        )
+
+        if has_stray_rows:
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved',
+                [start, end]
+            )
+            cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+
+
+def ensure_partitions(months_ahead: int = DEFAULT_MONTHS_AHEAD) -> List[str]:
+    """
+    Tạo trước partition cho tháng hiện tại và `months_ahead` tháng tiếp theo.
+    Idempotent: partition đã có thì bỏ qua. Trả về danh sách partition vừa tạo.
+    """
+    if not is_partitioned():
+        logger.warning(f"{PARENT_TABLE} chưa được partition, bỏ qua ensure_partitions.")
+        return []
+
+    existing = set(list_partitions())
+    current = _month_start(timezone.localdate())
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(current, offset)
+        name = _partition_name(month)
+        if name in existing:
+            continue
+        _create_partition(month)
+        created.append(name)
+        logger.info(f"Created partition {name}")
+
+    return created
+
+
+# ==========================================
+# PUBLIC INTERFACE (RETENTION)
+# ==========================================
+
+def apply_retention(retention_months: int = None, drop: bool = False, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Retention: Partition có toàn bộ dữ liệu cũ hơn `retention_months` tháng sẽ bị DETACH khỏi bảng cha
+    (query/insert không còn chạm tới), sau đó:
+    - drop=False (mặc định): Chuyển sang schema `analytics_archive` (vẫn query/pg_dump được).
+    - drop=True: DROP hẳn.
+    Trả về danh sách partition đã xử lý.
+    """
+    if retention_months is None:
+        retention_months = getattr(settings, 'ACTIVITY_LOG_RETENTION_MONTHS', 12)
+
+    if not is_partitioned():
+        logger.warning(f"{PARENT_TABLE} chưa được partition, bỏ qua apply_retention.")
+        return []
+
+    cutoff = _add_months(_month_start(timezone.localdate()), -retention_months)
+
+    results = []
+    for name in list_partitions():
+        month = _month_from_name(name)
+        if month is None or _add_months(month, 1) > cutoff:
+            continue
+
+        action = 'dropped' if drop else 'archived'
+        results.append({'partition': name, 'month': month.isoformat(), 'action': action})
+        if dry_run:
+            continue
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"')
+            if drop:
+                cursor.execute(f'DROP TABLE "{name}"')
+            else:
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{ARCHIVE_SCHEMA}"')
+                cursor.execute(f'ALTER TABLE "{name}" SET SCHEMA "{ARCHIVE_SCHEMA}"')
+
+        logger.info(f"Partition {name} {action} (retention {retention_months} months)")
+
+    return results
@@ -1,3 +1,4 @@
+import logging
 from django.db import transaction
 from django.conf import settings
 from typing import Optional, Dict, Any, List
@@ -5,10 +6,13 @@ from typing import Optional, Dict, Any, List
 from core.middleware import get_current_request_context
 from analytics.models import UserActivityLog, ACTION_VERBS
 from analytics.domains.activity_log_domain import ActivityLogDomain
-from analytics.tasks import async_log_activity,async_log_batch, update_streak_on_activity_logic
+from analytics.tasks import async_log_activity,async_log_batch, update_streak_on_activity_logic, flush_activity_buffer
+from analytics.services import activity_buffer_service, activity_rollup_service
 
 
 
+logger = logging.getLogger(__name__)
+
 VALID_ACTIONS = {action[0] for action in ACTION_VERBS}
 
 # ==========================================
@@ -58,6 +62,8 @@ def _validate_and_normalize(user,
         'entity_id': entity_id,
         'payload': enriched_payload,
         'session_id': data.get('session_id'),
+        # Denormalization cho Dashboard (UserActivityLog.course_id)
+        'course_id': str(data['course_id']) if data.get('course_id') else None,
         # Default False nếu không gửi
         'is_critical': data.get('is_critical', False) 
     }
@@ -74,8 +80,10 @@ def _save_to_db(data: Dict[str, Any]) -> Optional[ActivityLogDomain]:
             entity_type=data['entity_type'],
             entity_id=data['entity_id'],
             payload=data['payload'],
-            session_id=data['session_id']
+            session_id=data['session_id'],
+            course_id=data.get('course_id')
         )
+        activity_rollup_service.mark_dirty([log])
         return ActivityLogDomain.from_model(log)
     
     except Exception as e:
@@ -111,6 +119,28 @@ def _save_to_db(data: Dict[str, Any]) -> Optional[ActivityLogDomain]:
 #         return []
 
 
+def _enqueue_or_dispatch(user_id, entries: List[Dict[str, Any]]) -> None:
+    """
+    Non-critical log:
+    - Buffer bật -> Đẩy vào Redis, nếu buffer đầy thì kích hoạt flush sớm.
+    - Buffer tắt / Redis lỗi -> Fallback về Celery task như cũ (không mất log).
+    """
+    if activity_buffer_service.is_enabled():
+        try:
+            buffer_length = activity_buffer_service.enqueue_many(user_id, entries)
+            lock_token = activity_buffer_service.should_flush(buffer_length)
+            if lock_token:
+                flush_activity_buffer.delay(lock_token=lock_token)
+            return
+        except Exception as e:
+            logger.error(f"⚠️ Activity buffer unavailable, fallback Celery: {e}")
+
+    if len(entries) == 1:
+        async_log_activity.delay(user_id, entries[0])
+    else:
+        async_log_batch.delay(user_id, entries)
+
+
 # ==========================================
 # PUBLIC INTERFACE (RECORD)
 # ==========================================
@@ -154,8 +184,10 @@ def record_activity(user, data: Dict[str, Any]) -> Optional[ActivityLogDomain]:
         user_id = user.id       # Chỉ lấy ID
 
         # Gọi task async
+        # Buffered: Gom vào Redis, flush theo batch (bulk_create + streak 1 lần/user/ngày)
+        # thay vì 1 Celery task + ~4 query cho mỗi dòng log
         transaction.on_commit(
-            lambda: async_log_activity.delay(user_id, task_payload)
+            lambda: _enqueue_or_dispatch(user_id, [task_payload])
         )
         
         return True # Return True để báo hiệu đã đẩy vào queue thành công
@@ -194,7 +226,7 @@ def record_batch(user, data_list: List[Dict[str, Any]]) -> bool:
     user_id = user.id
 
     transaction.on_commit(
-        lambda: async_log_batch.delay(user_id, clean_entries)
+        lambda: _enqueue_or_dispatch(user_id, clean_entries)
     )
 
     # Bulk Create để tối ưu DB Performance
@@ -1,3 +1,4 @@
+import time
 import traceback
 from celery import shared_task
 from datetime import timedelta
@@ -8,6 +9,7 @@ from custom_account.models import UserModel
 from analytics.services.course_analyze_service import analyze_course_health_bulk
 from analytics.models import UserActivityLog, CourseAnalyticsLog
 from gamification.models import UserGamification
+from analytics.services import activity_rollup_service
 
 
 
@@ -70,6 +72,7 @@ def async_log_batch(user_id: int, data_list: list):
                 entity_id=data.get('entity_id'),
                 payload=data.get('payload', {}),
                 session_id=data.get('session_id'),
+                course_id=data.get('course_id'),
                 # timestamp sẽ tự động lấy now() nhờ auto_now_add trong Model
                 # Trừ khi bạn muốn ghi đè timestamp từ client gửi lên (cần parse datetime string)
             ))
@@ -77,6 +80,7 @@ def async_log_batch(user_id: int, data_list: list):
         # 2. Bulk Create (1 Query duy nhất cho N dòng)
         if log_instances:
             UserActivityLog.objects.bulk_create(log_instances, batch_size=500)
+            activity_rollup_service.mark_dirty(log_instances)
             
             # 3. [OPTIMIZATION] Update Streak
             # Thay vì update N lần cho N log, ta chỉ update 1 lần duy nhất cho cả Batch
@@ -91,6 +95,50 @@ def async_log_batch(user_id: int, data_list: list):
         print(f"❌ Error in async_log_batch: {e}")
 
 
+@shared_task
+def flush_activity_buffer(lock_token: Optional[str] = None):
+    """
+    Celery Beat (mỗi 5s) hoặc kích hoạt sớm khi buffer đầy (kèm lock_token để nhả lock):
+    Đẩy log non-critical từ Redis xuống DB theo batch.
+    """
+    from analytics.services import activity_buffer_service
+
+    try:
+        return activity_buffer_service.flush(lock_token=lock_token)
+    except Exception as e:
+        print(f"❌ Error in flush_activity_buffer: {e}")
+        return 0
+
+
+@shared_task
+def refresh_activity_rollups():
+    """
+    Celery Beat (mỗi 5 phút): Tính lại rollup UserDailyActivity cho các (course, ngày) vừa có log mới.
+    """
+    return activity_rollup_service.refresh_dirty()
+
+
+@shared_task
+def rebuild_activity_rollups_nightly():
+    """
+    Celery Beat (hằng đêm): Tính lại toàn bộ rollup của hôm qua (lưới an toàn nếu mark_dirty bị lỡ).
+    """
+    yesterday = timezone.localdate() - timedelta(days=1)
+    return activity_rollup_service.rebuild(yesterday)
+
+
+@shared_task
+def maintain_activity_log_partitions():
+    """
+    Celery Beat (hằng ngày): Tạo trước partition tháng tới + detach/archive partition quá hạn retention.
+    """
+    from analytics.services import log_partition_service
+
+    created = log_partition_service.ensure_partitions()
+    archived = log_partition_service.apply_retention()
+    return {'created': created, 'archived': [item['partition'] for item in archived]}
+
+
 def update_streak_on_activity_logic(user):
     gamification, _ = UserGamification.objects.get_or_create(user=user)
     today = timezone.now().date()
@@ -127,12 +175,18 @@ def update_streak_on_activity_logic(user):
 
 
 @shared_task
-def async_analyze_course(course_id: str):
+def async_analyze_course(course_id: str, run_id: Optional[str] = None):
     """
     Task chạy ngầm phân tích sức khỏe lớp học.
+    run_id: Được gọi từ lượt fan-out (schedule_course_health_analysis)
+    -> Ghi thời gian chạy và tự dispatch course tiếp theo trong hàng đợi.
     """
+    started = time.perf_counter()
+    status, total_students = 'failed', 0
+
     try:
         result = analyze_course_health_bulk(course_id)
+        status, total_students = 'success', result.total_students
         
         # A. LƯU LOG THÀNH CÔNG
         CourseAnalyticsLog.objects.create(
@@ -164,4 +218,40 @@ def async_analyze_course(course_id: str):
             status='failed',
             error_message=error_msg[:5000] # Cắt bớt nếu quá dài
         )
-        print(f"❌ Job Failed: {e}")
\ No newline at end of file
+        print(f"❌ Job Failed: {e}")
+
+    finally:
+        if run_id:
+            _continue_fanout(run_id, course_id, time.perf_counter() - started, status, total_students)
+
+
+def _continue_fanout(run_id: str, course_id: str, seconds: float, status: str, total_students: int):
+    """Ghi timing của course vừa xong + dispatch course tiếp theo (giữ nguyên số task song song)."""
+    from analytics.services import analysis_fanout_service
+
+    try:
+        analysis_fanout_service.record_course_done(run_id, course_id, seconds, status, total_students)
+        next_course_id = analysis_fanout_service.next_course(run_id)
+        if next_course_id:
+            async_analyze_course.delay(next_course_id, run_id=run_id)
+    except Exception as e:
+        print(f"⚠️ Fan-out {run_id} không tiếp tục được sau course {course_id}: {e}")
+
+
+@shared_task
+def schedule_course_health_analysis():
+    """
+    Celery Beat: Fan-out phân tích sức khỏe cho mọi khóa học có hoạt động mới.
+    - Bỏ qua khóa học không có hoạt động kể từ lần phân tích gần nhất.
+    - Lớp đông chạy trước, tối đa COURSE_ANALYSIS_MAX_CONCURRENCY task cùng lúc.
+    """
+    from analytics.services import analysis_fanout_service
+
+    run = analysis_fanout_service.start_run()
+    if not run:
+        return None
+
+    for course_id in run['dispatch']:
+        async_analyze_course.delay(course_id, run_id=run['run_id'])
+
+    return {'run_id': run['run_id'], 'total': run['total']}
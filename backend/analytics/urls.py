@@ -1,12 +1,13 @@
 from django.urls import path
 
-from analytics.api.views.log_view import AnalyticsBatchView
+from analytics.api.views.log_view import AnalyticsBatchView, ActivityIngestionMetricsView
 from analytics.api.views.instructor_dashboard_view import InstructorCourseHealthOverviewView, InstructorCourseAnalyticsTrendsView, InstructorOverviewView, InstructorCourseHealthAnalyzeView, InstructorCourseStudentsRiskListView
 
 
 
 urlpatterns = [
     path('batch/', AnalyticsBatchView.as_view(), name='analytics-activites-log'),
+    path('ingestion/metrics/', ActivityIngestionMetricsView.as_view(), name='analytics-ingestion-metrics'),
     
     path('instructor/overview/', InstructorOverviewView.as_view(), name='instructor-courses-overview'),
 
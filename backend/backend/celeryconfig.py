@@ -22,4 +22,41 @@ app.conf.beat_schedule = {
         'task': 'ai_personalization.tasks.train_mastery_prediction_model',
         'schedule': crontab(day_of_week=1, hour=3, minute=0),  # Weekly Monday 3 AM
     },
+    'flush-heartbeat-buffer': {
+        'task': 'progress.tasks.flush_heartbeat_buffer',
+        'schedule': 30.0,  # Every 30 seconds (write-behind heartbeat)
+    },
+    'flush-quiz-draft-buffer': {
+        'task': 'progress.tasks.flush_quiz_draft_buffer',
+        'schedule': 15.0,  # Every 15 seconds (coalesced quiz autosave)
+    },
+    'flush-activity-buffer': {
+        'task': 'analytics.tasks.flush_activity_buffer',
+        'schedule': 5.0,  # Every 5 seconds (buffered activity logs)
+    },
+    'refresh-activity-rollups': {
+        'task': 'analytics.tasks.refresh_activity_rollups',
+        'schedule': 300.0,  # Every 5 minutes (engagement rollup)
+    },
+    'rebuild-activity-rollups-nightly': {
+        'task': 'analytics.tasks.rebuild_activity_rollups_nightly',
+        'schedule': crontab(hour=0, minute=15),  # Daily at 0:15 AM
+    },
+    'schedule-course-health-analysis': {
+        'task': 'analytics.tasks.schedule_course_health_analysis',
+        'schedule': crontab(hour=3, minute=30),  # Daily at 3:30 AM (fan-out per course)
+    },
+    'prewarm-upcoming-exams': {
+        'task': 'quiz.tasks.prewarm_upcoming_exams',
+        'schedule': 60.0,  # Every minute (exam-start surge)
+    },
+    'maintain-activity-log-partitions': {
+        'task': 'analytics.tasks.maintain_activity_log_partitions',
+        'schedule': crontab(hour=1, minute=30),  # Daily at 1:30 AM
+    },
+    'cleanup-media-files-nightly': {
+        'task': 'media.tasks.cleanup_files',
+        'schedule': crontab(hour=4, minute=0),  # Daily at 4 AM (streaming orphan scan, resumes from checkpoint)
+        'kwargs': {'days_old': 1, 'max_pages': 2000},
+    },
 }
\ No newline at end of file
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     'corsheaders',
     'storages',
 
@@ -157,6 +158,10 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         # 'rest_framework.authentication.SessionAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DATETIME_FORMAT': "%Y-%m-%d %H:%M:%S",
@@ -296,10 +301,32 @@ PASSWORD_RESET_TIMEOUT = 600  # 10 minutes
 MAX_FILE_SIZE_MB = 200
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 
+# Multipart upload (video bài giảng): Client upload thẳng từng part lên S3, Django không chạm vào bytes
+MAX_MULTIPART_FILE_SIZE_MB = int(os.getenv("MAX_MULTIPART_FILE_SIZE_MB", 10 * 1024))  # 10 GB
+MAX_MULTIPART_FILE_SIZE_BYTES = MAX_MULTIPART_FILE_SIZE_MB * 1024 * 1024
+MULTIPART_PART_SIZE_MB = int(os.getenv("MULTIPART_PART_SIZE_MB", 64))
+# Phiên chưa complete quá N ngày -> cleanup_files abort trên S3 + xóa bản ghi (file staging thường chỉ sống 1 ngày)
+MULTIPART_ABANDONED_DAYS = int(os.getenv("MULTIPART_ABANDONED_DAYS", 7))
+
 # Send limits
 MAX_HEARTBEAT_INTERVAL = 60  # Client không nên gửi quá 60s một lần
 COMPLETION_THRESHOLD = 0.95   # Xem 95% video được tính là xong
 
+# Write-behind heartbeat: Gom heartbeat vào Redis, Celery Beat flush xuống DB mỗi 30s
+HEARTBEAT_WRITE_BEHIND = os.getenv("HEARTBEAT_WRITE_BEHIND", "true").lower() == "true"
+
+# Autosave nháp bài làm: Gom vào Redis hash theo attempt, Celery Beat flush xuống QuestionAnswer mỗi 15s
+QUIZ_DRAFT_WRITE_BEHIND = os.getenv("QUIZ_DRAFT_WRITE_BEHIND", "true").lower() == "true"
+
+# Activity log non-critical: Gom vào Redis, Celery Beat flush theo batch mỗi 5s
+ACTIVITY_LOG_BUFFERED = os.getenv("ACTIVITY_LOG_BUFFERED", "true").lower() == "true"
+
+# UserActivityLog partition theo tháng: giữ N tháng, partition cũ hơn bị detach và chuyển sang schema archive
+ACTIVITY_LOG_RETENTION_MONTHS = int(os.getenv("ACTIVITY_LOG_RETENTION_MONTHS", "12"))
+
+# Fan-out phân tích sức khỏe khóa học: số course được phân tích song song tối đa
+COURSE_ANALYSIS_MAX_CONCURRENCY = int(os.getenv("COURSE_ANALYSIS_MAX_CONCURRENCY", "4"))
+
 # HTTPS
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 CORS_ALLOW_CREDENTIALS = True
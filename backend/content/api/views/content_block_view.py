@@ -12,7 +12,7 @@ from content.serializers import ConvertBlockSerializer, ContentBlockCreateSerial
 from content.api.dtos.content_block_dto import ContentBlockInput, ContentBlockUpdateInput, ContentBlockAdminOutput, ContentBlockPublicOutput
 from content.domains.content_block_domain import ContentBlockDomain
 from core.exceptions import DomainError 
-from core.api.mixins import RoleBasedOutputMixin, AutoPermissionCheckMixin
+from core.api.mixins import RoleBasedOutputMixin, AutoPermissionCheckMixin, ObjectLookup
 from core.api.permissions import IsInstructor, IsCourseOwner
 
 
@@ -577,8 +577,8 @@ class InstructorContentBlockDetailView(RoleBasedOutputMixin, AutoPermissionCheck
     """
     permission_classes = [permissions.IsAuthenticated, IsInstructor, IsCourseOwner]
     
-    # Permission check: Block -> Lesson -> Module -> Course -> Owner
-    permission_lookup = {'block_id': ContentBlock}
+    # Permission check: Block -> Course (index đã cache). quiz_ref load sẵn để service dựng Detail không query lại
+    permission_lookup = {'block_id': ObjectLookup(ContentBlock, select_related=('quiz_ref',))}
 
     output_dto_public = ContentBlockPublicOutput
     output_dto_admin = ContentBlockAdminOutput
@@ -591,7 +591,8 @@ class InstructorContentBlockDetailView(RoleBasedOutputMixin, AutoPermissionCheck
         """Lấy chi tiết 1 block"""
         try:
             block_detail = self.content_block_service.get_content_block_detail(
-                block_id=block_id
+                block_id=block_id,
+                block=self.contentblock
             )
             return Response({"instance": block_detail}, status=status.HTTP_200_OK)
             
@@ -7,7 +7,7 @@ from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError as DRFValidationError
   
 from core.exceptions import DomainError, CourseNotFoundError
-from core.api.mixins import RoleBasedOutputMixin, AutoPermissionCheckMixin
+from core.api.mixins import RoleBasedOutputMixin, AutoPermissionCheckMixin, ObjectLookup
 from core.api.permissions import CanViewCourseContent
 from content.api.dtos.course_dto import CourseCatalogPublicOutput, MyCourseCatalogOutput, CourseCatalogAdminOutput, CoursePublicOutput, CourseAdminOutput
 from content.api.dtos.content_block_dto import ContentBlockPublicOutput, ContentBlockAdminOutput
@@ -15,7 +15,7 @@ from content.api.dtos.enrollment_dto import EnrollmentInput, EnrollmentOutput, E
 from content.types import CourseFetchStrategy, CourseFilter
 from content.services import enrollment_service, course_service, content_block_service
 from content.serializers import EnrollmentCreateSerializer
-from content.models import Course, ContentBlock
+from content.models import Course, Lesson, ContentBlock
 
 
 
@@ -127,12 +127,20 @@ class PublicCourseListView(RoleBasedOutputMixin, AutoPermissionCheckMixin, APIVi
     def get(self, request, *args, **kwargs):
         """
         Xử lý GET request để list courses chưa ghi danh.
+        Query params:
+        - search: Từ khóa (tiêu đề, mô tả, môn, tag, danh mục; gõ không dấu vẫn khớp)
+        - sort: 'relevance' (mặc định khi có search) | 'newest'
         """
         try:
+            search = request.query_params.get('search', '').strip()
+            sort = request.query_params.get('sort', 'relevance')
+
             courses_list = self.course_service.get_courses(
                 filters=CourseFilter(
                     published_only=True,
-                    exclude_enrolled_user=request.user),
+                    exclude_enrolled_user=request.user,
+                    search_term=search or None,
+                    order_by_relevance=(sort == 'relevance')),
                 strategy=CourseFetchStrategy.CATALOG_LIST
             )
             return Response({"instance": courses_list}, status=status.HTTP_200_OK)
@@ -234,8 +242,8 @@ class ContentBlockDetailView(RoleBasedOutputMixin, AutoPermissionCheckMixin, API
     """
     permission_classes = [permissions.IsAuthenticated, CanViewCourseContent]
     
-    # Permission check: Block -> Lesson -> Module -> Course -> Owner
-    permission_lookup = {'block_id': ContentBlock}
+    # Permission check: Block -> Course (index đã cache). quiz_ref load sẵn để service dựng Detail không query lại
+    permission_lookup = {'block_id': ObjectLookup(ContentBlock, select_related=('quiz_ref',))}
 
     output_dto_public = ContentBlockPublicOutput
     output_dto_admin = ContentBlockAdminOutput
@@ -248,7 +256,8 @@ class ContentBlockDetailView(RoleBasedOutputMixin, AutoPermissionCheckMixin, API
         """Lấy chi tiết 1 block"""
         try:
             block_detail = self.content_block_service.get_content_block_detail(
-                block_id=block_id
+                block_id=block_id,
+                block=self.contentblock
             )
             return Response({"instance": block_detail}, status=status.HTTP_200_OK)
             
@@ -258,6 +267,35 @@ class ContentBlockDetailView(RoleBasedOutputMixin, AutoPermissionCheckMixin, API
             return Response({"detail": f"Lỗi server - {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
 
+class LessonContentView(RoleBasedOutputMixin, AutoPermissionCheckMixin, APIView):
+    """
+    GET    /lessons/{lesson_id}/blocks/  - Lấy toàn bộ nội dung (Detail) của 1 lesson
+    Payload đã render lấy từ cache theo lô (block, payload_version) -> Lesson nhiều block vẫn 1 round trip cache.
+    """
+    permission_classes = [permissions.IsAuthenticated, CanViewCourseContent]
+
+    # Permission check: Lesson -> Course (module load sẵn, không đi FK lazy)
+    permission_lookup = {'lesson_id': ObjectLookup(Lesson, select_related=('module',))}
+
+    output_dto_public = ContentBlockPublicOutput
+    output_dto_admin = ContentBlockAdminOutput
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.content_block_service = content_block_service
+
+    def get(self, request, lesson_id: uuid.UUID, *args, **kwargs):
+        """Lấy chi tiết tất cả block của lesson"""
+        try:
+            blocks = self.content_block_service.get_content_blocks_detail(lesson_id=lesson_id)
+            return Response({"instance": blocks}, status=status.HTTP_200_OK)
+
+        except DomainError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({"detail": f"Lỗi server - {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # # ==========================================
 # # PUBLIC INTERFACE (INSTRUCTOR)
 # # ==========================================
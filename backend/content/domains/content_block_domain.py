@@ -5,7 +5,7 @@ from typing import Optional, List, Dict, Any
 
 from core.exceptions import DomainValidationError
 from content.models import ContentBlock
-from media.services.cloud_service import get_signed_url_by_id, generate_cloudfront_signed_url
+from content.services import block_payload_cache_service
 
 
 
@@ -228,12 +228,23 @@ class ContentBlockDomain:
     @classmethod
     def from_model_detail(cls, model):
         """Dùng cho Lesson Detail API: Lấy full, ký tên URL, xử lý HTML"""
-        domain = cls.from_model_summary(model) # Tái sử dụng base
-        
-        # Logic nặng: Ký tên URL, parse HTML...
-        domain.payload = cls._process_payload_heavy(model) 
-        
-        return domain
+        return cls.from_models_detail([model])[0]
+
+    @classmethod
+    def from_models_detail(cls, models):
+        """
+        Detail cho nhiều block (VD: cả lesson): Payload đã render lấy từ cache
+        theo (block, payload_version) trong 1 round trip, chỉ render các block bị miss.
+        """
+        models = list(models)
+        payloads = block_payload_cache_service.get_rendered_payloads(models, cls._process_payload_heavy)
+
+        domains = []
+        for model in models:
+            domain = cls.from_model_summary(model) # Tái sử dụng base
+            domain.payload = payloads[str(model.id)]
+            domains.append(domain)
+        return domains
     
     def to_model(self):
         """
@@ -12,7 +12,6 @@ from content.domains.category_domain import CategoryDomain
 from content.domains.tag_domain import TagDomain
 from content.types import CourseFetchStrategy
 from content.models import ContentBlock
-from media.services.cloud_service import get_signed_url_by_id
 from progress.domains.course_progress_domain import CourseProgressDomain
 
 
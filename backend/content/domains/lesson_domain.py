@@ -105,10 +105,8 @@ class LessonDomain:
         blocks_sorted = sorted(model.content_blocks.all(), key=lambda x: x.position)
         
         # Service phải prefetch '...__content_blocks'
-        for cb_model in blocks_sorted:
-            lesson_domain.content_blocks.append(
-                ContentBlockDomain.from_model_detail(cb_model)
-            )
+        # Payload đã render lấy theo lô (1 round trip cache cho cả lesson)
+        lesson_domain.content_blocks.extend(ContentBlockDomain.from_models_detail(blocks_sorted))
             
         return lesson_domain
     
@@ -0,0 +1,112 @@
+import time
+import uuid
+import random
+import statistics
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from content.models import Course, Subject
+from content.services import course_search_service
+
+
+
+SUBJECTS = ['Toán', 'Ngữ văn', 'Tiếng Anh', 'Vật lý', 'Hóa học', 'Sinh học', 'Lịch sử', 'Địa lý', 'Tin học']
+LEVELS = ['cơ bản', 'nâng cao', 'chuyên sâu', 'ôn thi', 'luyện đề', 'tổng ôn']
+TOPICS = [
+    'phân số', 'hình học phẳng', 'phương trình bậc hai', 'đọc hiểu', 'ngữ pháp', 'điện học',
+    'cơ học', 'hóa hữu cơ', 'di truyền', 'lập trình Python', 'kỹ năng viết', 'từ vựng'
+]
+
+DEFAULT_QUERIES = ['Toán lớp 6', 'toan lop 6', 'phuong trinh bac hai', 'hoá hữu cơ nâng cao', 'lap trinh pyton']
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark: So sánh tìm kiếm khóa học cũ (title__icontains) với search index mới '
+        '(tsvector + unaccent + trigram) trên fixture N khóa học, báo cáo p50/p99 và số kết quả. '
+        'CHỈ chạy trên môi trường dev/staging (Postgres): lệnh tạo khóa học tạm và xóa sau khi chạy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=100_000, help='Số khóa học ảo (mặc định 100000)')
+        parser.add_argument('--runs', type=int, default=20, help='Số lần chạy mỗi truy vấn (mặc định 20)')
+        parser.add_argument('--query', action='append', dest='queries', help='Từ khóa (có thể lặp lại)')
+        parser.add_argument('--explain', action='store_true', help='In EXPLAIN ANALYZE của từng truy vấn')
+        parser.add_argument('--keep', action='store_true', help='Giữ lại khóa học tạm sau khi chạy')
+
+    def _create_courses(self, run_id: str, count: int, batch_size: int = 2000):
+        rng = random.Random(run_id)
+        subjects = [
+            Subject.objects.get_or_create(slug=f'bench-{run_id}-{i}', defaults={'title': title})[0]
+            for i, title in enumerate(SUBJECTS)
+        ]
+
+        course_ids = []
+        for start in range(0, count, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, count)):
+                subject = rng.choice(subjects)
+                title = f"{subject.title} lớp {rng.randint(1, 12)} {rng.choice(LEVELS)} - {rng.choice(TOPICS)} #{run_id}-{i}"
+                batch.append(Course(
+                    title=title,
+                    slug=f'bench-{run_id}-{i}',
+                    description=f"Khóa học {rng.choice(TOPICS)} {rng.choice(LEVELS)} dành cho học sinh.",
+                    subject=subject,
+                    published=True,
+                ))
+            course_ids.extend(c.id for c in Course.objects.bulk_create(batch, batch_size=batch_size))
+            course_search_service.refresh_search_index([c.id for c in batch])
+            self.stdout.write(f" - Seeded {len(course_ids)} courses...")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Course._meta.db_table}')
+        return course_ids, subjects
+
+    def _time(self, build_query, runs: int):
+        latencies = []
+        rows = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            rows = list(build_query()[:20].values_list('id', flat=True))
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies, rows
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Benchmark cần Postgres (tsvector/unaccent/pg_trgm).")
+
+        run_id = uuid.uuid4().hex[:8]
+        queries = options['queries'] or DEFAULT_QUERIES
+
+        self.stdout.write(self.style.WARNING(f"--- CHUẨN BỊ {options['courses']} KHÓA HỌC ẢO (run {run_id}) ---"))
+        course_ids, subjects = self._create_courses(run_id, options['courses'])
+
+        try:
+            for term in queries:
+                legacy = lambda: Course.objects.filter(published=True, title__icontains=term).order_by('-created_at')
+                indexed = lambda: course_search_service.apply_search(
+                    Course.objects.filter(published=True), term, ranked=True
+                ).order_by('-search_rank', '-created_at')
+
+                self.stdout.write(self.style.WARNING(f"--- '{term}' ---"))
+                for label, build_query in [('icontains', legacy), ('search index', indexed)]:
+                    latencies, rows = self._time(build_query, options['runs'])
+                    total = build_query().count()
+                    self._report(label, latencies, len(rows), total)
+                    if options['explain']:
+                        self.stdout.write(build_query()[:20].explain(analyze=True))
+        finally:
+            if not options['keep']:
+                Course.objects.filter(id__in=course_ids).delete()
+                Subject.objects.filter(id__in=[s.id for s in subjects]).delete()
+                self.stdout.write("🧹 Đã xóa khóa học tạm.")
+
+        self.stdout.write(self.style.SUCCESS("--- HOÀN TẤT ---"))
+
+    def _report(self, label: str, latencies, page_size: int, total: int):
+        if len(latencies) >= 2:
+            q = statistics.quantiles(latencies, n=100, method='inclusive')
+            timing = f"p50: {q[49]:.1f}ms | p99: {q[98]:.1f}ms"
+        else:
+            timing = f"{latencies[0]:.1f}ms"
+        self.stdout.write(f"{label:>13}: {timing} | trang đầu: {page_size} | tổng khớp: {total}")
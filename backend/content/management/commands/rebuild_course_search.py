@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from content.services.course_search_service import rebuild_search_index
+
+
+
+class Command(BaseCommand):
+    help = 'Build lại search index (search_vector, search_title) cho toàn bộ khóa học'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("--- REBUILD SEARCH INDEX ---"))
+
+        try:
+            total = rebuild_search_index(stdout=self.stdout)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"❌ Lỗi: {e}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Đã index {total} khóa học"))
+        self.stdout.write(self.style.SUCCESS("--- HOÀN TẤT ---"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from content.services.course_stats_service import rebuild_course_stats
+
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng CourseStats (module/lesson/video/quiz/thời lượng/học viên) từ bảng gốc'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='course_ids', help='Chỉ rebuild khóa học này (có thể lặp lại)')
+
+    def handle(self, *args, **options):
+        course_ids = options['course_ids']
+        scope = f"{len(course_ids)} KHÓA HỌC" if course_ids else "TOÀN BỘ KHÓA HỌC"
+
+        self.stdout.write(self.style.WARNING(f"--- REBUILD COURSE STATS CHO {scope} ---"))
+
+        try:
+            total = rebuild_course_stats(course_ids, stdout=self.stdout)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"❌ Lỗi: {e}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Đã cập nhật {total} khóa học"))
+        self.stdout.write(self.style.SUCCESS("--- HOÀN TẤT ---"))
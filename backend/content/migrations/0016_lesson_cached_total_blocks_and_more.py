@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    Lesson = apps.get_model('content', 'Lesson')
+    Module = apps.get_model('content', 'Module')
+    ContentBlock = apps.get_model('content', 'ContentBlock')
+
+    block_counts = ContentBlock.objects.filter(lesson_id=OuterRef('pk')).order_by().values('lesson_id').annotate(c=Count('id')).values('c')
+    Lesson.objects.update(cached_total_blocks=Coalesce(Subquery(block_counts), Value(0)))
+
+    lesson_counts = Lesson.objects.filter(module_id=OuterRef('pk')).order_by().values('module_id').annotate(c=Count('id')).values('c')
+    Module.objects.update(cached_total_lessons=Coalesce(Subquery(lesson_counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0015_enrollment_cached_completed_lessons_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='cached_total_blocks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='cached_total_lessons',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
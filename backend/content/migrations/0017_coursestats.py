@@ -0,0 +1,77 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _count(model, course_path: str, aggregate=None, **filters):
+    """Subquery đếm/cộng theo course (GROUP BY trên bảng con, không JOIN chéo)."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{course_path: OuterRef('pk')}, **filters)
+            .order_by().values(course_path)
+            .annotate(v=aggregate or Count('pk')).values('v')
+        ),
+        Value(0)
+    )
+
+
+def backfill_stats(apps, schema_editor):
+    """Dòng stats cho mọi course đã có -> Catalog không hiện 0 module/bài/học viên sau khi deploy."""
+    Course = apps.get_model('content', 'Course')
+    Module = apps.get_model('content', 'Module')
+    Lesson = apps.get_model('content', 'Lesson')
+    ContentBlock = apps.get_model('content', 'ContentBlock')
+    Enrollment = apps.get_model('content', 'Enrollment')
+    CourseStats = apps.get_model('content', 'CourseStats')
+
+    block_path = 'lesson__module__course_id'
+    rows = Course.objects.order_by().annotate(
+        s_modules=_count(Module, 'course_id'),
+        s_lessons=_count(Lesson, 'module__course_id'),
+        s_videos=_count(ContentBlock, block_path, type='video'),
+        s_quizzes=_count(ContentBlock, block_path, type='quiz'),
+        s_seconds=_count(ContentBlock, block_path, aggregate=Sum('duration')),
+        s_students=_count(Enrollment, 'course_id'),
+    ).values_list('id', 's_modules', 's_lessons', 's_videos', 's_quizzes', 's_seconds', 's_students')
+
+    batch = []
+    for course_id, modules, lessons, videos, quizzes, seconds, students in rows.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        batch.append(CourseStats(
+            course_id=course_id, total_modules=modules, total_lessons=lessons, total_videos=videos,
+            total_quizzes=quizzes, total_seconds=seconds, total_students=students,
+        ))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            CourseStats.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        CourseStats.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0016_lesson_cached_total_blocks_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='content.course')),
+                ('total_modules', models.IntegerField(default=0)),
+                ('total_lessons', models.IntegerField(default=0)),
+                ('total_videos', models.IntegerField(default=0)),
+                ('total_quizzes', models.IntegerField(default=0)),
+                ('total_seconds', models.BigIntegerField(default=0)),
+                ('total_students', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:58
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.lookups import Unaccent
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import F, Value, OuterRef, Subquery, TextField
+from django.db.models.functions import Coalesce, Lower
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_search_index(apps, schema_editor):
+    """
+    Build index cho mọi course đã có (cùng công thức với course_search_service._index_updates)
+    -> Tìm kiếm hoạt động ngay sau deploy, không phải chờ chạy rebuild_course_search bằng tay.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    Course = apps.get_model('content', 'Course')
+    Subject = apps.get_model('content', 'Subject')
+    Tag = apps.get_model('content', 'Tag')
+    Category = apps.get_model('content', 'Category')
+
+    def names(model, relation, field):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(**{relation: OuterRef('pk')}).order_by().values(relation)
+                .annotate(names=StringAgg(field, delimiter=' ')).values('names')[:1],
+                output_field=TextField()
+            ),
+            Value(''),
+            output_field=TextField()
+        )
+
+    def weighted(expression, weight):
+        return SearchVector(Unaccent(expression), weight=weight, config='simple')
+
+    subject_title = Coalesce(
+        Subquery(Subject.objects.filter(pk=OuterRef('subject_id')).order_by().values('title')[:1]),
+        Value(''),
+        output_field=TextField()
+    )
+    updates = {
+        'search_vector': (
+            weighted(F('title'), 'A')
+            + weighted(subject_title, 'B')
+            + weighted(names(Tag, 'courses', 'name'), 'B')
+            + weighted(names(Category, 'courses', 'name'), 'B')
+            + weighted(Coalesce(F('description'), Value(''), output_field=TextField()), 'C')
+        ),
+        'search_title': Lower(Unaccent(F('title'))),
+    }
+
+    batch = []
+    for course_id in Course.objects.order_by().values_list('id', flat=True).iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        batch.append(course_id)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            Course.objects.filter(id__in=batch).update(**updates)
+            batch = []
+    if batch:
+        Course.objects.filter(id__in=batch).update(**updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0017_coursestats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.AddField(
+            model_name='course',
+            name='search_title',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='course_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_title'], name='course_search_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0018_course_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentblock',
+            name='payload_version',
+            field=models.PositiveIntegerField(default=0, help_text='Tăng mỗi lần sửa payload (khóa cache payload đã render)'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 import uuid
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.contrib.contenttypes.fields import GenericRelation
 
@@ -70,6 +72,12 @@ class Course(models.Model):
                                         help_text="Timestamp when the course was last published.")
     thumbnail = models.ImageField(upload_to='course_thumbnails/', storage=PublicMediaStorage(), blank=True, null=True)
 
+    # --- SEARCH INDEX (course_search_service.refresh_search_index cập nhật khi lưu) ---
+    # Tiêu đề/Môn/Tag/Danh mục/Mô tả đã bỏ dấu (unaccent) + trọng số
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    # Tiêu đề bỏ dấu + lowercase cho tìm gần đúng (trigram)
+    search_title = models.TextField(blank=True, default='', editable=False)
+
     class Meta:
         verbose_name = 'Course'
         verbose_name_plural = 'Courses'
@@ -79,6 +87,8 @@ class Course(models.Model):
         indexes = [
             models.Index(fields=['published', 'grade']), 
             models.Index(fields=['owner']),
+            GinIndex(fields=['search_vector'], name='course_search_vector_gin'),
+            GinIndex(fields=['search_title'], name='course_search_title_trgm', opclasses=['gin_trgm_ops']),
         ]
 
     def __str__(self):
@@ -96,6 +106,10 @@ class Module(models.Model):
     title = models.CharField(max_length=255)
     position = models.IntegerField(default=0, validators=[MinValueValidator(0)])
 
+    # Denormalization: Tổng số lesson trong module (mẫu số cho ModuleCompletion).
+    # Được cập nhật bởi lesson_service, rebuild bằng lệnh `rebuild_progress_counters`.
+    cached_total_lessons = models.IntegerField(default=0)
+
     class Meta:
         verbose_name = ('Module')
         verbose_name_plural = ('Modules')
@@ -111,6 +125,10 @@ class Lesson(models.Model):
     title = models.CharField(max_length=255)
     position = models.IntegerField(default=0, validators=[MinValueValidator(0)])
 
+    # Denormalization: Tổng số block trong lesson (mẫu số cho LessonCompletion).
+    # Được cập nhật bởi content_block_service, rebuild bằng lệnh `rebuild_progress_counters`.
+    cached_total_blocks = models.IntegerField(default=0)
+
     class Meta:
         verbose_name = ('Lesson')
         verbose_name_plural = ('Lessons')
@@ -198,6 +216,29 @@ class Enrollment(models.Model):
             models.Index(fields=['course', 'current_risk_level']),
             models.Index(fields=['course', 'current_engagement_score']),
         ]
+
+
+class CourseStats(models.Model):
+    """
+    Thống kê tổng hợp của 1 khóa học (materialized) cho màn hình danh sách.
+    Thay cho Count/Sum qua Module -> Lesson -> ContentBlock + Enrollment ở mỗi lần load catalog.
+    - Nội dung: Tính lại theo course sau mỗi lần ghi content (course_stats_service.schedule_refresh)
+    - Học viên: Cộng/trừ F() khi ghi danh/hủy ghi danh
+    Lệch số liệu -> python manage.py rebuild_course_stats
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+
+    total_modules = models.IntegerField(default=0)
+    total_lessons = models.IntegerField(default=0)
+    total_videos = models.IntegerField(default=0)
+    total_quizzes = models.IntegerField(default=0)
+    total_seconds = models.BigIntegerField(default=0)
+    total_students = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats of {self.course_id}"
       
 
 class ContentBlock(models.Model):
@@ -218,7 +259,8 @@ class ContentBlock(models.Model):
     )
     duration = models.PositiveIntegerField(default=0, help_text="Thời lượng tính bằng giây")
     position = models.IntegerField(default=0, validators=[MinValueValidator(0)])
-    payload = models.JSONField(default=dict)  
+    payload = models.JSONField(default=dict)
+    payload_version = models.PositiveIntegerField(default=0, help_text="Tăng mỗi lần sửa payload (khóa cache payload đã render)")
     quiz_ref = models.ForeignKey(
         Quiz,
         on_delete=models.CASCADE, # Hoặc CASCADE nếu bạn muốn
@@ -0,0 +1,110 @@
+import hashlib
+import logging
+from typing import Callable, Dict, Iterable, List
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from content.models import ContentBlock
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'content:block_payload'
+
+# Tăng khi đổi logic render (ContentBlockDomain._process_payload_heavy) -> Bỏ qua toàn bộ bản cũ
+RENDER_VERSION = 1
+
+# Key đã khóa theo payload_version -> Không bao giờ stale, TTL chỉ để dọn rác các version cũ
+PAYLOAD_TTL_SECONDS = 24 * 60 * 60
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _render_tag() -> str:
+    # Payload đã render chứa domain CDN -> Đổi AWS_S3_CUSTOM_DOMAIN cũng phải ra key mới
+    cdn_domain = getattr(settings, 'AWS_S3_CUSTOM_DOMAIN', '') or ''
+    return f"r{RENDER_VERSION}-{hashlib.md5(cdn_domain.encode()).hexdigest()[:8]}"
+
+
+def _payload_key(block_id, payload_version: int, tag: str = None) -> str:
+    return f'{KEY_PREFIX}:{tag or _render_tag()}:{block_id}:v{payload_version}'
+
+
+def _can_store() -> bool:
+    """
+    Chỉ ghi cache NGOÀI transaction: Payload đọc trong transaction có thể chưa commit (hoặc bị rollback)
+    -> Ghi vào key của version đó sẽ làm sai cache của lần sửa thật sau này.
+    """
+    return not transaction.get_connection().in_atomic_block
+
+
+# ==========================================
+# PUBLIC INTERFACE (READ)
+# ==========================================
+
+def get_rendered_payloads(blocks: Iterable[ContentBlock], render: Callable[[ContentBlock], dict]) -> Dict[str, dict]:
+    """
+    Lấy payload đã render cho nhiều block trong 1 round trip (cache.get_many).
+    Block chưa có trong cache -> render(block) rồi ghi lại bằng 1 lệnh set_many.
+    Trả về {str(block.id): payload}. Cache lỗi -> Render trực tiếp, không làm hỏng request.
+    """
+    blocks = list(blocks)
+    if not blocks:
+        return {}
+
+    tag = _render_tag()
+    keys = {_payload_key(block.id, block.payload_version, tag): block for block in blocks}
+
+    try:
+        cached = cache.get_many(list(keys.keys()))
+    except Exception as e:
+        logger.warning(f"Block payload cache unavailable, rendering directly: {e}")
+        return {str(block.id): render(block) for block in blocks}
+
+    result = {}
+    missing = {}
+    for key, block in keys.items():
+        payload = cached.get(key)
+        if payload is None:
+            payload = render(block)
+            missing[key] = payload
+        result[str(block.id)] = payload
+
+    if missing and _can_store():
+        try:
+            cache.set_many(missing, timeout=PAYLOAD_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Cannot store rendered block payloads: {e}")
+
+    return result
+
+
+# ==========================================
+# PUBLIC INTERFACE (INVALIDATE)
+# ==========================================
+
+def invalidate(blocks: Iterable[ContentBlock]) -> None:
+    """
+    Xóa payload đã render của các block (theo payload_version mà block đang giữ) SAU KHI commit.
+    Gọi khi block bị sửa payload / đổi loại / xóa. Bản mới đã nằm ở key version khác,
+    việc xóa chỉ để giải phóng bộ nhớ sớm thay vì chờ TTL.
+    """
+    keys = [_payload_key(block.id, block.payload_version) for block in blocks]
+    if not keys:
+        return
+
+    def _delete():
+        try:
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.warning(f"Cannot invalidate rendered block payloads {keys}: {e}")
+
+    transaction.on_commit(_delete)
@@ -5,7 +5,8 @@ from bs4 import BeautifulSoup
 from django.conf import settings
 from django.db import transaction
 from django.db.models import F, Max
-from typing import List, Dict, Any, Tuple
+from django.db.models.functions import Greatest
+from typing import List, Dict, Any, Tuple, Optional
 
 from core.exceptions import DomainError
 from custom_account.models import UserModel
@@ -14,8 +15,13 @@ from content.domains.content_block_domain import ContentBlockDomain
 from quiz.services.quiz_course_service import create_quiz, update_quiz
 from quiz.models import Quiz
 from media.services.cloud_service import s3_copy_object
+from media.services import file_reference_service
 from media.models import UploadedFile, FileStatus
-from progress.tasks import process_content_addition_impact
+from progress.models import LessonCompletion, UserBlockProgress
+from progress.tasks import process_content_addition_impact, process_content_removal_impact
+from content.services import course_structure_service
+from content.services import block_payload_cache_service
+from core.services import course_access_service
 
 
 
@@ -174,11 +180,24 @@ def get_content_blocks(lesson_id: uuid.UUID) -> list[ContentBlockDomain]:
     return [ContentBlockDomain.from_model_summary(block) for block in blocks]
 
 
-def get_content_block_detail(block_id: uuid.UUID) -> ContentBlockDomain:
+def get_content_blocks_detail(lesson_id: uuid.UUID) -> List[ContentBlockDomain]:
+    """
+    Lấy chi tiết TOÀN BỘ block của 1 lesson (Dạng Detail).
+    Payload đã render lấy từ cache theo lô: Lesson 30 block = 1 query + 1 round trip cache.
+    """
+    blocks = ContentBlock.objects.filter(lesson_id=lesson_id).order_by('position')
+    return ContentBlockDomain.from_models_detail(blocks)
+
+
+def get_content_block_detail(block_id: uuid.UUID, block: Optional[ContentBlock] = None) -> ContentBlockDomain:
     """
     Lấy chi tiết 1 block (Dạng Detail - Nặng).
     Dùng khi bấm vào nút 'Edit' của 1 block.
+    block: Đã được view load sẵn kèm quiz_ref (AutoPermissionCheckMixin) -> Không query lại.
     """
+    if block is not None:
+        return ContentBlockDomain.from_model_detail(block)
+
     try:
         # Cần lấy cả quiz_ref để fill dữ liệu nếu là quiz block
         block = ContentBlock.objects.select_related('quiz_ref').get(id=block_id)
@@ -205,7 +224,7 @@ def create_content_block(
     FE thường chỉ gửi: {"type": "rich_text", "position": ...} hoặc thậm chí không gửi gì.
     """
     try:
-        lesson = Lesson.objects.get(id=lesson_id)
+        lesson = Lesson.objects.select_related('module').get(id=lesson_id)
     except Lesson.DoesNotExist:
         raise Lesson.DoesNotExist(f"Bài học {lesson_id} không tồn tại.")
     
@@ -259,6 +278,11 @@ def create_content_block(
         quiz_ref=quiz_ref_model
     )
 
+    # Counter: Mẫu số của LessonCompletion
+    Lesson.objects.filter(id=lesson.id).update(cached_total_blocks=F('cached_total_blocks') + 1)
+
+    course_structure_service.bump_version(lesson.module.course_id)
+
     logger.info(f"Start processing impact for lesson {lesson_id}")
     transaction.on_commit(
         lambda: process_content_addition_impact.delay(str(lesson.id))
@@ -395,12 +419,22 @@ def update_content_block(block: ContentBlock, data: dict, actor: UserModel) -> C
                     logger.error(f"Promote file failed: {e}")
                     raise DomainError(f"Lỗi khi xử lý file media - {str(e)}")
 
-        # Lưu payload mới
+        # Lưu payload mới (tăng payload_version -> Payload đã render trong cache chuyển sang key mới)
+        block_payload_cache_service.invalidate([block])
         block.payload = updated_payload
-        fields_to_update.append('payload')
+        block.payload_version = F('payload_version') + 1
+        fields_to_update.extend(['payload', 'payload_version'])
 
         if fields_to_update:
             block.save(update_fields=fields_to_update)
+        block.refresh_from_db(fields=['payload_version'])
+
+        # Index file đang dùng (cleanup_files so khớp với index thay vì quét lại payload)
+        file_reference_service.sync_block(block)
+
+    # Syllabus chỉ phụ thuộc title/duration, payload không ảnh hưởng
+    if 'title' in fields_to_update or 'duration' in fields_to_update:
+        course_structure_service.bump_version_for_lesson(block.lesson_id)
 
     return ContentBlockDomain.from_model_detail(block)
 
@@ -422,8 +456,27 @@ def delete_content_block(block_id: uuid.UUID) -> None:
         # Hoặc raise lỗi nếu muốn báo FE biết.
         raise DomainError(f"ContentBlock với ID '{block_id}' không tồn tại.")
 
+    # Counter: Trừ block này khỏi mẫu số và khỏi tử số của những ai đã học xong nó
+    # (UserBlockProgress sẽ bị CASCADE nên phải trừ TRƯỚC khi xóa)
+    LessonCompletion.objects.filter(
+        lesson_id=block.lesson_id,
+        enrollment_id__in=UserBlockProgress.objects.filter(block=block, is_completed=True).values('enrollment_id')
+    ).update(completed_blocks=Greatest(F('completed_blocks') - 1, 0))
+    Lesson.objects.filter(id=block.lesson_id).update(
+        cached_total_blocks=Greatest(F('cached_total_blocks') - 1, 0)
+    )
+
+    # Tính key trước khi xóa (delete() gán pk = None)
+    block_payload_cache_service.invalidate([block])
     block.delete()
 
+    course_structure_service.bump_version_for_lesson(block.lesson_id)
+    course_access_service.invalidate_quiz_courses(block.quiz_ref_id)
+
+    # Mẫu số giảm: Ai chỉ còn thiếu block này giờ đã xong lesson -> Đánh giá lại sau khi commit
+    lesson_id = block.lesson_id
+    transaction.on_commit(lambda: process_content_removal_impact.delay(str(lesson_id)))
+
 
 # ==========================================
 # PUBLIC INTERFACE (CONVERT TYPE)
@@ -453,7 +506,9 @@ def convert_content_block(
     saved_title = old_block.title
     
     # 2. Xóa block cũ (Dọn dẹp file cũ nếu có)
+    block_payload_cache_service.invalidate([old_block])
     old_block.delete()
+    course_access_service.invalidate_quiz_courses(old_block.quiz_ref_id)
 
     # 3. Chuẩn bị payload cho loại mới
     new_payload = {}
@@ -488,6 +543,12 @@ def convert_content_block(
         quiz_ref=new_quiz_ref
     )
 
+    course_structure_service.bump_version_for_lesson(saved_lesson.id)
+
+    # Tiến độ của block cũ bị CASCADE, block mới chưa ai học -> Đánh giá lại lesson/module sau khi commit
+    lesson_id = saved_lesson.id
+    transaction.on_commit(lambda: process_content_removal_impact.delay(str(lesson_id)))
+
     return ContentBlockDomain.from_model_detail(new_block)
 
 
@@ -544,6 +605,7 @@ def reorder_content_blocks(
     # 5. Bulk Update (1 Query duy nhất)
     if update_list:
         ContentBlock.objects.bulk_update(update_list, ['position'])
+        course_structure_service.bump_version_for_lesson(lesson_id)
 
     # Trả về dạng Summary (nhẹ) để FE cập nhật lại list nếu cần
     return [ContentBlockDomain.from_model_summary(b) for b in ordered_blocks]
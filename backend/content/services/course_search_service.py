@@ -0,0 +1,145 @@
+import re
+import uuid
+import logging
+from typing import Iterable
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.lookups import Unaccent
+from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank, TrigramSimilarity
+from django.db.models import F, Q, Value, OuterRef, Subquery, TextField
+from django.db.models.functions import Coalesce, Lower
+
+from content.models import Course, Tag, Category, Subject
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+# 'simple': Không stemming/stopword -> Hợp với tiếng Việt (đơn âm tiết).
+# Bỏ dấu bằng unaccent ở CẢ 2 phía (index + query): "toan lop 6" khớp "Toán lớp 6".
+SEARCH_CONFIG = 'simple'
+
+TRIGRAM_WEIGHT = 0.5            # Cộng điểm giống chuỗi của tiêu đề (bắt lỗi gõ sai/thiếu chữ)
+MAX_QUERY_LENGTH = 200
+MAX_QUERY_TOKENS = 10
+
+REBUILD_BATCH_SIZE = 1000
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _names_subquery(model, relation: str, field: str):
+    """Subquery gộp tên (Tag/Category) của course đang UPDATE thành 1 chuỗi."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{relation: OuterRef('pk')})
+            .order_by()
+            .values(relation)
+            .annotate(names=StringAgg(field, delimiter=' '))
+            .values('names')[:1],
+            output_field=TextField()
+        ),
+        Value(''),
+        output_field=TextField()
+    )
+
+
+def _weighted(expression, weight: str) -> SearchVector:
+    return SearchVector(Unaccent(expression), weight=weight, config=SEARCH_CONFIG)
+
+
+def _index_updates() -> dict:
+    """
+    Biểu thức SQL tính search_vector / search_title ngay trong 1 câu UPDATE (subquery cho Subject/Tag/Category).
+    Dùng chung cho cập nhật 1 course và rebuild theo lô.
+    Trọng số: Tiêu đề (A) > Môn học/Tag/Danh mục (B) > Mô tả (C)
+    """
+    subject_title = Coalesce(
+        Subquery(Subject.objects.filter(pk=OuterRef('subject_id')).order_by().values('title')[:1]),
+        Value(''),
+        output_field=TextField()
+    )
+    return {
+        'search_vector': (
+            _weighted(F('title'), 'A')
+            + _weighted(subject_title, 'B')
+            + _weighted(_names_subquery(Tag, 'courses', 'name'), 'B')
+            + _weighted(_names_subquery(Category, 'courses', 'name'), 'B')
+            + _weighted(Coalesce(F('description'), Value(''), output_field=TextField()), 'C')
+        ),
+        'search_title': Lower(Unaccent(F('title'))),
+    }
+
+
+def _normalize(term: str) -> list:
+    """Tách từ (giữ chữ có dấu; unaccent làm ở phía DB) -> Tối đa MAX_QUERY_TOKENS từ."""
+    return re.findall(r'[^\W_]+', term[:MAX_QUERY_LENGTH].lower())[:MAX_QUERY_TOKENS]
+
+
+# ==========================================
+# PUBLIC INTERFACE (INDEX)
+# ==========================================
+
+def refresh_search_index(course_ids: Iterable[uuid.UUID]) -> int:
+    """
+    Cập nhật search index cho các course (1 câu UPDATE).
+    Gọi trong cùng transaction sau khi lưu Course + Tags/Categories -> Index luôn khớp dữ liệu đã commit.
+    """
+    course_ids = list(course_ids)
+    if not course_ids:
+        return 0
+    return Course.objects.filter(id__in=course_ids).update(**_index_updates())
+
+
+def rebuild_search_index(batch_size: int = REBUILD_BATCH_SIZE, stdout=None) -> int:
+    """Build lại index cho mọi course theo lô (triển khai lần đầu / đổi trọng số / đổi tên Tag, Category)."""
+    total = 0
+    batch = []
+    for course_id in Course.objects.order_by().values_list('id', flat=True).iterator(chunk_size=batch_size):
+        batch.append(course_id)
+        if len(batch) >= batch_size:
+            total += refresh_search_index(batch)
+            batch = []
+            if stdout:
+                stdout.write(f" - Indexed {total} courses...")
+    if batch:
+        total += refresh_search_index(batch)
+
+    logger.info(f"Course search index rebuilt for {total} courses")
+    return total
+
+
+# ==========================================
+# PUBLIC INTERFACE (SEARCH)
+# ==========================================
+
+def apply_search(query_set, term: str, ranked: bool = False):
+    """
+    Lọc query_set theo từ khóa:
+    - Full-text (GIN trên search_vector): Mọi từ đều phải khớp, khớp theo tiền tố (từ đang gõ dở)
+    - Trigram (GIN trên search_title): Bắt tiêu đề gần giống (gõ sai chính tả)
+    ranked=True -> Annotate search_rank để sắp xếp theo độ liên quan.
+    """
+    tokens = _normalize(term or '')
+    if not tokens:
+        return query_set
+
+    # Raw tsquery an toàn: Token chỉ gồm chữ/số (không chứa toán tử & | ! : ( ))
+    raw = ' & '.join(f"{token}:*" for token in tokens)
+    query = SearchQuery(Unaccent(Value(raw)), search_type='raw', config=SEARCH_CONFIG)
+    plain = Unaccent(Value(' '.join(tokens)))
+
+    query_set = query_set.filter(
+        Q(search_vector=query) | Q(search_title__trigram_similar=plain)
+    )
+
+    if ranked:
+        query_set = query_set.annotate(
+            search_rank=SearchRank(F('search_vector'), query) + TrigramSimilarity('search_title', plain) * TRIGRAM_WEIGHT
+        )
+    return query_set
@@ -6,17 +6,18 @@ from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction, IntegrityError
-from django.db.models import Q, Count, Prefetch, Sum, F
+from django.db.models import Prefetch, F
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.text import slugify
 
 from custom_account.models import UserModel 
 from content.services.module_service import create_module_from_template
+from content.services import course_search_service
 from media.services.cloud_service import s3_copy_object
 from media.models import UploadedFile, FileStatus
 from content.domains.course_domain import CourseDomain
-from content.models import Course, Module, Lesson, Category, Tag, Subject, ContentBlock
+from content.models import Course, Module, Lesson, Category, Tag, Subject, ContentBlock, CourseStats
 from core.exceptions import DomainError
 from content.types import CourseFetchStrategy, CourseFilter
 
@@ -43,7 +44,10 @@ def _build_queryset(filters: CourseFilter, strategy: CourseFetchStrategy):
     if filters.published_only:
         query_set = query_set.filter(published=True)
     if filters.search_term:
-        query_set = query_set.filter(title__icontains=filters.search_term)
+        # Full-text + trigram trên index đã bỏ dấu (thay cho title__icontains: Seq Scan, phân biệt dấu)
+        query_set = course_search_service.apply_search(
+            query_set, filters.search_term, ranked=filters.order_by_relevance
+        )
     if filters.enrolled_user:
         # Logic: Tìm khóa học mà user đã ghi danh
         query_set = query_set.filter(enrollments__user=filters.enrolled_user)
@@ -81,10 +85,12 @@ def _build_queryset(filters: CourseFilter, strategy: CourseFetchStrategy):
     # --- C. ANNOTATION (TÍNH TOÁN SQL) ---
     # Phần này cực quan trọng: Chuyển logic đếm từ Python sang SQL
 
-    # Đếm cơ bản
+    # Đếm cơ bản: Đọc từ bảng CourseStats đã materialize (1 LEFT JOIN theo PK)
+    # thay vì Count/Sum qua Module -> Lesson -> ContentBlock + Enrollment (nhân dòng rồi DISTINCT).
+    # Coalesce: Course chưa có dòng stats (chưa rebuild) -> 0
     query_set = query_set.annotate(
-        modules_count=Count('modules', distinct=True),
-        students_count=Count('enrollments', distinct=True),
+        modules_count=Coalesce(F('stats__total_modules'), 0),
+        students_count=Coalesce(F('stats__total_students'), 0),
     )
 
     ordering = '-created_at'
@@ -97,28 +103,10 @@ def _build_queryset(filters: CourseFilter, strategy: CourseFetchStrategy):
         CourseFetchStrategy.ADMIN_LIST
     ]:
         query_set = query_set.annotate(
-            modules_count=Count('modules', distinct=True),
-
-            # Đếm tổng số bài học (Lesson) thông qua Module
-            total_lessons=Count('modules__lessons', distinct=True),
-            
-            # Đếm Video & Quiz (Dùng Conditional Count)
-            # Giả sử ContentBlock link với Lesson qua 'content_blocks'
-            total_videos=Count(
-                'modules__lessons__content_blocks', 
-                filter=Q(modules__lessons__content_blocks__type='video'),
-                distinct=True
-            ),
-            total_quizzes=Count(
-                'modules__lessons__content_blocks', 
-                filter=Q(modules__lessons__content_blocks__type='quiz'),
-                distinct=True
-            ),
-            
-            # NEW: TÍNH TỔNG THỜI LƯỢNG (Sum Duration)
-            # Logic: Cộng dồn cột 'duration' của tất cả content blocks
-            # Coalesce để nếu null thì trả về 0
-            total_seconds=Coalesce(Sum('modules__lessons__content_blocks__duration'), 0)
+            total_lessons=Coalesce(F('stats__total_lessons'), 0),
+            total_videos=Coalesce(F('stats__total_videos'), 0),
+            total_quizzes=Coalesce(F('stats__total_quizzes'), 0),
+            total_seconds=Coalesce(F('stats__total_seconds'), 0),
         )
 
         if strategy == CourseFetchStrategy.MY_ENROLLED:
@@ -143,11 +131,14 @@ def _build_queryset(filters: CourseFilter, strategy: CourseFetchStrategy):
         )
 
         query_set = query_set.annotate(
-            modules_count=Count('modules', distinct=True),
-            total_lessons=Count('modules__lessons', distinct=True),
+            total_lessons=Coalesce(F('stats__total_lessons'), 0),
             # total_seconds=... (Nếu cần hiển thị "Tổng thời lượng khóa học: 10h")
         )
         
+    # Chế độ tìm kiếm: Liên quan nhất lên đầu, hòa điểm thì theo sort mặc định
+    if filters.search_term and filters.order_by_relevance:
+        return query_set.order_by('-search_rank', ordering)
+
     # Sort mặc định
     return query_set.order_by(ordering)
 
@@ -366,6 +357,9 @@ def create_course_metadata(
     except KeyError as e:
         raise ValueError(f"Thiếu trường dữ liệu bắt buộc: {e}") from e
 
+    # Dòng thống kê rỗng (0 module, 0 học viên) -> Catalog luôn JOIN được
+    CourseStats.objects.create(course=course)
+
     # 5. Xử lý Tags (M2M)
     if tag_names:
         tags = _get_or_create_tags(tag_names)
@@ -376,6 +370,9 @@ def create_course_metadata(
         categories = _get_or_create_categories(categories_names)
         course.categories.set(categories)
 
+    # Search index (tiêu đề, mô tả, môn, tags, danh mục) - cùng transaction
+    course_search_service.refresh_search_index([course.id])
+
     # 7. TỐI ƯU HÓA: Xử lý Image bằng S3 Copy
     if image_id:
         try:
@@ -515,6 +512,8 @@ def update_course_metadata(
         categories = _get_or_create_categories(categories_names)
         course.categories.set(categories)
 
+    course_search_service.refresh_search_index([course.id])
+
     # 8. Xử lý ảnh bìa
     if image_id:
         _handle_course_image_update(course, image_id)
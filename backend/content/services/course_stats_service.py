@@ -0,0 +1,169 @@
+import uuid
+import logging
+from typing import Dict, Iterable, List
+from django.db import transaction
+from django.db.models import Count, Sum, F, Q
+from django.db.models.functions import Greatest
+
+from content.models import Course, Module, Lesson, ContentBlock, Enrollment, CourseStats
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+CONTENT_FIELDS = ['total_modules', 'total_lessons', 'total_videos', 'total_quizzes', 'total_seconds']
+STUDENT_FIELDS = ['total_students']
+
+REBUILD_BATCH_SIZE = 500
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _compute(course_ids: List[uuid.UUID]) -> Dict[uuid.UUID, dict]:
+    """
+    Tính thống kê cho 1 lô course bằng các query GROUP BY (mỗi bảng 1 query, không JOIN chéo
+    Module x Lesson x Block x Enrollment như annotate cũ).
+    """
+    stats = {course_id: {field: 0 for field in CONTENT_FIELDS + STUDENT_FIELDS} for course_id in course_ids}
+
+    modules = (
+        Module.objects.filter(course_id__in=course_ids)
+        .order_by().values('course_id').annotate(c=Count('id'))
+    )
+    for row in modules:
+        stats[row['course_id']]['total_modules'] = row['c']
+
+    lessons = (
+        Lesson.objects.filter(module__course_id__in=course_ids)
+        .order_by().values('module__course_id').annotate(c=Count('id'))
+    )
+    for row in lessons:
+        stats[row['module__course_id']]['total_lessons'] = row['c']
+
+    blocks = (
+        ContentBlock.objects.filter(lesson__module__course_id__in=course_ids)
+        .order_by().values('lesson__module__course_id')
+        .annotate(
+            videos=Count('id', filter=Q(type='video')),
+            quizzes=Count('id', filter=Q(type='quiz')),
+            seconds=Sum('duration'),
+        )
+    )
+    for row in blocks:
+        course_stats = stats[row['lesson__module__course_id']]
+        course_stats['total_videos'] = row['videos']
+        course_stats['total_quizzes'] = row['quizzes']
+        course_stats['total_seconds'] = row['seconds'] or 0
+
+    students = (
+        Enrollment.objects.filter(course_id__in=course_ids)
+        .order_by().values('course_id').annotate(c=Count('id'))
+    )
+    for row in students:
+        stats[row['course_id']]['total_students'] = row['c']
+
+    return stats
+
+
+def _upsert(stats: Dict[uuid.UUID, dict], update_fields: List[str]) -> int:
+    """
+    INSERT ... ON CONFLICT (course_id) DO UPDATE: Dòng mới nhận đủ mọi cột,
+    dòng đã có chỉ ghi đè update_fields (VD: Refresh nội dung không đụng tới total_students).
+    """
+    if not stats:
+        return 0
+    CourseStats.objects.bulk_create(
+        [CourseStats(course_id=course_id, **values) for course_id, values in stats.items()],
+        update_conflicts=True,
+        unique_fields=['course'],
+        update_fields=update_fields + ['updated_at'],
+    )
+    return len(stats)
+
+
+# ==========================================
+# PUBLIC INTERFACE (CONTENT)
+# ==========================================
+
+def refresh_content_stats(course_id: uuid.UUID) -> None:
+    """Tính lại số module/lesson/video/quiz/thời lượng của 1 course (vài query GROUP BY trên 1 course)."""
+    existing = Course.objects.filter(id=course_id).values_list('id', flat=True).first()
+    if not existing:
+        return  # Course vừa bị xóa -> Stats đã CASCADE theo
+    _upsert(_compute([existing]), CONTENT_FIELDS)
+
+
+def schedule_refresh(course_id) -> None:
+    """
+    Gọi từ các service content (qua course_structure_service.bump_version).
+    Chạy SAU KHI commit: Thấy được thay đổi của mọi transaction đã commit,
+    tránh 2 transaction song song tính trên snapshot riêng rồi ghi đè lẫn nhau.
+    """
+    if not course_id:
+        return
+
+    def _refresh():
+        try:
+            refresh_content_stats(course_id)
+        except Exception as e:
+            logger.error(f"⚠️ Không cập nhật được CourseStats của course {course_id}: {e}")
+
+    transaction.on_commit(_refresh)
+
+
+# ==========================================
+# PUBLIC INTERFACE (ENROLLMENT)
+# ==========================================
+
+def increment_students(course_id: uuid.UUID, delta: int) -> None:
+    """
+    Cộng/trừ số học viên bằng F() (atomic, nằm trong transaction ghi danh).
+    Chưa có dòng stats -> Tạo sau khi commit bằng cách đếm đầy đủ.
+    """
+    updated = CourseStats.objects.filter(course_id=course_id).update(
+        total_students=Greatest(F('total_students') + delta, 0)
+    )
+    if not updated:
+        def _create():
+            try:
+                rebuild_course_stats([course_id])
+            except Exception as e:
+                logger.error(f"⚠️ Không tạo được CourseStats của course {course_id}: {e}")
+
+        transaction.on_commit(_create)
+
+
+# ==========================================
+# PUBLIC INTERFACE (REBUILD)
+# ==========================================
+
+def rebuild_course_stats(course_ids: Iterable[uuid.UUID] = None, batch_size: int = REBUILD_BATCH_SIZE, stdout=None) -> int:
+    """
+    Tính lại toàn bộ cột (kể cả total_students) từ bảng gốc. course_ids=None -> Mọi course.
+    Trả về số dòng đã ghi.
+    """
+    if course_ids is None:
+        course_ids = Course.objects.order_by().values_list('id', flat=True).iterator(chunk_size=batch_size)
+    else:
+        course_ids = list(Course.objects.filter(id__in=list(course_ids)).values_list('id', flat=True))
+
+    total = 0
+    batch = []
+    for course_id in course_ids:
+        batch.append(course_id)
+        if len(batch) >= batch_size:
+            total += _upsert(_compute(batch), CONTENT_FIELDS + STUDENT_FIELDS)
+            batch = []
+            if stdout:
+                stdout.write(f" - Rebuilt {total} courses...")
+    if batch:
+        total += _upsert(_compute(batch), CONTENT_FIELDS + STUDENT_FIELDS)
+
+    logger.info(f"Course stats rebuilt for {total} courses")
+    return total
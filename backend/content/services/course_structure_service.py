@@ -0,0 +1,188 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from content.models import Module, Lesson, ContentBlock
+from content.services import course_stats_service
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'content:structure'
+
+# Cấu trúc đã được khóa theo version -> Không bao giờ stale, TTL chỉ để dọn rác các version cũ
+STRUCTURE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# LRU trong RAM của từng process (worker gunicorn/celery)
+LOCAL_CACHE_MAX_SIZE = 256
+
+_local_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+_local_lock = threading.Lock()
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _version_key(course_id) -> str:
+    return f'{KEY_PREFIX}:{course_id}:version'
+
+
+def _structure_key(course_id, version: int) -> str:
+    return f'{KEY_PREFIX}:{course_id}:v{version}'
+
+
+def _new_version() -> int:
+    # Khởi tạo bằng timestamp (ms) thay vì 1: nếu key version bị evict,
+    # version mới vẫn không trùng với bản cũ còn nằm trong LRU của process khác.
+    return int(time.time() * 1000)
+
+
+def _local_get(key: tuple):
+    with _local_lock:
+        value = _local_cache.get(key)
+        if value is not None:
+            _local_cache.move_to_end(key)
+        return value
+
+
+def _local_set(key: tuple, value) -> None:
+    with _local_lock:
+        _local_cache[key] = value
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > LOCAL_CACHE_MAX_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def _build_structure(course_id: uuid.UUID) -> List[Dict[str, Any]]:
+    """
+    Query cây Module -> Lesson -> ContentBlock (3 query, sắp xếp sẵn bằng SQL)
+    và serialize thành list dict thuần (pickle được, không giữ model instance).
+    """
+    modules = Module.objects.filter(course_id=course_id).only('id', 'title', 'position').prefetch_related(
+        Prefetch(
+            'lessons',
+            queryset=Lesson.objects.only('id', 'title', 'position', 'module_id').order_by('position')
+        ),
+        Prefetch(
+            'lessons__content_blocks',
+            queryset=ContentBlock.objects.only('id', 'title', 'type', 'duration', 'position', 'lesson_id').order_by('position')
+        ),
+    ).order_by('position')
+
+    return [
+        {
+            'id': module.id,
+            'title': module.title,
+            'lessons': [
+                {
+                    'id': lesson.id,
+                    'title': lesson.title,
+                    'blocks': [
+                        {
+                            'id': block.id,
+                            'title': block.title,
+                            'type': block.type,
+                            'duration': block.duration or 0,
+                        }
+                        for block in lesson.content_blocks.all()
+                    ],
+                }
+                for lesson in module.lessons.all()
+            ],
+        }
+        for module in modules
+    ]
+
+
+# ==========================================
+# PUBLIC INTERFACE (VERSION)
+# ==========================================
+
+def get_version(course_id) -> int:
+    key = _version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_now(course_id) -> None:
+    key = _version_key(course_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key chưa có (hoặc đã bị evict)
+        cache.set(key, _new_version(), timeout=None)
+    except Exception as e:
+        logger.error(f"⚠️ Không bump được structure version của course {course_id}: {e}")
+
+
+def bump_version(course_id) -> None:
+    """
+    Đánh dấu cấu trúc khóa học đã thay đổi.
+    Gọi từ các service content (create/update/delete/reorder Module, Lesson, ContentBlock).
+    Chạy SAU KHI commit để request khác không build lại cache từ dữ liệu chưa commit.
+    Đồng thời tính lại CourseStats (số module/lesson/video/quiz/thời lượng) của khóa học.
+    """
+    if not course_id:
+        return
+    transaction.on_commit(lambda: _bump_now(course_id))
+    course_stats_service.schedule_refresh(course_id)
+
+
+def bump_version_for_lesson(lesson_id) -> None:
+    """Giống bump_version, dùng cho các thao tác ở cấp ContentBlock (chỉ biết lesson_id)."""
+    course_id = Lesson.objects.filter(id=lesson_id).values_list('module__course_id', flat=True).first()
+    bump_version(course_id)
+
+
+# ==========================================
+# PUBLIC INTERFACE (READ)
+# ==========================================
+
+def get_course_structure(course_id: uuid.UUID) -> List[Dict[str, Any]]:
+    """
+    Lấy cây Module -> Lesson -> Block (đã sắp xếp theo position) của khóa học.
+    Thứ tự tra cứu: LRU trong process -> Redis -> DB.
+    Kết quả dùng chung giữa các request: KHÔNG được sửa trực tiếp.
+    """
+    try:
+        version = get_version(course_id)
+    except Exception as e:
+        logger.error(f"⚠️ Structure cache unavailable: {e}")
+        return _build_structure(course_id)
+
+    local_key = (str(course_id), version)
+    structure = _local_get(local_key)
+    if structure is not None:
+        return structure
+
+    redis_key = _structure_key(course_id, version)
+    try:
+        structure = cache.get(redis_key)
+    except Exception as e:
+        logger.error(f"⚠️ Structure cache unavailable: {e}")
+        structure = None
+
+    if structure is None:
+        structure = _build_structure(course_id)
+        try:
+            cache.set(redis_key, structure, timeout=STRUCTURE_TTL_SECONDS)
+        except Exception as e:
+            logger.error(f"⚠️ Không ghi được structure cache {redis_key}: {e}")
+
+    _local_set(local_key, structure)
+    return structure
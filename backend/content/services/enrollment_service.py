@@ -8,6 +8,8 @@ from custom_account.models import UserModel
 from content.domains.enrollment_domain import EnrollmentDomain, EnrollmentCollectionDomain
 from core.exceptions import DomainError
 from content.models import Course, Enrollment, Lesson
+from core.services import course_access_service
+from content.services import course_stats_service
 
 
 
@@ -64,6 +66,11 @@ def enroll_user_in_course(course_id: uuid.UUID, user: UserModel, force_enroll: b
             # Nếu đã tồn tại, có thể user đã enroll từ trước
             # (Hoặc logic tái kích hoạt nếu bạn có soft-delete)
             raise DomainError("Bạn đã ghi danh vào khóa học này rồi.")
+
+        course_stats_service.increment_students(course.id, 1)
+
+        # Quyền xem nội dung đã cache (memo 'none') -> Xóa để có hiệu lực ngay
+        course_access_service.invalidate_course_role(user, course.id)
         
         # TODO: Tại đây nên gọi thêm hàm init_learning_progress(user, course)
         # để tạo sẵn các bản ghi theo dõi tiến độ bài học.
@@ -97,7 +104,10 @@ def unenroll_user_from_course(course_id: uuid.UUID, user: UserModel) -> None:
         raise DomainError("Không thể hủy ghi danh đối với khóa học có tính phí.")
 
     # 3. Nếu là khóa Free -> Thực hiện xóa
-    enrollment.delete()
+    with transaction.atomic():
+        enrollment.delete()
+        course_stats_service.increment_students(course_id, -1)
+    course_access_service.invalidate_course_role(user, course_id)
 
     # TODO: Xử lý dọn dẹp tiến độ học tập (Progress) nếu cần
 
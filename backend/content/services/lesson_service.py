@@ -1,16 +1,19 @@
 import uuid
 import logging
+from collections import Counter
 from typing import Dict, Any, List, Tuple
 from uuid import UUID
 from django.db import transaction
 from django.db.models import Max, F, Case, When, Value, Prefetch
+from django.db.models.functions import Greatest
 
 from custom_account.models import UserModel
 from content.models import Lesson, Module, ContentBlock
 from content.domains.lesson_domain import LessonDomain
 from core.exceptions import DomainError, ModuleNotFoundError, LessonNotFoundError, NotEnrolledError, NoPublishedContentError, VersionNotFoundError
 from content.services.content_block_service import create_content_block, update_content_block
-from progress.tasks import process_lesson_addition_impact
+from progress.tasks import process_lesson_addition_impact, recompute_course_progress
+from content.services import course_structure_service
 
 
 
@@ -73,6 +76,11 @@ def create_lesson(
         position=position
     )
 
+    # Counter: Mẫu số của ModuleCompletion
+    Module.objects.filter(id=module.id).update(cached_total_lessons=F('cached_total_lessons') + 1)
+
+    course_structure_service.bump_version(module.course_id)
+
     transaction.on_commit(
         lambda: process_lesson_addition_impact.delay(str(module.course_id))
     )
@@ -91,7 +99,7 @@ def update_lesson(
 ) -> LessonDomain:
     """Update lesson"""
     try:
-        lesson = Lesson.objects.get(id=lesson_id)
+        lesson = Lesson.objects.select_related('module').get(id=lesson_id)
     except Lesson.DoesNotExist:
         raise Lesson.DoesNotExist(f"Lesson với ID '{lesson_id}' không tồn tại.")
     
@@ -100,6 +108,8 @@ def update_lesson(
         lesson.title = data['title']
     lesson.save()
 
+    course_structure_service.bump_version(lesson.module.course_id)
+
     return LessonDomain.from_model_summary(lesson)
 
 
@@ -120,6 +130,19 @@ def delete_lesson(lesson_id: UUID):
 
     # 2. Xóa bài học 
     lesson.delete()
+
+    Module.objects.filter(id=lesson.module_id).update(
+        cached_total_lessons=Greatest(F('cached_total_lessons') - 1, 0)
+    )
+
+    course_structure_service.bump_version(lesson.module.course_id)
+
+    # Mẫu số giảm -> Đánh giá lại hoàn thành module + tính lại % cho toàn bộ học viên
+    course_id = lesson.module.course_id
+    module_id = lesson.module_id
+    transaction.on_commit(
+        lambda: recompute_course_progress.delay(str(course_id), module_id=str(module_id))
+    )
     
 
 # ==========================================
@@ -160,6 +183,7 @@ def reorder_lessons(course_id: uuid.UUID, target_module_id: uuid.UUID, lesson_id
     # 4. Logic Update (Position + Module)
     update_list = []
     ordered_lessons = []
+    moved_out = Counter() # {source_module_id: số lesson bị kéo đi}
 
     for index, lesson_id in enumerate(input_uuids):
         lesson = lessons_dict[lesson_id]
@@ -175,6 +199,7 @@ def reorder_lessons(course_id: uuid.UUID, target_module_id: uuid.UUID, lesson_id
         
         # Check 2: Có thay đổi nhà (Module) không? (Cross-module drag)
         if lesson.module_id != target_module_id:
+            moved_out[lesson.module_id] += 1
             lesson.module_id = target_module_id
             is_changed = True
         
@@ -185,6 +210,17 @@ def reorder_lessons(course_id: uuid.UUID, target_module_id: uuid.UUID, lesson_id
     # Quan trọng: Cần update cả field 'module' để support việc di chuyển
     if update_list:
         Lesson.objects.bulk_update(update_list, ['position', 'module'])
+        course_structure_service.bump_version(course_id)
+
+    # Counter: Đồng bộ mẫu số của các module bị ảnh hưởng bởi cross-module drag
+    if moved_out:
+        for source_module_id, count in moved_out.items():
+            Module.objects.filter(id=source_module_id).update(
+                cached_total_lessons=Greatest(F('cached_total_lessons') - count, 0)
+            )
+        Module.objects.filter(id=target_module_id).update(
+            cached_total_lessons=F('cached_total_lessons') + sum(moved_out.values())
+        )
 
     return [LessonDomain.from_model_summary(l) for l in ordered_lessons]
 
@@ -216,6 +252,7 @@ def create_lesson_from_template(module: Module, data: Dict[str, Any], actor: Use
         title=title,
         position=position,
     )
+    Module.objects.filter(id=module.id).update(cached_total_lessons=F('cached_total_lessons') + 1)
     
     # 4. ỦY QUYỀN cho hàm 'create_content_block' (Hàm 4)
     for block_data in content_blocks_data:
@@ -8,6 +8,8 @@ from custom_account.models import UserModel
 from content.services.lesson_service import create_lesson_from_template
 from content.domains.module_domain import ModuleDomain
 from content.models import Module, Course, Lesson
+from content.services import course_structure_service
+from progress.tasks import recompute_course_progress
 
 
 
@@ -64,6 +66,8 @@ def create_module(
         title=data.get('title') or "Untitled",
         position=new_position
     )
+
+    course_structure_service.bump_version(course.id)
     
     return ModuleDomain.from_model(module)
 
@@ -88,6 +92,8 @@ def update_module(
         module.title = data['title']
     module.save()
 
+    course_structure_service.bump_version(module.course_id)
+
     return ModuleDomain.from_model_metadata(module)
 
 
@@ -105,6 +111,15 @@ def delete_module(module_id: uuid.UUID) -> None:
         
     module.delete()
 
+    course_structure_service.bump_version(module.course_id)
+
+    # Các lesson con bị xóa theo -> Tính lại % + hoàn thành khóa học cho toàn bộ học viên
+    # (ModuleCompletion của module này CASCADE theo, các module khác không đổi mẫu số)
+    course_id = module.course_id
+    transaction.on_commit(
+        lambda: recompute_course_progress.delay(str(course_id))
+    )
+
 
 # ==========================================
 # PUBLIC INTERFACE (REORDER)
@@ -160,6 +175,7 @@ def reorder_modules(course_id: uuid.UUID, module_id_list: list[uuid.UUID]):
     # 4. Bulk update
     if update_list:
         Module.objects.bulk_update(update_list, ['position'])
+        course_structure_service.bump_version(course_id)
 
     return [ModuleDomain.from_model(m) for m in ordered_modules]    
     
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from content.models import Course, Tag, Category, Subject
+from content.services import course_search_service
+
+
+
+# Tên Tag/Category/Subject nằm trong search_vector (trọng số B) của mọi course dùng nó
+# -> Đổi tên / xóa phải build lại index của các course đó, nếu không tìm kiếm sẽ trả kết quả cũ.
+TAXONOMY_COURSE_FILTERS = {
+    Tag: 'tags',
+    Category: 'categories',
+    Subject: 'subject',
+}
+
+
+def _course_ids(sender, instance) -> list:
+    return list(
+        Course.objects.filter(**{TAXONOMY_COURSE_FILTERS[sender]: instance}).values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subject)
+def on_taxonomy_saved(sender, instance, created, **kwargs):
+    """Đổi tên -> Cập nhật index ngay trong transaction của lệnh save (1 câu UPDATE)."""
+    if created:
+        return  # Chưa có course nào dùng
+    course_search_service.refresh_search_index(_course_ids(sender, instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Subject)
+def on_taxonomy_deleted(sender, instance, **kwargs):
+    """Xóa -> Lấy danh sách course TRƯỚC khi liên kết mất, build lại index SAU khi commit."""
+    course_ids = _course_ids(sender, instance)
+    if course_ids:
+        transaction.on_commit(lambda: course_search_service.refresh_search_index(course_ids))
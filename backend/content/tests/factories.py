@@ -1,7 +1,8 @@
 # content/tests/factories.py
+"""
+Factory dùng chung cho test các app (content, progress, ...): User -> Course -> Module -> Lesson -> ContentBlock, Enrollment.
+"""
 import factory
-from datetime import datetime
-from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
 # import project models
@@ -11,22 +12,20 @@ from content import models as content_models
 class UserFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = UserModel
+        skip_postgeneration_save = True
 
     username = factory.Sequence(lambda n: f"user{n}")
     email = factory.LazyAttribute(lambda o: f"{o.username}@example.com")
     role = "student"
-    phone = factory.Faker("phone_number")
     is_active = True
     is_staff = False
-    created_on = factory.LazyFunction(timezone.now)
-    updated_on = factory.LazyFunction(timezone.now)
 
     @factory.post_generation
     def set_password(obj, create, extracted, **kwargs):
         raw = extracted or "password123"
         obj.set_password(raw)
         if create:
-            obj.save()
+            obj.save(update_fields=['password'])
             # ensure token exists for convenience
             Token.objects.get_or_create(user=obj)
 
@@ -48,7 +47,7 @@ class CourseFactory(factory.django.DjangoModelFactory):
     description = "A sample course"
     grade = "1"
     published = False
-    owner = factory.SubFactory(UserFactory)
+    owner = factory.SubFactory(UserFactory, role="instructor")
     slug = factory.LazyAttribute(lambda o: o.title.lower().replace(" ", "-"))
 
 
@@ -58,7 +57,7 @@ class ModuleFactory(factory.django.DjangoModelFactory):
 
     course = factory.SubFactory(CourseFactory)
     title = factory.Sequence(lambda n: f"Module {n}")
-    position = 0
+    position = factory.Sequence(lambda n: n)
 
 
 class LessonFactory(factory.django.DjangoModelFactory):
@@ -67,57 +66,23 @@ class LessonFactory(factory.django.DjangoModelFactory):
 
     module = factory.SubFactory(ModuleFactory)
     title = factory.Sequence(lambda n: f"Lesson {n}")
-    position = 0
-    content_type = "lesson"
-    published = False
-
-
-class LessonVersionFactory(factory.django.DjangoModelFactory):
-    class Meta:
-        model = content_models.LessonVersion
-
-    lesson = factory.SubFactory(LessonFactory)
-    version = 1
-    status = "draft"
-    author = factory.SubFactory(UserFactory)
-    content = factory.LazyFunction(lambda: {"content_blocks": []})
-    created_at = factory.LazyFunction(timezone.now)
+    position = factory.Sequence(lambda n: n)
 
 
 class ContentBlockFactory(factory.django.DjangoModelFactory):
     class Meta:
         model = content_models.ContentBlock
 
-    lesson_version = factory.SubFactory(LessonVersionFactory)
-    type = "text"
-    position = 0
-    payload = factory.LazyFunction(lambda: {"text": "Hello world"})
-
-
-class ExplorationFactory(factory.django.DjangoModelFactory):
-    class Meta:
-        model = content_models.Exploration
-
-    title = factory.Sequence(lambda n: f"Exploration {n}")
-    owner = factory.SubFactory(UserFactory)
-    language = "vi"
-    published = False
-
-
-class ExplorationStateFactory(factory.django.DjangoModelFactory):
-    class Meta:
-        model = content_models.ExplorationState
+    lesson = factory.SubFactory(LessonFactory)
+    type = "rich_text"
+    title = factory.Sequence(lambda n: f"Nội dung {n}")
+    position = factory.Sequence(lambda n: n)
+    payload = factory.LazyFunction(lambda: {"html_content": "<p>Nội dung</p>"})
 
-    exploration = factory.SubFactory(ExplorationFactory)
-    name = factory.Sequence(lambda n: f"state_{n}")
-    content = factory.LazyFunction(lambda: {"prompt": "Hello"})
-    interaction = factory.LazyFunction(lambda: {"type": "text"})
 
-class ExplorationTransitionFactory(factory.django.DjangoModelFactory):
+class EnrollmentFactory(factory.django.DjangoModelFactory):
     class Meta:
-        model = content_models.ExplorationTransition
+        model = content_models.Enrollment
 
-    exploration = factory.SubFactory(ExplorationFactory)
-    from_state = factory.SubFactory(ExplorationStateFactory)
-    to_state = factory.SubFactory(ExplorationStateFactory)
-    condition = factory.LazyFunction(lambda: {"always": True})
+    user = factory.SubFactory(UserFactory)
+    course = factory.SubFactory(CourseFactory)
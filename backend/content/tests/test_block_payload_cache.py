@@ -0,0 +1,134 @@
+# content/tests/test_block_payload_cache.py
+"""
+Cache payload đã render theo (block, payload_version):
+Miss -> render rồi ghi cache, Hit -> không render lại, invalidate xóa key sau commit.
+Sửa block (update_content_block) phải tăng payload_version -> Không bao giờ trả payload render cũ.
+Cache chỉ được ghi NGOÀI transaction -> Các test cần ghi cache dùng django_db(transaction=True).
+"""
+import pytest
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from content.domains.content_block_domain import ContentBlockDomain
+from content.services import block_payload_cache_service, content_block_service
+from progress.tests.factories import UserFactory, LessonFactory, ContentBlockFactory, EnrollmentFactory
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def render_calls(monkeypatch):
+    """Đếm số lần render thật (_process_payload_heavy) theo block id."""
+    calls = []
+    original = ContentBlockDomain._process_payload_heavy
+
+    def _counting(model):
+        calls.append(str(model.id))
+        return original(model)
+
+    monkeypatch.setattr(ContentBlockDomain, '_process_payload_heavy', staticmethod(_counting))
+    return calls
+
+
+@pytest.mark.django_db(transaction=True)
+def test_miss_renders_and_stores_then_hit_skips_render(render_calls):
+    lesson = LessonFactory()
+    blocks = ContentBlockFactory.create_batch(3, lesson=lesson)
+
+    first = content_block_service.get_content_blocks_detail(lesson.id)
+    assert sorted(render_calls) == sorted(str(b.id) for b in blocks)
+    for block in blocks:
+        assert cache.get(block_payload_cache_service._payload_key(block.id, block.payload_version)) is not None
+
+    render_calls.clear()
+    second = content_block_service.get_content_blocks_detail(lesson.id)
+
+    assert render_calls == []
+    assert [d.payload for d in second] == [d.payload for d in first]
+    assert [d.id for d in second] == [str(b.id) for b in blocks]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_invalidate_deletes_key_after_commit():
+    block = ContentBlockFactory()
+    content_block_service.get_content_blocks_detail(block.lesson_id)
+    key = block_payload_cache_service._payload_key(block.id, block.payload_version)
+    assert cache.get(key) is not None
+
+    with transaction.atomic():
+        block_payload_cache_service.invalidate([block])
+        # Chưa commit -> Key vẫn còn
+        assert cache.get(key) is not None
+    assert cache.get(key) is None
+
+
+@pytest.mark.django_db
+def test_read_inside_transaction_does_not_store():
+    block = ContentBlockFactory()
+    content_block_service.get_content_blocks_detail(block.lesson_id)
+    assert cache.get(block_payload_cache_service._payload_key(block.id, block.payload_version)) is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_bumps_payload_version_and_never_serves_old_payload(render_calls):
+    block = ContentBlockFactory(payload={'html_content': '<p>Bản cũ</p>'})
+    old_version = block.payload_version
+    [before] = content_block_service.get_content_blocks_detail(block.lesson_id)
+    assert before.payload['html_content'] == '<p>Bản cũ</p>'
+
+    content_block_service.update_content_block(
+        block, {'payload': {'html_content': '<p>Bản mới</p>'}}, actor=block.lesson.module.course.owner
+    )
+
+    block.refresh_from_db()
+    assert block.payload_version == old_version + 1
+    assert cache.get(block_payload_cache_service._payload_key(block.id, old_version)) is None
+
+    render_calls.clear()
+    [after] = content_block_service.get_content_blocks_detail(block.lesson_id)
+    assert after.payload['html_content'] == '<p>Bản mới</p>'
+    assert render_calls == [str(block.id)]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_with_lost_invalidation_still_misses_old_entry(monkeypatch):
+    # Dù việc xóa key cũ bị lỡ (cache lỗi...), version mới nằm ở key khác
+    block = ContentBlockFactory(payload={'html_content': '<p>Bản cũ</p>'})
+    content_block_service.get_content_blocks_detail(block.lesson_id)
+    monkeypatch.setattr(block_payload_cache_service, 'invalidate', lambda blocks: None)
+
+    content_block_service.update_content_block(
+        block, {'payload': {'html_content': '<p>Bản mới</p>'}}, actor=block.lesson.module.course.owner
+    )
+
+    [after] = content_block_service.get_content_blocks_detail(block.lesson_id)
+    assert after.payload['html_content'] == '<p>Bản mới</p>'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lesson_content_endpoint_serves_cached_detail(render_calls):
+    enrollment = EnrollmentFactory()
+    lesson = LessonFactory(module__course=enrollment.course)
+    blocks = ContentBlockFactory.create_batch(2, lesson=lesson)
+    client = APIClient()
+    client.force_authenticate(user=enrollment.user)
+    url = f'/api/content/lessons/{lesson.id}/blocks/'
+
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert [item['id'] for item in resp.json()] == [str(b.id) for b in blocks]
+    assert resp.json()[0]['payload']['html_content'] == '<p>Nội dung</p>'
+
+    render_calls.clear()
+    assert client.get(url).json() == resp.json()
+    assert render_calls == []
+
+    stranger = APIClient()
+    stranger.force_authenticate(user=UserFactory())
+    assert stranger.get(url).status_code == 403
@@ -41,4 +41,5 @@ class CourseFilter:
     enrolled_user: Optional[UserModel] = None   # Lấy khóa user này đã mua/enroll
     exclude_enrolled_user: Optional[UserModel] = None  # Dùng để loại trừ khóa "Của tôi" ra khỏi list public
     published_only: bool = False                # Chỉ lấy public
-    search_term: Optional[str] = None           # Tìm kiếm
\ No newline at end of file
+    search_term: Optional[str] = None           # Tìm kiếm
+    order_by_relevance: bool = False            # Có search_term -> Sắp xếp theo độ liên quan (search_rank)
\ No newline at end of file
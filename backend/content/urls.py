@@ -5,7 +5,7 @@ from content.api.views.subject_view import AdminSubjectListView
 from content.api.views.module_view import InstructorModuleListCreateView, InstructorModuleDetailView, InstructorModuleReorderView
 from content.api.views.lesson_view import InstructorLessonListCreateView, InstructorLessonDetailView, InstructorLessonReorderView
 from content.api.views.content_block_view import InstructorContentBlockListCreateView, InstructorContentBlockConvertView, InstructorContentBlockDetailView, InstructorContentBlockReorderView
-from content.api.views.enrollment_view import CourseEnrollView, PublicCourseListView, MyEnrolledCourseListView, CourseStructureView, ContentBlockDetailView
+from content.api.views.enrollment_view import CourseEnrollView, PublicCourseListView, MyEnrolledCourseListView, CourseStructureView, ContentBlockDetailView, LessonContentView
 
 
 
@@ -17,6 +17,7 @@ urlpatterns = [
     path('my-courses/', MyEnrolledCourseListView.as_view(), name='public-course-list'),
     path('courses/<uuid:course_id>/', CourseStructureView.as_view(), name='public-course-detail'),
     path('blocks/<uuid:block_id>/', ContentBlockDetailView.as_view(), name='public-block-detail'),
+    path('lessons/<uuid:lesson_id>/blocks/', LessonContentView.as_view(), name='public-lesson-blocks'),
 
 
     # # ---------------------------- ADMIN ---------------------------------------
@@ -1,19 +1,68 @@
+import json
+import math
+import uuid
 import logging
-from dataclasses import asdict, is_dataclass
-from pydantic import BaseModel
-from typing import Type, Any, Optional
+import datetime
+from decimal import Decimal
+from functools import lru_cache
+from dataclasses import asdict, is_dataclass, dataclass
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+from typing import Type, Any, Optional, Tuple, List
+from django.core import signing
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.shortcuts import get_object_or_404
+from django.db import connections
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from rest_framework import status
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.api.renderers import FastJSONRenderer, PreRenderedJSON
+
 
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
+def _list_adapter(dto_cls: Type[BaseModel]) -> TypeAdapter:
+    """TypeAdapter(List[DTO]) build 1 lần cho mỗi DTO class (build schema/validator khá tốn)."""
+    return TypeAdapter(List[dto_cls])
+
+
+# Kiểu mà pydantic-core encode JSON KHÁC DRF JSONEncoder
+# (timedelta: "PT45M" vs "2700.0", Decimal: "1.50" vs 1.5)
+_JSON_INCOMPATIBLE_TYPES = frozenset({'timedelta', 'decimal'})
+
+
+def _schema_is_json_compatible(schema) -> bool:
+    """Duyệt core schema: Không có kiểu encode khác DRF, không có serializer chỉ chạy ở mode JSON."""
+    if isinstance(schema, dict):
+        # Chỉ xét node schema (giá trị là str); dict 'fields' có thể chứa field tên 'type'
+        node_type, when_used = schema.get('type'), schema.get('when_used')
+        if isinstance(node_type, str) and node_type in _JSON_INCOMPATIBLE_TYPES:
+            return False
+        if isinstance(when_used, str) and when_used in ('json', 'json-unless-none'):
+            return False
+        return all(_schema_is_json_compatible(value) for value in schema.values())
+    if isinstance(schema, (list, tuple)):
+        return all(_schema_is_json_compatible(value) for value in schema)
+    return True
+
+
+@lru_cache(maxsize=None)
+def _dumps_json_like_drf(dto_cls: Type[BaseModel]) -> bool:
+    """
+    DTO đã kiểm: Encode thẳng bằng pydantic-core ra JSON cùng giá trị với model_dump() + DRF JSONEncoder.
+    DTO chưa kiểm được (có timedelta/Decimal, không phải BaseModel...) -> Đường dict + DRF encode.
+    """
+    schema = getattr(dto_cls, '__pydantic_core_schema__', None)
+    return isinstance(schema, dict) and _schema_is_json_compatible(schema)
+
+
 class DtoMappingError(APIException):
     status_code = 500
     default_detail = 'DTO mapping failed.'
@@ -35,6 +84,10 @@ class RoleBasedOutputMixin:
     output_dto_instructor: Optional[Type[BaseModel]] = None # NEW: DTO cho chủ sở hữu resource
     output_dto_self: Optional[Type[BaseModel]] = None       # DTO cho chính bản thân user (Profile)
 
+    # Encode DTO thẳng ra JSON bytes (pydantic-core) khi renderer là FastJSONRenderer và DTO đã kiểm
+    # (_dumps_json_like_drf). False -> dict + DRF encode như cũ
+    fast_json_output = True
+
     def _select_dto_class(self, instance: Any, request) -> Type[BaseModel]:
         """Chọn DTO class phù hợp."""
         user = request.user
@@ -76,6 +129,65 @@ class RoleBasedOutputMixin:
         # `from_orm` works with Django models, SQLAlchemy, etc.
         return dto_cls.model_validate(instance) # Pydantic v2
 
+    def _uniform_dto_class(self, request) -> Optional[Type[BaseModel]]:
+        """
+        DTO chung cho CẢ response khi vai trò đã đủ quyết định (không phụ thuộc từng item):
+        Admin, hoặc view không có DTO instructor/self, hoặc chưa đăng nhập. Còn lại -> None (xét từng item).
+        """
+        user = request.user
+        is_auth = user.is_authenticated
+
+        if is_auth and user.is_staff and self.output_dto_admin:
+            return self.output_dto_admin
+        if not is_auth or not (self.output_dto_instructor or self.output_dto_self):
+            return self.output_dto_public
+        return None
+
+    def _validate_many(self, items, request) -> Tuple[list, set]:
+        """
+        Validate cả list bằng TypeAdapter đã cache (1 lần gọi vào pydantic-core thay vì N lần model_validate).
+        Trả về (dtos, các DTO class đã dùng).
+        """
+        items = list(items)
+        if not items:
+            return [], set()
+
+        dto_cls = self._uniform_dto_class(request)
+        if dto_cls is None:
+            classes = [self._select_dto_class(item, request) for item in items]
+            if len(set(classes)) == 1:
+                dto_cls = classes[0]
+
+        if dto_cls is not None:
+            return _list_adapter(dto_cls).validate_python(items), {dto_cls}
+
+        # Trộn DTO (VD: list có cả khóa của mình và của người khác) -> Validate theo nhóm, giữ thứ tự
+        dtos = [None] * len(items)
+        for cls in set(classes):
+            indexes = [i for i, c in enumerate(classes) if c is cls]
+            validated = _list_adapter(cls).validate_python([items[i] for i in indexes])
+            for i, dto in zip(indexes, validated):
+                dtos[i] = dto
+        return dtos, set(classes)
+
+    def _dump_many(self, items, request):
+        """
+        DTO đều đã kiểm -> JSON bytes (pydantic-core).
+        Ngược lại -> list dict (model_dump mode python) để DRF encode như đường cũ.
+        """
+        dtos, classes = self._validate_many(items, request)
+        uniform_cls = next(iter(classes)) if len(classes) == 1 else None
+
+        if all(_dumps_json_like_drf(cls) for cls in classes):
+            return _list_adapter(uniform_cls).dump_json(dtos) if uniform_cls else to_json(dtos)
+        if uniform_cls:
+            return _list_adapter(uniform_cls).dump_python(dtos)
+        return [dto.model_dump() for dto in dtos]
+
+    def _can_prerender(self, request) -> bool:
+        # Chỉ khi renderer đã chọn là FastJSONRenderer (Browsable API / renderer khác -> đường cũ)
+        return self.fast_json_output and isinstance(getattr(request, 'accepted_renderer', None), FastJSONRenderer)
+
     def finalize_response(self, request, response, *args, **kwargs):
         """
         DRF calls this *after* the view returns a Response.
@@ -89,20 +201,30 @@ class RoleBasedOutputMixin:
                 meta_data = response.data["meta"]
 
                 try:  
-                    # Tối ưu: Nếu items_data rỗng thì khỏi map
-                    if not items_data:
-                        dtos = []
+                    if self._can_prerender(request):
+                        # Fast path: Validate + dump cả list 1 lần; DTO đã kiểm -> Encode thẳng ra bytes
+                        items = self._dump_many(items_data, request)
+                        if isinstance(items, bytes):
+                            response.data = PreRenderedJSON(
+                                b'{"items":' + items + b',"meta":' + JSONRenderer().render(meta_data) + b'}'
+                            )
+                        else:
+                            response.data = {"items": items, "meta": meta_data}
                     else:
-                        dtos = [
-                            self._to_dto(item, request).model_dump()
-                            for item in items_data
-                        ]
-                    
-                    # Cập nhật lại response data
-                    response.data = {
-                        "items": dtos,
-                        "meta": meta_data
-                    }
+                        # Tối ưu: Nếu items_data rỗng thì khỏi map
+                        if not items_data:
+                            dtos = []
+                        else:
+                            dtos = [
+                                self._to_dto(item, request).model_dump()
+                                for item in items_data
+                            ]
+                        
+                        # Cập nhật lại response data
+                        response.data = {
+                            "items": dtos,
+                            "meta": meta_data
+                        }
 
                 except Exception as e:
                     # (Thêm exc_info=True để debug dễ hơn)
@@ -114,7 +236,14 @@ class RoleBasedOutputMixin:
                 instance_data = response.data["instance"]
 
                 try:
-                    if isinstance(instance_data, (list, QuerySet)):
+                    if self._can_prerender(request):
+                        if isinstance(instance_data, (list, QuerySet)):
+                            data = self._dump_many(instance_data, request)
+                        else:
+                            dto = self._to_dto(instance_data, request)
+                            data = to_json(dto) if _dumps_json_like_drf(type(dto)) else dto.model_dump()
+                        response.data = PreRenderedJSON(data) if isinstance(data, bytes) else data
+                    elif isinstance(instance_data, (list, QuerySet)):
                         response.data = [
                             self._to_dto(item, request).model_dump()
                             for item in instance_data
@@ -129,6 +258,28 @@ class RoleBasedOutputMixin:
         return APIView.finalize_response(self, request, response, *args, **kwargs)
     
 
+@dataclass(frozen=True)
+class ObjectLookup:
+    """
+    Khai báo cách load object cho AutoPermissionCheckMixin (thay cho chỉ truyền Model class).
+    - select_related: Các FK mà permission + service cần (load trong CÙNG 1 query).
+    - only: Giới hạn cột khi view chỉ cần object để check quyền.
+
+    Ví dụ: ObjectLookup(ContentBlock, select_related=('lesson__module__course',))
+    """
+    model: Any
+    select_related: Tuple[str, ...] = ()
+    only: Tuple[str, ...] = ()
+
+    def get_queryset(self):
+        queryset = self.model.objects.all()
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
 class AutoPermissionCheckMixin:
     """
     Mixin tự động lấy object từ URL và check quyền sở hữu/truy cập 
@@ -138,20 +289,25 @@ class AutoPermissionCheckMixin:
     1. Kế thừa Mixin này trong APIView.
     2. Khai báo biến `permission_lookup`.
        Ví dụ: permission_lookup = {'module_id': Module, 'course_id': Course}
+       Hoặc khai báo đường join/cột cần load (1 query duy nhất):
+       permission_lookup = {'block_id': ObjectLookup(ContentBlock, select_related=('lesson__module__course',))}
+    3. Object đã load được gắn vào view (self.<model_name>) -> Truyền thẳng xuống service, không query lại.
     """
-    permission_lookup = {}  # Format: {'url_kwarg_name': ModelClass}
+    permission_lookup = {}  # Format: {'url_kwarg_name': ModelClass | ObjectLookup}
 
     def initial(self, request, *args, **kwargs):
         # 1. Chạy logic khởi tạo mặc định của DRF (Authentication, Throttling...)
         super().initial(request, *args, **kwargs)
 
         # 2. Duyệt qua cấu hình lookup để tìm và check quyền
-        for url_param, model_class in self.permission_lookup.items():
+        for url_param, lookup in self.permission_lookup.items():
             if url_param in kwargs:
                 obj_id = kwargs[url_param]
+                if not isinstance(lookup, ObjectLookup):
+                    lookup = ObjectLookup(lookup)
                 
                 # a. Query DB (Tự động raise 404 nếu không thấy)
-                obj = get_object_or_404(model_class, pk=obj_id)
+                obj = get_object_or_404(lookup.get_queryset(), pk=obj_id)
                 
                 # b. Check Object Permissions (Kích hoạt IsCourseOwner, IsInstructor...)
                 # Nếu fail, DRF tự raise 403 Forbidden
@@ -159,33 +315,133 @@ class AutoPermissionCheckMixin:
                 
                 # c. Gắn object vào view instance để dùng lại (DRY)
                 # Ví dụ: Model là 'Module' -> self.module = obj
-                model_name = model_class._meta.model_name # 'module', 'course', 'lesson'...
+                model_name = lookup.model._meta.model_name # 'module', 'course', 'lesson'...
                 setattr(self, model_name, obj)
 
 
+CURSOR_SALT = 'core.api.pagination.cursor'
+
+# Dưới ngưỡng này đếm chính xác luôn (COUNT trên tập nhỏ rẻ, ước lượng lại sai số lớn)
+ESTIMATE_EXACT_THRESHOLD = 1000
+
+
+def estimate_count(queryset) -> int:
+    """
+    Ước lượng số dòng từ thống kê của planner (EXPLAIN, không chạy query) thay cho COUNT(*).
+    Chỉ Postgres; DB khác hoặc lỗi -> COUNT chính xác.
+    """
+    if queryset.db and connections[queryset.db].vendor == 'postgresql':
+        try:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            if isinstance(plan, list):
+                plan = plan[0]
+            estimate = int(plan['Plan']['Plan Rows'])
+            if estimate >= ESTIMATE_EXACT_THRESHOLD:
+                return estimate
+        except Exception as e:
+            logger.warning(f"Không ước lượng được count, dùng COUNT(*): {e}")
+    return queryset.count()
+
+
+def _read_value(item, field: str):
+    """Đọc giá trị cột sắp xếp từ object (hỗ trợ 'user__email')."""
+    value = item
+    for attr in field.split('__'):
+        value = getattr(value, attr, None)
+    return value
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, Decimal)):
+        return str(value)
+    return value
+
+
+def _keyset_filter(ordering: Tuple[str, ...], values: list, reverse: bool) -> Q:
+    """
+    Điều kiện "đứng SAU dòng mốc" theo thứ tự từ điển của ordering.
+    VD: ('-created_at', 'id') -> created_at < v0 OR (created_at = v0 AND id > v1).
+    reverse=True -> "đứng TRƯỚC" (dùng cho trang trước).
+    """
+    condition = Q()
+    for i in range(len(ordering) - 1, -1, -1):
+        field = ordering[i].lstrip('-')
+        descending = ordering[i].startswith('-') != reverse
+        step = Q(**{f"{field}__{'lt' if descending else 'gt'}": values[i]})
+        if i < len(ordering) - 1:
+            step |= Q(**{field: values[i]}) & condition
+        condition = step
+    return condition
+
+
+def _invert(ordering: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(f[1:] if f.startswith('-') else f'-{f}' for f in ordering)
+
+
 class PaginationMixin:
     """
     Mixin hỗ trợ phân trang chuẩn cho API.
     Tự động lấy `page` và `page_size` từ Query Params.
+
+    Chế độ cursor (keyset, opt-in): View khai báo `cursor_ordering` (ordering ỔN ĐỊNH, cột cuối unique,
+    không NULL - VD: ('-created_at', 'id')). Client gửi `?pagination=cursor` ở trang đầu, sau đó gửi lại
+    `cursor` lấy từ meta.next_cursor / meta.previous_cursor. Không OFFSET -> Trang sâu nhanh như trang đầu.
+
+    `count_mode`: 'exact' (COUNT(*)) | 'estimated' (thống kê planner) | 'none' (không đếm).
+    `cursor_count_mode`: Như count_mode nhưng chỉ cho chế độ cursor (None -> dùng count_mode).
+    Giữ count_mode='exact' nếu client đang dựa vào total_count/total_pages của chế độ số trang.
+    Response vẫn là {items, meta} -> RoleBasedOutputMixin map DTO như cũ.
     """
     default_page_size = 20
     max_page_size = 100
 
+    cursor_ordering: Optional[Tuple[str, ...]] = None
+    count_mode = 'exact'
+    cursor_count_mode: Optional[str] = None
+
+    def _get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params.get('page_size', self.default_page_size))
+        except (ValueError, TypeError):
+            page_size = self.default_page_size
+        # Limit max size để tránh user request 1 triệu record
+        return max(1, min(page_size, self.max_page_size))
+
+    def _count(self, queryset_or_list, count_mode: Optional[str] = None) -> Optional[int]:
+        count_mode = count_mode or self.count_mode
+        if count_mode == 'none':
+            return None
+        if count_mode == 'estimated' and isinstance(queryset_or_list, QuerySet):
+            return estimate_count(queryset_or_list)
+        if isinstance(queryset_or_list, QuerySet):
+            return queryset_or_list.count()
+        return len(queryset_or_list)
+
+    def _use_cursor(self, queryset_or_list, request) -> bool:
+        return bool(
+            self.cursor_ordering
+            and isinstance(queryset_or_list, QuerySet)
+            and ('cursor' in request.query_params or request.query_params.get('pagination') == 'cursor')
+        )
+
     def paginate_queryset(self, queryset_or_list, request) -> dict:
         """
         Hàm core: Nhận vào QuerySet/List -> Trả về Dict cấu trúc chuẩn.
         """
+        if self._use_cursor(queryset_or_list, request):
+            return self.paginate_queryset_by_cursor(queryset_or_list, request)
+
         # 1. Lấy tham số từ URL
         try:
             page_number = int(request.query_params.get('page', 1))
-            page_size = int(request.query_params.get('page_size', self.default_page_size))
         except (ValueError, TypeError):
             page_number = 1
-            page_size = self.default_page_size
+        page_size = self._get_page_size(request)
 
-        # Limit max size để tránh user request 1 triệu record
-        if page_size > self.max_page_size:
-            page_size = self.max_page_size
+        if self.count_mode != 'exact':
+            return self._paginate_by_offset(queryset_or_list, page_number, page_size)
 
         # 2. Paginator của Django
         paginator = Paginator(queryset_or_list, page_size)
@@ -222,6 +478,77 @@ class PaginationMixin:
             }
         }
 
+    def _paginate_by_offset(self, queryset_or_list, page_number: int, page_size: int) -> dict:
+        """Phân trang số trang nhưng không COUNT(*) chính xác: Lấy dư 1 dòng để biết còn trang sau."""
+        page_number = max(page_number, 1)
+        offset = (page_number - 1) * page_size
+        rows = list(queryset_or_list[offset:offset + page_size + 1])
+        total_count = self._count(queryset_or_list)
+
+        return {
+            "items": rows[:page_size],
+            "meta": {
+                "total_count": total_count,
+                "count_is_estimate": self.count_mode == 'estimated',
+                "page": page_number,
+                "page_size": page_size,
+                "total_pages": math.ceil(total_count / page_size) if total_count is not None else None,
+                "has_next": len(rows) > page_size,
+                "has_previous": page_number > 1,
+            }
+        }
+
+    def paginate_queryset_by_cursor(self, queryset: QuerySet, request) -> dict:
+        """
+        Keyset pagination: WHERE (cột sắp xếp) vượt qua dòng mốc + LIMIT page_size + 1.
+        Cursor là chuỗi ký (django.core.signing) chứa giá trị cột sắp xếp của dòng mốc + hướng đi.
+        """
+        page_size = self._get_page_size(request)
+        ordering = tuple(self.cursor_ordering)
+
+        token = request.query_params.get('cursor')
+        position = None
+        if token:
+            try:
+                position = signing.loads(token, salt=CURSOR_SALT)
+                if len(position['v']) != len(ordering) or position['d'] not in ('next', 'prev'):
+                    raise ValueError("cursor không khớp ordering")
+            except Exception:
+                raise ValidationError({"cursor": "Cursor không hợp lệ hoặc đã hết hạn."})
+
+        backwards = bool(position) and position['d'] == 'prev'
+        page_qs = queryset.order_by(*(_invert(ordering) if backwards else ordering))
+        if position:
+            page_qs = page_qs.filter(_keyset_filter(ordering, position['v'], reverse=backwards))
+
+        rows = list(page_qs[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        # Đi tới: Còn dòng dư -> có trang sau; đã có cursor -> có trang trước (và ngược lại khi đi lùi)
+        has_next = has_more if not backwards else True
+        has_previous = bool(position) if not backwards else has_more
+
+        def _cursor(item, direction: str) -> str:
+            values = [_to_json(_read_value(item, f.lstrip('-'))) for f in ordering]
+            return signing.dumps({'v': values, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+        count_mode = self.cursor_count_mode or self.count_mode
+        return {
+            "items": rows,
+            "meta": {
+                "total_count": self._count(queryset, count_mode),
+                "count_is_estimate": count_mode == 'estimated',
+                "page_size": page_size,
+                "next_cursor": _cursor(rows[-1], 'next') if rows and has_next else None,
+                "previous_cursor": _cursor(rows[0], 'prev') if rows and has_previous else None,
+                "has_next": has_next,
+                "has_previous": has_previous,
+            }
+        }
+
     def get_paginated_response(self, data: dict) -> Response:
         """
         Helper để wrap vào DRF Response (200 OK).
@@ -0,0 +1,58 @@
+import json
+from rest_framework.renderers import JSONRenderer
+
+
+
+class PreRenderedJSON:
+    """
+    Body JSON đã encode sẵn (bytes) từ RoleBasedOutputMixin -> FastJSONRenderer trả thẳng, không encode lại.
+    response.data vẫn đọc được như dict/list (decode lười, chỉ khi có ai đọc - VD: test, log).
+    """
+    __slots__ = ('content', '_decoded')
+
+    _MISSING = object()
+
+    def __init__(self, content: bytes):
+        self.content = content
+        self._decoded = self._MISSING
+
+    @property
+    def value(self):
+        if self._decoded is self._MISSING:
+            self._decoded = json.loads(self.content)
+        return self._decoded
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __eq__(self, other):
+        if isinstance(other, PreRenderedJSON):
+            other = other.value
+        return self.value == other
+
+    def __getattr__(self, name):
+        # get/keys/items/... của dict hoặc list bên dưới (không áp dụng cho thuộc tính nội bộ / copy, pickle)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.value, name)
+
+    def __repr__(self):
+        return f"PreRenderedJSON({self.content[:80]!r})"
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer mặc định + cho phép body đã encode sẵn (PreRenderedJSON) đi thẳng ra response."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, PreRenderedJSON):
+            return data.content
+        return super().render(data, accepted_media_type, renderer_context)
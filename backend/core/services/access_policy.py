@@ -1,8 +1,10 @@
 from django.utils import timezone
 
-from content.models import Course, Enrollment, Quiz
+from content.models import Quiz
 from quiz.models import Question
 from progress.models import QuizAttempt
+from core.services import course_access_service
+from core.services.course_access_service import OWNER_ROLES, ENROLLED_ROLES
 
 
 
@@ -10,26 +12,6 @@ from progress.models import QuizAttempt
 # HELPER 
 # ==========================================
 
-def _resolve_course(obj):
-    """
-    Helper function: Tìm Course cha từ bất kỳ object con nào (Module, Lesson, Block, File...).
-    Mô phỏng tư duy 'Context' của Moodle.
-    """
-    if obj is None:
-        return None
-    if isinstance(obj, Course):
-        return obj
-    
-    if hasattr(obj, 'course'): # Module, Enrollment...
-        return obj.course
-    if hasattr(obj, 'module') and hasattr(obj.module, 'course'): # Lesson
-        return obj.module.course
-    if hasattr(obj, 'lesson') and hasattr(obj.lesson, 'module'): # ContentBlock
-        return obj.lesson.module.course
-    
-    return None
-
-
 def _check_quiz_access(user, quiz_obj):
         """
         Kiểm tra user có đủ điều kiện làm bài Quiz không.
@@ -39,7 +21,7 @@ def _check_quiz_access(user, quiz_obj):
         # 1. Admin/Giảng viên sở hữu -> Luôn OK (để họ còn test bài)
         if user.is_staff or user.is_superuser:
             return True
-        if quiz_obj.owner == user:
+        if quiz_obj.owner_id == user.id:
             return True
 
         now = timezone.now()
@@ -82,71 +64,61 @@ def _check_quiz_access(user, quiz_obj):
 # ==========================================
 
 def is_course_owner(user, obj):
-    course = _resolve_course(obj)
-    if not course or not user.is_authenticated:
+    if not user.is_authenticated:
         return False
-    return course.owner == user
+    course_id = course_access_service.resolve_course_id(obj)
+    return course_access_service.get_course_role(user, course_id) in OWNER_ROLES
 
 
 def is_enrolled(user, obj):
-    course = _resolve_course(obj)
-    if not course or not user.is_authenticated:
+    if not user.is_authenticated:
         return False
-    return Enrollment.objects.filter(user=user, course=course).exists()
+    course_id = course_access_service.resolve_course_id(obj)
+    return course_access_service.get_course_role(user, course_id) in ENROLLED_ROLES
 
 
 def can_view_course_content(user, obj, request=None):
     """
     Quyền xem nội dung (Module, Lesson, Video, File...).
     Logic: Admin > Owner > Public Course > Enrolled Student
+    Course cha lấy từ index object -> course_id, vai trò (user, course) memo theo request + Redis:
+    Request nóng (heartbeat, xem block, serve file) tốn 0-1 query.
     """
     # 1. Admin/Staff luôn có quyền
     if user.is_staff or user.is_superuser:
         return True
+    if not user.is_authenticated:
+        return False
     
     # 2. Xử lý riêng nếu obj là QUIZ
     if isinstance(obj, Quiz):
-        # 2.1. Owner của Quiz (Người tạo đề)
-        if obj.owner == user:
+        # 2.1. Owner của Quiz (Người tạo đề) - so sánh ID, không load User
+        if obj.owner_id == user.id:
             return True
         
-        # 1. OPTIMIZATION: Nếu Client gửi kèm course_id
-        # Ta check thẳng vào khóa đó -> Nhanh hơn nhiều
+        # Các course chứa quiz này (index đã cache, thay cho join 4 cấp)
+        quiz_course_ids = {str(c) for c in course_access_service.get_quiz_course_ids(obj.id)}
+
+        # 1. OPTIMIZATION: Nếu Client gửi kèm course_id -> Check thẳng vào khóa đó
         course_id_param = request.query_params.get('course_id') if request else None
 
         if course_id_param:
-            # Query này NHANH vì nó filter ngay course_id, DB không phải scan toàn bộ enrollment
-            # Vẫn phải join để đảm bảo Quiz này THỰC SỰ nằm trong Course đó (tránh user hack truyền course_id bừa)
-            return Enrollment.objects.filter(
-                user=user,
-                course_id=course_id_param, # <--- Fast Filter
-                # state='active',
-                course__modules__lessons__content_blocks__quiz_ref=obj # Security Check
-            ).exists()
+            # Security Check: Quiz phải THỰC SỰ nằm trong Course đó (tránh user hack truyền course_id bừa)
+            if str(course_id_param) not in quiz_course_ids:
+                return False
+            return course_access_service.get_course_role(user, course_id_param) in ENROLLED_ROLES
         
-        # 2. FALLBACK: Nếu không có course_id -> Dùng Magic Query (chậm hơn chút)
-        return Enrollment.objects.filter(
-            user=user,
-            course__modules__lessons__content_blocks__quiz_ref=obj
-        ).exists()
-
-    course = _resolve_course(obj)
-    if not course:
-        return False
-
-    # 2. Owner (Giảng viên)
-    if course.owner == user:
-        return True
+        # 2. FALLBACK: Ghi danh vào BẤT KỲ course nào chứa quiz (batch 1 lượt)
+        roles = course_access_service.get_course_roles(user, quiz_course_ids)
+        return any(role in ENROLLED_ROLES for role in roles.values())
 
-    # # 3. Public Course (nếu có logic xem thử)
-    # if getattr(course, 'published', False) or getattr(course, 'is_public', False):
-    #     return True
+    course_id = course_access_service.resolve_course_id(obj)
+    if not course_id:
+        return False
 
-    # 4. Học viên đã ghi danh
-    if is_enrolled(user, course):
-        return True
-        
-    return False
+    # 3. Owner (Giảng viên) hoặc 4. Học viên đã ghi danh
+    # # (Public Course nếu có logic xem thử)
+    return course_access_service.get_course_role(user, course_id) in OWNER_ROLES | ENROLLED_ROLES
 
 
 def can_edit_course_content(user, obj):
@@ -194,7 +166,7 @@ def is_quiz_owner_logic(user, obj):
     if isinstance(obj, Question):
         quiz_obj = obj.quiz
     
-    if hasattr(quiz_obj, 'owner') and quiz_obj.owner == user:
+    if getattr(quiz_obj, 'owner_id', None) == user.id:
         return True
 
     return False
@@ -223,11 +195,11 @@ def can_access_attempt(user, obj):
     
     # Nếu obj không phải là Attempt hay Answer (ví dụ truyền nhầm), return False
     # (Tùy logic model của bạn, ở đây giả sử obj hợp lệ có field user)
-    if not hasattr(attempt, 'user') or not hasattr(attempt, 'quiz'):
+    if not hasattr(attempt, 'user_id') or not hasattr(attempt, 'quiz_id'):
         return False
 
-    # 3. Check quyền "Chính chủ" (Student)
-    if attempt.user == user:
+    # 3. Check quyền "Chính chủ" (Student) - so sánh ID, không load User
+    if attempt.user_id == user.id:
         return True
 
     # 4. Check quyền "Giáo viên" (Người sở hữu Quiz/Course)
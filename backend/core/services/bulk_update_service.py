@@ -0,0 +1,60 @@
+import uuid
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from django.db import connection
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# PUBLIC INTERFACE (UPDATE)
+# ==========================================
+
+def update_from_values(
+    model,
+    key_columns: List[Tuple[str, str]],
+    columns: List[Tuple[str, str]],
+    rows: List[tuple],
+    where: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    UPDATE <table> AS t SET col = v.col ... FROM (VALUES ...) AS v(keys..., cols...)
+    WHERE t.key = v.key ... [AND t.<cột> = <giá trị> ...]
+    1 câu SQL cho cả chunk thay vì N câu UPDATE (không load object lên RAM).
+
+    key_columns / columns: [(tên cột, kiểu Postgres để cast)] - VD: [('id', 'uuid')], [('score', 'float8')]
+    rows: [(các key..., các giá trị theo thứ tự columns)]
+    where: Điều kiện bằng thêm trên bảng đích - VD: {'course_id': course_id}
+    Chỉ Postgres (cast ::type). DB khác -> Caller tự fallback bằng bulk_update.
+    Trả về số dòng đã update.
+    """
+    if not rows:
+        return 0
+
+    qn = connection.ops.quote_name
+    all_columns = key_columns + columns
+    where = where or {}
+
+    row_placeholder = '(' + ', '.join(f'%s::{cast}' for _, cast in all_columns) + ')'
+    set_clause = ', '.join(f'{qn(name)} = v.{qn(name)}' for name, _ in columns)
+    alias_columns = ', '.join(qn(name) for name, _ in all_columns)
+    conditions = [f't.{qn(name)} = v.{qn(name)}' for name, _ in key_columns]
+    conditions += [f't.{qn(name)} = %s' for name in where]
+
+    # Key -> str rồi cast (UUID, int của numpy/pandas...). Giá trị UUID -> str để cast ::uuid
+    key_count = len(key_columns)
+    params = [
+        str(value) if i < key_count or isinstance(value, uuid.UUID) else value
+        for row in rows for i, value in enumerate(row)
+    ]
+    params += [str(value) if isinstance(value, uuid.UUID) else value for value in where.values()]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {qn(model._meta.db_table)} AS t SET {set_clause} '
+            f'FROM (VALUES {", ".join([row_placeholder] * len(rows))}) AS v({alias_columns}) '
+            f'WHERE {" AND ".join(conditions)}',
+            params
+        )
+        return cursor.rowcount
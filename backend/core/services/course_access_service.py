@@ -0,0 +1,270 @@
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from content.models import Course, Module, Lesson, ContentBlock, Enrollment
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'core:access'
+
+# Quyền (user, course): Xóa chủ động khi enroll/unenroll, TTL ngắn để tự lành khi đổi owner
+ROLE_TTL_SECONDS = 60
+
+# Lesson/Module -> Course: Không đổi trong suốt vòng đời object (chỉ kéo thả trong cùng khóa học)
+INDEX_TTL_SECONDS = 24 * 60 * 60
+
+# Quiz -> Các course chứa nó: Xóa chủ động khi xóa/đổi block, TTL ngắn cho trường hợp xóa cascade
+QUIZ_INDEX_TTL_SECONDS = 5 * 60
+
+LOCAL_INDEX_MAX_SIZE = 4096
+
+ROLE_OWNER = 'owner'
+ROLE_ENROLLED = 'enrolled'
+ROLE_OWNER_ENROLLED = 'owner_enrolled'   # Chủ khóa học tự ghi danh vào khóa của mình
+ROLE_NONE = 'none'
+
+# So khớp vai trò qua 2 tập này (không so == từng giá trị) -> Owner đã ghi danh vẫn tính là học viên
+OWNER_ROLES = frozenset({ROLE_OWNER, ROLE_OWNER_ENROLLED})
+ENROLLED_ROLES = frozenset({ROLE_ENROLLED, ROLE_OWNER_ENROLLED})
+
+# Memo theo request: Gắn vào chính object user của request (mỗi request 1 instance riêng)
+_REQUEST_MEMO_ATTR = '_course_access_memo'
+
+_local_index: "OrderedDict[tuple, uuid.UUID]" = OrderedDict()
+_local_lock = threading.Lock()
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _role_key(user_id, course_id) -> str:
+    return f'{KEY_PREFIX}:role:{user_id}:{course_id}'
+
+
+def _index_key(kind: str, obj_id) -> str:
+    return f'{KEY_PREFIX}:course_of:{kind}:{obj_id}'
+
+
+def _quiz_key(quiz_id) -> str:
+    return f'{KEY_PREFIX}:quiz_courses:{quiz_id}'
+
+
+def _local_get(key: tuple):
+    with _local_lock:
+        value = _local_index.get(key)
+        if value is not None:
+            _local_index.move_to_end(key)
+        return value
+
+
+def _local_set(key: tuple, value) -> None:
+    with _local_lock:
+        _local_index[key] = value
+        _local_index.move_to_end(key)
+        while len(_local_index) > LOCAL_INDEX_MAX_SIZE:
+            _local_index.popitem(last=False)
+
+
+def _get_memo(user) -> dict:
+    memo = getattr(user, _REQUEST_MEMO_ATTR, None)
+    if memo is None:
+        memo = {}
+        setattr(user, _REQUEST_MEMO_ATTR, memo)
+    return memo
+
+
+def _loaded(obj, field: str):
+    """FK đã được select_related sẵn trên instance (không phát sinh query), None nếu chưa load."""
+    return obj._state.fields_cache.get(field)
+
+
+def _course_of(kind: str, obj_id) -> Optional[uuid.UUID]:
+    """
+    Index object -> course_id. Thứ tự tra cứu: RAM (process) -> Redis -> DB (1 query nhẹ).
+    """
+    if obj_id is None:
+        return None
+
+    local_key = (kind, str(obj_id))
+    course_id = _local_get(local_key)
+    if course_id is not None:
+        return course_id
+
+    redis_key = _index_key(kind, obj_id)
+    try:
+        course_id = cache.get(redis_key)
+    except Exception as e:
+        logger.error(f"⚠️ Access index cache unavailable: {e}")
+        course_id = None
+
+    if course_id is None:
+        if kind == 'module':
+            qs = Module.objects.filter(id=obj_id).values_list('course_id', flat=True)
+        else:
+            qs = Lesson.objects.filter(id=obj_id).values_list('module__course_id', flat=True)
+        course_id = qs.first()
+        if course_id is None:
+            return None
+        try:
+            cache.set(redis_key, course_id, timeout=INDEX_TTL_SECONDS)
+        except Exception as e:
+            logger.error(f"⚠️ Không ghi được access index {redis_key}: {e}")
+
+    _local_set(local_key, course_id)
+    return course_id
+
+
+# ==========================================
+# PUBLIC INTERFACE (INDEX)
+# ==========================================
+
+def resolve_course_id(obj) -> Optional[uuid.UUID]:
+    """
+    Tìm course_id cha từ bất kỳ object con nào (Course, Module, Enrollment, Lesson, ContentBlock...).
+    Chỉ đọc cột FK có sẵn trên instance (hoặc FK đã select_related) + index đã cache -> Không đi qua chuỗi FK lazy.
+    """
+    if obj is None:
+        return None
+    if isinstance(obj, Course):
+        return obj.id
+    if isinstance(obj, Lesson):
+        module = _loaded(obj, 'module')
+        return module.course_id if module else _course_of('module', obj.module_id)
+    if isinstance(obj, ContentBlock):
+        lesson = _loaded(obj, 'lesson')
+        if lesson is None:
+            return _course_of('lesson', obj.lesson_id)
+        module = _loaded(lesson, 'module')
+        return module.course_id if module else _course_of('module', lesson.module_id)
+
+    # Module, Enrollment... (có FK course trực tiếp)
+    if getattr(obj, 'course_id', None):
+        return obj.course_id
+    if getattr(obj, 'module_id', None):
+        return _course_of('module', obj.module_id)
+    if getattr(obj, 'lesson_id', None):
+        return _course_of('lesson', obj.lesson_id)
+
+    return None
+
+
+def get_quiz_course_ids(quiz_id) -> FrozenSet[uuid.UUID]:
+    """Các course có block trỏ tới quiz (thay cho join 4 cấp course->modules->lessons->blocks->quiz_ref)."""
+    redis_key = _quiz_key(quiz_id)
+    try:
+        course_ids = cache.get(redis_key)
+    except Exception as e:
+        logger.error(f"⚠️ Access index cache unavailable: {e}")
+        course_ids = None
+
+    if course_ids is None:
+        course_ids = frozenset(
+            ContentBlock.objects.filter(quiz_ref_id=quiz_id)
+            .values_list('lesson__module__course_id', flat=True)
+            .distinct()
+        )
+        try:
+            cache.set(redis_key, course_ids, timeout=QUIZ_INDEX_TTL_SECONDS)
+        except Exception as e:
+            logger.error(f"⚠️ Không ghi được access index {redis_key}: {e}")
+
+    return course_ids
+
+
+def invalidate_quiz_courses(quiz_id) -> None:
+    """Gọi khi block trỏ tới quiz bị xóa/đổi loại. Chạy SAU KHI commit."""
+    if not quiz_id:
+        return
+
+    def _delete():
+        try:
+            cache.delete(_quiz_key(quiz_id))
+        except Exception as e:
+            logger.error(f"⚠️ Không xóa được access index của quiz {quiz_id}: {e}")
+
+    transaction.on_commit(_delete)
+
+
+# ==========================================
+# PUBLIC INTERFACE (ROLE)
+# ==========================================
+
+def get_course_roles(user, course_ids: Iterable) -> Dict[str, str]:
+    """
+    Batch: Vai trò của user trên nhiều course -> {str(course_id): 'owner' | 'enrolled' | 'owner_enrolled' | 'none'}.
+    Thứ tự tra cứu: Memo của request -> Redis (get_many) -> DB (1 query cho tất cả course còn thiếu).
+    """
+    course_ids = {str(c) for c in course_ids if c}
+    if not course_ids or not user.is_authenticated:
+        return {c: ROLE_NONE for c in course_ids}
+
+    memo = _get_memo(user)
+    roles = {c: memo[c] for c in course_ids if c in memo}
+    missing = course_ids - roles.keys()
+
+    if missing:
+        keys = {_role_key(user.id, c): c for c in missing}
+        try:
+            cached = cache.get_many(list(keys.keys()))
+        except Exception as e:
+            logger.error(f"⚠️ Access cache unavailable: {e}")
+            cached = {}
+        roles.update({keys[k]: v for k, v in cached.items()})
+        missing -= roles.keys()
+
+    if missing:
+        rows = Course.objects.filter(id__in=missing).annotate(
+            is_enrolled=Exists(Enrollment.objects.filter(user=user, course_id=OuterRef('pk')))
+        ).values_list('id', 'owner_id', 'is_enrolled')
+
+        fetched = {c: ROLE_NONE for c in missing}
+        for course_id, owner_id, is_enrolled in rows:
+            if owner_id == user.id:
+                fetched[str(course_id)] = ROLE_OWNER_ENROLLED if is_enrolled else ROLE_OWNER
+            elif is_enrolled:
+                fetched[str(course_id)] = ROLE_ENROLLED
+
+        roles.update(fetched)
+        try:
+            cache.set_many({_role_key(user.id, c): r for c, r in fetched.items()}, timeout=ROLE_TTL_SECONDS)
+        except Exception as e:
+            logger.error(f"⚠️ Không ghi được access cache: {e}")
+
+    memo.update(roles)
+    return roles
+
+
+def get_course_role(user, course_id) -> str:
+    if not course_id:
+        return ROLE_NONE
+    return get_course_roles(user, [course_id])[str(course_id)]
+
+
+def invalidate_course_role(user, course_id) -> None:
+    """Gọi khi enroll/unenroll. Xóa memo của request hiện tại ngay, xóa Redis SAU KHI commit."""
+    memo = getattr(user, _REQUEST_MEMO_ATTR, None)
+    if memo:
+        memo.pop(str(course_id), None)
+
+    key = _role_key(user.id, course_id)
+
+    def _delete():
+        try:
+            cache.delete(key)
+        except Exception as e:
+            logger.error(f"⚠️ Không xóa được access cache {key}: {e}")
+
+    transaction.on_commit(_delete)
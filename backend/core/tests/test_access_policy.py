@@ -0,0 +1,52 @@
+# core/tests/test_access_policy.py
+"""
+Vai trò (user, course) của course_access_service dùng cho access_policy:
+Chủ khóa học tự ghi danh vào khóa của mình vẫn là học viên (is_enrolled) và vẫn là owner (is_course_owner),
+giống logic cũ kiểm tra thẳng Enrollment.
+"""
+import pytest
+from django.core.cache import cache
+
+from core.services import access_policy, course_access_service
+from content.tests.factories import UserFactory, CourseFactory, LessonFactory, EnrollmentFactory
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_owner_who_is_enrolled_counts_as_enrolled():
+    course = CourseFactory()
+    EnrollmentFactory(user=course.owner, course=course)
+    lesson = LessonFactory(module__course=course)
+
+    assert course_access_service.get_course_role(course.owner, course.id) == course_access_service.ROLE_OWNER_ENROLLED
+    assert access_policy.is_enrolled(course.owner, lesson)
+    assert access_policy.is_course_owner(course.owner, lesson)
+    assert access_policy.can_view_course_content(course.owner, lesson)
+
+
+@pytest.mark.django_db
+def test_owner_without_enrollment_is_not_enrolled():
+    course = CourseFactory()
+    lesson = LessonFactory(module__course=course)
+
+    assert access_policy.is_course_owner(course.owner, lesson)
+    assert not access_policy.is_enrolled(course.owner, lesson)
+    assert access_policy.can_view_course_content(course.owner, lesson)
+
+
+@pytest.mark.django_db
+def test_student_roles():
+    enrollment = EnrollmentFactory()
+    lesson = LessonFactory(module__course=enrollment.course)
+    stranger = UserFactory()
+
+    assert access_policy.is_enrolled(enrollment.user, lesson)
+    assert not access_policy.is_course_owner(enrollment.user, lesson)
+    assert not access_policy.is_enrolled(stranger, lesson)
+    assert not access_policy.can_view_course_content(stranger, lesson)
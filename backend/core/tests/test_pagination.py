@@ -0,0 +1,126 @@
+# core/tests/test_pagination.py
+"""
+PaginationMixin - chế độ cursor (keyset):
+- _keyset_filter: "sau"/"trước" dòng mốc theo thứ tự từ điển của ordering (kể cả cột trùng giá trị)
+- Đi tới rồi đi lùi qua các trang: đủ dòng, không trùng, has_next/has_previous đúng
+- Cursor bị sửa -> 400; chế độ số trang vẫn COUNT chính xác như cũ
+Chạy trên DB cấu hình trong settings (Postgres của repo, hoặc sqlite): Kết quả mong đợi lấy từ chính ORDER BY
+của DB nên không phụ thuộc collation. Riêng estimate_count (EXPLAIN của planner) chỉ kiểm tra được trên Postgres.
+"""
+import pytest
+from django.core import signing
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from content.models import Subject
+from core.api.mixins import PaginationMixin, _keyset_filter, estimate_count, CURSOR_SALT
+
+ORDERING = ('-title', 'slug')
+
+
+@pytest.fixture
+def subjects(db):
+    # Tiêu đề trùng nhau -> Cột thứ 2 (slug) quyết định thứ tự
+    titles = ['Toán', 'Toán', 'Văn', 'Văn', 'Văn', 'Anh', 'Sử']
+    for i, title in enumerate(titles):
+        Subject.objects.create(title=title, slug=f's-{i:02d}')
+    return list(Subject.objects.order_by(*ORDERING))
+
+
+class _Paginator(PaginationMixin):
+    cursor_ordering = ORDERING
+    default_page_size = 3
+
+
+def _request(**params) -> Request:
+    return Request(APIRequestFactory().get('/', params))
+
+
+def _page(paginator, **params) -> dict:
+    return paginator.paginate_queryset(Subject.objects.all(), _request(**params))
+
+
+def _slugs(page: dict) -> list:
+    return [s.slug for s in page['items']]
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_keyset_filter_selects_rows_after_or_before_anchor(subjects, reverse):
+    for index, anchor in enumerate(subjects):
+        condition = _keyset_filter(ORDERING, [anchor.title, anchor.slug], reverse=reverse)
+        got = list(Subject.objects.filter(condition).order_by(*ORDERING))
+        assert got == (subjects[:index] if reverse else subjects[index + 1:])
+
+
+def test_cursor_walks_forward_and_back(subjects):
+    paginator = _Paginator()
+
+    pages = [_page(paginator, pagination='cursor')]
+    while pages[-1]['meta']['has_next']:
+        pages.append(_page(paginator, cursor=pages[-1]['meta']['next_cursor']))
+
+    assert [_slugs(p) for p in pages] == [[s.slug for s in subjects[i:i + 3]] for i in (0, 3, 6)]
+    assert [(p['meta']['has_previous'], p['meta']['has_next']) for p in pages] == [
+        (False, True), (True, True), (True, False)
+    ]
+    assert pages[-1]['meta']['next_cursor'] is None
+
+    # Đi lùi từ trang cuối -> Đúng các trang đã đi qua, cùng thứ tự trong trang
+    back = _page(paginator, cursor=pages[-1]['meta']['previous_cursor'])
+    assert _slugs(back) == _slugs(pages[1])
+    back = _page(paginator, cursor=back['meta']['previous_cursor'])
+    assert _slugs(back) == _slugs(pages[0])
+    assert back['meta']['has_previous'] is False
+    assert back['meta']['has_next'] is True
+
+
+class _SubjectListView(PaginationMixin, APIView):
+    permission_classes = []
+    cursor_ordering = ORDERING
+
+    def get(self, request):
+        return Response(self.paginate_queryset(Subject.objects.all(), request))
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    signing.dumps({'v': ['Toán', 's-00'], 'd': 'next'}, salt=CURSOR_SALT)[:-2] + 'xx',  # Sửa chữ ký
+    signing.dumps({'v': ['Toán'], 'd': 'next'}, salt=CURSOR_SALT),                       # Sai số cột
+    signing.dumps({'v': ['Toán', 's-00'], 'd': 'sideways'}, salt=CURSOR_SALT),
+])
+def test_tampered_cursor_returns_400(subjects, cursor):
+    response = _SubjectListView.as_view()(APIRequestFactory().get('/', {'cursor': cursor}))
+
+    assert response.status_code == 400
+    assert 'cursor' in response.data
+
+
+def test_page_mode_keeps_exact_count_when_cursor_mode_estimates(subjects):
+    class _View(_Paginator):
+        cursor_count_mode = 'estimated'
+
+    page = _page(_View(), page=2)
+
+    assert page['meta']['total_count'] == 7
+    assert page['meta']['total_pages'] == 3
+    assert 'count_is_estimate' not in page['meta']
+    assert list(page['items']) == list(Subject.objects.all()[3:6])
+
+
+def test_estimate_count_falls_back_to_exact_count(subjects):
+    # Tập nhỏ (dưới ESTIMATE_EXACT_THRESHOLD) hoặc DB không phải Postgres -> COUNT(*) chính xác
+    assert estimate_count(Subject.objects.all()) == 7
+    assert estimate_count(Subject.objects.filter(title='Văn')) == 3
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='EXPLAIN (FORMAT JSON) chỉ có trên Postgres')
+def test_estimate_count_uses_planner_rows_on_postgres(subjects, monkeypatch):
+    monkeypatch.setattr('core.api.mixins.ESTIMATE_EXACT_THRESHOLD', 0)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {Subject._meta.db_table}')
+
+    # Không chạy COUNT(*): Số dòng lấy từ thống kê planner sau ANALYZE
+    assert estimate_count(Subject.objects.all()) == 7
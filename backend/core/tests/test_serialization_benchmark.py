@@ -0,0 +1,272 @@
+# core/tests/test_serialization_benchmark.py
+"""
+Microbenchmark: Đường serialize cũ (model_validate + model_dump từng item rồi DRF JSONRenderer encode lại)
+so với fast path của RoleBasedOutputMixin (TypeAdapter cache + encode thẳng ra bytes).
+Kèm kiểm tra tương thích: Với MỌI output_dto_* của các view, fast path phải ra cùng JSON với đường cũ.
+Không cần DB. Đặt SERIALIZATION_BENCH_ROUNDS để chạy nhiều vòng hơn; xem bảng kết quả với `pytest -s`.
+"""
+import os
+import enum
+import json
+import time
+import uuid
+import typing
+import datetime
+import importlib
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace, UnionType
+
+import pytest
+from django.conf import settings
+from pydantic import BaseModel
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from analytics.api.dtos.analytics_dto import StudentRiskInfoOutput
+from content.api.dtos.course_dto import CourseCatalogPublicOutput, CoursePublicOutput, CourseInstructorOutput
+from core.api.mixins import RoleBasedOutputMixin, _dumps_json_like_drf
+from quiz.api.dtos.exam_dto import ExamAdminOutput
+from core.api.renderers import FastJSONRenderer, PreRenderedJSON
+
+ROUNDS = int(os.getenv('SERIALIZATION_BENCH_ROUNDS', '5'))
+NOW = datetime.datetime(2026, 1, 1, 8, 30, tzinfo=datetime.timezone.utc)
+
+
+# ==========================================
+# FIXTURE: Domain giả lập (đọc qua thuộc tính như CourseDomain)
+# ==========================================
+
+def _named(name: str):
+    return SimpleNamespace(id=uuid.uuid4(), name=name, title=name, slug=name.lower().replace(' ', '-'))
+
+
+def _course(index: int, owner_id=None, modules: int = 0, lessons: int = 0, blocks: int = 0):
+    return SimpleNamespace(
+        id=uuid.uuid4(), title=f"Toán lớp {index % 12 + 1} - Khóa {index}", slug=f"course-{index}",
+        description="Mô tả khóa học " * 10, short_description="Mô tả ngắn",
+        price="0", currency="VND", is_free=True, published=True, grade="6",
+        owner_id=owner_id or uuid.uuid4(), owner_name="Giảng viên",
+        subject=_named("Toán"),
+        categories=[_named("Toán học"), _named("THCS")],
+        tags=[_named("lớp 6"), _named("cơ bản"), _named("ôn thi")],
+        thumbnail_url=f"https://cdn.example.com/public/course_thumbnails/{index}.jpg",
+        stats={"modules": modules, "lessons": modules * lessons, "videos": 12, "quizzes": 3, "duration": 5400},
+        updated_at=NOW, created_at=NOW, published_at=NOW,
+        modules=[
+            SimpleNamespace(
+                id=uuid.uuid4(), title=f"Chương {m + 1}", position=m,
+                lessons=[
+                    SimpleNamespace(
+                        id=uuid.uuid4(), title=f"Bài {l + 1}", position=l,
+                        content_blocks=[
+                            SimpleNamespace(
+                                id=uuid.uuid4(), title=f"Nội dung {b + 1}", type="video", position=b,
+                                payload={"file_id": str(uuid.uuid4()), "duration": 300}, icon_key="video"
+                            )
+                            for b in range(blocks)
+                        ]
+                    )
+                    for l in range(lessons)
+                ]
+            )
+            for m in range(modules)
+        ],
+    )
+
+
+def _student_risk(index: int):
+    return SimpleNamespace(
+        user_id=str(uuid.uuid4()), course_id=str(uuid.uuid4()), full_name=f"Học viên {index}",
+        email=f"student{index}@example.com", avatar_url=None,
+        engagement_score=3.5, performance_score=6.25, days_inactive=index % 30, last_access_days=index % 30,
+        risk_level="high", ai_insight="Ít tương tác trong 2 tuần gần đây.", suggested_action="send_reminder",
+        real_percent_completed=42.5, last_login_at=NOW,
+    )
+
+
+class _View(RoleBasedOutputMixin):
+    def __init__(self, dto_public, dto_instructor=None):
+        self.output_dto_public = dto_public
+        self.output_dto_instructor = dto_instructor
+
+
+def _request(user_id=None):
+    user = SimpleNamespace(is_authenticated=True, is_staff=False, id=user_id or uuid.uuid4())
+    return SimpleNamespace(user=user, accepted_renderer=FastJSONRenderer())
+
+
+# ==========================================
+# HELPER
+# ==========================================
+
+def _legacy(view, items, request) -> bytes:
+    data = [view._to_dto(item, request).model_dump() for item in items]
+    return JSONRenderer().render(data)
+
+
+def _fast(view, items, request) -> bytes:
+    # Giống response thật: bytes đã encode sẵn, hoặc list dict để DRF encode
+    data = view._dump_many(items, request)
+    return data if isinstance(data, bytes) else JSONRenderer().render(data)
+
+
+def _best_ms(fn, *args) -> float:
+    fn(*args)  # Warm-up (build TypeAdapter, import...)
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+CASES = {
+    'catalog_100': lambda: (_View(CourseCatalogPublicOutput), [_course(i) for i in range(100)]),
+    'course_tree_100': lambda: (_View(CoursePublicOutput), [_course(i, modules=5, lessons=4, blocks=3) for i in range(100)]),
+    'student_risk_500': lambda: (_View(StudentRiskInfoOutput), [_student_risk(i) for i in range(500)]),
+}
+
+
+# ==========================================
+# BENCHMARK
+# ==========================================
+
+@pytest.mark.parametrize('case', CASES.keys())
+def test_fast_path_matches_legacy_output_and_reports_timing(case):
+    view, items = CASES[case]()
+    request = _request()
+
+    legacy = _legacy(view, items, request)
+    fast = _fast(view, items, request)
+    assert json.loads(fast) == json.loads(legacy)
+
+    legacy_ms = _best_ms(_legacy, view, items, request)
+    fast_ms = _best_ms(_fast, view, items, request)
+    print(f"\n{case:>18}: legacy {legacy_ms:8.2f}ms | fast {fast_ms:8.2f}ms | x{legacy_ms / fast_ms:.1f}")
+
+
+def test_mixed_roles_keep_order_and_per_item_dto():
+    owner_id = uuid.uuid4()
+    view = _View(CourseCatalogPublicOutput, dto_instructor=CourseInstructorOutput)
+    items = [_course(i, owner_id=owner_id if i % 2 else None) for i in range(6)]
+    request = _request(user_id=owner_id)
+
+    assert json.loads(_fast(view, items, request)) == json.loads(_legacy(view, items, request))
+
+
+# ==========================================
+# TƯƠNG THÍCH: MỌI output_dto_* CỦA CÁC VIEW
+# ==========================================
+
+def _view_output_dtos() -> dict:
+    """Import toàn bộ <app>/api/views/*.py rồi gom output_dto_* của các view dùng RoleBasedOutputMixin."""
+    for path in Path(settings.BASE_DIR).glob('*/api/views/*.py'):
+        importlib.import_module('.'.join(path.relative_to(settings.BASE_DIR).with_suffix('').parts))
+
+    dtos, pending = {}, list(RoleBasedOutputMixin.__subclasses__())
+    while pending:
+        view = pending.pop()
+        pending.extend(view.__subclasses__())
+        for attr in ('output_dto_public', 'output_dto_admin', 'output_dto_instructor', 'output_dto_self'):
+            dto_cls = getattr(view, attr, None)
+            if isinstance(dto_cls, type) and issubclass(dto_cls, BaseModel):
+                dtos[f"{dto_cls.__module__}.{dto_cls.__qualname__}"] = dto_cls
+    return dtos
+
+
+VIEW_DTOS = _view_output_dtos()
+
+# Giá trị mẫu theo kiểu: Cố ý dùng microsecond, timedelta, Decimal có số 0 cuối, tiếng Việt
+SAMPLE_VALUES = {
+    str: "Bài kiểm tra chương 1", int: 7, float: 6.25, bool: True,
+    uuid.UUID: uuid.UUID('6f1c2a9e-8b7d-4c3e-9a1f-2b3c4d5e6f70'),
+    datetime.datetime: NOW.replace(microsecond=123456), datetime.date: NOW.date(),
+    datetime.timedelta: datetime.timedelta(minutes=45), Decimal: Decimal('12.50'),
+}
+
+
+def _sample(annotation, depth: int = 0):
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+
+    if annotation in SAMPLE_VALUES:
+        return SAMPLE_VALUES[annotation]
+    if origin in (typing.Union, UnionType):
+        return _sample(next(arg for arg in args if arg is not type(None)), depth)
+    if origin is typing.Literal:
+        return args[0]
+    if origin is typing.Annotated:
+        return _sample(args[0], depth)
+    if origin in (list, set, tuple) or annotation in (list, set, tuple):
+        return [_sample(args[0], depth) for _ in range(2)] if args and depth < 3 else []
+    if origin is dict or annotation is dict:
+        return {"key": _sample(args[1], depth)} if args else {"score": 8.5, "label": "Khá"}
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return next(iter(annotation))
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _sample_input(annotation, depth + 1)
+    return {"nested": [1, "hai", None]}  # Any / kiểu tự do
+
+
+def _sample_input(dto_cls, depth: int = 0) -> dict:
+    return {
+        (field.validation_alias if isinstance(field.validation_alias, str) else field.alias or name):
+            _sample(field.annotation, depth)
+        for name, field in dto_cls.model_fields.items()
+    }
+
+
+@pytest.mark.parametrize('dto_name', sorted(VIEW_DTOS))
+def test_fast_path_matches_legacy_for_every_view_dto(dto_name):
+    dto_cls = VIEW_DTOS[dto_name]
+    view, request = _View(dto_cls), _request()
+    items = [_sample_input(dto_cls) for _ in range(3)]
+
+    assert json.loads(_fast(view, items, request)) == json.loads(_legacy(view, items, request))
+
+
+def test_exam_admin_output_keeps_drf_encoding():
+    assert not _dumps_json_like_drf(ExamAdminOutput)
+
+    view, request = _View(ExamAdminOutput), _request()
+    items = [_sample_input(ExamAdminOutput)]
+    body = json.loads(_fast(view, items, request))
+
+    assert body[0]["time_limit"] == "2700.0"  # Không phải "PT45M"
+    assert body[0] == json.loads(_legacy(view, items, request))[0]
+
+
+def test_view_dtos_are_collected_from_unrouted_views_too():
+    # exam_view chưa có URL nhưng DTO vẫn phải được kiểm
+    assert f"{ExamAdminOutput.__module__}.ExamAdminOutput" in VIEW_DTOS
+    assert len(VIEW_DTOS) > 40
+
+
+# ==========================================
+# END-TO-END (APIView + renderer)
+# ==========================================
+
+class _CatalogView(RoleBasedOutputMixin, APIView):
+    permission_classes = []
+    output_dto_public = CourseCatalogPublicOutput
+
+    def get(self, request):
+        items = [_course(i) for i in range(3)]
+        return Response({"items": items, "meta": {"page": 1, "has_next": False}})
+
+
+def test_paginated_response_is_prerendered_and_still_readable():
+    request = APIRequestFactory().get('/catalog/')
+    force_authenticate(request, user=SimpleNamespace(is_authenticated=True, is_staff=False, id=uuid.uuid4()))
+
+    response = _CatalogView.as_view()(request)
+    response.render()
+
+    assert isinstance(response.data, PreRenderedJSON)
+    body = json.loads(response.content)
+    assert body["meta"] == {"page": 1, "has_next": False}
+    assert len(body["items"]) == 3
+    # response.data vẫn dùng được như dict (test/log cũ)
+    assert response.data["items"][0]["slug"] == "course-0"
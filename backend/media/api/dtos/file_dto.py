@@ -2,7 +2,8 @@
 import uuid
 from pydantic import BaseModel, ConfigDict
 from datetime import datetime
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
+from pydantic import Field
 
 from media.models import FileStatus
 
@@ -24,6 +25,31 @@ class FileInitInput(BaseModel):
         return self.model_dump()
 
 
+class MultipartPartSignInput(BaseModel):
+    part_number: int = Field(ge=1)
+    checksum_sha256: str     # base64(SHA-256 của part), client gửi lại nguyên văn trong header
+
+
+class MultipartSignInput(BaseModel):
+    parts: List[MultipartPartSignInput]
+
+    def to_dict(self) -> dict:
+        return self.model_dump()
+
+
+class MultipartPartCompleteInput(BaseModel):
+    part_number: int = Field(ge=1)
+    etag: str                # Header ETag S3 trả về sau khi PUT part
+    checksum_sha256: str
+
+
+class MultipartCompleteInput(BaseModel):
+    parts: List[MultipartPartCompleteInput]
+
+    def to_dict(self) -> dict:
+        return self.model_dump()
+
+
 # class FileInputDTO(BaseModel):
 #     """
 #     Pydantic DTO để cấu trúc hóa input *sau khi* DRF Serializer validate.
@@ -54,6 +80,23 @@ class FileInitOutput(BaseModel):
     upload_url: str
     upload_fields: Dict[str, Any]
 
+
+
+class MultipartUploadOutput(BaseModel):
+    """
+    Trạng thái phiên multipart upload + URL cho các part vừa xin.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    file_id: uuid.UUID
+    file_size: int
+    part_size: int
+    part_count: int
+    uploaded_parts: List[Dict[str, Any]] = []
+    missing_parts: List[int] = []
+    part_urls: List[Dict[str, Any]] = []
+    expires_in: int = 0
+
     
 class FileOutput(BaseModel):
     """
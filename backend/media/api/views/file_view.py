@@ -14,9 +14,13 @@ from rest_framework.views import APIView
 
 from core.api.mixins import RoleBasedOutputMixin
 from core.exceptions import DomainError, UserNotFoundError, AccessDeniedError
-from media.serializers import FileUploadInitSerializer, FileUpdateInputSerializer
-from media.api.dtos.file_dto import FileInitInput, FileInitOutput, FileOutput, FileUpdateInput
-from media.services import file_service
+from pydantic import ValidationError as PydanticValidationError
+from media.serializers import FileUploadInitSerializer, FileUpdateInputSerializer, MultipartUploadInitSerializer
+from media.api.dtos.file_dto import (
+    FileInitInput, FileInitOutput, FileOutput, FileUpdateInput,
+    MultipartSignInput, MultipartCompleteInput, MultipartUploadOutput
+)
+from media.services import file_service, multipart_upload_service
 from media.models import UploadedFile, FileStatus
 
 
@@ -68,6 +72,120 @@ class FileUploadConfirmView(RoleBasedOutputMixin, APIView):
             return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
 
 
+class MultipartUploadInitView(RoleBasedOutputMixin, APIView):
+    """
+    POST /upload/multipart/
+    Mở phiên multipart upload cho file lớn (video bài giảng...), trả về cách chia part.
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [IsAuthenticated]
+
+    output_dto_public = MultipartUploadOutput
+    output_dto_admin = MultipartUploadOutput
+
+    def post(self, request):
+        serializer = MultipartUploadInitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            input_dto = FileInitInput(**serializer.validated_data)
+
+            domain_obj = multipart_upload_service.initiate_multipart_upload(request.user, input_dto.to_dict())
+            return Response({"instance": domain_obj}, status=status.HTTP_201_CREATED)
+
+        except DomainError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MultipartUploadDetailView(RoleBasedOutputMixin, APIView):
+    """
+    GET    /upload/multipart/<file_id>/ : Resume - Part đã upload / còn thiếu
+    DELETE /upload/multipart/<file_id>/ : Hủy phiên upload
+    """
+    permission_classes = [IsAuthenticated]
+
+    output_dto_public = MultipartUploadOutput
+    output_dto_admin = MultipartUploadOutput
+
+    def get(self, request, file_id):
+        try:
+            domain_obj = multipart_upload_service.get_multipart_upload(request.user, file_id)
+            return Response({"instance": domain_obj}, status=status.HTTP_200_OK)
+
+        except DomainError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PermissionDenied as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+    def delete(self, request, file_id):
+        try:
+            multipart_upload_service.abort_multipart_upload(request.user, file_id)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        except DomainError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PermissionDenied as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+
+class MultipartUploadPartsView(RoleBasedOutputMixin, APIView):
+    """
+    POST /upload/multipart/<file_id>/parts/
+    Xin presigned URL cho 1 loạt part (kèm checksum SHA-256 của từng part) để upload song song.
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [IsAuthenticated]
+
+    output_dto_public = MultipartUploadOutput
+    output_dto_admin = MultipartUploadOutput
+
+    def post(self, request, file_id):
+        try:
+            input_dto = MultipartSignInput(**request.data)
+        except PydanticValidationError as e:
+            return Response({"error": e.errors()}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            domain_obj = multipart_upload_service.sign_upload_parts(
+                request.user, file_id, input_dto.to_dict()['parts']
+            )
+            return Response({"instance": domain_obj}, status=status.HTTP_200_OK)
+
+        except DomainError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PermissionDenied as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+
+class MultipartUploadCompleteView(RoleBasedOutputMixin, APIView):
+    """
+    POST /upload/multipart/<file_id>/complete/
+    Kiểm tra từng part (etag + checksum + kích thước) rồi ghép file trên S3.
+    """
+    parser_classes = [JSONParser]
+    permission_classes = [IsAuthenticated]
+
+    output_dto_public = FileOutput
+    output_dto_admin = FileOutput
+
+    def post(self, request, file_id):
+        try:
+            input_dto = MultipartCompleteInput(**request.data)
+        except PydanticValidationError as e:
+            return Response({"error": e.errors()}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            file_domain = multipart_upload_service.complete_multipart_upload(
+                request.user, file_id, input_dto.to_dict()['parts']
+            )
+            return Response({"instance": file_domain}, status=status.HTTP_200_OK)
+
+        except DomainError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except PermissionDenied as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+
 class PublicDownloadFileView(APIView):
     """
     View này "gác cổng" tất cả các file đã commit.
@@ -0,0 +1,22 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Any
+import uuid
+
+@dataclass
+class MultipartUploadDomain:
+    """
+    Trạng thái 1 phiên multipart upload (file lớn, upload thẳng lên S3 theo từng part).
+    Client dùng uploaded_parts / missing_parts để upload song song và resume sau khi mất kết nối.
+    """
+    file_id: uuid.UUID
+    file_size: int
+    part_size: int
+    part_count: int
+
+    # Part đã nằm trên S3: [{'part_number', 'etag', 'size', 'checksum_sha256'}]
+    uploaded_parts: List[Dict[str, Any]] = field(default_factory=list)
+    missing_parts: List[int] = field(default_factory=list)
+
+    # Presigned URL vừa cấp: [{'part_number', 'url', 'headers'}] (client PHẢI gửi kèm headers)
+    part_urls: List[Dict[str, Any]] = field(default_factory=list)
+    expires_in: int = 0
@@ -2,22 +2,44 @@ import boto3
 import re
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
 
 from media.models import UploadedFile, FileStatus 
+from media.services import file_reference_service, multipart_upload_service
 from content.models import Course, Module, Lesson, ContentBlock
-from content.services.content_block_service import _extract_file_ids_from_html
+from quiz.models import Question
 
 
 
+# Chỉ quét trong các folder này để tránh xóa nhầm folder khác (tmp/ do bước Staging lo)
+ORPHAN_PREFIXES = ['public/', 'private/']
+
+# Vị trí đã quét tới (prefix + key cuối của trang) -> Lần chạy bị ngắt giữa chừng sẽ chạy tiếp từ đây
+CHECKPOINT_KEY = 'media:orphan_scan:checkpoint'
+CHECKPOINT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+S3_PAGE_SIZE = 1000
+
+
 class Command(BaseCommand):
     help = 'Công cụ dọn dẹp hệ thống File (Staging & Broken Links)'
 
     def add_arguments(self, parser):
         parser.add_argument('--days', type=int, default=1, help='Tuổi thọ file staging (ngày)')
+        parser.add_argument(
+            '--multipart-days', type=int, default=multipart_upload_service.ABANDONED_UPLOAD_DAYS,
+            help='Tuổi thọ phiên multipart upload chưa complete (ngày): Quá hạn -> Abort trên S3 + xóa bản ghi'
+        )
         parser.add_argument('--dry-run', action='store_true', help='Chỉ in ra chứ không xóa thật')
+        parser.add_argument('--rebuild-index', action='store_true', help='Build lại index file đang dùng (FileReference) từ payload trước khi quét')
+        parser.add_argument('--max-pages', type=int, default=None, help='Số trang S3 tối đa cho lần chạy này (còn lại chạy tiếp lần sau)')
+        parser.add_argument('--min-age-hours', type=int, default=24, help='Bỏ qua object mới hơn N giờ (file vừa promote, block chưa kịp commit)')
+        parser.add_argument('--restart', action='store_true', help='Bỏ checkpoint, quét lại từ đầu')
+        parser.add_argument('--full-scan', action='store_true', help='Chế độ cũ: Nạp toàn bộ payload + bucket vào RAM rồi so khớp')
 
     def handle(self, *args, **options):
         self.dry_run = options['dry_run']
@@ -30,6 +52,7 @@ class Command(BaseCommand):
 
         # --- TASK 1: XÓA FILE STAGING (Bulk Delete - Nhanh) ---
         self.cleanup_staging_files(days)
+        self.cleanup_abandoned_multipart(options['multipart_days'])
 
         # # Nếu không làm bước này, bước check S3 phía sau sẽ thấy DB vẫn còn record nên không xóa file.
         # self.cleanup_zombie_rows()
@@ -45,7 +68,19 @@ class Command(BaseCommand):
 
         # 2. DỌN ORPHAN (So khớp S3 vs DB)
         # Chỉ chạy bước này khi hệ thống thấp tải (ví dụ ban đêm)
-        self.cleanup_orphans()
+        if options['rebuild_index']:
+            self.stdout.write("\n--- REBUILD FILE REFERENCE INDEX ---")
+            total = file_reference_service.rebuild_index(stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Index: {total} tham chiếu."))
+
+        if options['full_scan']:
+            self.cleanup_orphans()
+        else:
+            self.cleanup_orphans_streaming(
+                max_pages=options['max_pages'],
+                min_age=timedelta(hours=options['min_age_hours']),
+                restart=options['restart'],
+            )
 
 
     # def cleanup_zombie_rows(self):
@@ -129,10 +164,12 @@ class Command(BaseCommand):
         self.stdout.write("\n1. --- CLEANUP STAGING ---")
         cutoff_time = timezone.now() - timedelta(days=days)
         
+        # Phiên multipart còn mở có TTL riêng (cleanup_abandoned_multipart): Upload lớn có thể resume qua nhiều ngày,
+        # xóa bản ghi giữa chừng sẽ mất UploadId -> Client không resume được, part nằm lại S3 mãi
         junk_files_qs = UploadedFile.objects.filter(
             status=FileStatus.STAGING, 
             uploaded_at__lt=cutoff_time
-        ).exclude(file='')
+        ).exclude(file='').filter(Q(multipart_upload_id__isnull=True) | Q(multipart_upload_id=''))
 
         count = junk_files_qs.count()
         self.stdout.write(f"Tìm thấy {count} file staging hết hạn.")
@@ -190,6 +227,94 @@ class Command(BaseCommand):
         # self.stdout.write(self.style.SUCCESS(f"✓ Staging: Đã xóa {deleted_count} file."))
 
 
+    def cleanup_abandoned_multipart(self, days):
+        """Phiên multipart bỏ dở: Abort trên S3 (dọn part đang bị tính phí) rồi mới xóa bản ghi STAGING"""
+        self.stdout.write(f"\n1b. --- CLEANUP MULTIPART (>{days} ngày) ---")
+        count = multipart_upload_service.abort_abandoned_uploads(days=days, dry_run=self.dry_run)
+        if self.dry_run:
+            self.stdout.write(f"Tìm thấy {count} phiên multipart bị bỏ dở.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Đã abort {count} phiên multipart bị bỏ dở."))
+
+    def _s3_client(self):
+        return boto3.client('s3', 
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID, 
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            endpoint_url=getattr(settings, 'AWS_S3_ENDPOINT_URL', None)
+        )
+
+    def cleanup_orphans_streaming(self, max_pages=None, min_age=timedelta(hours=24), restart=False):
+        """
+        So khớp theo từng trang: List S3 theo prefix (1000 key / trang) -> Tra index cho đúng các key đó -> Xóa rác.
+        RAM chỉ giữ 1 trang, checkpoint sau mỗi trang -> Bị ngắt thì lần sau chạy tiếp.
+        """
+        self.stdout.write("\n2. --- CLEANUP ORPHANS (STREAMING) ---")
+
+        if not file_reference_service.is_index_ready():
+            self.stdout.write(self.style.ERROR(
+                "Index file chưa được build -> Bỏ qua bước Orphan (tránh xóa nhầm). Chạy lại với --rebuild-index."
+            ))
+            return
+
+        if restart:
+            cache.delete(CHECKPOINT_KEY)
+        checkpoint = cache.get(CHECKPOINT_KEY) or {
+            'prefix': ORPHAN_PREFIXES[0], 'start_after': None, 'scanned': 0, 'orphans': 0,
+        }
+        if checkpoint['start_after']:
+            self.stdout.write(f"Resume từ {checkpoint['prefix']} sau key '{checkpoint['start_after']}'")
+
+        s3 = self._s3_client()
+        paginator = s3.get_paginator('list_objects_v2')
+        cutoff = timezone.now() - min_age
+        pages = 0
+
+        for prefix in ORPHAN_PREFIXES[ORPHAN_PREFIXES.index(checkpoint['prefix']):]:
+            params = {'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Prefix': prefix, 'PaginationConfig': {'PageSize': S3_PAGE_SIZE}}
+            if checkpoint['prefix'] == prefix and checkpoint['start_after']:
+                params['StartAfter'] = checkpoint['start_after']
+
+            for page in paginator.paginate(**params):
+                contents = page.get('Contents', [])
+                if not contents:
+                    continue
+
+                # Object quá mới: Block tham chiếu nó có thể chưa commit -> Để lần quét sau
+                candidates = [obj['Key'] for obj in contents if obj['LastModified'] < cutoff]
+                orphans = sorted(set(candidates) - file_reference_service.referenced_paths(candidates))
+
+                if orphans:
+                    if self.dry_run:
+                        for o in orphans[:10]:
+                            self.stdout.write(f" - {o}")
+                    else:
+                        self._delete_s3_batch(orphans)
+
+                checkpoint.update(
+                    prefix=prefix,
+                    start_after=contents[-1]['Key'],
+                    scanned=checkpoint['scanned'] + len(contents),
+                    orphans=checkpoint['orphans'] + len(orphans),
+                )
+                # Dry run không ghi checkpoint: Lần chạy thật phải quét lại từ đầu
+                if not self.dry_run:
+                    cache.set(CHECKPOINT_KEY, checkpoint, timeout=CHECKPOINT_TTL_SECONDS)
+
+                pages += 1
+                if max_pages and pages >= max_pages:
+                    self.stdout.write(self.style.WARNING(
+                        f"Dừng sau {pages} trang (đã quét {checkpoint['scanned']}, rác {checkpoint['orphans']}). Lần sau chạy tiếp."
+                    ))
+                    return
+
+            checkpoint.update(start_after=None)
+
+        cache.delete(CHECKPOINT_KEY)
+        self.stdout.write(self.style.SUCCESS(
+            f"Hoàn tất: Đã quét {checkpoint['scanned']} object, {checkpoint['orphans']} file rác"
+            f"{' (dry run, chưa xóa)' if self.dry_run else ' đã xóa'}."
+        ))
+
     def cleanup_orphans(self):
         """
         Logic so khớp "Nuclear": Lấy tất cả path trong DB so với S3.
@@ -237,6 +362,12 @@ class Command(BaseCommand):
                 for match in matches:
                     valid_paths.add(match)
 
+        # 3. Quét Question (Ảnh/Media trong prompt/đáp án/gợi ý: private/quizzes/...)
+        self.stdout.write("Scanning Questions...")
+        questions = Question.objects.values_list(*file_reference_service.QUESTION_JSON_FIELDS)
+        for json_fields in questions.iterator(chunk_size=1000):
+            valid_paths.update(file_reference_service.extract_question_paths(*json_fields))
+
         self.stdout.write(f"-> Tổng số file hợp lệ trong DB: {len(valid_paths)}")
 
         # BƯỚC B: Lấy danh sách thực tế trên S3
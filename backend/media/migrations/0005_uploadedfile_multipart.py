@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0004_uploadedfile_file_size_alter_uploadedfile_component'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='multipart_part_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='multipart_upload_id',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+        migrations.AlterField(
+            model_name='uploadedfile',
+            name='file_size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
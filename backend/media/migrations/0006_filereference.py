@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0016_lesson_cached_total_blocks_and_more'),
+        ('media', '0005_uploadedfile_multipart'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(db_index=True, max_length=1024)),
+                ('block', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_references', to='content.contentblock')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('block', 'path'), name='uniq_file_reference_block_path')],
+            },
+        ),
+    ]
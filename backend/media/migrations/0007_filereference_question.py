@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0019_contentblock_payload_version'),
+        ('media', '0006_filereference'),
+        ('quiz', '0002_alter_quiz_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filereference',
+            name='question',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='file_references', to='quiz.question'),
+        ),
+        migrations.AlterField(
+            model_name='filereference',
+            name='block',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='file_references', to='content.contentblock'),
+        ),
+        migrations.AddConstraint(
+            model_name='filereference',
+            constraint=models.UniqueConstraint(fields=('question', 'path'), name='uniq_file_reference_question_path'),
+        ),
+        migrations.AddConstraint(
+            model_name='filereference',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('block__isnull', False), ('question__isnull', True)), models.Q(('block__isnull', True), ('question__isnull', False)), _connector='OR'), name='file_reference_single_owner'),
+        ),
+    ]
@@ -9,7 +9,8 @@ from django.db.models.signals import post_delete
 from django.dispatch import receiver
 import mimetypes
 
-from content.models import Course
+from content.models import Course, ContentBlock
+from quiz.models import Question
 
 
 
@@ -78,7 +79,11 @@ class UploadedFile(models.Model):
     object_id = models.CharField(max_length=255, db_index=True, null=True, blank=True)
     content_object = GenericForeignKey('content_type', 'object_id')
     mime_type = models.CharField(max_length=255, blank=True, null=True)
-    file_size = models.PositiveIntegerField(default=0)
+    file_size = models.PositiveBigIntegerField(default=0)
+
+    # UploadId của S3 multipart upload đang dở (None = upload thường hoặc đã hoàn tất)
+    multipart_upload_id = models.CharField(max_length=1024, null=True, blank=True)
+    multipart_part_size = models.PositiveIntegerField(null=True, blank=True)
 
     sort_order = models.IntegerField(default=0)
 
@@ -103,5 +108,33 @@ class UploadedFile(models.Model):
         # NẾU LÀ PRIVATE (Bài giảng)
         # Trả về URL "Gác cổng" API của bạn để check quyền
         return generate_cloudfront_signed_url(self.file.name)
-    
-#     
\ No newline at end of file
+
+
+class FileReference(models.Model):
+    """
+    Index: S3 key đang được dùng bởi
+    - ContentBlock (file_path trong payload, ảnh trong rich_text)
+    - Question (file_path trong prompt/answer_payload/hint, VD: private/quizzes/...)
+    Đồng bộ mỗi khi block/question được lưu -> cleanup_files so khớp từng trang S3 với index, không quét lại toàn bộ payload.
+    Block/Question bị xóa (kể cả CASCADE từ Lesson/Module/Course/Quiz) -> Dòng index mất theo.
+    Mỗi dòng thuộc đúng 1 chủ sở hữu (block HOẶC question).
+    """
+    path = models.CharField(max_length=1024, db_index=True)
+    block = models.ForeignKey(ContentBlock, on_delete=models.CASCADE, related_name='file_references', null=True, blank=True)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='file_references', null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['block', 'path'], name='uniq_file_reference_block_path'),
+            models.UniqueConstraint(fields=['question', 'path'], name='uniq_file_reference_question_path'),
+            models.CheckConstraint(
+                condition=(
+                    models.Q(block__isnull=False, question__isnull=True)
+                    | models.Q(block__isnull=True, question__isnull=False)
+                ),
+                name='file_reference_single_owner',
+            ),
+        ]
+
+    def __str__(self):
+        return self.path
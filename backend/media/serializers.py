@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from media.models import Component
@@ -22,6 +23,16 @@ class FileUploadInitSerializer(serializers.Serializer):
     content_type_str = serializers.CharField(required=False, max_length=100) 
     object_id = serializers.CharField(required=False, max_length=255)
 
+
+class MultipartUploadInitSerializer(FileUploadInitSerializer):
+    """
+    Giống upload thường, nhưng giới hạn dung lượng cao hơn nhiều (file đi thẳng lên S3 theo part)
+    """
+    def validate_file_size(self, value):
+        if value > settings.MAX_MULTIPART_FILE_SIZE_BYTES:
+            raise serializers.ValidationError(f"File vượt quá giới hạn {settings.MAX_MULTIPART_FILE_SIZE_MB} MB.")
+        return value
+
  
 # class FileUploadInputSerializer(serializers.Serializer):
 #     """
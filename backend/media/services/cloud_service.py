@@ -1,17 +1,16 @@
+import time
 import boto3
-import base64
-import json
-from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import padding
+from boto3.s3.transfer import TransferConfig
+import logging
 from datetime import timedelta, datetime, timezone
 from django.conf import settings
 
-from media.models import UploadedFile
+from media.services import cloudfront_signer_service
+from media.services.cloudfront_signer_service import cloudfront_base64
 
 
 
-def cloudfront_base64(data):
-        return base64.b64encode(data).decode('utf-8').translate(str.maketrans('+=/', '-_~'))
+logger = logging.getLogger(__name__)
 
 
 def generate_cloudfront_signed_url(object_key, expire_minutes=60):
@@ -19,84 +18,41 @@ def generate_cloudfront_signed_url(object_key, expire_minutes=60):
     Hàm sinh URL có chữ ký CloudFront.
     Input: object_key (VD: media/lesson/video.mp4)
     Output: https://d2t4....cloudfront.net/media/lesson/video.mp4?Policy=...&Signature=...
+    Key được parse 1 lần / process, URL đã ký được cache tới gần lúc hết hạn (xem cloudfront_signer_service).
     """
-    
-    if not settings.MY_CLOUDFRONT_KEY_ID or not settings.MY_CLOUDFRONT_KEY_PATH:
-        raise Exception("Server chưa cấu hình CloudFront Key ID hoặc Key Path!")
-    
-    # 1. Ghép URL gốc
-    base_url = f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{object_key}"
-    
-    # 2. Thời gian hết hạn (Ví dụ: 1 tiếng)
-    expire_date = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes)
-    expire_timestamp = int(expire_date.timestamp())
-
-    # 3. Tạo Policy (Luật cho phép truy cập)
-    # Luật: Cho phép xem resource này nếu thời gian < expire_timestamp
-    policy_dict = {
-        "Statement": [{
-            "Resource": base_url,
-            "Condition": {
-                "DateLessThan": {"AWS:EpochTime": expire_timestamp}
-            }
-        }]
-    }
-    policy_json = json.dumps(policy_dict, separators=(',', ':'))
-
-    # 4. Đọc Private Key và Ký tên
-    try:
-        with open(settings.MY_CLOUDFRONT_KEY_PATH, 'rb') as key_file:
-            private_key = serialization.load_pem_private_key(
-                key_file.read(),
-                password=None
-            )
-    except FileNotFoundError:
-        raise Exception(f"Không tìm thấy private key tại: {settings.MY_CLOUDFRONT_KEY_PATH}")
-
-    # Ký Policy bằng thuật toán SHA1 (CloudFront yêu cầu)
-    signature = private_key.sign(
-        policy_json.encode('utf-8'),
-        padding.PKCS1v15(),
-        hashes.SHA1()
-    )
-
-    # 5. Mã hóa Base64 an toàn cho URL (Thay thế ký tự đặc biệt)
-
-    encoded_policy = cloudfront_base64(policy_json.encode('utf-8'))
-    encoded_signature = cloudfront_base64(signature)
-    
-    # 6. Ghép thành URL cuối cùng
-    signed_url = f"{base_url}?Policy={encoded_policy}&Signature={encoded_signature}&Key-Pair-Id={settings.MY_CLOUDFRONT_KEY_ID}"
-    
-    return signed_url
+    return cloudfront_signer_service.sign_url(object_key, expire_minutes=expire_minutes)
 
 
 def get_signed_url_by_id(file_id: str, expire_minutes=60) -> str:
     """
     Hàm tiện ích: Nhận vào UUID, trả về CloudFront Signed URL.
     Dùng cho các module khác (Content, Quiz) gọi sang.
+    Nhiều file cùng lúc -> Dùng get_signed_urls_by_ids (1 query cho cả lô).
     """
     if not file_id:
         return None
-        
+
     try:
-        # 1. Query nhẹ vào DB để lấy đường dẫn S3 (file.name)
-        # Chỉ lấy trường 'file' để tối ưu query
-        file_obj = UploadedFile.objects.only('file').get(id=file_id)
-        
-        # 2. Lấy S3 Key (VD: media/images/2025/abc.jpg)
-        s3_key = file_obj.file.name
-        
-        # 3. Ký tên
-        return generate_cloudfront_signed_url(s3_key, expire_minutes=expire_minutes)
-        
-    except UploadedFile.DoesNotExist:
-        return None 
+        return get_signed_urls_by_ids([file_id], expire_minutes=expire_minutes).get(str(file_id))
     except Exception as e:
-        print(f"Error resolving URL for {file_id}: {e}")
+        logger.error(f"Error resolving URL for {file_id}: {e}")
         return None
+
+
+def get_signed_urls_by_ids(file_ids, expire_minutes=60) -> dict:
+    """Batch: {str(file_id): signed_url | None}, resolve S3 key bằng 1 query."""
+    return cloudfront_signer_service.get_signed_urls_by_ids(file_ids, expire_minutes=expire_minutes)
     
 
+def _copy_transfer_config() -> TransferConfig:
+    """
+    CopyObject đơn lẻ của S3 giới hạn 5 GB, trong khi multipart upload cho phép tới MAX_MULTIPART_FILE_SIZE_MB.
+    Managed copy tự chuyển sang UploadPartCopy khi file vượt ngưỡng (mỗi part copy phía server, không tải bytes về).
+    """
+    chunk_size = settings.MULTIPART_PART_SIZE_MB * 1024 * 1024
+    return TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size)
+
+
 def s3_copy_object(src_path, dest_path, is_public=True):
     s3 = boto3.client(
         's3',
@@ -109,12 +65,13 @@ def s3_copy_object(src_path, dest_path, is_public=True):
     # Cấu hình ACL
     extra_args = {'ACL': 'public-read'} if is_public else {'ACL': 'private'}
 
-    # Lệnh Copy nội bộ trên Cloud (Cực nhanh)
-    s3.copy_object(
-        Bucket=bucket_name,
+    # Lệnh Copy nội bộ trên Cloud (file lớn -> multipart copy, không giới hạn 5 GB)
+    s3.copy(
         CopySource={'Bucket': bucket_name, 'Key': src_path},
+        Bucket=bucket_name,
         Key=dest_path,
-        **extra_args
+        ExtraArgs=extra_args,
+        Config=_copy_transfer_config(),
     )
 
     # (Tùy chọn) Xóa file gốc ở Staging luôn để dọn rác
@@ -126,38 +83,17 @@ def generate_cloudfront_signed_cookies_util(resource_url, expire_minutes=60):
     Hàm tiện ích cấp thấp: Nhận input thô -> Trả về cookies thô.
     Không quan tâm ai dùng, dùng để làm gì.
     """
-    if not settings.MY_CLOUDFRONT_KEY_ID or not settings.MY_CLOUDFRONT_KEY_PATH:
-        raise ValueError("Server chưa cấu hình CloudFront Key!")
+    cloudfront_signer_service._check_config()
 
     expire_dt = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes)
     expire_timestamp = int(expire_dt.timestamp())
 
-    policy_dict = {
-        "Statement": [{
-            "Resource": resource_url,
-            "Condition": {
-                "DateLessThan": {"AWS:EpochTime": expire_timestamp}
-            }
-        }]
-    }
-    policy_json = json.dumps(policy_dict, separators=(',', ':'))
-
-    try:
-        with open(settings.MY_CLOUDFRONT_KEY_PATH, 'rb') as key_file:
-            private_key = serialization.load_pem_private_key(key_file.read(), password=None)
-    except FileNotFoundError:
-        raise ValueError("Không tìm thấy Private Key file.")
-
-    signature = private_key.sign(
-        policy_json.encode('utf-8'),
-        padding.PKCS1v15(),
-        hashes.SHA1()
-    )
+    params = cloudfront_signer_service._sign_policy(resource_url, expire_timestamp)
 
     return {
-        'CloudFront-Policy': cloudfront_base64(policy_json.encode('utf-8')),
-        'CloudFront-Signature': cloudfront_base64(signature),
-        'CloudFront-Key-Pair-Id': settings.MY_CLOUDFRONT_KEY_ID,
+        'CloudFront-Policy': params['Policy'],
+        'CloudFront-Signature': params['Signature'],
+        'CloudFront-Key-Pair-Id': params['Key-Pair-Id'],
         'Expires': expire_timestamp
     }
 
@@ -168,16 +104,13 @@ def generate_access_cookies() -> dict:
     """
     # 1. Định nghĩa "Luật" của App
     # App quy định: Đã login là xem được tất cả trong folder private
-    resource_url = f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/private/*"
     expire_minutes = 720 # 12 tiếng
 
-    # 2. Gọi Util để tính toán (Delegation)
-    cookies_raw = generate_cloudfront_signed_cookies_util(
-        resource_url=resource_url,
-        expire_minutes=expire_minutes
-    )
+    # 2. Chữ ký wildcard dùng chung cho mọi user (policy không chứa thông tin user) -> Cache tới gần hạn
+    cookies_raw = cloudfront_signer_service.get_prefix_cookies('private', expire_minutes=expire_minutes)
 
     # 3. Đóng gói kết quả trả về cho View
+    # Cookie có thể lấy từ cache -> max_age tính theo thời gian sống thực còn lại
     return {
         "cookies": {
             'CloudFront-Policy': cookies_raw['CloudFront-Policy'],
@@ -186,12 +119,7 @@ def generate_access_cookies() -> dict:
         },
         "metadata": {
             "expires_at": cookies_raw['Expires'],
-            "expires_in_seconds": expire_minutes * 60,
-            "resource": resource_url
+            "expires_in_seconds": max(0, cookies_raw['Expires'] - int(time.time())),
+            "resource": cookies_raw['Resource']
         }
     }
-
-
-
-
-
@@ -0,0 +1,272 @@
+import json
+import time
+import base64
+import logging
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from django.conf import settings
+from django.core.cache import cache
+
+from media.models import UploadedFile
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'media:signed'
+
+# URL/Grant được ký với hạn = thời gian yêu cầu + margin và chỉ dùng lại trong "margin" giây đầu:
+# margin = max(MIN_REFRESH_MARGIN_SECONDS, REFRESH_MARGIN_RATIO * thời gian yêu cầu)
+# -> URL trả về (mới ký hay lấy từ cache) luôn còn sống ít nhất đúng thời gian yêu cầu.
+REFRESH_MARGIN_RATIO = 0.25
+MIN_REFRESH_MARGIN_SECONDS = 5 * 60
+
+LOCAL_CACHE_MAX_SIZE = 4096
+
+_local_cache: "OrderedDict[tuple, Tuple[object, int]]" = OrderedDict()
+_local_lock = threading.Lock()
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def cloudfront_base64(data: bytes) -> str:
+    return base64.b64encode(data).decode('utf-8').translate(str.maketrans('+=/', '-_~'))
+
+
+def _check_config() -> None:
+    if not settings.MY_CLOUDFRONT_KEY_ID or not settings.MY_CLOUDFRONT_KEY_PATH:
+        raise ValueError("Server chưa cấu hình CloudFront Key ID hoặc Key Path!")
+
+
+@lru_cache(maxsize=1)
+def _get_private_key():
+    """
+    Parse PEM 1 lần cho mỗi process (trước đây: mở file + parse ở MỖI URL).
+    Ưu tiên bytes đã đọc sẵn lúc load settings, fallback đọc file. Lỗi không bị cache -> Lần sau thử lại.
+    """
+    key_data = getattr(settings, 'CLOUDFRONT_KEY_DATA', None)
+    if not key_data:
+        try:
+            with open(settings.MY_CLOUDFRONT_KEY_PATH, 'rb') as key_file:
+                key_data = key_file.read()
+        except FileNotFoundError:
+            raise ValueError(f"Không tìm thấy private key tại: {settings.MY_CLOUDFRONT_KEY_PATH}")
+    return serialization.load_pem_private_key(key_data, password=None)
+
+
+def _sign_policy(resource: str, expire_timestamp: int) -> Dict[str, str]:
+    """Custom policy (Resource + DateLessThan) -> {'Policy', 'Signature', 'Key-Pair-Id'} đã mã hóa."""
+    policy_json = json.dumps({
+        "Statement": [{
+            "Resource": resource,
+            "Condition": {
+                "DateLessThan": {"AWS:EpochTime": expire_timestamp}
+            }
+        }]
+    }, separators=(',', ':')).encode('utf-8')
+
+    # CloudFront yêu cầu RSA-SHA1
+    signature = _get_private_key().sign(policy_json, padding.PKCS1v15(), hashes.SHA1())
+
+    return {
+        'Policy': cloudfront_base64(policy_json),
+        'Signature': cloudfront_base64(signature),
+        'Key-Pair-Id': settings.MY_CLOUDFRONT_KEY_ID,
+    }
+
+
+def _refresh_margin(expire_minutes: int) -> int:
+    return max(MIN_REFRESH_MARGIN_SECONDS, int(expire_minutes * 60 * REFRESH_MARGIN_RATIO))
+
+
+def _cache_key(kind: str, value: str, expire_minutes: int) -> str:
+    return f'{KEY_PREFIX}:{kind}:{expire_minutes}:{value}'
+
+
+def _local_get(key: str, now: int):
+    with _local_lock:
+        entry = _local_cache.get(key)
+        if entry is None:
+            return None
+        value, refresh_at = entry
+        if now >= refresh_at:
+            del _local_cache[key]
+            return None
+        _local_cache.move_to_end(key)
+        return value
+
+
+def _local_set(key: str, value, refresh_at: int) -> None:
+    with _local_lock:
+        _local_cache[key] = (value, refresh_at)
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > LOCAL_CACHE_MAX_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def _cached_many(kind: str, values: Iterable[str], expire_minutes: int, build) -> Dict[str, object]:
+    """
+    Tra cứu theo lô: LRU trong process -> Redis (get_many) -> build(values còn thiếu, expire_timestamp).
+    Mỗi entry lưu kèm expires_at; chỉ trả về entry còn sống lâu hơn thời gian yêu cầu.
+    """
+    values = {v for v in values if v}
+    if not values:
+        return {}
+
+    now = int(time.time())
+    lifetime = expire_minutes * 60
+    margin = _refresh_margin(expire_minutes)
+    keys = {_cache_key(kind, v, expire_minutes): v for v in values}
+
+    result = {}
+    for key, value in keys.items():
+        hit = _local_get(key, now)
+        if hit is not None:
+            result[value] = hit
+
+    missing_keys = [k for k, v in keys.items() if v not in result]
+    if missing_keys:
+        try:
+            cached = cache.get_many(missing_keys)
+        except Exception as e:
+            logger.error(f"⚠️ Signed URL cache unavailable: {e}")
+            cached = {}
+        for key, (signed, expires_at) in cached.items():
+            if expires_at - now > lifetime:
+                result[keys[key]] = signed
+                _local_set(key, signed, expires_at - lifetime)
+
+    missing = values - result.keys()
+    if missing:
+        _check_config()
+        # Ký dư margin -> Bản cache dùng lại trong margin giây vẫn còn >= lifetime
+        expires_at = now + lifetime + margin
+        fresh = build(missing, expires_at)
+        result.update(fresh)
+
+        for value, signed in fresh.items():
+            _local_set(_cache_key(kind, value, expire_minutes), signed, now + margin)
+        try:
+            cache.set_many(
+                {_cache_key(kind, v, expire_minutes): (s, expires_at) for v, s in fresh.items()},
+                timeout=margin
+            )
+        except Exception as e:
+            logger.error(f"⚠️ Không ghi được signed URL cache: {e}")
+
+    return result
+
+
+def _base_url(object_key: str) -> str:
+    return f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{object_key}"
+
+
+def _to_query(params: Dict[str, str]) -> str:
+    return f"Policy={params['Policy']}&Signature={params['Signature']}&Key-Pair-Id={params['Key-Pair-Id']}"
+
+
+# ==========================================
+# PUBLIC INTERFACE (URL)
+# ==========================================
+
+def sign_urls(object_keys: Iterable[str], expire_minutes: int = 60) -> Dict[str, str]:
+    """
+    Batch: {object_key: signed_url}. URL đã ký được dùng lại (cùng chữ ký) cho tới gần lúc hết hạn,
+    nên 1 màn hình liệt kê N file chỉ ký các file chưa có trong cache.
+    """
+    def build(missing, expires_at):
+        return {
+            key: f"{_base_url(key)}?{_to_query(_sign_policy(_base_url(key), expires_at))}"
+            for key in missing
+        }
+
+    return _cached_many('url', object_keys, expire_minutes, build)
+
+
+def sign_url(object_key: str, expire_minutes: int = 60) -> str:
+    """Input: object_key (VD: media/lesson/video.mp4) -> https://cdn.../media/lesson/video.mp4?Policy=...&Signature=..."""
+    return sign_urls([object_key], expire_minutes)[object_key]
+
+
+def get_signed_urls_by_ids(file_ids: Iterable, expire_minutes: int = 60) -> Dict[str, Optional[str]]:
+    """
+    Batch: {str(file_id): signed_url | None}. Resolve toàn bộ file_id -> S3 key bằng 1 query,
+    thay cho 1 query + 1 lần ký cho từng file.
+    """
+    file_ids = {str(f) for f in file_ids if f}
+    if not file_ids:
+        return {}
+
+    object_keys = {
+        str(file_id): name
+        for file_id, name in UploadedFile.objects.filter(id__in=file_ids).values_list('id', 'file')
+        if name
+    }
+    signed = sign_urls(object_keys.values(), expire_minutes)
+
+    return {file_id: signed.get(object_keys.get(file_id)) for file_id in file_ids}
+
+
+# ==========================================
+# PUBLIC INTERFACE (PREFIX)
+# ==========================================
+
+def sign_prefix(prefix: str, expire_minutes: int = 60) -> Dict[str, object]:
+    """
+    Wildcard policy cho mọi object dưới prefix (VD: 'private/', 'media/lesson_material/'):
+    1 chữ ký dùng chung cho nhiều asset. Trả về {'resource', 'expires_at', 'params': {Policy, Signature, Key-Pair-Id}}.
+    """
+    prefix = prefix.strip('/')
+
+    def build(missing, expires_at):
+        grants = {}
+        for p in missing:
+            resource = f"{_base_url(p)}/*"
+            grants[p] = {
+                'resource': resource,
+                'expires_at': expires_at,
+                'params': _sign_policy(resource, expires_at),
+            }
+        return grants
+
+    return _cached_many('prefix', [prefix], expire_minutes, build)[prefix]
+
+
+def sign_urls_with_prefix(object_keys: Iterable[str], prefix: str, expire_minutes: int = 60) -> Dict[str, str]:
+    """
+    Batch bằng wildcard policy: Ký 1 lần cho prefix, gắn chung query string vào URL của từng object.
+    Object nằm ngoài prefix -> Ký riêng (policy wildcard không phủ được).
+    """
+    grant = sign_prefix(prefix, expire_minutes)
+    query = _to_query(grant['params'])
+    base = prefix.strip('/') + '/'
+
+    object_keys = set(object_keys)
+    covered = {key for key in object_keys if key and key.startswith(base)}
+
+    result = {key: f"{_base_url(key)}?{query}" for key in covered}
+    result.update(sign_urls(object_keys - covered, expire_minutes))
+    return result
+
+
+def get_prefix_cookies(prefix: str, expire_minutes: int = 60) -> Dict[str, object]:
+    """Signed Cookies cho prefix: Trình duyệt gửi kèm cookie -> Không cần ký từng URL."""
+    grant = sign_prefix(prefix, expire_minutes)
+    params = grant['params']
+    return {
+        'CloudFront-Policy': params['Policy'],
+        'CloudFront-Signature': params['Signature'],
+        'CloudFront-Key-Pair-Id': params['Key-Pair-Id'],
+        'Expires': grant['expires_at'],
+        'Resource': grant['resource'],
+    }
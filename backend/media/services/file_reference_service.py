@@ -0,0 +1,223 @@
+import re
+import logging
+from typing import Iterable, Set
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from content.models import Course, ContentBlock
+from media.models import FileReference
+from quiz.models import Question
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'media:file_ref'
+
+# Đánh dấu index đã được build đầy đủ ít nhất 1 lần (rebuild_index).
+# Mất marker (Redis bị flush) -> Quét orphan từ chối chạy thay vì xóa nhầm file: An toàn khi lỗi.
+# Tăng version khi index có thêm loại tham chiếu mới (v2: media của Question)
+# -> Index cũ (thiếu loại mới) không còn được coi là sẵn sàng cho tới khi rebuild.
+INDEX_VERSION = 2
+INDEX_READY_KEY = f'{KEY_PREFIX}:index_ready:v{INDEX_VERSION}'
+
+QUESTION_JSON_FIELDS = ('prompt', 'answer_payload', 'hint')
+
+REBUILD_BATCH_SIZE = 500
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _cdn_url_pattern():
+    domain = re.escape(settings.AWS_S3_CUSTOM_DOMAIN)
+    return re.compile(rf'https?://{domain}/([^"\'?#\s]+)')
+
+
+def extract_block_paths(block_type: str, payload: dict) -> Set[str]:
+    """
+    S3 key mà 1 block đang dùng (cùng quy ước với cleanup_files):
+    - Media (video/pdf/...): payload['file_path'] nằm dưới 'private/'
+    - Rich text: Mọi URL CDN trong HTML (ảnh đã promote)
+    """
+    if not payload:
+        return set()
+
+    paths = set()
+    if payload.get('file_path'):
+        paths.add(f"private/{payload['file_path']}")
+
+    if block_type == 'rich_text':
+        html = payload.get('html_content') or ''
+        paths.update(_cdn_url_pattern().findall(html))
+
+    return paths
+
+
+def extract_question_paths(*json_fields) -> Set[str]:
+    """
+    S3 key mà 1 question đang dùng: Mọi 'file_path' lồng trong prompt/answer_payload/hint
+    (question_service promote vào private/quizzes/{quiz_id}/questions/...).
+    """
+    paths = set()
+
+    def _walk(data):
+        if isinstance(data, dict):
+            if data.get('file_path'):
+                paths.add(f"private/{data['file_path']}")
+            for value in data.values():
+                _walk(value)
+        elif isinstance(data, list):
+            for item in data:
+                _walk(item)
+
+    for data in json_fields:
+        _walk(data)
+    return paths
+
+
+def _build_rows(blocks) -> list:
+    return [
+        FileReference(block_id=block_id, path=path)
+        for block_id, block_type, payload in blocks
+        for path in extract_block_paths(block_type, payload)
+    ]
+
+
+def _build_question_rows(questions) -> list:
+    return [
+        FileReference(question_id=question_id, path=path)
+        for question_id, *json_fields in questions
+        for path in extract_question_paths(*json_fields)
+    ]
+
+
+# ==========================================
+# PUBLIC INTERFACE (SYNC)
+# ==========================================
+
+def sync_block(block: ContentBlock) -> None:
+    """Đồng bộ index của 1 block với payload hiện tại. Gọi trong cùng transaction với block.save()."""
+    paths = extract_block_paths(block.type, block.payload)
+    existing = set(FileReference.objects.filter(block=block).values_list('path', flat=True))
+
+    removed = existing - paths
+    if removed:
+        FileReference.objects.filter(block=block, path__in=removed).delete()
+
+    added = paths - existing
+    if added:
+        FileReference.objects.bulk_create(
+            [FileReference(block=block, path=p) for p in added],
+            ignore_conflicts=True
+        )
+
+
+def sync_questions(questions: Iterable[Question]) -> None:
+    """
+    Đồng bộ index của các question với prompt/answer_payload/hint hiện tại.
+    Gọi trong cùng transaction với save()/bulk_create()/bulk_update() của Question.
+    """
+    questions = [q for q in questions if q.pk]
+    if not questions:
+        return
+
+    wanted = {
+        (q.pk, path)
+        for q in questions
+        for path in extract_question_paths(*(getattr(q, f) for f in QUESTION_JSON_FIELDS))
+    }
+    existing = set(
+        FileReference.objects.filter(question_id__in=[q.pk for q in questions]).values_list('question_id', 'path')
+    )
+
+    removed = existing - wanted
+    for question_id, path in removed:
+        FileReference.objects.filter(question_id=question_id, path=path).delete()
+
+    added = wanted - existing
+    if added:
+        FileReference.objects.bulk_create(
+            [FileReference(question_id=question_id, path=path) for question_id, path in added],
+            ignore_conflicts=True
+        )
+
+
+def _rebuild_owner_rows(rows, owner_field: str, build_rows, batch_size: int, stdout=None) -> int:
+    """Build lại index của 1 loại chủ sở hữu (block/question) theo batch."""
+    total = 0
+    batch = []
+
+    def _flush(batch):
+        with transaction.atomic():
+            FileReference.objects.filter(**{f'{owner_field}__in': [b[0] for b in batch]}).delete()
+            created = FileReference.objects.bulk_create(build_rows(batch), ignore_conflicts=True)
+        return len(created)
+
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            total += _flush(batch)
+            batch = []
+            if stdout:
+                stdout.write(f" - Indexed {total} {owner_field} references...")
+    if batch:
+        total += _flush(batch)
+    return total
+
+
+def rebuild_index(batch_size: int = REBUILD_BATCH_SIZE, stdout=None) -> int:
+    """
+    Build lại toàn bộ index từ payload của ContentBlock + JSON của Question
+    (chạy 1 lần khi triển khai, hoặc khi nghi index lệch).
+    Duyệt theo batch bằng iterator -> RAM không phụ thuộc số block/question. Trả về số dòng index.
+    """
+    blocks = ContentBlock.objects.exclude(payload={}).values_list('id', 'type', 'payload')
+    total = _rebuild_owner_rows(blocks, 'block_id', _build_rows, batch_size, stdout)
+
+    questions = Question.objects.values_list('id', *QUESTION_JSON_FIELDS)
+    total += _rebuild_owner_rows(questions, 'question_id', _build_question_rows, batch_size, stdout)
+
+    cache.set(INDEX_READY_KEY, timezone.now().isoformat(), timeout=None)
+    logger.info(f"File reference index rebuilt: {total} references")
+    return total
+
+
+def is_index_ready() -> bool:
+    try:
+        return bool(cache.get(INDEX_READY_KEY))
+    except Exception as e:
+        logger.error(f"⚠️ Không đọc được trạng thái file index: {e}")
+        return False
+
+
+# ==========================================
+# PUBLIC INTERFACE (LOOKUP)
+# ==========================================
+
+def referenced_paths(paths: Iterable[str]) -> Set[str]:
+    """
+    Các key (trong 1 trang S3) đang được dùng: Index của block/question + thumbnail của Course.
+    2 query có index/giới hạn theo trang -> Chi phí tỉ lệ với trang, không với toàn bộ DB.
+    """
+    paths = list(paths)
+    if not paths:
+        return set()
+
+    used = set(FileReference.objects.filter(path__in=paths).values_list('path', flat=True).distinct())
+
+    # Thumbnail: DB lưu "course_thumbnails/abc.jpg", S3 là "public/course_thumbnails/abc.jpg"
+    thumbnails = [p[len('public/'):] for p in paths if p.startswith('public/')]
+    if thumbnails:
+        used.update(
+            f"public/{t}" for t in Course.objects.filter(thumbnail__in=thumbnails).values_list('thumbnail', flat=True)
+        )
+
+    return used
@@ -3,7 +3,6 @@ from botocore.config import Config
 from botocore.exceptions import ClientError
 import logging
 import uuid
-import threading
 from datetime import datetime
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -11,7 +10,6 @@ from django.contrib.auth.models import AbstractBaseUser
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.core.management import call_command
 from django.db import transaction
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
@@ -19,13 +17,17 @@ from django.utils import timezone
 
 from core.exceptions import DomainError, FileNotFoundError
 from custom_account.models import UserModel
-from content.models import Course, Enrollment
+from content.models import Course
+from core.services import course_access_service
+from core.services.course_access_service import ENROLLED_ROLES
 from media.models import UploadedFile, FileStatus, Component
 from media.domains.file_domain import FileDomain
 from media.domains.presigned_upload_domain import PresignedUploadDomain
 from media.domains.cleanup_task_domain import CleanupTaskDomain
 from media.services.cloud_service import generate_cloudfront_signed_url
+from media.services import cloudfront_signer_service
 from progress.models import QuizAttempt
+from media.tasks import CLEANUP_LOCK_ID, cleanup_files as cleanup_files_task
 
 
 
@@ -33,18 +35,8 @@ User = get_user_model()
 
 logger = logging.getLogger(__name__)
 
-@transaction.atomic
-def initiate_file_upload(user, data: dict) -> dict:
-    """
-    1. Tạo bản ghi UploadedFile (Status = STAGING)
-    2. Sinh ra Presigned URL để Client tự upload lên S3
-    """
-    original_filename = data.get('filename') # Client gửi tên file lên
-    file_type = data.get('file_type')       # Client gửi mime type (video/mp4)
-    file_size = data.get('file_size')       # Client gửi size dự kiến
-    component = data.get('component')
-    
-    # 1. Tạo tên file vật lý (key trên S3)
+def build_staging_key(component: str, original_filename: str, file_uuid: uuid.UUID) -> str:
+    """Key tạm trên S3 cho file vừa upload (dùng chung cho upload thường và multipart)."""
     # 1. Map tên component sang số nhiều (Plural) để thống nhất với folder đích sau này
     FOLDER_MAPPING = {
         'course_thumbnail': 'course_thumbnails', # Ép về số nhiều
@@ -58,10 +50,25 @@ def initiate_file_upload(user, data: dict) -> dict:
     # 2. Quy hoạch lại đường dẫn S3
     # Thay vì để lung tung trong 'media/', ta gom hết vào 'tmp/'
     ext = original_filename.split('.')[-1]
-    file_uuid = uuid.uuid4()
     
     # Kết quả: tmp/course_thumbnails/2024/uuid.jpg
-    s3_key = f"tmp/{folder_name}/{datetime.now().year}/{file_uuid}.{ext}"
+    return f"tmp/{folder_name}/{datetime.now().year}/{file_uuid}.{ext}"
+
+
+@transaction.atomic
+def initiate_file_upload(user, data: dict) -> dict:
+    """
+    1. Tạo bản ghi UploadedFile (Status = STAGING)
+    2. Sinh ra Presigned URL để Client tự upload lên S3
+    """
+    original_filename = data.get('filename') # Client gửi tên file lên
+    file_type = data.get('file_type')       # Client gửi mime type (video/mp4)
+    file_size = data.get('file_size')       # Client gửi size dự kiến
+    component = data.get('component')
+    
+    # 1. Tạo tên file vật lý (key trên S3)
+    file_uuid = uuid.uuid4()
+    s3_key = build_staging_key(component, original_filename, file_uuid)
     
     # if component in PUBLIC_COMPONENTS:
     #     acl_policy = 'public-read'  # File này ai cũng đọc được
@@ -310,41 +317,20 @@ def confirm_file_upload(user, file_id: str) -> FileDomain:
 #     return len(update_list)
 
 
-CLEANUP_LOCK_ID = "cleanup_task_running_lock"
 def trigger_background_cleanup(days_old: int = 1) -> CleanupTaskDomain:
     """
-    Kích hoạt tiến trình dọn dẹp chạy ngầm (Threading).
+    Kích hoạt tiến trình dọn dẹp chạy ngầm (Celery task).
     Trả về CleanupTaskDomain báo trạng thái (Thành công hoặc Bị khóa).
     """
     
-    # 1. Check Lock
+    # 1. Check Lock (Task tự giữ lock bằng cache.add -> 2 lần bấm liên tiếp cũng chỉ 1 task chạy)
     if cache.get(CLEANUP_LOCK_ID):
         return CleanupTaskDomain.locked(
             message="Tiến trình dọn dẹp ĐANG CHẠY. Vui lòng đợi nó hoàn tất."
         )
 
-    # 2. Định nghĩa hàm Worker (Chạy trong Thread)
-    def _run_worker():
-        try:
-            # Set Lock (Hết hạn sau 10 phút)
-            cache.set(CLEANUP_LOCK_ID, "running", timeout=600)
-            print(f">>> [Service] Thread Start: Dọn file cũ hơn {days_old} ngày...")
-            
-            # TRUYỀN THAM SỐ VÀO ĐÂY
-            # days: xóa file staging cũ
-            # clean_broken: True để bật chế độ quét file lỗi (nếu muốn admin chạy cái này)
-            call_command('cleanup_files', days=days_old)
-            
-            print(">>> [Service] Thread Done: Hoàn tất.")
-        except Exception as e:
-            print(f">>> [Service] Thread Error: {e}")
-        finally:
-            # Luôn giải phóng lock
-            cache.delete(CLEANUP_LOCK_ID)
-
-    # 3. Khởi chạy Thread
-    task_thread = threading.Thread(target=_run_worker, daemon=True)
-    task_thread.start()
+    # 2. Đẩy sang Celery worker (không còn thread daemon trong web process)
+    cleanup_files_task.delay(days_old=days_old)
 
     return CleanupTaskDomain.started(
         message="Đã kích hoạt tiến trình dọn dẹp ngầm thành công.",
@@ -365,6 +351,13 @@ def list_all_files() -> list[FileDomain]: # <-- Thay đổi ở đây
         'uploaded_by'
     ).all().order_by('-uploaded_at')
 
+    # Ký URL cả lô trước (1 lần get_many Redis) -> model.url bên dưới chỉ đọc LRU trong process
+    public_components = {Component.USER_AVATAR, Component.COURSE_THUMBNAIL, Component.SITE_LOGO}
+    cloudfront_signer_service.sign_urls(
+        model.file.name for model in all_file_models
+        if model.file and model.component not in public_components
+    )
+
     # Chuyển đổi QuerySet[Model] -> list[Domain]
     all_file_domains = [
         FileDomain.from_model(model) for model in all_file_models
@@ -520,14 +513,9 @@ def _get_course_from_object(obj):
 def user_is_enrolled(user, course: Course) -> bool:
     """
     Kiểm tra xem user có đang ghi danh vào khóa học này không.
+    Dùng memo (user, course) của course_access_service -> Serve nhiều file cùng khóa không query lại.
     """
-    # 2. Check trong bảng Enrollment
-    # Dùng .exists() là tối ưu nhất vì nó không load dữ liệu lên RAM, 
-    # chỉ trả về True/False ở cấp DB.
-    return Enrollment.objects.filter(
-        user=user, 
-        course=course
-    ).exists()
+    return course_access_service.get_course_role(user, course.id) in ENROLLED_ROLES
 
 
 def user_has_access_to_file(user: UserModel, file_object: UploadedFile) -> bool:
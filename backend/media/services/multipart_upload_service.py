@@ -0,0 +1,409 @@
+import math
+import uuid
+import base64
+import logging
+import binascii
+from datetime import timedelta
+from typing import Dict, List, Tuple
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.utils import timezone
+
+from core.exceptions import DomainError
+from media.models import UploadedFile, FileStatus
+from media.domains.file_domain import FileDomain
+from media.domains.multipart_upload_domain import MultipartUploadDomain
+from media.services.file_service import build_staging_key
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+# Giới hạn của S3: Part tối thiểu 5MB (trừ part cuối), tối đa 10.000 part / upload
+MIN_PART_SIZE_BYTES = 5 * 1024 * 1024
+MAX_PARTS = 10_000
+
+# Presigned URL của từng part: Đủ dài cho 1 part trên mạng chậm, hết hạn thì client xin lại (resume)
+PART_URL_EXPIRES_SECONDS = 60 * 60
+
+# Số URL tối đa cấp trong 1 request: Client xin theo "cửa sổ" các part sắp upload
+MAX_PART_URLS_PER_REQUEST = 100
+
+# Phiên multipart mở quá N ngày mà chưa complete -> Coi là bị bỏ (cleanup_files abort + xóa bản ghi).
+# Dài hơn hẳn TTL của file staging thường (1 ngày): Upload file lớn có thể resume qua nhiều ngày.
+ABANDONED_UPLOAD_DAYS = settings.MULTIPART_ABANDONED_DAYS
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _get_s3_client():
+    region = settings.AWS_S3_REGION_NAME
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=region,
+        endpoint_url=getattr(settings, 'AWS_S3_ENDPOINT_URL', None) or f"https://s3.{region}.amazonaws.com",
+        config=Config(signature_version="s3v4", s3={"addressing_style": "virtual"}),
+    )
+
+
+def plan_parts(file_size: int) -> Tuple[int, int]:
+    """(part_size, part_count): Part mặc định theo settings, tự nới ra để không vượt quá 10.000 part."""
+    part_size = max(
+        settings.MULTIPART_PART_SIZE_MB * 1024 * 1024,
+        MIN_PART_SIZE_BYTES,
+        math.ceil(file_size / MAX_PARTS),
+    )
+    return part_size, math.ceil(file_size / part_size)
+
+
+def expected_part_size(part_number: int, part_size: int, file_size: int) -> int:
+    """Kích thước đúng của part: Mọi part bằng part_size, riêng part cuối là phần dư."""
+    return min(part_size, file_size - (part_number - 1) * part_size)
+
+
+def _normalize_etag(etag) -> str:
+    return (etag or '').strip('"')
+
+
+def _validate_checksum(checksum: str) -> None:
+    """checksum_sha256 = base64(SHA-256 của bytes của part), đúng format header x-amz-checksum-sha256."""
+    try:
+        digest = base64.b64decode(checksum, validate=True)
+    except (binascii.Error, ValueError):
+        digest = b''
+    if len(digest) != 32:
+        raise DomainError("checksum_sha256 phải là base64 của SHA-256 (32 bytes).")
+
+
+def _get_upload(user, file_id, for_update: bool = False) -> UploadedFile:
+    qs = UploadedFile.objects.select_for_update() if for_update else UploadedFile.objects
+    try:
+        file_obj = qs.get(pk=file_id)
+    except UploadedFile.DoesNotExist:
+        raise DomainError(f"File {file_id} không tồn tại.")
+
+    if file_obj.uploaded_by_id != user.id:
+        raise PermissionDenied("Bạn không có quyền thao tác với file này.")
+    return file_obj
+
+
+def _require_open(file_obj: UploadedFile) -> None:
+    if not file_obj.multipart_upload_id:
+        raise DomainError("File không có phiên multipart upload đang mở.")
+
+
+def _list_parts(s3_client, file_obj: UploadedFile) -> Dict[int, dict]:
+    """Toàn bộ part đã lên S3 (list_parts phân trang 1000 part / trang)."""
+    paginator = s3_client.get_paginator('list_parts')
+    parts = {}
+    try:
+        for page in paginator.paginate(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Key=file_obj.file.name,
+            UploadId=file_obj.multipart_upload_id,
+        ):
+            for part in page.get('Parts', []):
+                parts[part['PartNumber']] = part
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchUpload':
+            raise DomainError("Phiên upload đã hết hạn hoặc bị hủy. Vui lòng upload lại.")
+        raise DomainError(f"Lỗi đọc trạng thái upload trên S3: {e}")
+    return parts
+
+
+def _head_size(s3_client, key: str):
+    """ContentLength của object đã ghép, None nếu object chưa tồn tại."""
+    try:
+        return s3_client.head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key).get('ContentLength', 0)
+    except ClientError:
+        return None
+
+
+def _mark_completed(file_obj: UploadedFile, real_size: int) -> FileDomain:
+    # Size thật từ S3 (client có thể khai báo sai lúc init)
+    file_obj.file_size = real_size
+    file_obj.multipart_upload_id = None
+    file_obj.save(update_fields=['file_size', 'multipart_upload_id'])
+
+    logger.info(f"Multipart upload hoàn tất: {file_obj.id} ({real_size} bytes)")
+    return FileDomain.from_model(file_obj)
+
+
+def _to_domain(file_obj: UploadedFile, uploaded: Dict[int, dict] = None, part_urls: List[dict] = None) -> MultipartUploadDomain:
+    part_size = file_obj.multipart_part_size
+    part_count = math.ceil(file_obj.file_size / part_size)
+    uploaded = uploaded or {}
+
+    return MultipartUploadDomain(
+        file_id=file_obj.id,
+        file_size=file_obj.file_size,
+        part_size=part_size,
+        part_count=part_count,
+        uploaded_parts=[
+            {
+                'part_number': number,
+                'etag': _normalize_etag(part.get('ETag')),
+                'size': part.get('Size'),
+                'checksum_sha256': part.get('ChecksumSHA256'),
+            }
+            for number, part in sorted(uploaded.items())
+        ],
+        missing_parts=[n for n in range(1, part_count + 1) if n not in uploaded],
+        part_urls=part_urls or [],
+        expires_in=PART_URL_EXPIRES_SECONDS if part_urls else 0,
+    )
+
+
+# ==========================================
+# PUBLIC INTERFACE (INITIATE / RESUME)
+# ==========================================
+
+@transaction.atomic
+def initiate_multipart_upload(user, data: dict) -> MultipartUploadDomain:
+    """
+    1. Mở phiên multipart upload trên S3 (bắt buộc checksum SHA-256 cho từng part)
+    2. Tạo bản ghi UploadedFile (Status = STAGING) giữ UploadId + part_size để resume
+    Bytes đi thẳng từ client lên S3 -> Giới hạn dung lượng không phụ thuộc Django worker.
+    """
+    original_filename = data.get('filename')
+    file_type = data.get('file_type')
+    file_size = data.get('file_size')
+    component = data.get('component')
+
+    if file_size > settings.MAX_MULTIPART_FILE_SIZE_BYTES:
+        raise DomainError(f"File vượt quá giới hạn {settings.MAX_MULTIPART_FILE_SIZE_MB} MB.")
+
+    file_uuid = uuid.uuid4()
+    s3_key = build_staging_key(component, original_filename, file_uuid)
+    part_size, _ = plan_parts(file_size)
+
+    try:
+        response = _get_s3_client().create_multipart_upload(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Key=s3_key,
+            ACL='private',
+            ContentType=file_type,
+            ChecksumAlgorithm='SHA256',
+        )
+    except ClientError as e:
+        raise DomainError(f"Không mở được phiên upload trên S3: {e}")
+
+    instance = UploadedFile.objects.create(
+        id=file_uuid,
+        uploaded_by=user,
+        original_filename=original_filename,
+        mime_type=file_type,
+        file_size=file_size, # Size khai báo -> Dùng để chia part, kiểm lại khi complete
+        component=component,
+        status=FileStatus.STAGING,
+        file=s3_key,
+        multipart_upload_id=response['UploadId'],
+        multipart_part_size=part_size,
+    )
+
+    return _to_domain(instance)
+
+
+def get_multipart_upload(user, file_id) -> MultipartUploadDomain:
+    """Resume: Các part đã nằm trên S3 và các part còn thiếu (client chỉ upload lại phần thiếu)."""
+    file_obj = _get_upload(user, file_id)
+    _require_open(file_obj)
+
+    return _to_domain(file_obj, uploaded=_list_parts(_get_s3_client(), file_obj))
+
+
+def sign_upload_parts(user, file_id, parts: List[dict]) -> MultipartUploadDomain:
+    """
+    Cấp presigned URL cho các part [{'part_number', 'checksum_sha256'}].
+    Checksum nằm trong chữ ký -> Client phải gửi header x-amz-checksum-sha256 khớp, S3 từ chối part bị hỏng.
+    """
+    file_obj = _get_upload(user, file_id)
+    _require_open(file_obj)
+
+    if not parts:
+        raise DomainError("Cần ít nhất 1 part.")
+    if len(parts) > MAX_PART_URLS_PER_REQUEST:
+        raise DomainError(f"Tối đa {MAX_PART_URLS_PER_REQUEST} part cho mỗi lần xin URL.")
+
+    part_count = math.ceil(file_obj.file_size / file_obj.multipart_part_size)
+    s3_client = _get_s3_client()
+
+    part_urls = []
+    for part in parts:
+        part_number = part['part_number']
+        checksum = part['checksum_sha256']
+        if not 1 <= part_number <= part_count:
+            raise DomainError(f"part_number {part_number} nằm ngoài khoảng 1..{part_count}.")
+        _validate_checksum(checksum)
+
+        url = s3_client.generate_presigned_url(
+            'upload_part',
+            Params={
+                'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                'Key': file_obj.file.name,
+                'UploadId': file_obj.multipart_upload_id,
+                'PartNumber': part_number,
+                'ChecksumSHA256': checksum,
+            },
+            ExpiresIn=PART_URL_EXPIRES_SECONDS,
+        )
+        part_urls.append({
+            'part_number': part_number,
+            'url': url,
+            'headers': {'x-amz-checksum-sha256': checksum},
+        })
+
+    return _to_domain(file_obj, part_urls=part_urls)
+
+
+# ==========================================
+# PUBLIC INTERFACE (COMPLETE / ABORT)
+# ==========================================
+
+def verify_parts(uploaded: Dict[int, dict], claimed: List[dict], part_size: int, file_size: int) -> Tuple[List[int], List[int]]:
+    """
+    So từng part trên S3 với part client báo đã upload (etag + checksum) và kích thước dự kiến.
+    Trả về (missing, corrupted): Danh sách part_number cần upload lại.
+    """
+    part_count = math.ceil(file_size / part_size)
+    claimed_by_number = {p['part_number']: p for p in claimed}
+
+    missing = []
+    corrupted = []
+    for part_number in range(1, part_count + 1):
+        stored = uploaded.get(part_number)
+        reported = claimed_by_number.get(part_number)
+        if stored is None or reported is None:
+            missing.append(part_number)
+            continue
+
+        stored_checksum = stored.get('ChecksumSHA256')
+        if (
+            stored.get('Size') != expected_part_size(part_number, part_size, file_size)
+            or _normalize_etag(stored.get('ETag')) != _normalize_etag(reported.get('etag'))
+            or (stored_checksum and stored_checksum != reported.get('checksum_sha256'))
+        ):
+            corrupted.append(part_number)
+
+    return missing, corrupted
+
+
+@transaction.atomic
+def complete_multipart_upload(user, file_id, parts: List[dict]) -> FileDomain:
+    """
+    Ghép part thành object hoàn chỉnh (server-side, S3 tự nối, Django không đọc bytes).
+    Row lock: Client bấm complete 2 lần -> Lần sau thấy phiên đã đóng và trả về kết quả cũ.
+    """
+    file_obj = _get_upload(user, file_id, for_update=True)
+    if not file_obj.multipart_upload_id:
+        if file_obj.multipart_part_size:
+            return FileDomain.from_model(file_obj)
+        raise DomainError("File không có phiên multipart upload đang mở.")
+
+    s3_client = _get_s3_client()
+    try:
+        uploaded = _list_parts(s3_client, file_obj)
+    except DomainError:
+        # Lần complete trước đã ghép xong trên S3 nhưng chưa kịp lưu DB -> Chỉ cần hoàn tất phần DB
+        real_size = _head_size(s3_client, file_obj.file.name)
+        if real_size is None:
+            raise
+        return _mark_completed(file_obj, real_size)
+
+    missing, corrupted = verify_parts(uploaded, parts, file_obj.multipart_part_size, file_obj.file_size)
+    if missing or corrupted:
+        raise DomainError(
+            f"Upload chưa hoàn chỉnh. Part còn thiếu: {missing[:50]}, part sai checksum/kích thước: {corrupted[:50]}."
+        )
+
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    try:
+        s3_client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=file_obj.file.name,
+            UploadId=file_obj.multipart_upload_id,
+            MultipartUpload={'Parts': [
+                {
+                    'PartNumber': p['part_number'],
+                    'ETag': f"\"{_normalize_etag(p['etag'])}\"",
+                    'ChecksumSHA256': p['checksum_sha256'],
+                }
+                for p in sorted(parts, key=lambda p: p['part_number'])
+            ]},
+        )
+        real_size = s3_client.head_object(Bucket=bucket, Key=file_obj.file.name).get('ContentLength', 0)
+    except ClientError as e:
+        raise DomainError(f"Lỗi ghép file trên S3: {e}")
+
+    return _mark_completed(file_obj, real_size)
+
+
+@transaction.atomic
+def abort_multipart_upload(user, file_id) -> None:
+    """Hủy phiên upload: S3 xóa các part đã lên (không tính phí lưu trữ nữa), xóa bản ghi STAGING."""
+    file_obj = _get_upload(user, file_id, for_update=True)
+    _require_open(file_obj)
+
+    _abort_on_s3(_get_s3_client(), file_obj)
+    file_obj.delete()
+
+
+def _abort_on_s3(s3_client, file_obj: UploadedFile) -> None:
+    """Abort phiên trên S3 (xóa các part đã lên). Phiên đã hết hạn/bị hủy trước đó -> Coi như xong."""
+    try:
+        s3_client.abort_multipart_upload(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Key=file_obj.file.name,
+            UploadId=file_obj.multipart_upload_id,
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchUpload':
+            raise DomainError(f"Không hủy được phiên upload trên S3: {e}")
+
+
+# ==========================================
+# PUBLIC INTERFACE (CLEANUP)
+# ==========================================
+
+def abort_abandoned_uploads(days: int = ABANDONED_UPLOAD_DAYS, dry_run: bool = False) -> int:
+    """
+    Dọn phiên multipart bị bỏ dở quá `days` ngày (gọi từ cleanup_files):
+    Abort trên S3 TRƯỚC (part đã upload không bị tính phí lưu trữ nữa) rồi mới xóa bản ghi STAGING.
+    Abort lỗi -> Giữ bản ghi để lần chạy sau thử lại (xóa bản ghi trước sẽ mất UploadId, part nằm lại S3 mãi).
+    Trả về số phiên đã dọn.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    abandoned = UploadedFile.objects.filter(
+        status=FileStatus.STAGING,
+        multipart_upload_id__isnull=False,
+        uploaded_at__lt=cutoff,
+    ).exclude(multipart_upload_id='')
+
+    if dry_run:
+        return abandoned.count()
+
+    s3_client = _get_s3_client()
+    aborted = 0
+    for file_obj in abandoned.iterator():
+        try:
+            _abort_on_s3(s3_client, file_obj)
+        except DomainError as e:
+            logger.error(f"⚠️ {file_obj.id}: {e}")
+            continue
+        file_obj.delete()
+        aborted += 1
+
+    logger.info(f"Aborted {aborted} abandoned multipart uploads (>{days} days)")
+    return aborted
@@ -0,0 +1,34 @@
+import logging
+from celery import shared_task
+from django.core.cache import cache
+from django.core.management import call_command
+
+from media.services import file_reference_service
+
+
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_LOCK_ID = "cleanup_task_running_lock"
+
+# Lock tự hết hạn nếu worker chết giữa chừng; lần chạy sau resume từ checkpoint của cleanup_files
+CLEANUP_LOCK_TIMEOUT_SECONDS = 2 * 60 * 60
+
+@shared_task
+def cleanup_files(days_old: int = 1, max_pages: int = None):
+    """
+    Dọn file Staging hết hạn + quét Orphan trên S3 (streaming, có checkpoint).
+    Lock đảm bảo chỉ 1 lượt dọn dẹp chạy tại 1 thời điểm (API trigger + Beat hằng đêm).
+    """
+    if not cache.add(CLEANUP_LOCK_ID, "running", timeout=CLEANUP_LOCK_TIMEOUT_SECONDS):
+        logger.info("Cleanup đang chạy ở worker khác -> Bỏ qua.")
+        return
+
+    try:
+        # Index chưa build (lần đầu / vừa thêm loại tham chiếu mới) -> Build trước khi quét, không xóa dựa trên index thiếu
+        rebuild_index = not file_reference_service.is_index_ready()
+        logger.info(f"Cleanup start: staging > {days_old} ngày, max_pages={max_pages}, rebuild_index={rebuild_index}")
+        call_command('cleanup_files', days=days_old, max_pages=max_pages, rebuild_index=rebuild_index)
+        logger.info("Cleanup done.")
+    finally:
+        cache.delete(CLEANUP_LOCK_ID)
@@ -0,0 +1,13 @@
+# media/tests/factories.py
+import factory
+
+from custom_account.models import UserModel
+
+class UserFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = UserModel
+
+    username = factory.Sequence(lambda n: f"uploader{n}")
+    email = factory.LazyAttribute(lambda o: f"{o.username}@example.com")
+    role = "instructor"
+    is_active = True
@@ -0,0 +1,106 @@
+# media/tests/test_cleanup_files.py
+"""
+cleanup_files (streaming orphan scan) trên S3 giả lập (moto):
+File còn được tham chiếu (ContentBlock, Question) phải sống sót, file rác bị xóa.
+"""
+import boto3
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+
+from media.models import FileReference
+from media.services import file_reference_service
+from quiz.models import Quiz, Question
+from quiz.services import question_service
+from media.tests.factories import UserFactory
+
+BUCKET = 'test-cleanup-bucket'
+REGION = 'us-east-1'
+
+
+@pytest.fixture
+def s3(settings):
+    moto = pytest.importorskip('moto')
+    settings.AWS_STORAGE_BUCKET_NAME = BUCKET
+    settings.AWS_S3_REGION_NAME = REGION
+    settings.AWS_S3_ENDPOINT_URL = None
+    settings.AWS_ACCESS_KEY_ID = 'testing'
+    settings.AWS_SECRET_ACCESS_KEY = 'testing'
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name=REGION)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def _clean_markers():
+    cache.delete(file_reference_service.INDEX_READY_KEY)
+    cache.delete('media:orphan_scan:checkpoint')
+    yield
+    cache.delete(file_reference_service.INDEX_READY_KEY)
+
+
+def _keys(s3, prefix: str) -> set:
+    return {obj['Key'] for obj in s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix).get('Contents', [])}
+
+
+def _question_with_image(quiz: Quiz, relative_path: str) -> Question:
+    return Question.objects.create(
+        quiz=quiz, type='multiple_choice_single',
+        prompt={'text': 'Hình nào là tam giác?', 'media': [{'file_path': relative_path, 'storage_type': 's3_private'}]},
+        answer_payload={'options': [{'id': 'A', 'image': {'file_path': f'{relative_path}.a.png', 'storage_type': 's3_private'}}]},
+    )
+
+
+def _run_cleanup(**options):
+    # min_age_hours=-1: Coi mọi object là đủ cũ (moto vừa tạo xong)
+    call_command('cleanup_files', min_age_hours=-1, **options)
+
+
+@pytest.mark.django_db
+def test_referenced_quiz_image_survives_cleanup(s3):
+    quiz = Quiz.objects.create(title='Hình học')
+    live = f'quizzes/{quiz.id}/questions/q1/prompt.png'
+    _question_with_image(quiz, live)
+
+    for key in [f'private/{live}', f'private/{live}.a.png', f'private/quizzes/{quiz.id}/questions/q1/old.png']:
+        s3.put_object(Bucket=BUCKET, Key=key, Body=b'img')
+
+    _run_cleanup(rebuild_index=True)
+
+    assert _keys(s3, 'private/quizzes/') == {f'private/{live}', f'private/{live}.a.png'}
+
+
+@pytest.mark.django_db
+def test_question_update_keeps_index_in_sync(s3):
+    quiz = Quiz.objects.create(title='Hình học', owner=UserFactory())
+    question = _question_with_image(quiz, f'quizzes/{quiz.id}/questions/q1/v1.png')
+    file_reference_service.rebuild_index()
+
+    new_path = f'quizzes/{quiz.id}/questions/{question.id}/v2.png'
+    question_service.update_question(question.id, {
+        'prompt': {'media': [{'file_path': new_path, 'storage_type': 's3_private'}]},
+        'answer_payload': {},
+    })
+
+    assert set(FileReference.objects.filter(question=question).values_list('path', flat=True)) == {f'private/{new_path}'}
+
+    s3.put_object(Bucket=BUCKET, Key=f'private/{new_path}', Body=b'img')
+    s3.put_object(Bucket=BUCKET, Key=f'private/quizzes/{quiz.id}/questions/q1/v1.png', Body=b'img')
+    _run_cleanup()
+
+    assert _keys(s3, 'private/quizzes/') == {f'private/{new_path}'}
+
+
+@pytest.mark.django_db
+def test_scan_refuses_to_run_on_index_without_question_media(s3):
+    # Marker của index cũ (v1, chỉ có block) không được coi là sẵn sàng
+    cache.set('media:file_ref:index_ready', 'legacy', timeout=None)
+    quiz = Quiz.objects.create(title='Hình học')
+    live = f'quizzes/{quiz.id}/questions/q1/prompt.png'
+    _question_with_image(quiz, live)
+    s3.put_object(Bucket=BUCKET, Key=f'private/{live}', Body=b'img')
+
+    _run_cleanup()
+
+    assert _keys(s3, 'private/quizzes/') == {f'private/{live}'}
@@ -0,0 +1,63 @@
+# media/tests/test_cloudfront_signer.py
+"""
+Cache URL đã ký (cloudfront_signer_service): URL trả về, dù mới ký hay lấy lại từ cache,
+luôn còn sống ít nhất đúng expire_minutes được yêu cầu.
+"""
+import json
+import base64
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
+
+from media.services import cloudfront_signer_service
+
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture(autouse=True)
+def _signer(settings, monkeypatch):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    settings.CLOUDFRONT_KEY_DATA = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    settings.MY_CLOUDFRONT_KEY_ID = 'TESTKEY'
+    cloudfront_signer_service._get_private_key.cache_clear()
+    cloudfront_signer_service._local_cache.clear()
+    cache.clear()
+    clock = {'now': NOW}
+    monkeypatch.setattr(cloudfront_signer_service.time, 'time', lambda: clock['now'])
+    yield clock
+    cloudfront_signer_service._get_private_key.cache_clear()
+    cloudfront_signer_service._local_cache.clear()
+    cache.clear()
+
+
+def _expires_at(url: str) -> int:
+    policy = parse_qs(urlparse(url).query)['Policy'][0]
+    raw = policy.translate(str.maketrans('-_~', '+=/'))
+    statement = json.loads(base64.b64decode(raw))['Statement'][0]
+    return statement['Condition']['DateLessThan']['AWS:EpochTime']
+
+
+def test_cached_url_keeps_requested_lifetime(_signer):
+    lifetime = 60 * 60
+    margin = cloudfront_signer_service._refresh_margin(60)
+
+    first = cloudfront_signer_service.sign_url('media/lesson/video.mp4', expire_minutes=60)
+    assert _expires_at(first) - NOW >= lifetime
+
+    # Gần hết khoảng dùng lại -> Vẫn là URL cũ, vẫn còn đủ 60 phút
+    _signer['now'] = NOW + margin - 1
+    again = cloudfront_signer_service.sign_url('media/lesson/video.mp4', expire_minutes=60)
+    assert again == first
+    assert _expires_at(again) - _signer['now'] >= lifetime
+
+    # Quá khoảng dùng lại -> Ký mới
+    _signer['now'] = NOW + margin
+    renewed = cloudfront_signer_service.sign_url('media/lesson/video.mp4', expire_minutes=60)
+    assert renewed != first
+    assert _expires_at(renewed) - _signer['now'] >= lifetime
@@ -0,0 +1,259 @@
+# media/tests/test_multipart_upload.py
+"""
+Harness cho multipart upload: Mặc định chạy trên moto (S3 giả lập trong process).
+Đặt TEST_S3_ENDPOINT_URL (VD: http://localhost:9000 của MinIO) + TEST_S3_ACCESS_KEY/TEST_S3_SECRET_KEY
+để chạy cùng bộ test trên S3-compatible thật.
+"""
+import os
+import base64
+import hashlib
+import boto3
+import pytest
+import requests
+from datetime import timedelta
+from botocore.config import Config
+from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
+from django.utils import timezone
+
+from core.exceptions import DomainError
+from media.models import UploadedFile
+from media.services import multipart_upload_service, cloud_service
+from media.tests.factories import UserFactory
+
+MB = 1024 * 1024
+PART_SIZE = 5 * MB
+BUCKET = 'test-multipart-bucket'
+REGION = 'us-east-1'
+
+
+def _checksum(data: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def _payload(size: int) -> bytes:
+    # Mỗi part có nội dung khác nhau -> Sai thứ tự / lẫn part sẽ lộ ra khi so sánh
+    return bytes((i // PART_SIZE + i) % 251 for i in range(size))
+
+
+def _put_part(part_url: dict, data: bytes) -> str:
+    response = requests.put(part_url['url'], data=data, headers=part_url['headers'])
+    assert response.status_code == 200, response.text
+    return response.headers['ETag'].strip('"')
+
+
+@pytest.fixture
+def s3(settings):
+    endpoint = os.getenv('TEST_S3_ENDPOINT_URL')
+
+    settings.AWS_STORAGE_BUCKET_NAME = BUCKET
+    settings.AWS_S3_REGION_NAME = REGION
+    settings.MULTIPART_PART_SIZE_MB = PART_SIZE // MB
+    settings.AWS_S3_ENDPOINT_URL = endpoint
+
+    if endpoint:
+        settings.AWS_ACCESS_KEY_ID = os.getenv('TEST_S3_ACCESS_KEY', 'minioadmin')
+        settings.AWS_SECRET_ACCESS_KEY = os.getenv('TEST_S3_SECRET_KEY', 'minioadmin')
+        client = boto3.client(
+            's3', endpoint_url=endpoint, region_name=REGION,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            config=Config(signature_version='s3v4', s3={'addressing_style': 'path'}),
+        )
+        existing = [b['Name'] for b in client.list_buckets()['Buckets']]
+        if BUCKET not in existing:
+            client.create_bucket(Bucket=BUCKET)
+        yield client
+        return
+
+    moto = pytest.importorskip('moto')
+    settings.AWS_ACCESS_KEY_ID = 'testing'
+    settings.AWS_SECRET_ACCESS_KEY = 'testing'
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name=REGION)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def uploader(db):
+    return UserFactory()
+
+
+def _initiate(user, size: int):
+    return multipart_upload_service.initiate_multipart_upload(user, {
+        'filename': 'lecture.mp4',
+        'file_type': 'video/mp4',
+        'file_size': size,
+        'component': 'course_thumbnail',   # Component public -> FileDomain.url không cần key CloudFront
+    })
+
+
+def _upload_parts(user, file_id, data: bytes, part_numbers, part_size=PART_SIZE) -> list:
+    chunks = {n: data[(n - 1) * part_size: n * part_size] for n in part_numbers}
+    signed = multipart_upload_service.sign_upload_parts(user, file_id, [
+        {'part_number': n, 'checksum_sha256': _checksum(chunk)} for n, chunk in chunks.items()
+    ])
+    return [
+        {'part_number': p['part_number'], 'etag': _put_part(p, chunks[p['part_number']]),
+         'checksum_sha256': _checksum(chunks[p['part_number']])}
+        for p in signed.part_urls
+    ]
+
+
+# ==========================================
+# PLAN / VERIFY (không cần DB)
+# ==========================================
+
+def test_plan_parts_grows_part_size_to_stay_under_s3_part_limit(settings):
+    settings.MULTIPART_PART_SIZE_MB = 64
+
+    assert multipart_upload_service.plan_parts(200 * MB) == (64 * MB, 4)
+
+    huge = 1024 * 1024 * MB  # 1 TB
+    part_size, part_count = multipart_upload_service.plan_parts(huge)
+    assert part_count <= multipart_upload_service.MAX_PARTS
+    assert part_size * part_count >= huge
+
+
+def test_verify_parts_reports_missing_and_corrupted_parts():
+    file_size = 2 * PART_SIZE + 10
+    uploaded = {
+        1: {'PartNumber': 1, 'ETag': '"aaa"', 'Size': PART_SIZE},
+        2: {'PartNumber': 2, 'ETag': '"bbb"', 'Size': PART_SIZE - 1},   # Bị cắt cụt
+    }
+    claimed = [
+        {'part_number': 1, 'etag': 'aaa', 'checksum_sha256': 'x'},
+        {'part_number': 2, 'etag': 'bbb', 'checksum_sha256': 'y'},
+        {'part_number': 3, 'etag': 'ccc', 'checksum_sha256': 'z'},
+    ]
+
+    missing, corrupted = multipart_upload_service.verify_parts(uploaded, claimed, PART_SIZE, file_size)
+
+    assert missing == [3]
+    assert corrupted == [2]
+
+
+# ==========================================
+# FLOW (S3 giả lập + DB)
+# ==========================================
+
+def test_parallel_parts_resume_and_complete(s3, uploader):
+    data = _payload(2 * PART_SIZE + 123)
+    upload = _initiate(uploader, len(data))
+    assert (upload.part_size, upload.part_count) == (PART_SIZE, 3)
+
+    # Phiên 1: Upload part 3 và 1 (không theo thứ tự) rồi "mất kết nối"
+    done = _upload_parts(uploader, upload.file_id, data, [3, 1])
+
+    # Resume: Server báo lại part đã có / còn thiếu
+    status = multipart_upload_service.get_multipart_upload(uploader, upload.file_id)
+    assert status.missing_parts == [2]
+    assert [p['part_number'] for p in status.uploaded_parts] == [1, 3]
+
+    done += _upload_parts(uploader, upload.file_id, data, status.missing_parts)
+    file_domain = multipart_upload_service.complete_multipart_upload(uploader, upload.file_id, done)
+
+    file_obj = UploadedFile.objects.get(pk=upload.file_id)
+    assert file_domain.file_size == len(data)
+    assert file_obj.multipart_upload_id is None
+
+    body = s3.get_object(Bucket=BUCKET, Key=file_obj.file.name)['Body'].read()
+    assert hashlib.sha256(body).digest() == hashlib.sha256(data).digest()
+
+    # Complete lần 2 (client retry) -> Idempotent
+    again = multipart_upload_service.complete_multipart_upload(uploader, upload.file_id, done)
+    assert again.file_size == len(data)
+
+
+def test_complete_rejects_missing_and_mismatched_parts(s3, uploader):
+    data = _payload(PART_SIZE + 1)
+    upload = _initiate(uploader, len(data))
+    done = _upload_parts(uploader, upload.file_id, data, [1])
+
+    with pytest.raises(DomainError, match=r"thiếu: \[2\]"):
+        multipart_upload_service.complete_multipart_upload(uploader, upload.file_id, done)
+
+    done += _upload_parts(uploader, upload.file_id, data, [2])
+    tampered = [dict(p, etag='0' * 32) if p['part_number'] == 1 else p for p in done]
+    with pytest.raises(DomainError, match=r"kích thước: \[1\]"):
+        multipart_upload_service.complete_multipart_upload(uploader, upload.file_id, tampered)
+
+    assert UploadedFile.objects.get(pk=upload.file_id).multipart_upload_id
+
+
+def test_sign_parts_validates_range_and_checksum(s3, uploader):
+    upload = _initiate(uploader, PART_SIZE)
+
+    with pytest.raises(DomainError):
+        multipart_upload_service.sign_upload_parts(uploader, upload.file_id, [
+            {'part_number': 2, 'checksum_sha256': _checksum(b'x')}
+        ])
+    with pytest.raises(DomainError):
+        multipart_upload_service.sign_upload_parts(uploader, upload.file_id, [
+            {'part_number': 1, 'checksum_sha256': 'not-a-checksum'}
+        ])
+
+
+def test_only_owner_can_touch_upload_and_abort_cleans_up(s3, uploader):
+    upload = _initiate(uploader, PART_SIZE)
+    stranger = UserFactory()
+
+    with pytest.raises(PermissionDenied):
+        multipart_upload_service.get_multipart_upload(stranger, upload.file_id)
+
+    multipart_upload_service.abort_multipart_upload(uploader, upload.file_id)
+
+    assert not UploadedFile.objects.filter(pk=upload.file_id).exists()
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+
+
+def test_initiate_rejects_files_over_multipart_limit(s3, uploader, settings):
+    settings.MAX_MULTIPART_FILE_SIZE_BYTES = 10 * MB
+
+    with pytest.raises(DomainError):
+        _initiate(uploader, 10 * MB + 1)
+    assert not UploadedFile.objects.filter(uploaded_by=uploader).exists()
+
+
+def test_promotion_copy_uses_multipart_copy_for_large_files(s3):
+    # File lớn hơn 1 part -> UploadPartCopy (CopyObject đơn lẻ bị S3 giới hạn 5 GB)
+    data = _payload(2 * PART_SIZE + 123)
+    s3.put_object(Bucket=BUCKET, Key='tmp/lecture.mp4', Body=data)
+
+    cloud_service.s3_copy_object('tmp/lecture.mp4', 'private/courses/c/lecture.mp4', is_public=False)
+
+    copied = s3.get_object(Bucket=BUCKET, Key='private/courses/c/lecture.mp4')
+    assert copied['Body'].read() == data
+    assert copied['ETag'].strip('"').endswith('-3')
+    assert 'Contents' not in s3.list_objects_v2(Bucket=BUCKET, Prefix='tmp/')
+
+
+def _age(file_id, days: int) -> None:
+    UploadedFile.objects.filter(pk=file_id).update(uploaded_at=timezone.now() - timedelta(days=days))
+
+
+def _open_upload_ids(s3) -> set:
+    return {u['UploadId'] for u in s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', [])}
+
+
+def test_cleanup_keeps_resumable_upload_and_aborts_abandoned_one(s3, uploader):
+    data = _payload(PART_SIZE + 1)
+    resuming = _initiate(uploader, len(data))
+    abandoned = _initiate(uploader, len(data))
+    _upload_parts(uploader, abandoned.file_id, data, [1])
+
+    _age(resuming.file_id, 2)    # Quá TTL staging thường (1 ngày) nhưng vẫn đang resume
+    _age(abandoned.file_id, multipart_upload_service.ABANDONED_UPLOAD_DAYS + 1)
+    abandoned_upload_id = UploadedFile.objects.get(pk=abandoned.file_id).multipart_upload_id
+
+    call_command('cleanup_files', days=1, min_age_hours=-1)
+
+    assert not UploadedFile.objects.filter(pk=abandoned.file_id).exists()
+    assert abandoned_upload_id not in _open_upload_ids(s3)
+
+    # Phiên còn mở vẫn resume + complete được
+    still_open = UploadedFile.objects.get(pk=resuming.file_id)
+    assert still_open.multipart_upload_id in _open_upload_ids(s3)
+    done = _upload_parts(uploader, resuming.file_id, data, [1, 2])
+    assert multipart_upload_service.complete_multipart_upload(uploader, resuming.file_id, done).file_size == len(data)
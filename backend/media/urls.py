@@ -1,6 +1,9 @@
 from django.urls import path
 
-from media.api.views.file_view import FileUploadInitView, FileUploadConfirmView, PublicDownloadFileView, ListAllFilesView, FileDetailView
+from media.api.views.file_view import (
+    FileUploadInitView, FileUploadConfirmView, PublicDownloadFileView, ListAllFilesView, FileDetailView,
+    MultipartUploadInitView, MultipartUploadDetailView, MultipartUploadPartsView, MultipartUploadCompleteView
+)
 from media.api.views.cloud_view import CloudFrontCookieView
 
 
@@ -9,6 +12,10 @@ urlpatterns = [
     # Public
     path('upload/init/', FileUploadInitView.as_view(), name='file-upload'),
     path('upload/confirm/<uuid:file_id>/', FileUploadConfirmView.as_view(), name='file-upload-confirm'), 
+    path('upload/multipart/', MultipartUploadInitView.as_view(), name='file-multipart-init'),
+    path('upload/multipart/<uuid:file_id>/', MultipartUploadDetailView.as_view(), name='file-multipart-detail'),
+    path('upload/multipart/<uuid:file_id>/parts/', MultipartUploadPartsView.as_view(), name='file-multipart-parts'),
+    path('upload/multipart/<uuid:file_id>/complete/', MultipartUploadCompleteView.as_view(), name='file-multipart-complete'),
     path('files/<uuid:file_id>/', PublicDownloadFileView.as_view(), name='file-download'),
 
     path('cookies/', CloudFrontCookieView.as_view(), name='cookies'),
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Any, Dict
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from datetime import datetime
 from dataclasses import dataclass
 from uuid import UUID
@@ -16,6 +16,14 @@ class BlockHeartbeatInput(BaseModel):
     time_spent_add: int = 0 # Cộng dồn thời gian học (giây)
 
 
+class BlockHeartbeatBatchItemInput(BlockHeartbeatInput):
+    block_id: UUID
+
+
+class BlockHeartbeatBatchInput(BaseModel):
+    beats: List[BlockHeartbeatBatchItemInput]
+
+
 # class BlockProgressBaseOutput(BaseModel):
 #     model_config = ConfigDict(from_attributes=True)
 #     block_id: UUID
@@ -36,6 +36,19 @@ class QuestionContentOutput(BaseModel):
     submission_result: Optional[Dict[str, Any]] = None
 
 
+class AttemptQuestionSetOutput(BaseModel):
+    """
+    DTO trả về toàn bộ câu hỏi của attempt (hoặc 1 cửa sổ offset/limit)
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    attempt_id: uuid.UUID
+    status: str
+    total: int
+    offset: int
+    items: List[QuestionContentOutput]
+
+
 class QuizItemResultOutput(BaseModel):
     """ 
     DTO Output trả về cho Client.
@@ -97,3 +97,29 @@ class QuizAttemptResultOutput(BaseModel):
 
     items: List[QuizItemResultOutput] = []
 
+
+
+class RegradeJobOutput(BaseModel):
+    """
+    DTO trạng thái job chấm lại toàn bộ bài thi (Instructor).
+    Frontend poll endpoint này để vẽ progress bar + ETA.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    job_id: str
+    quiz_id: str
+    status: str                 # 'pending', 'running', 'done', 'failed'
+
+    total_attempts: int
+    processed_attempts: int
+    processed_answers: int
+    changed_answers: int
+    chunks_total: int
+    chunks_done: int
+    chunks_failed: int = 0
+
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    percent: float
+    eta_seconds: Optional[int] = None
+    error: Optional[str] = None
@@ -0,0 +1,7 @@
+from core.api.mixins import ObjectLookup
+from progress.models import QuizAttempt
+
+
+
+# Check quyền attempt chỉ cần user_id/quiz_id -> Không load questions_order (JSON lớn)
+ATTEMPT_LOOKUP = ObjectLookup(QuizAttempt, only=('id', 'user', 'quiz'))
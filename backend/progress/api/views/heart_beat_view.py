@@ -7,12 +7,12 @@ from rest_framework.exceptions import ValidationError as DRFValidationError
 from pydantic import ValidationError as PydanticValidationError
 import logging
 
-from core.api.mixins import RoleBasedOutputMixin, AutoPermissionCheckMixin
+from core.api.mixins import RoleBasedOutputMixin, AutoPermissionCheckMixin, ObjectLookup
 from core.api.permissions import CanViewCourseContent
 from progress.services import course_tracking_service
-from progress.api.dtos.heart_beat_dto import BlockHeartbeatInput, BlockProgressPublicOutput, BlockProgressAdminOutput, ResetProgressOutput, CourseProgressPublicOutput
+from progress.api.dtos.heart_beat_dto import BlockHeartbeatInput, BlockHeartbeatBatchInput, BlockProgressPublicOutput, BlockProgressAdminOutput, ResetProgressOutput, CourseProgressPublicOutput
 from progress.api.dtos.syllabus_dto import CourseSyllabusOutput
-from progress.serializers import BlockHeartbeatSerializer, BlockCompletionInputSerializer
+from progress.serializers import BlockHeartbeatSerializer, BlockHeartbeatBatchSerializer, BlockCompletionInputSerializer
 from content.models import ContentBlock, Course, Enrollment
 
 
@@ -29,7 +29,8 @@ class BlockInteractionHeartbeatView(RoleBasedOutputMixin, AutoPermissionCheckMix
     """
     permission_classes = [IsAuthenticated, CanViewCourseContent] 
 
-    permission_lookup = {'block_id': ContentBlock}
+    # Load block kèm Lesson -> Module -> Course trong 1 query: Dùng cho cả check quyền lẫn service
+    permission_lookup = {'block_id': ObjectLookup(ContentBlock, select_related=('lesson__module__course',))}
 
     output_dto_public = BlockProgressPublicOutput
     output_dto_admin = BlockProgressAdminOutput
@@ -48,7 +49,8 @@ class BlockInteractionHeartbeatView(RoleBasedOutputMixin, AutoPermissionCheckMix
             # Gọi service lấy dữ liệu
             user_block_progress_domain = self.interaction_service.get_interaction_status(
                 user=request.user, 
-                block_id=block_id
+                block_id=block_id,
+                block=self.contentblock
             )
             return Response({"instance": user_block_progress_domain}, status=status.HTTP_200_OK)
 
@@ -85,7 +87,8 @@ class BlockInteractionHeartbeatView(RoleBasedOutputMixin, AutoPermissionCheckMix
             user_block_progress_domain = self.interaction_service.sync_heartbeat(
                 user=request.user,
                 block_id=block_id,
-                data=dto.model_dump()
+                data=dto.model_dump(),
+                block=self.contentblock
             )
             
             # Return 200 OK rỗng để tiết kiệm băng thông (Heartbeat cần nhẹ)
@@ -111,6 +114,87 @@ class BlockInteractionHeartbeatView(RoleBasedOutputMixin, AutoPermissionCheckMix
             return Response({"detail": f"Lỗi máy chủ khi đồng bộ tiến độ - {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# ==========================================
+# BULK HEARTBEAT
+# ==========================================
+class BlockInteractionHeartbeatBatchView(APIView):
+    """
+    POST /tracking/heartbeat/blocks/batch/
+        -> Gửi nhiều heartbeat (nhiều block / beat offline gửi bù) trong 1 request.
+
+    Quyền được check 1 lần cho mỗi khóa học có trong batch (thay vì 1 lần/block).
+    """
+    permission_classes = [IsAuthenticated, CanViewCourseContent]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interaction_service = course_tracking_service
+
+    def post(self, request, *args, **kwargs):
+        """
+        Payload mẫu:
+        {
+            "beats": [
+                {"block_id": "...", "time_spent_add": 30, "interaction_data": {"video_timestamp": 145.5}},
+                {"block_id": "...", "time_spent_add": 30, "interaction_data": {"read_complete": true}}
+            ]
+        }
+        """
+        serializer = BlockHeartbeatBatchSerializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+            validated_data = serializer.validated_data
+        except DRFValidationError:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            dto = BlockHeartbeatBatchInput(**validated_data)
+            beats = [beat.model_dump() for beat in dto.beats]
+        except PydanticValidationError as e:
+            return Response({"detail": f"Dữ liệu input không hợp lệ: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 1. Lấy toàn bộ block trong 1 query
+        blocks = self.interaction_service.get_blocks_for_heartbeat([beat['block_id'] for beat in beats])
+
+        # 2. Check quyền 1 lần cho mỗi khóa học (thay vì AutoPermissionCheckMixin cho từng block)
+        # Fail -> DRF tự raise 403 cho cả batch
+        courses = {block.lesson.module.course_id: block.lesson.module.course for block in blocks.values()}
+        for course in courses.values():
+            self.check_object_permissions(request, course)
+
+        try:
+            # 3. Ghi nhận toàn bộ beat trong 1 transaction
+            progress_domains = self.interaction_service.sync_heartbeat_batch(
+                user=request.user,
+                blocks=blocks,
+                beats=beats
+            )
+
+            return Response({
+                "status": "synced",
+                "results": [
+                    {
+                        "block_id": str(domain.block_id),
+                        "is_completed": domain.is_completed,
+                        "progress": domain.progress_percentage,
+                    }
+                    for domain in progress_domains
+                ],
+                # Block đã bị xóa -> Client bỏ beat khỏi hàng đợi
+                "skipped": sorted({str(beat['block_id']) for beat in beats if beat['block_id'] not in blocks}),
+            }, status=status.HTTP_200_OK)
+
+        except PermissionError:
+            return Response({"detail": "Chưa ghi danh."}, status=403)
+
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as e:
+            logger.error(f"Lỗi trong BlockInteractionHeartbeatBatchView (POST): {e}", exc_info=True)
+            return Response({"detail": f"Lỗi máy chủ khi đồng bộ tiến độ - {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # ==========================================
 # RESUME COURSE
 # ==========================================
@@ -12,14 +12,63 @@ from quiz.models import Quiz, Question
 from progress.services import quiz_attempt_service, question_attempt_service
 from progress.serializers import StartQuizInputSerializer
 from progress.api.dtos.quiz_attempt_dto import QuizAttemptInfoOutput
-from progress.api.dtos.question_attempt_dto import QuestionSubmissionInput, QuestionContentOutput, QuizItemResultOutput
+from progress.api.dtos.question_attempt_dto import QuestionSubmissionInput, QuestionContentOutput, QuizItemResultOutput, AttemptQuestionSetOutput
 from progress.models import QuizAttempt
+from progress.api.lookups import ATTEMPT_LOOKUP
 from progress.serializers import QuestionAnswerInputSerializer
 
 
 
 logger = logging.getLogger(__name__)
 
+class AttemptQuestionListView(RoleBasedOutputMixin, AutoPermissionCheckMixin, APIView):
+    """
+    GET attempts/<attempt_id>/questions/?offset=0&limit=20
+    Chức năng: Lấy toàn bộ câu hỏi của bài làm (hoặc 1 cửa sổ) trong 1 request cho exam player.
+    Hỗ trợ conditional GET: Gửi If-None-Match = ETag lần trước -> 304 nếu không có gì thay đổi.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAttemptOwner]
+    permission_lookup = {'attempt_id': ATTEMPT_LOOKUP}
+
+    output_dto_public = AttemptQuestionSetOutput
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.service = question_attempt_service
+
+    def get(self, request, attempt_id: uuid.UUID, *args, **kwargs):
+        try:
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+            limit = request.query_params.get('limit')
+            limit = max(int(limit), 1) if limit is not None else None
+        except (TypeError, ValueError):
+            return Response({"detail": "offset/limit phải là số nguyên."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            question_set = self.service.get_attempt_questions(
+                attempt_id=attempt_id,
+                user=request.user,
+                offset=offset,
+                limit=limit,
+                if_none_match=request.headers.get('If-None-Match')
+            )
+        except DomainError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Lỗi lấy bộ câu hỏi của attempt: {e}", exc_info=True)
+            return Response({"detail": "Lỗi hệ thống."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if question_set.not_modified:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({"instance": question_set}, status=status.HTTP_200_OK)
+
+        response['ETag'] = question_set.etag
+        # Nội dung riêng của từng học viên: Không cho proxy/CDN cache chung
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
 class AttemptQuestionDetailView(RoleBasedOutputMixin, AutoPermissionCheckMixin, APIView):
     """
     GET attempts/<attempt_id>/questions/<question_id>/
@@ -28,13 +77,13 @@ class AttemptQuestionDetailView(RoleBasedOutputMixin, AutoPermissionCheckMixin,
     permission_classes = [permissions.IsAuthenticated, IsAttemptOwner]
     
     # Ở đây lookup theo attempt, cần check user sở hữu attempt đó (AutoPermissionCheckMixin lo hoặc view tự check)
-    permission_lookup = {'attempt_id': QuizAttempt} 
+    permission_lookup = {'attempt_id': ATTEMPT_LOOKUP} 
 
     output_dto_public = QuestionContentOutput
     output_dto_instructor = QuestionContentOutput
     output_dto_admin = QuestionContentOutput
 
-    permission_lookup = {'attempt_id': QuizAttempt}
+    permission_lookup = {'attempt_id': ATTEMPT_LOOKUP}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -62,7 +111,7 @@ class AttemptQuestionSaveDraftView(RoleBasedOutputMixin, AutoPermissionCheckMixi
     permission_classes = [permissions.IsAuthenticated, IsAttemptOwner]
     
     # AutoPermissionCheckMixin sẽ check user có sở hữu attempt_id không
-    permission_lookup = {'attempt_id': QuizAttempt} 
+    permission_lookup = {'attempt_id': ATTEMPT_LOOKUP} 
 
     # Autosave thường không cần Output DTO phức tạp, chỉ cần báo thành công
     # Nhưng nếu cần trả về data mới nhất, có thể dùng lại Serializer nào đó
@@ -118,7 +167,7 @@ class AttemptQuestionSubmitView(RoleBasedOutputMixin, AutoPermissionCheckMixin,
     Chức năng: Nộp bài một câu hỏi -> Chấm điểm -> Trả về kết quả.
     """
     permission_classes = [permissions.IsAuthenticated, IsAttemptOwner]
-    permission_lookup = {'attempt_id': QuizAttempt}
+    permission_lookup = {'attempt_id': ATTEMPT_LOOKUP}
 
     # Định nghĩa Output DTO để Mixin tự động serialize domain trả về
     output_dto_public = QuizItemResultOutput
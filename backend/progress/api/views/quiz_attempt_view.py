@@ -6,13 +6,14 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
 from core.api.mixins import RoleBasedOutputMixin, AutoPermissionCheckMixin
-from core.api.permissions import CanViewCourseContent, IsAttemptOwner
+from core.api.permissions import CanViewCourseContent, IsAttemptOwner, IsQuizOwner
 from core.exceptions import DomainError
 from quiz.models import Quiz
-from progress.services import quiz_attempt_service, question_attempt_service
+from progress.services import quiz_attempt_service, question_attempt_service, quiz_regrade_service
 from progress.serializers import StartQuizInputSerializer
-from progress.api.dtos.quiz_attempt_dto import QuizAttemptInfoOutput, QuizAttemptResultOutput
+from progress.api.dtos.quiz_attempt_dto import QuizAttemptInfoOutput, QuizAttemptResultOutput, RegradeJobOutput
 from progress.models import QuizAttempt
+from progress.api.lookups import ATTEMPT_LOOKUP
 
 
 
@@ -62,7 +63,7 @@ class QuizAttemptFinishView(RoleBasedOutputMixin, AutoPermissionCheckMixin, APIV
     permission_classes = [permissions.IsAuthenticated, IsAttemptOwner]
     
     # AutoPermissionCheckMixin check quyền sở hữu attempt
-    permission_lookup = {'attempt_id': QuizAttempt}
+    permission_lookup = {'attempt_id': ATTEMPT_LOOKUP}
 
     # Định nghĩa Output DTO để Mixin tự động map từ Domain sang JSON
     output_dto_public = QuizAttemptResultOutput
@@ -99,3 +100,39 @@ class QuizAttemptFinishView(RoleBasedOutputMixin, AutoPermissionCheckMixin, APIV
             return Response({"detail": f"Lỗi hệ thống khi nộp bài - {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class InstructorQuizRegradeView(RoleBasedOutputMixin, AutoPermissionCheckMixin, APIView):
+    """
+    POST instructor/quizzes/<quiz_id>/regrade/ -> Kích hoạt job chấm lại toàn bộ bài đã nộp (chạy ngầm).
+    GET  instructor/quizzes/<quiz_id>/regrade/ -> Trạng thái job gần nhất (tiến độ + ETA).
+    """
+    permission_classes = [permissions.IsAuthenticated, IsQuizOwner]
+
+    permission_lookup = {'quiz_id': Quiz}
+
+    output_dto_public = RegradeJobOutput
+    output_dto_admin = RegradeJobOutput
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.service = quiz_attempt_service
+        self.regrade_service = quiz_regrade_service
+
+    def post(self, request, quiz_id: uuid.UUID, *args, **kwargs):
+        try:
+            job_domain = self.service.regrade_all_attempts_in_quiz(quiz_id)
+            return Response({"instance": job_domain}, status=status.HTTP_202_ACCEPTED)
+        except DomainError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error starting regrade for quiz {quiz_id}: {e}", exc_info=True)
+            return Response({"detail": f"Lỗi hệ thống - {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def get(self, request, quiz_id: uuid.UUID, *args, **kwargs):
+        try:
+            job_domain = self.regrade_service.get_latest_job(quiz_id)
+            if not job_domain:
+                return Response({"detail": "Chưa có job chấm lại nào cho bài này."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"instance": job_domain}, status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"Error reading regrade job for quiz {quiz_id}: {e}", exc_info=True)
+            return Response({"detail": f"Lỗi hệ thống - {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
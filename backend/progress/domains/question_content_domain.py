@@ -18,4 +18,17 @@ class QuestionContentDomain:
 
     current_answer: dict  # Chứa answer_data (ví dụ: {"selected_ids": [...]})
     is_flagged: bool # Trạng thái cắm cờ
-    submission_result: Optional[dict]
\ No newline at end of file
+    submission_result: Optional[dict]
+
+@dataclass
+class AttemptQuestionSetDomain:
+    """Bộ câu hỏi của 1 attempt (toàn bộ hoặc 1 cửa sổ theo questions_order) trả về trong 1 request"""
+    attempt_id: uuid.UUID
+    status: str
+    total: int              # Tổng số câu của attempt
+    offset: int
+    etag: str
+    items: List[QuestionContentDomain] = field(default_factory=list)
+
+    # Client đã có bản mới nhất (If-None-Match khớp) -> View trả 304
+    not_modified: bool = False
@@ -0,0 +1,69 @@
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+from django.utils import timezone
+
+
+
+@dataclass
+class RegradeJobDomain:
+    """Trạng thái 1 job chấm lại toàn bộ bài thi của Quiz (lưu trong Redis)"""
+    job_id: str
+    quiz_id: str
+    status: str                 # 'pending', 'running', 'done', 'failed'
+
+    total_attempts: int
+    processed_attempts: int
+    processed_answers: int
+    changed_answers: int
+    chunks_total: int
+    chunks_done: int
+    chunks_failed: int          # Chunk hỏng hẳn (hết lượt retry) -> Job kết thúc với status 'failed'
+
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    percent: float
+    eta_seconds: Optional[int]
+    error: Optional[str] = None
+
+    @staticmethod
+    def _to_datetime(value) -> Optional[datetime]:
+        if not value:
+            return None
+        return datetime.fromtimestamp(float(value), tz=timezone.get_current_timezone())
+
+    @classmethod
+    def from_hash(cls, job_id: str, data: Dict[str, Any]) -> "RegradeJobDomain":
+        """Map từ Redis Hash (đã decode) sang Domain, tính % và ETA theo tốc độ hiện tại."""
+        total = int(data.get('total_attempts', 0))
+        processed = int(data.get('processed_attempts', 0))
+        status = data.get('status', 'pending')
+        started_at = cls._to_datetime(data.get('started_at'))
+        finished_at = cls._to_datetime(data.get('finished_at'))
+
+        percent = round(processed * 100.0 / total, 1) if total else (100.0 if status == 'done' else 0.0)
+
+        eta_seconds = None
+        if status == 'running' and started_at and processed and total > processed:
+            elapsed = (timezone.now() - started_at).total_seconds()
+            eta_seconds = int(elapsed / processed * (total - processed))
+        elif status == 'done':
+            eta_seconds = 0
+
+        return cls(
+            job_id=job_id,
+            quiz_id=data.get('quiz_id', ''),
+            status=status,
+            total_attempts=total,
+            processed_attempts=processed,
+            processed_answers=int(data.get('processed_answers', 0)),
+            changed_answers=int(data.get('changed_answers', 0)),
+            chunks_total=int(data.get('chunks_total', 0)),
+            chunks_done=int(data.get('chunks_done', 0)),
+            chunks_failed=int(data.get('chunks_failed', 0)),
+            started_at=started_at,
+            finished_at=finished_at,
+            percent=percent,
+            eta_seconds=eta_seconds,
+            error=data.get('error') or None,
+        )
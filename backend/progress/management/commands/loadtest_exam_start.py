@@ -0,0 +1,112 @@
+import time
+import uuid
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from custom_account.models import UserModel
+from quiz.models import Quiz
+from quiz.services import answer_key_service
+from progress.models import QuizAttempt
+from progress.services.quiz_attempt_service import start_or_resume_attempt
+
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test: Mô phỏng N học viên cùng bấm "Bắt đầu làm bài" lúc mở đề '
+        '(start_or_resume_attempt chạy song song), báo cáo độ trễ p50/p99. '
+        'CHỈ chạy trên môi trường dev/staging: lệnh tạo user tạm và xóa sau khi chạy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', required=True, help='ID của Quiz dùng để test')
+        parser.add_argument('--users', type=int, default=200, help='Số học viên ảo (mặc định 200)')
+        parser.add_argument('--concurrency', type=int, default=50, help='Số luồng gọi đồng thời (mặc định 50)')
+        parser.add_argument('--course', default=None, help='course_id truyền vào start_or_resume_attempt (tùy chọn)')
+        parser.add_argument('--cold', action='store_true', help='Bump version trước khi chạy -> request đầu phải build lại exam context')
+        parser.add_argument('--keep', action='store_true', help='Giữ lại user/attempt tạm sau khi chạy')
+
+    def _create_users(self, run_id: str, count: int):
+        users = [
+            UserModel(
+                username=f'loadtest_{run_id}_{i}',
+                email=f'loadtest_{run_id}_{i}@loadtest.local',
+                role='student',
+            )
+            for i in range(count)
+        ]
+        for user in users:
+            user.set_unusable_password()
+        return UserModel.objects.bulk_create(users, batch_size=500)
+
+    def handle(self, *args, **options):
+        quiz_id = uuid.UUID(options['quiz'])
+        if not Quiz.objects.filter(id=quiz_id).exists():
+            raise CommandError(f"Quiz {quiz_id} không tồn tại.")
+
+        course_id = uuid.UUID(options['course']) if options['course'] else None
+        run_id = uuid.uuid4().hex[:8]
+
+        self.stdout.write(self.style.WARNING(f"--- CHUẨN BỊ {options['users']} USER ẢO (run {run_id}) ---"))
+        users = self._create_users(run_id, options['users'])
+
+        if options['cold']:
+            answer_key_service.bump_version(quiz_id)
+
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        start_gate = threading.Event()
+
+        def start_one(user):
+            # Tất cả luồng chờ cùng 1 tín hiệu -> Dồn request như lúc mở đề
+            start_gate.wait()
+            started = time.perf_counter()
+            try:
+                start_or_resume_attempt(quiz_id=quiz_id, user=user, course_id=course_id)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed_ms)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            finally:
+                connection.close()
+
+        self.stdout.write(self.style.WARNING(f"--- CHẠY {options['users']} REQUEST, {options['concurrency']} LUỒNG ---"))
+        wall_started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                futures = [executor.submit(start_one, user) for user in users]
+                start_gate.set()
+                for future in futures:
+                    future.result()
+            wall_seconds = time.perf_counter() - wall_started
+
+            self._report(latencies, errors, wall_seconds)
+        finally:
+            if not options['keep']:
+                user_ids = [u.id for u in users]
+                QuizAttempt.objects.filter(user_id__in=user_ids).delete()
+                UserModel.objects.filter(id__in=user_ids).delete()
+                self.stdout.write("🧹 Đã xóa user/attempt tạm.")
+
+    def _report(self, latencies, errors, wall_seconds: float):
+        self.stdout.write(self.style.WARNING("--- KẾT QUẢ ---"))
+        self.stdout.write(f"Thành công: {len(latencies)} | Lỗi: {len(errors)} | Thời gian: {wall_seconds:.2f}s")
+
+        if len(latencies) >= 2:
+            q = statistics.quantiles(latencies, n=100, method='inclusive')
+            self.stdout.write(
+                f"p50: {q[49]:.1f}ms | p90: {q[89]:.1f}ms | p99: {q[98]:.1f}ms | max: {max(latencies):.1f}ms"
+            )
+            self.stdout.write(f"Throughput: {len(latencies) / wall_seconds:.1f} req/s")
+
+        for message in sorted(set(errors))[:5]:
+            self.stdout.write(self.style.ERROR(f"❌ {message}"))
+
+        if not errors:
+            self.stdout.write(self.style.SUCCESS("--- HOÀN TẤT ---"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from content.models import Course
+from progress.services.progress_counter_service import rebuild_course_counters
+
+
+
+class Command(BaseCommand):
+    help = 'Tính lại các counter tiến độ (LessonCompletion, ModuleCompletion, Enrollment) từ bảng gốc'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', action='append', dest='course_ids', help='Chỉ rebuild khóa học này (có thể lặp lại)')
+
+    def handle(self, *args, **options):
+        course_ids = options['course_ids'] or list(Course.objects.values_list('id', flat=True))
+
+        self.stdout.write(self.style.WARNING(f"--- REBUILD COUNTER CHO {len(course_ids)} KHÓA HỌC ---"))
+
+        for course_id in course_ids:
+            try:
+                stats = rebuild_course_counters(course_id)
+                self.stdout.write(
+                    f"✅ {course_id}: {stats['lesson_completions']} lesson, "
+                    f"{stats['module_completions']} module, {stats['enrollments']} enrollment"
+                )
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"❌ {course_id}: {e}"))
+
+        self.stdout.write(self.style.SUCCESS("--- HOÀN TẤT ---"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0005_userblockprogress_last_logged_time_spent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessoncompletion',
+            name='completed_blocks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='modulecompletion',
+            name='completed_lessons',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:20
+
+from django.db import migrations
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_counters(apps, schema_editor):
+    UserBlockProgress = apps.get_model('progress', 'UserBlockProgress')
+    LessonCompletion = apps.get_model('progress', 'LessonCompletion')
+    ModuleCompletion = apps.get_model('progress', 'ModuleCompletion')
+
+    # 1. LessonCompletion.completed_blocks: Đếm block đã xong theo (enrollment, lesson)
+    done_blocks = UserBlockProgress.objects.filter(
+        enrollment_id=OuterRef('enrollment_id'), block__lesson_id=OuterRef('lesson_id'), is_completed=True
+    ).order_by().values('enrollment_id').annotate(c=Count('pk')).values('c')
+    LessonCompletion.objects.update(completed_blocks=Coalesce(Subquery(done_blocks), Value(0)))
+    LessonCompletion.objects.filter(
+        is_completed=False, lesson__cached_total_blocks__gt=0, completed_blocks__gte=F('lesson__cached_total_blocks')
+    ).update(is_completed=True)
+
+    # 2. ModuleCompletion: Trước đây chỉ có dòng khi xong cả module -> Tạo dòng cho module đang học dở,
+    # nếu không counter +1 của calculate_aggregation sẽ bắt đầu từ 0 và không bao giờ đủ
+    pairs = LessonCompletion.objects.filter(
+        is_completed=True, enrollment__isnull=False, lesson__isnull=False
+    ).order_by().values_list('enrollment_id', 'lesson__module_id').distinct()
+    batch = []
+    for enrollment_id, module_id in pairs.iterator(chunk_size=BATCH_SIZE):
+        batch.append(ModuleCompletion(enrollment_id=enrollment_id, module_id=module_id, is_completed=False))
+        if len(batch) >= BATCH_SIZE:
+            ModuleCompletion.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        ModuleCompletion.objects.bulk_create(batch, ignore_conflicts=True)
+
+    # 3. ModuleCompletion.completed_lessons: Đếm lesson đã xong theo (enrollment, module)
+    done_lessons = LessonCompletion.objects.filter(
+        enrollment_id=OuterRef('enrollment_id'), lesson__module_id=OuterRef('module_id'), is_completed=True
+    ).order_by().values('enrollment_id').annotate(c=Count('pk')).values('c')
+    ModuleCompletion.objects.update(completed_lessons=Coalesce(Subquery(done_lessons), Value(0)))
+    ModuleCompletion.objects.filter(
+        is_completed=False, module__cached_total_lessons__gt=0, completed_lessons__gte=F('module__cached_total_lessons')
+    ).update(is_completed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0006_lessoncompletion_completed_blocks_and_more'),
+        ('content', '0016_lesson_cached_total_blocks_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
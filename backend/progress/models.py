@@ -17,6 +17,9 @@ class ModuleCompletion(models.Model):
     is_completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(auto_now_add=True)
 
+    # Counter: Số lesson đã xong trong module (so với Module.cached_total_lessons)
+    completed_lessons = models.IntegerField(default=0)
+
     class Meta:
         unique_together = ('enrollment', 'module')
 
@@ -24,12 +27,17 @@ class ModuleCompletion(models.Model):
 class LessonCompletion(models.Model):
     """
     CHECKPOINT: Dùng để xử lý logic 'Phải xong Lesson 1 mới mở Lesson 2'.
+    Kiêm luôn bộ đếm block đã xong (completed_blocks) để aggregation không phải COUNT lại.
     """
     enrollment = models.ForeignKey("content.Enrollment", on_delete=models.CASCADE, related_name='completed_lessons', null=True, blank=True)
     lesson = models.ForeignKey("content.Lesson", on_delete=models.CASCADE, null=True, blank=True)
     is_completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(auto_now_add=True)
 
+    # Counter: Số block đã xong trong lesson (so với Lesson.cached_total_blocks).
+    # Row được tạo ngay từ block đầu tiên hoàn thành, is_completed chỉ True khi đủ block.
+    completed_blocks = models.IntegerField(default=0)
+
     class Meta:
         unique_together = ('enrollment', 'lesson')
 
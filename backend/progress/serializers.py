@@ -11,8 +11,19 @@ class BlockHeartbeatSerializer(serializers.Serializer):
     # Validate boolean
     is_completed = serializers.BooleanField(required=False, default=False)
     
-    # Validate số nguyên dương (tránh hack gửi số âm để trừ giờ học)
-    time_spent_add = serializers.IntegerField(required=False, default=0, min_value=0)
+    # Validate số nguyên dương (tránh hack gửi số âm để trừ giờ học), tối đa 5 phút / beat
+    time_spent_add = serializers.IntegerField(required=False, default=0, min_value=0, max_value=300)
+
+
+class BlockHeartbeatBatchItemSerializer(BlockHeartbeatSerializer):
+    block_id = serializers.UUIDField()
+
+
+class BlockHeartbeatBatchSerializer(serializers.Serializer):
+    # Giới hạn số beat/request để 1 transaction không giữ lock quá lâu
+    MAX_BEATS = 200
+
+    beats = BlockHeartbeatBatchItemSerializer(many=True, allow_empty=False, max_length=MAX_BEATS)
 
 
 class BlockCompletionInputSerializer(serializers.Serializer):
@@ -0,0 +1,288 @@
+import json
+import logging
+import uuid
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from progress.models import QuizAttempt, QuestionAnswer
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'progress:draft'
+DIRTY_SET_KEY = f'{KEY_PREFIX}:dirty'   # Set chứa attempt_id còn nháp chưa flush xuống DB
+
+# Nháp sống lâu hơn nhiều so với chu kỳ flush để không mất khi worker chậm
+DRAFT_TTL_SECONDS = 24 * 60 * 60
+
+# Các cột bị reset khi lưu nháp (giống update_or_create cũ): nháp mới làm kết quả chấm cũ mất giá trị
+DRAFT_FIELDS = ['question_type', 'answer_data', 'score', 'is_graded', 'is_correct', 'feedback']
+
+Draft = Tuple[str, dict]   # (question_type, answer_data)
+
+# HDEL field chỉ khi giá trị vẫn là bản đã ghi xuống DB (không xóa nháp mới đến sau đó)
+_DELETE_IF_UNCHANGED_LUA = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+return 1
+"""
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def is_enabled() -> bool:
+    return getattr(settings, 'QUIZ_DRAFT_WRITE_BEHIND', False)
+
+
+def _get_redis():
+    return get_redis_connection('default')
+
+
+def _draft_key(attempt_id) -> str:
+    return f'{KEY_PREFIX}:{attempt_id}'
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _parse(raw: dict) -> Dict[uuid.UUID, Draft]:
+    """Redis hash {question_id: json} -> {UUID: (question_type, answer_data)}"""
+    drafts = {}
+    for field, value in raw.items():
+        data = json.loads(_decode(value))
+        drafts[uuid.UUID(_decode(field))] = (data['question_type'], data['answer_data'])
+    return drafts
+
+
+def _read_drafts(redis_conn, attempt_ids: List[str]) -> Dict[str, dict]:
+    """
+    HGETALL nháp của nhiều attempt trong 1 round trip: {attempt_id: raw hash}.
+    KHÔNG xóa ở đây: Nháp chỉ bị xóa sau khi DB commit (_delete_after_commit)
+    -> Worker chết / rollback giữa chừng thì nháp vẫn nằm nguyên trong Redis.
+    """
+    pipe = redis_conn.pipeline(transaction=False)
+    for attempt_id in attempt_ids:
+        pipe.hgetall(_draft_key(attempt_id))
+
+    return {attempt_id: raw for attempt_id, raw in zip(attempt_ids, pipe.execute()) if raw}
+
+
+def _delete_after_commit(raw_by_attempt: Dict[str, dict]) -> None:
+    """Sau khi commit: Xóa các field đã ghi xuống DB, chỉ khi chưa bị nháp mới hơn ghi đè."""
+    snapshots = {
+        _draft_key(attempt_id): [item for field, value in raw.items() for item in (field, value)]
+        for attempt_id, raw in raw_by_attempt.items()
+    }
+    if snapshots:
+        transaction.on_commit(lambda: _delete_if_unchanged(snapshots))
+
+
+def _delete_if_unchanged(snapshots: Dict[str, list]) -> None:
+    try:
+        pipe = _get_redis().pipeline(transaction=False)
+        for key, snapshot in snapshots.items():
+            pipe.eval(_DELETE_IF_UNCHANGED_LUA, 1, key, *snapshot)
+        pipe.execute()
+    except Exception as e:
+        # Nháp còn sót sẽ được flush lại (câu đã chấm bị bỏ qua) -> Chỉ tốn thêm 1 lần ghi
+        logger.error(f"⚠️ Không dọn được nháp {list(snapshots.keys())}: {e}")
+
+
+def write_drafts(drafts_by_attempt: Dict[str, Dict[uuid.UUID, Draft]]) -> int:
+    """
+    Ghi nháp xuống QuestionAnswer (bulk_update + bulk_create).
+    Câu đã chấm (is_graded) bị bỏ qua: Không bao giờ sửa câu đã nộp.
+    Caller PHẢI đang giữ row lock của các attempt (select_for_update) và attempt còn 'in_progress'.
+    """
+    if not drafts_by_attempt:
+        return 0
+
+    question_ids = {q_id for drafts in drafts_by_attempt.values() for q_id in drafts}
+    existing = {
+        (str(a.attempt_id), a.question_id): a
+        for a in QuestionAnswer.objects.filter(
+            attempt_id__in=list(drafts_by_attempt.keys()),
+            question_id__in=question_ids
+        ).only('id', 'attempt_id', 'question_id', 'is_graded')
+    }
+
+    to_update = []
+    to_create = []
+    for attempt_id, drafts in drafts_by_attempt.items():
+        for question_id, (question_type, answer_data) in drafts.items():
+            answer = existing.get((attempt_id, question_id))
+            if answer and answer.is_graded:
+                continue
+            if not answer:
+                answer = QuestionAnswer(attempt_id=attempt_id, question_id=question_id)
+                to_create.append(answer)
+            else:
+                to_update.append(answer)
+
+            answer.question_type = question_type
+            answer.answer_data = answer_data
+            answer.score = 0.0
+            answer.is_graded = False
+            answer.is_correct = False
+            answer.feedback = None
+
+    if to_update:
+        QuestionAnswer.objects.bulk_update(to_update, DRAFT_FIELDS, batch_size=500)
+    if to_create:
+        # ignore_conflicts: Phòng trường hợp dòng được tạo ngay trước đó bởi luồng không giữ lock
+        QuestionAnswer.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+
+    return len(to_update) + len(to_create)
+
+
+# ==========================================
+# PUBLIC INTERFACE (READ)
+# ==========================================
+
+def get_draft(attempt_id, question_id) -> Optional[dict]:
+    """
+    answer_data nháp mới nhất của 1 câu (chưa flush), None nếu không có.
+    Dùng cho API resume: Dòng QuestionAnswer trong DB có thể trễ tối đa 1 chu kỳ flush.
+    """
+    if not is_enabled():
+        return None
+
+    try:
+        raw = _get_redis().hget(_draft_key(attempt_id), str(question_id))
+    except Exception as e:
+        logger.error(f"⚠️ Draft buffer unavailable: {e}")
+        return None
+
+    return json.loads(_decode(raw))['answer_data'] if raw else None
+
+
+def get_drafts(attempt_id) -> Dict[uuid.UUID, dict]:
+    """Toàn bộ nháp chưa flush của 1 attempt: {question_id: answer_data} (1 lệnh HGETALL)."""
+    if not is_enabled():
+        return {}
+
+    try:
+        raw = _get_redis().hgetall(_draft_key(attempt_id))
+    except Exception as e:
+        logger.error(f"⚠️ Draft buffer unavailable: {e}")
+        return {}
+
+    return {question_id: answer_data for question_id, (_, answer_data) in _parse(raw).items()}
+
+
+# ==========================================
+# PUBLIC INTERFACE (WRITE)
+# ==========================================
+
+def stage(attempt_id, question_id, question_type: str, answer_data: dict) -> None:
+    """
+    Ghi đè nháp của 1 câu vào hash của attempt và đánh dấu attempt 'dirty'.
+    Gõ phím liên tục chỉ ghi đè 1 field trong RAM -> DB nhận 1 lần ghi / chu kỳ flush.
+    """
+    key = _draft_key(attempt_id)
+
+    pipe = _get_redis().pipeline()
+    pipe.hset(key, str(question_id), json.dumps({
+        'question_type': question_type, 'answer_data': answer_data
+    }))
+    pipe.expire(key, DRAFT_TTL_SECONDS)
+    pipe.sadd(DIRTY_SET_KEY, str(attempt_id))
+    pipe.execute()
+
+
+# ==========================================
+# PUBLIC INTERFACE (FLUSH)
+# ==========================================
+
+def flush_attempt(attempt_id) -> int:
+    """
+    Đẩy toàn bộ nháp của 1 attempt xuống DB ngay (gọi từ submit_question / finish_quiz_attempt).
+    Caller PHẢI đang giữ row lock của attempt trong transaction hiện tại.
+    Nháp chỉ bị xóa khỏi Redis SAU KHI commit (và chỉ khi chưa bị ghi đè) -> Rollback không làm mất nháp.
+    """
+    if not is_enabled():
+        return 0
+
+    key = _draft_key(attempt_id)
+    try:
+        raw = _get_redis().hgetall(key)
+    except Exception as e:
+        # Redis lỗi -> save_question_draft cũng đang ghi thẳng DB, chấm trên dữ liệu DB
+        logger.error(f"⚠️ Draft buffer unavailable: {e}")
+        return 0
+    if not raw:
+        return 0
+
+    written = write_drafts({str(attempt_id): _parse(raw)})
+    _delete_after_commit({str(attempt_id): raw})
+    return written
+
+
+def flush(batch_size: int = 200, max_batches: Optional[int] = None) -> int:
+    """
+    Đẩy nháp của các attempt 'dirty' xuống DB theo batch.
+    Mỗi batch: 1 transaction, lock các attempt bằng SKIP LOCKED (không chờ finish/submit đang chạy),
+    attempt đã nộp -> Bỏ nháp. Trả về số dòng đã ghi.
+    """
+    redis_conn = _get_redis()
+    total = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        # SPOP là atomic: 2 worker chạy song song không lấy trùng attempt
+        attempt_ids = [_decode(a) for a in (redis_conn.spop(DIRTY_SET_KEY, batch_size) or [])]
+        if not attempt_ids:
+            break
+
+        try:
+            with transaction.atomic():
+                locked = dict(
+                    QuizAttempt.objects.select_for_update(skip_locked=True)
+                    .filter(id__in=attempt_ids)
+                    .values_list('id', 'status')
+                )
+                locked = {str(k): v for k, v in locked.items()}
+
+                # Attempt đang bị finish/submit giữ lock -> Luồng đó tự flush, trả lại set để chắc chắn.
+                # Attempt đã bị xóa -> Bỏ nháp.
+                not_locked = [a for a in attempt_ids if a not in locked]
+                if not_locked:
+                    busy = [str(a) for a in QuizAttempt.objects.filter(id__in=not_locked).values_list('id', flat=True)]
+                    gone = [a for a in not_locked if a not in busy]
+                    if busy:
+                        redis_conn.sadd(DIRTY_SET_KEY, *busy)
+                    if gone:
+                        redis_conn.delete(*[_draft_key(a) for a in gone])
+
+                # Đọc trước, xóa sau commit. Attempt đã nộp -> Không ghi, nháp bị dọn cùng lúc
+                raw_by_attempt = _read_drafts(redis_conn, list(locked.keys()))
+                open_drafts = {
+                    a: _parse(raw) for a, raw in raw_by_attempt.items() if locked[a] == 'in_progress'
+                }
+                total += write_drafts(open_drafts)
+                _delete_after_commit(raw_by_attempt)
+        except Exception:
+            # Rollback -> on_commit bị hủy, nháp vẫn còn trong Redis: Chỉ cần đánh dấu dirty lại
+            redis_conn.sadd(DIRTY_SET_KEY, *attempt_ids)
+            raise
+
+        batches += 1
+
+    if total:
+        logger.info(f"Draft buffer: flushed {total} answers ({batches} batches) at {timezone.now()}")
+
+    return total
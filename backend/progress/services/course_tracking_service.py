@@ -1,9 +1,10 @@
 import uuid
+import logging
 from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 from django.db.models import F
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 
 from content.models import ContentBlock, Lesson, Module, Enrollment
@@ -15,10 +16,21 @@ from progress.domains.course_card_domain import CourseCardDomain
 from progress.domains.resume_point_domain import ResumePointDomain
 from progress.domains.syllabus_domain import CourseSyllabusDomain, ModuleSyllabusDomain, LessonSyllabusDomain, BlockSyllabusDomain
 from progress.tasks import calculate_aggregation
+from progress.services import heartbeat_buffer_service
+from content.services import course_structure_service
 from analytics.services.log_service import record_activity
 
 
 
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+# Thời gian học tối đa được cộng cho 1 block trong 1 request (1 beat, hoặc tổng các beat cùng block của 1 batch)
+MAX_TIME_SPENT_PER_REQUEST = 300
+
 # ==========================================
 # PUBLIC INTERFACE (HELPER)
 # ==========================================
@@ -74,22 +86,26 @@ def evaluate(block: ContentBlock, interaction_data: dict, current_progress_secon
 # PUBLIC INTERFACE (GET BLOCK INTERACTION) - Lấy tiến độ hiện tại của 1 block
 # ==========================================
 
-def get_interaction_status(user, block_id: str) -> UserBlockProgressDomain:
+def get_interaction_status(user, block_id: str, block: Optional[ContentBlock] = None) -> UserBlockProgressDomain:
+    """
+    block: ContentBlock đã được view load sẵn (AutoPermissionCheckMixin) -> Không query lại.
+    """
     try:
         uuid_obj = uuid.UUID(str(block_id))
     except ValueError:
         raise ValueError("block_id không hợp lệ.")
 
     # 1. Lấy ContentBlock trước (Cần thiết để trả về metadata cho FE)
-    # Dùng select_related nếu ContentBlock có quan hệ cha con để tối ưu
-    try:
-        block = ContentBlock.objects.get(id=uuid_obj)
-    except ContentBlock.DoesNotExist:
-        raise ValueError(f"ContentBlock {block_id} không tồn tại.")
+    if block is None:
+        try:
+            block = ContentBlock.objects.get(id=uuid_obj)
+        except ContentBlock.DoesNotExist:
+            raise ValueError(f"ContentBlock {block_id} không tồn tại.")
 
     # 2. Lấy Progress của User
     try:
         progress = UserBlockProgress.objects.get(user=user, block_id=uuid_obj)
+        progress = heartbeat_buffer_service.get_fresh(progress)
         # Found: Merge data
         return UserBlockProgressDomain.from_model(progress, block)
         
@@ -115,12 +131,9 @@ def get_course_progress(user, course_id: str) -> CourseProgressDomain:
     except Enrollment.DoesNotExist:
         raise PermissionError("User chưa ghi danh khóa học này.")
     
-    # 2. QUERY CẤU TRÚC (Eager Loading cực mạnh)
-    # Lấy Modules -> Lessons -> Blocks chỉ trong 1-2 query
-    modules = Module.objects.filter(course_id=course_uuid).prefetch_related(
-        'lessons', 
-        'lessons__content_blocks' # ContentBlock
-    ).order_by('position')
+    # 2. CẤU TRÚC KHÓA HỌC (Versioned cache: LRU process -> Redis -> DB)
+    # Cây Module -> Lesson -> Block đã được sắp xếp sẵn, chỉ query lại khi nội dung khóa học thay đổi
+    modules = course_structure_service.get_course_structure(course_uuid)
 
     # 3. QUERY TIẾN ĐỘ (Bulk Fetching - Chỉ lấy ID)
     # Thay vì query từng cái, ta lấy 1 list ID đã xong. Set trong Python lookup O(1).
@@ -146,37 +159,32 @@ def get_course_progress(user, course_id: str) -> CourseProgressDomain:
     for module in modules:
         syllabus_lessons = []
         
-        # Sắp xếp lesson (nếu chưa order trong model meta)
-        lessons = sorted(module.lessons.all(), key=lambda x: x.position)
-        
         # Check module completed (Optional: có thể dùng bảng ModuleCompletion nếu muốn chính xác)
         # Ở đây mình tính dynamic dựa trên lesson cho đơn giản
         module_fully_completed = True 
 
-        for lesson in lessons:
-            is_lesson_done = lesson.id in completed_lesson_ids
+        for lesson in module['lessons']:
+            is_lesson_done = lesson['id'] in completed_lesson_ids
             if not is_lesson_done:
                 module_fully_completed = False
             
             # Xử lý Blocks
-            syllabus_blocks = []
-            blocks = sorted(lesson.content_blocks.all(), key=lambda x: x.position)
-            
-            for block in blocks:
-                is_block_done = block.id in completed_block_ids
-                syllabus_blocks.append(BlockSyllabusDomain(
-                    id=block.id,
-                    title=block.title,
-                    type=block.type,
-                    is_completed=is_block_done,
+            syllabus_blocks = [
+                BlockSyllabusDomain(
+                    id=block['id'],
+                    title=block['title'],
+                    type=block['type'],
+                    is_completed=block['id'] in completed_block_ids,
                     is_locked=False, 
-                    duration=block.duration or 0
-                ))
+                    duration=block['duration']
+                )
+                for block in lesson['blocks']
+            ]
 
             # Tạo Lesson Domain
             syllabus_lessons.append(LessonSyllabusDomain(
-                id=lesson.id,
-                title=lesson.title,
+                id=lesson['id'],
+                title=lesson['title'],
                 is_completed=is_lesson_done,
                 is_locked= False,
                 blocks=syllabus_blocks
@@ -189,12 +197,12 @@ def get_course_progress(user, course_id: str) -> CourseProgressDomain:
             # else:
             #     # Nếu lesson này chưa xong -> lesson sau sẽ bị khóa
             #     # Tuy nhiên, lesson hiện tại vẫn phải mở để học
-            #     previous_lesson_completed = False 
+            #     previous_lesson_completed = False
 
         # Tạo Module Domain
         syllabus_modules.append(ModuleSyllabusDomain(
-            id=module.id,
-            title=module.title,
+            id=module['id'],
+            title=module['title'],
             is_completed=module_fully_completed, 
             lessons=syllabus_lessons
         ))
@@ -304,6 +312,7 @@ def get_resume_state(user, course_id: str) -> UserBlockProgressDomain:
         ).first()
         
         if progress:
+            progress = heartbeat_buffer_service.get_fresh(progress)
             return UserBlockProgressDomain.from_model(progress, target_block)
 
     # Ưu tiên 2: Cold Start (Chưa học bài nào hoặc data bị lệch)
@@ -326,14 +335,16 @@ def get_resume_state(user, course_id: str) -> UserBlockProgressDomain:
 # PUBLIC INTERFACE (TRACK) - Ghi nhận tiến độ block
 # ==========================================
 
-def sync_heartbeat(user, block_id: str, data: dict) -> UserBlockProgressDomain :
+def sync_heartbeat(user, block_id: str, data: dict, block: Optional[ContentBlock] = None) -> UserBlockProgressDomain :
     """
     Hàm này xử lý ghi nhận tiến độ từ API Heartbeat.
+    block: ContentBlock đã load sẵn kèm lesson__module__course (AutoPermissionCheckMixin) -> Không query lại.
     """
     # 1. Validation cơ bản & Lấy ContentBlock
     try:
-        block = ContentBlock.objects.select_related('lesson__module__course').get(id=block_id)
-        enrollment = Enrollment.objects.get(user=user, course=block.lesson.module.course)
+        if block is None:
+            block = ContentBlock.objects.select_related('lesson__module__course').get(id=block_id)
+        enrollment = Enrollment.objects.get(user=user, course_id=block.lesson.module.course_id)
         course = block.lesson.module.course
 
     except ContentBlock.DoesNotExist:
@@ -367,14 +378,29 @@ def sync_heartbeat(user, block_id: str, data: dict) -> UserBlockProgressDomain :
     # ---------------------------------------------------------
     # 3. LOGIC CỘNG DỒN TRONG MEMORY (Tránh F expression)
     # ---------------------------------------------------------
-    progress, created = UserBlockProgress.objects.get_or_create(
-        user=user,
-        block=block,
-        enrollment=enrollment,
-        defaults={'is_completed': False, 'time_spent_seconds': 0}
-    )
+    progress, is_buffered = _load_progress(user, block, enrollment)
+
+    has_changes, just_completed = _apply_beat(user, block, enrollment, progress, data, now)
 
-    # 3. Xử lý Logic cộng dồn (Dùng F expression để tránh Race Condition mà không cần Lock)
+    # ---------------------------------------------------------
+    # 6. FINAL SAVE (1 Write Query duy nhất)
+    # ---------------------------------------------------------
+    if has_changes:
+        progress.last_accessed = now
+        _save_progress(progress, is_buffered, just_completed)
+
+    return UserBlockProgressDomain.from_model(progress, block)
+
+
+def _apply_beat(user, block: ContentBlock, enrollment: Enrollment, progress: UserBlockProgress, data: dict, now):
+    """
+    Áp dụng 1 beat lên progress (In-Memory, chưa ghi DB).
+    Dùng chung cho sync_heartbeat và sync_heartbeat_batch.
+    Trả về (has_changes, just_completed).
+    """
+    course_id = block.lesson.module.course_id
+
+    # 3. Xử lý Logic cộng dồn
     time_add = data.get('time_spent_add', 0)
     incoming_interaction = data.get('interaction_data', {})
     has_changes = False
@@ -387,7 +413,7 @@ def sync_heartbeat(user, block_id: str, data: dict) -> UserBlockProgressDomain :
         has_changes = True
 
     # B. Update Time (Giới hạn max 5 phút để tránh hack/bug FE)
-    if 0 < time_add <= 300:
+    if 0 < time_add <= MAX_TIME_SPENT_PER_REQUEST:
         progress.time_spent_seconds += time_add 
         has_changes = True
 
@@ -421,7 +447,7 @@ def sync_heartbeat(user, block_id: str, data: dict) -> UserBlockProgressDomain :
             'action': 'LESSON_COMPLETE',
             'entity_type': 'content_block',
             'entity_id': str(block.id),
-            'course_id': str(course.id),
+            'course_id': str(course_id),
             'is_critical': False # Async
         })
         
@@ -438,8 +464,8 @@ def sync_heartbeat(user, block_id: str, data: dict) -> UserBlockProgressDomain :
         record_activity(user, {
             'action': 'LEARNING_SESSION',
             'entity_type': 'course',
-            'entity_id': str(course.id),
-            'course_id': str(course.id),
+            'entity_id': str(course_id),
+            'course_id': str(course_id),
             'is_critical': False, # Async
             'payload': {
                 'block_id': str(block.id),
@@ -450,14 +476,135 @@ def sync_heartbeat(user, block_id: str, data: dict) -> UserBlockProgressDomain :
         progress.last_logged_time_spent = progress.time_spent_seconds
         has_changes = True
 
-    # ---------------------------------------------------------
-    # 6. FINAL SAVE (1 Write Query duy nhất)
-    # ---------------------------------------------------------
-    if has_changes:
-        progress.last_accessed = now
+    return has_changes, just_completed
+
+
+def _load_progress(user, block: ContentBlock, enrollment: Enrollment):
+    """
+    Write-behind mode: Đọc state từ Redis (0 query DB cho các beat tiếp theo).
+    Redis lỗi -> Fallback về get_or_create như cũ để không mất heartbeat.
+    Trả về (progress, is_buffered).
+    """
+    if heartbeat_buffer_service.is_enabled():
+        try:
+            return heartbeat_buffer_service.load_progress(user, block, enrollment), True
+        except Exception as e:
+            logger.error(f"⚠️ Heartbeat buffer unavailable, fallback DB: {e}")
+
+    progress, created = UserBlockProgress.objects.get_or_create(
+        user=user,
+        block=block,
+        enrollment=enrollment,
+        defaults={'is_completed': False, 'time_spent_seconds': 0}
+    )
+    return progress, False
+
+
+def _save_progress(progress: UserBlockProgress, is_buffered: bool, just_completed: bool) -> None:
+    """
+    - Chế độ thường: save() thẳng xuống DB.
+    - Write-behind: Ghi vào Redis, task flush_heartbeat_buffer sẽ upsert theo batch.
+      Riêng lúc vừa HOÀN THÀNH thì ghi thẳng (write-through) để aggregation và response chính xác.
+    """
+    if not is_buffered:
         progress.save()
+        return
 
-    return UserBlockProgressDomain.from_model(progress, block)
+    if just_completed:
+        heartbeat_buffer_service.write_through(progress)
+        return
+
+    try:
+        heartbeat_buffer_service.stage(progress)
+    except Exception as e:
+        logger.error(f"⚠️ Heartbeat buffer stage failed, write-through: {e}")
+        heartbeat_buffer_service.write_through(progress)
+
+
+# ==========================================
+# PUBLIC INTERFACE (TRACK BATCH) - Ghi nhận tiến độ nhiều block trong 1 request
+# ==========================================
+
+def get_blocks_for_heartbeat(block_ids: List[uuid.UUID]) -> Dict[uuid.UUID, ContentBlock]:
+    """
+    Lấy các block của 1 batch heartbeat trong 1 query (kèm Lesson -> Module -> Course để check quyền).
+    Block không tồn tại (đã bị xóa) sẽ không có trong kết quả.
+    """
+    return ContentBlock.objects.select_related('lesson__module__course').in_bulk(block_ids)
+
+
+@transaction.atomic
+def sync_heartbeat_batch(user, blocks: Dict[uuid.UUID, ContentBlock], beats: List[dict]) -> List[UserBlockProgressDomain]:
+    """
+    Bản batch của sync_heartbeat (Client có nhiều block đang mở, hoặc app offline gửi bù beat).
+    - Các beat được áp dụng THEO THỨ TỰ gửi lên (nhiều beat cùng block sẽ cộng dồn).
+    - Tổng time_spent_add của 1 block trong batch bị chặn ở MAX_TIME_SPENT_PER_REQUEST
+      (như 1 beat đơn): 200 beat x 300s cùng block không cộng được 60.000s trong 1 request.
+    - 1 query Enrollment, 1 lần đọc progress, 1 câu upsert cho cả batch, trong 1 transaction.
+    - Beat của block không có trong `blocks` bị bỏ qua.
+    Trả về tiến độ cuối cùng của từng block (theo thứ tự xuất hiện đầu tiên).
+    """
+    beats = [beat for beat in beats if beat['block_id'] in blocks]
+    if not beats:
+        return []
+
+    ordered_blocks = list({beat['block_id']: blocks[beat['block_id']] for beat in beats}.values())
+    course_ids = {block.lesson.module.course_id for block in ordered_blocks}
+
+    # 1. Enrollment: 1 query cho mọi khóa học trong batch
+    enrollments = {
+        e.course_id: e
+        for e in Enrollment.objects.filter(user=user, course_id__in=course_ids)
+    }
+    if len(enrollments) != len(course_ids):
+        raise PermissionError("User chưa ghi danh khóa học này.")
+
+    now = timezone.now()
+
+    # 2. Đọc tiến độ hiện tại của tất cả block
+    progress_map = None
+    if heartbeat_buffer_service.is_enabled():
+        try:
+            progress_map = heartbeat_buffer_service.load_progress_many(user, ordered_blocks, enrollments)
+        except Exception as e:
+            logger.error(f"⚠️ Heartbeat buffer unavailable, fallback DB: {e}")
+    if progress_map is None:
+        progress_map = heartbeat_buffer_service.load_progress_many_from_db(user, ordered_blocks, enrollments)
+
+    # 3. Áp dụng từng beat (In-Memory)
+    changed = {}
+    last_block_per_enrollment = {}
+    time_budget = {block.id: MAX_TIME_SPENT_PER_REQUEST for block in ordered_blocks}
+    for beat in beats:
+        block = blocks[beat['block_id']]
+        enrollment = enrollments[block.lesson.module.course_id]
+        progress = progress_map[block.id]
+
+        # Beat hợp lệ chỉ được cộng phần thời gian còn lại trong hạn mức của block
+        time_add = beat.get('time_spent_add', 0)
+        if 0 < time_add <= MAX_TIME_SPENT_PER_REQUEST:
+            time_add = min(time_add, time_budget[block.id])
+            time_budget[block.id] -= time_add
+            beat = {**beat, 'time_spent_add': time_add}
+
+        has_changes, _ = _apply_beat(user, block, enrollment, progress, beat, now)
+        if has_changes:
+            progress.last_accessed = now
+            changed[block.id] = progress
+
+        last_block_per_enrollment[enrollment.id] = (enrollment, block)
+
+    # 4. Upsert 1 lần cho cả batch (đồng thời cập nhật state write-behind nếu bật)
+    heartbeat_buffer_service.write_through_many(list(changed.values()))
+
+    # 5. Con trỏ Resume: Block cuối cùng của mỗi khóa học trong batch
+    for enrollment, block in last_block_per_enrollment.values():
+        if enrollment.current_block_id != block.id or (now - enrollment.last_accessed_at).total_seconds() > 300:
+            enrollment.current_block = block
+            enrollment.last_accessed_at = now
+            enrollment.save(update_fields=['current_block', 'last_accessed_at'])
+
+    return [UserBlockProgressDomain.from_model(progress_map[block.id], block) for block in ordered_blocks]
 
 
 # ==========================================
@@ -479,6 +626,11 @@ def mark_quiz_as_completed(user_id: str, quiz_id: str, enrollment_id: str, score
     if not block:
         return False
 
+    # Write-behind: Flush delta heartbeat đang chờ + xóa state cũ trong Redis,
+    # tránh lần flush sau ghi đè interaction_data['score'] vừa set.
+    if heartbeat_buffer_service.is_enabled() and enrollment_id:
+        heartbeat_buffer_service.invalidate(enrollment_id, block.id)
+
     # 2. Update hoặc Create UserBlockProgress
     # Sử dụng update_or_create để atomic hơn get_or_create + save
     # Tuy nhiên cần check trạng thái cũ để biết có cần trigger aggregation không
@@ -523,6 +675,10 @@ def reset_course_progress(user, enrollment_id: str) -> ResetProgressResultDomain
     except Enrollment.DoesNotExist:
         raise PermissionError("Không tìm thấy ghi danh hoặc bạn không có quyền.")
 
+    # Bỏ các heartbeat đang nằm trong buffer, không để flush 'hồi sinh' tiến độ cũ
+    if heartbeat_buffer_service.is_enabled():
+        heartbeat_buffer_service.discard_enrollment(enrollment.id)
+
     # 2. Thực hiện Reset (Atomic)
     with transaction.atomic():
         # A. Xóa Tracking chi tiết (Nhóm 1)
@@ -540,6 +696,7 @@ def reset_course_progress(user, enrollment_id: str) -> ResetProgressResultDomain
 
         # D. Reset Enrollment về 0
         enrollment.percent_completed = 0.0
+        enrollment.cached_completed_lessons = 0
         enrollment.is_completed = False
         enrollment.completed_at = None
         enrollment.save()
@@ -0,0 +1,424 @@
+import json
+import logging
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from content.models import ContentBlock, Enrollment
+from progress.models import UserBlockProgress
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'progress:hb'
+DIRTY_SET_KEY = f'{KEY_PREFIX}:dirty'   # Set chứa các pending key chưa flush xuống DB
+
+# State sống lâu hơn nhiều so với chu kỳ flush (30s) để không mất delta khi worker chậm
+STATE_TTL_SECONDS = 24 * 60 * 60
+
+# Các cột được flush định kỳ.
+# KHÔNG flush is_completed/completed_at: trạng thái hoàn thành luôn được ghi thẳng (write-through)
+# để không ghi đè kết quả do luồng khác set (vd: mark_quiz_as_completed).
+FLUSH_FIELDS = ['time_spent_seconds', 'interaction_data', 'last_accessed', 'last_logged_time_spent']
+WRITE_THROUGH_FIELDS = FLUSH_FIELDS + ['is_completed', 'completed_at']
+
+# Cột dùng khi flush phải INSERT dòng mới (Lazy Creation)
+INSERT_FIELDS = ['id', 'user', 'enrollment', 'block', 'is_completed', 'completed_at'] + FLUSH_FIELDS
+
+# Trả snapshot về buffer khi flush lỗi, NHƯNG không đè lên snapshot mới hơn đã được stage trong lúc flush
+RESTORE_SNAPSHOT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return redis.call('SADD', KEYS[2], KEYS[1])
+"""
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def is_enabled() -> bool:
+    return getattr(settings, 'HEARTBEAT_WRITE_BEHIND', False)
+
+
+def _get_redis():
+    return get_redis_connection('default')
+
+
+def _state_key(enrollment_id, block_id) -> str:
+    # State đầy đủ, dùng làm cache đọc cho các beat tiếp theo
+    return f'{KEY_PREFIX}:state:{enrollment_id}:{block_id}'
+
+
+def _pending_key(enrollment_id, block_id) -> str:
+    # Snapshot chờ flush. Flush lấy ra bằng HGETALL + DEL (atomic), beat mới sẽ tạo snapshot mới
+    return f'{KEY_PREFIX}:pending:{enrollment_id}:{block_id}'
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _serialize(progress: UserBlockProgress) -> dict:
+    """Model (chưa lưu) -> Redis hash (toàn bộ là string)."""
+    return {
+        'id': str(progress.id),
+        'user_id': str(progress.user_id),
+        'enrollment_id': str(progress.enrollment_id),
+        'block_id': str(progress.block_id),
+        'time_spent_seconds': progress.time_spent_seconds,
+        'last_logged_time_spent': progress.last_logged_time_spent,
+        'interaction_data': json.dumps(progress.interaction_data or {}),
+        'is_completed': int(progress.is_completed),
+        'completed_at': progress.completed_at.isoformat() if progress.completed_at else '',
+        'last_accessed': progress.last_accessed.isoformat() if progress.last_accessed else '',
+    }
+
+
+def _deserialize(raw: dict) -> UserBlockProgress:
+    """Redis hash -> UserBlockProgress (unsaved instance, dùng lại được cho Domain/bulk_create)."""
+    data = {_decode(k): _decode(v) for k, v in raw.items()}
+
+    return UserBlockProgress(
+        id=data['id'],
+        user_id=data['user_id'],
+        enrollment_id=data['enrollment_id'],
+        block_id=data['block_id'],
+        time_spent_seconds=int(data.get('time_spent_seconds') or 0),
+        last_logged_time_spent=int(data.get('last_logged_time_spent') or 0),
+        interaction_data=json.loads(data.get('interaction_data') or '{}'),
+        is_completed=data.get('is_completed') == '1',
+        completed_at=parse_datetime(data['completed_at']) if data.get('completed_at') else None,
+        last_accessed=parse_datetime(data['last_accessed']) if data.get('last_accessed') else None,
+    )
+
+
+def _upsert(progress_list: List[UserBlockProgress], update_fields: List[str]) -> None:
+    """
+    Batched upsert: INSERT ... ON CONFLICT (enrollment_id, block_id) DO UPDATE.
+    1 query cho cả batch thay vì get_or_create + save từng dòng.
+    """
+    UserBlockProgress.objects.bulk_create(
+        progress_list,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['enrollment', 'block'],
+        update_fields=update_fields,
+    )
+
+
+def _upsert_snapshots(progress_list: List[UserBlockProgress]) -> int:
+    """
+    Upsert các snapshot lấy từ buffer: INSERT ... ON CONFLICT DO UPDATE ... WHERE.
+    - Ghi đúng last_accessed của beat (bulk_create sẽ bị auto_now đè bằng giờ flush).
+    - Chỉ đè khi snapshot MỚI HƠN dòng hiện tại (so theo last_accessed): flush/write-through
+      chạy chồng nhau không thể ghi bản cũ lên bản mới.
+    Trả về số snapshot đã gửi xuống DB.
+    """
+    # 1 dòng chỉ được xuất hiện 1 lần trong câu INSERT ... ON CONFLICT -> Giữ bản mới nhất
+    latest = {}
+    for progress in progress_list:
+        progress.last_accessed = progress.last_accessed or timezone.now()
+        pair = (str(progress.enrollment_id), str(progress.block_id))
+        if pair not in latest or latest[pair].last_accessed <= progress.last_accessed:
+            latest[pair] = progress
+    rows = list(latest.values())
+    if not rows:
+        return 0
+
+    opts = UserBlockProgress._meta
+    qn = connection.ops.quote_name
+    fields = [opts.get_field(name) for name in INSERT_FIELDS]
+    table = qn(opts.db_table)
+    columns = ', '.join(qn(f.column) for f in fields)
+    updates = ', '.join(
+        f'{qn(opts.get_field(name).column)} = EXCLUDED.{qn(opts.get_field(name).column)}'
+        for name in FLUSH_FIELDS
+    )
+    conflict = ', '.join(qn(opts.get_field(name).column) for name in ('enrollment', 'block'))
+    accessed = qn(opts.get_field('last_accessed').column)
+    row_sql = f"({', '.join(['%s'] * len(fields))})"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            params = [
+                field.get_db_prep_save(getattr(progress, field.attname), connection)
+                for progress in chunk
+                for field in fields
+            ]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([row_sql] * len(chunk))} "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {updates} "
+                f"WHERE {table}.{accessed} IS NULL OR {table}.{accessed} <= EXCLUDED.{accessed}",
+                params,
+            )
+
+    return len(rows)
+
+
+def _take_snapshots(redis_conn, keys: List) -> List[dict]:
+    """
+    Lấy và xóa snapshot trong 1 MULTI/EXEC (HGETALL + DEL, tương đương GETDEL cho hash).
+    Beat đến sau thời điểm này ghi vào snapshot mới -> Không bị mất, không bị 2 worker xử lý trùng.
+    """
+    pipe = redis_conn.pipeline(transaction=True)
+    for key in keys:
+        pipe.hgetall(key)
+        pipe.delete(key)
+    return pipe.execute()[0::2]
+
+
+def _restore_snapshots(redis_conn, keys: List, snapshots: List[dict]) -> None:
+    restore = redis_conn.register_script(RESTORE_SNAPSHOT_SCRIPT)
+    for key, raw in zip(keys, snapshots):
+        if not raw:
+            continue
+        args = [STATE_TTL_SECONDS]
+        for field, value in raw.items():
+            args += [field, value]
+        restore(keys=[key, DIRTY_SET_KEY], args=args)
+
+
+# ==========================================
+# PUBLIC INTERFACE (READ)
+# ==========================================
+
+def load_progress(user, block: ContentBlock, enrollment: Enrollment) -> UserBlockProgress:
+    """
+    Lấy tiến độ hiện tại của user tại block.
+    - Có state trong Redis -> Dùng luôn (0 query DB).
+    - Chưa có -> Đọc DB 1 lần (SELECT, không ghi) rồi seed vào Redis ở lần stage() đầu tiên.
+    """
+    raw = _get_redis().hgetall(_state_key(enrollment.id, block.id))
+    if raw:
+        return _deserialize(raw)
+
+    progress = UserBlockProgress.objects.filter(enrollment=enrollment, block=block).first()
+    if progress:
+        return progress
+
+    # Lazy Creation: Chưa chạm vào block bao giờ -> Object tạm, sẽ được INSERT khi flush
+    return UserBlockProgress(
+        user=user,
+        block=block,
+        enrollment=enrollment,
+        is_completed=False,
+        time_spent_seconds=0,
+    )
+
+
+def load_progress_many(user, blocks: List[ContentBlock], enrollments: Dict) -> Dict:
+    """
+    Bản batch của load_progress (dùng cho Bulk Heartbeat).
+    enrollments: {course_id: Enrollment}
+    1 round-trip Redis (pipeline) + tối đa 1 query DB cho các block chưa có state.
+    Trả về {block_id: UserBlockProgress}.
+    """
+    pipe = _get_redis().pipeline(transaction=False)
+    for block in blocks:
+        enrollment = enrollments[block.lesson.module.course_id]
+        pipe.hgetall(_state_key(enrollment.id, block.id))
+    states = pipe.execute()
+
+    result = {}
+    missing = []
+    for block, raw in zip(blocks, states):
+        if raw:
+            result[block.id] = _deserialize(raw)
+        else:
+            missing.append(block)
+
+    if missing:
+        result.update(load_progress_many_from_db(user, missing, enrollments))
+
+    return result
+
+
+def load_progress_many_from_db(user, blocks: List[ContentBlock], enrollments: Dict) -> Dict:
+    """
+    Đọc tiến độ của nhiều block trong 1 query (SELECT, không ghi).
+    Block chưa có dòng nào -> Object tạm (Lazy Creation), sẽ được INSERT khi upsert.
+    """
+    existing = {
+        p.block_id: p
+        for p in UserBlockProgress.objects.filter(
+            enrollment__in=list(enrollments.values()),
+            block__in=blocks
+        )
+    }
+
+    result = {}
+    for block in blocks:
+        result[block.id] = existing.get(block.id) or UserBlockProgress(
+            user=user,
+            block=block,
+            enrollment=enrollments[block.lesson.module.course_id],
+            is_completed=False,
+            time_spent_seconds=0,
+        )
+    return result
+
+
+def get_fresh(progress: UserBlockProgress) -> UserBlockProgress:
+    """
+    Dùng cho các API đọc (GET status/resume): Ưu tiên bản trong Redis nếu có,
+    vì dòng trong DB có thể trễ tối đa 1 chu kỳ flush.
+    """
+    if not is_enabled() or not progress.enrollment_id:
+        return progress
+
+    try:
+        raw = _get_redis().hgetall(_state_key(progress.enrollment_id, progress.block_id))
+    except Exception as e:
+        logger.error(f"⚠️ Heartbeat buffer unavailable: {e}")
+        return progress
+
+    return _deserialize(raw) if raw else progress
+
+
+# ==========================================
+# PUBLIC INTERFACE (WRITE)
+# ==========================================
+
+def stage(progress: UserBlockProgress) -> None:
+    """
+    Ghi state mới vào Redis (cache đọc + snapshot chờ flush) và đánh dấu 'dirty'.
+    DB sẽ được cập nhật bởi task flush_heartbeat_buffer.
+    """
+    key = _state_key(progress.enrollment_id, progress.block_id)
+    pending_key = _pending_key(progress.enrollment_id, progress.block_id)
+    data = _serialize(progress)
+
+    pipe = _get_redis().pipeline()
+    pipe.hset(key, mapping=data)
+    pipe.expire(key, STATE_TTL_SECONDS)
+    pipe.hset(pending_key, mapping=data)
+    pipe.expire(pending_key, STATE_TTL_SECONDS)
+    pipe.sadd(DIRTY_SET_KEY, pending_key)
+    pipe.execute()
+
+
+def write_through(progress: UserBlockProgress) -> None:
+    """
+    Ghi thẳng xuống DB (dùng khi block vừa HOÀN THÀNH).
+    Đảm bảo calculate_aggregation đọc được is_completed=True ngay lập tức.
+    """
+    write_through_many([progress])
+
+
+def write_through_many(progress_list: List[UserBlockProgress]) -> None:
+    """
+    Upsert cả batch xuống DB (1 câu INSERT ... ON CONFLICT) rồi đồng bộ lại state trong Redis.
+    Dùng cho write_through và Bulk Heartbeat.
+    """
+    if not progress_list:
+        return
+
+    _upsert(progress_list, WRITE_THROUGH_FIELDS)
+
+    if not is_enabled():
+        return
+
+    keys = [_state_key(p.enrollment_id, p.block_id) for p in progress_list]
+    # DB đã có bản mới nhất -> Snapshot chờ flush (cũ hơn) không còn cần thiết
+    pending_keys = [_pending_key(p.enrollment_id, p.block_id) for p in progress_list]
+    try:
+        pipe = _get_redis().pipeline()
+        for key, progress in zip(keys, progress_list):
+            pipe.hset(key, mapping=_serialize(progress))
+            pipe.expire(key, STATE_TTL_SECONDS)
+        pipe.srem(DIRTY_SET_KEY, *pending_keys)
+        pipe.delete(*pending_keys)
+        pipe.execute()
+    except Exception as e:
+        # DB đã đúng, chỉ mất cache -> beat sau tự seed lại
+        logger.error(f"⚠️ Không cập nhật được heartbeat buffer ({len(keys)} keys): {e}")
+
+
+def invalidate(enrollment_id, block_id) -> None:
+    """
+    Xóa state của 1 block (gọi khi có luồng khác ghi trực tiếp vào UserBlockProgress,
+    vd: nộp Quiz). Lần heartbeat sau sẽ seed lại từ DB.
+    Delta chưa flush được ghi xuống trước để không mất thời gian học.
+    """
+    key = _state_key(enrollment_id, block_id)
+    pending_key = _pending_key(enrollment_id, block_id)
+    try:
+        redis_conn = _get_redis()
+        redis_conn.srem(DIRTY_SET_KEY, pending_key)
+        raw = _take_snapshots(redis_conn, [pending_key])[0]
+        if raw:
+            _upsert_snapshots([_deserialize(raw)])
+        redis_conn.delete(key)
+    except Exception as e:
+        logger.error(f"⚠️ Không invalidate được heartbeat buffer {key}: {e}")
+
+
+def discard_enrollment(enrollment_id) -> None:
+    """
+    Bỏ toàn bộ state (kể cả delta chưa flush) của 1 enrollment.
+    Dùng khi Reset tiến độ: tránh việc flush sau đó 'hồi sinh' các dòng vừa xóa.
+    """
+    try:
+        redis_conn = _get_redis()
+        keys = list(redis_conn.scan_iter(match=_state_key(enrollment_id, '*'), count=500))
+        pending_keys = list(redis_conn.scan_iter(match=_pending_key(enrollment_id, '*'), count=500))
+        if keys or pending_keys:
+            pipe = redis_conn.pipeline()
+            if pending_keys:
+                pipe.srem(DIRTY_SET_KEY, *pending_keys)
+            pipe.delete(*(keys + pending_keys))
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"⚠️ Không xóa được heartbeat buffer của enrollment {enrollment_id}: {e}")
+
+
+# ==========================================
+# PUBLIC INTERFACE (FLUSH)
+# ==========================================
+
+def flush(batch_size: int = 500, max_batches: Optional[int] = None) -> int:
+    """
+    Đẩy các snapshot 'dirty' từ Redis xuống DB bằng batched upsert.
+    Trả về số dòng đã flush.
+    """
+    redis_conn = _get_redis()
+    total = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        # SPOP là atomic: 2 worker chạy song song sẽ không lấy trùng key.
+        keys = redis_conn.spop(DIRTY_SET_KEY, batch_size)
+        if not keys:
+            break
+
+        # Snapshot được lấy + xóa atomic. Beat mới đến sau đó tạo snapshot mới và SADD lại
+        # -> Lần flush sau xử lý, delta không bị mất.
+        snapshots = _take_snapshots(redis_conn, keys)
+        progress_list = [_deserialize(raw) for raw in snapshots if raw]
+
+        try:
+            flushed = _upsert_snapshots(progress_list)
+        except Exception:
+            # Trả snapshot về buffer để lần sau flush tiếp, không mất dữ liệu
+            _restore_snapshots(redis_conn, keys, snapshots)
+            raise
+
+        total += flushed
+        batches += 1
+
+    if total:
+        logger.info(f"Heartbeat buffer: flushed {total} rows ({batches} batches) at {timezone.now()}")
+
+    return total
@@ -0,0 +1,348 @@
+import uuid
+import logging
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value, F, Case, When, FloatField
+from django.db.models.functions import Coalesce, Round, Cast
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from content.models import ContentBlock, Lesson, Module, Enrollment
+from progress.models import UserBlockProgress, LessonCompletion, ModuleCompletion
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _count_subquery(model, fk_field: str, **filters):
+    """Subquery đếm số dòng con theo khóa ngoại (dùng cho UPDATE ... SET = (SELECT COUNT ...))."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{fk_field: OuterRef('pk')}, **filters)
+            .order_by()
+            .values(fk_field)
+            .annotate(c=Count('pk'))
+            .values('c')
+        ),
+        Value(0)
+    )
+
+
+def _rebuild_structure_totals(course_id: uuid.UUID) -> None:
+    """Mẫu số: Lesson.cached_total_blocks và Module.cached_total_lessons."""
+    Lesson.objects.filter(module__course_id=course_id).update(
+        cached_total_blocks=_count_subquery(ContentBlock, 'lesson_id')
+    )
+    Module.objects.filter(course_id=course_id).update(
+        cached_total_lessons=_count_subquery(Lesson, 'module_id')
+    )
+
+
+def _rebuild_lesson_counters(course_id: uuid.UUID) -> int:
+    """Tử số cấp Lesson: LessonCompletion.completed_blocks từ UserBlockProgress."""
+    lesson_totals = dict(
+        Lesson.objects.filter(module__course_id=course_id).values_list('id', 'cached_total_blocks')
+    )
+
+    # Đếm block đã xong theo (enrollment, lesson) - 1 query GROUP BY
+    rows = (
+        UserBlockProgress.objects
+        .filter(enrollment__course_id=course_id, is_completed=True, block__lesson_id__in=lesson_totals.keys())
+        .order_by()
+        .values('enrollment_id', 'block__lesson_id')
+        .annotate(done=Count('id'))
+    )
+
+    now = timezone.now()
+    objs = []
+    for row in rows:
+        total = lesson_totals[row['block__lesson_id']]
+        done = min(row['done'], total)
+        objs.append(LessonCompletion(
+            enrollment_id=row['enrollment_id'],
+            lesson_id=row['block__lesson_id'],
+            completed_blocks=done,
+            is_completed=total > 0 and done >= total,
+            completed_at=now,
+        ))
+
+    # Reset về 0 trước, rồi upsert lại giá trị đúng (dòng không còn tiến độ sẽ giữ 0)
+    LessonCompletion.objects.filter(lesson__module__course_id=course_id).update(completed_blocks=0, is_completed=False)
+    LessonCompletion.objects.bulk_create(
+        objs,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['enrollment', 'lesson'],
+        update_fields=['completed_blocks', 'is_completed'],
+    )
+    return len(objs)
+
+
+def _rebuild_module_counters(course_id: uuid.UUID) -> int:
+    """Tử số cấp Module: ModuleCompletion.completed_lessons từ LessonCompletion."""
+    module_totals = dict(
+        Module.objects.filter(course_id=course_id).values_list('id', 'cached_total_lessons')
+    )
+
+    rows = (
+        LessonCompletion.objects
+        .filter(lesson__module__course_id=course_id, is_completed=True)
+        .order_by()
+        .values('enrollment_id', 'lesson__module_id')
+        .annotate(done=Count('id'))
+    )
+
+    now = timezone.now()
+    objs = []
+    for row in rows:
+        total = module_totals[row['lesson__module_id']]
+        done = min(row['done'], total)
+        objs.append(ModuleCompletion(
+            enrollment_id=row['enrollment_id'],
+            module_id=row['lesson__module_id'],
+            completed_lessons=done,
+            is_completed=total > 0 and done >= total,
+            completed_at=now,
+        ))
+
+    ModuleCompletion.objects.filter(module__course_id=course_id).update(completed_lessons=0, is_completed=False)
+    ModuleCompletion.objects.bulk_create(
+        objs,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['enrollment', 'module'],
+        update_fields=['completed_lessons', 'is_completed'],
+    )
+    return len(objs)
+
+
+def _enrollment_progress_updates(total_lessons: int) -> dict:
+    """
+    Các biểu thức SET cho UPDATE content_enrollment (set-based, 1 câu SQL).
+    Trong UPDATE, cột ở vế phải luôn là giá trị CŨ -> phải lặp lại subquery đếm
+    thay vì tham chiếu F('cached_completed_lessons') vừa gán.
+    """
+    done = _count_subquery(LessonCompletion, 'enrollment_id', is_completed=True)
+
+    if total_lessons == 0:
+        return {
+            'cached_total_lessons': 0,
+            'cached_completed_lessons': done,
+            'percent_completed': 0.0,
+            'is_completed': False,
+            'completed_at': None,
+        }
+
+    is_done = GreaterThanOrEqual(done, total_lessons)
+    return {
+        'cached_total_lessons': total_lessons,
+        'cached_completed_lessons': done,
+        'percent_completed': Round((Cast(done, FloatField()) * 100.0) / total_lessons, 2),
+        'is_completed': Case(When(is_done, then=Value(True)), default=Value(False)),
+        # Giữ completed_at cũ nếu vẫn hoàn thành, set mới nếu vừa hoàn thành, xóa nếu không còn
+        'completed_at': Case(
+            When(is_done, completed_at__isnull=False, then=F('completed_at')),
+            When(is_done, then=Value(timezone.now())),
+            default=Value(None),
+        ),
+    }
+
+
+# ==========================================
+# PUBLIC INTERFACE (RECOMPUTE)
+# ==========================================
+
+def recompute_enrollment_progress(course_id: uuid.UUID, chunk_size: int = 1000) -> int:
+    """
+    Tính lại cached_completed_lessons / cached_total_lessons / percent_completed / is_completed
+    cho TOÀN BỘ enrollment của khóa học từ bảng gốc (LessonCompletion).
+    - Mỗi chunk là 1 câu UPDATE duy nhất, lọc theo khoảng id (keyset) và commit riêng
+      -> Không giữ lock lâu trên content_enrollment dù khóa học có hàng chục nghìn học viên.
+    - Idempotent: chạy lại bao nhiêu lần cũng ra cùng kết quả (tự sửa counter bị lệch).
+    Trả về số enrollment đã cập nhật.
+    """
+    total_lessons = Lesson.objects.filter(module__course_id=course_id).count()
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+
+    updated = 0
+    last_id = None
+    while True:
+        chunk_qs = enrollments.order_by('id')
+        if last_id is not None:
+            chunk_qs = chunk_qs.filter(id__gt=last_id)
+        chunk_ids = list(chunk_qs.values_list('id', flat=True)[:chunk_size])
+        if not chunk_ids:
+            break
+
+        with transaction.atomic():
+            updated += enrollments.filter(id__gte=chunk_ids[0], id__lte=chunk_ids[-1]).update(
+                **_enrollment_progress_updates(total_lessons)
+            )
+
+        last_id = chunk_ids[-1]
+
+    logger.info(f"Recomputed progress for {updated} enrollments of course {course_id} ({total_lessons} lessons)")
+    return updated
+
+
+# ==========================================
+# PUBLIC INTERFACE (CONTENT REMOVAL)
+# ==========================================
+
+def _recount_module_completions(module_id: uuid.UUID, enrollment_ids=None) -> None:
+    """
+    Đếm lại ModuleCompletion.completed_lessons của 1 module từ LessonCompletion (set-based)
+    và đặt lại cờ is_completed theo cả 2 chiều (mẫu số có thể vừa tăng hoặc giảm).
+    enrollment_ids: Chỉ xét các học viên này (None = toàn bộ học viên của module).
+    """
+    total_lessons = Lesson.objects.filter(module_id=module_id).count()
+    Module.objects.filter(id=module_id).update(cached_total_lessons=total_lessons)
+
+    finished_lessons = LessonCompletion.objects.filter(lesson__module_id=module_id, is_completed=True)
+    if enrollment_ids is not None:
+        finished_lessons = finished_lessons.filter(enrollment_id__in=enrollment_ids)
+
+    # Học viên đã xong lesson nhưng chưa có dòng ModuleCompletion -> Tạo để counter đếm đúng
+    now = timezone.now()
+    ModuleCompletion.objects.bulk_create(
+        [
+            ModuleCompletion(enrollment_id=enrollment_id, module_id=module_id, completed_at=now)
+            for enrollment_id in finished_lessons.order_by().values_list('enrollment_id', flat=True).distinct()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+    completions = ModuleCompletion.objects.filter(module_id=module_id)
+    if enrollment_ids is not None:
+        completions = completions.filter(enrollment_id__in=enrollment_ids)
+
+    done_lessons = Coalesce(
+        Subquery(
+            LessonCompletion.objects
+            .filter(enrollment_id=OuterRef('enrollment_id'), lesson__module_id=module_id, is_completed=True)
+            .order_by().values('enrollment_id').annotate(c=Count('pk')).values('c')
+        ),
+        Value(0)
+    )
+    completions.update(completed_lessons=done_lessons)
+
+    if total_lessons == 0:
+        completions.filter(is_completed=True).update(is_completed=False)
+        return
+    completions.filter(is_completed=False, completed_lessons__gte=total_lessons).update(is_completed=True, completed_at=now)
+    completions.filter(is_completed=True, completed_lessons__lt=total_lessons).update(is_completed=False)
+
+
+def reevaluate_lesson(lesson_id: uuid.UUID) -> int:
+    """
+    Sau khi XÓA block khỏi lesson (mẫu số giảm) hoặc ĐỔI LOẠI block (tiến độ của block cũ mất theo):
+    1. Đếm lại completed_blocks của mọi LessonCompletion trong lesson từ UserBlockProgress (1 câu UPDATE).
+    2. Đặt lại cờ hoàn thành lesson theo cả 2 chiều:
+       - Nay đã đủ block (trước đó chỉ thiếu đúng block vừa xóa) -> Lesson hoàn thành.
+       - Không còn đủ (block vừa đổi loại chưa ai học) -> Lesson chưa hoàn thành.
+    3. Module của lesson: Đếm lại completed_lessons + cờ hoàn thành cho các học viên đó.
+    4. Enrollment: Tính lại % của khóa học (set-based, chunk theo id).
+    Idempotent: Chạy lại không đổi kết quả. Trả về số học viên vừa hoàn thành lesson.
+    """
+    try:
+        lesson = Lesson.objects.select_related('module').get(id=lesson_id)
+    except Lesson.DoesNotExist:
+        return 0
+
+    module = lesson.module
+    total_blocks = ContentBlock.objects.filter(lesson_id=lesson.id).count()
+    now = timezone.now()
+
+    with transaction.atomic():
+        Lesson.objects.filter(id=lesson.id).update(cached_total_blocks=total_blocks)
+
+        done_blocks = Coalesce(
+            Subquery(
+                UserBlockProgress.objects
+                .filter(enrollment_id=OuterRef('enrollment_id'), block__lesson_id=lesson.id, is_completed=True)
+                .order_by().values('enrollment_id').annotate(c=Count('pk')).values('c')
+            ),
+            Value(0)
+        )
+        completions = LessonCompletion.objects.filter(lesson_id=lesson.id)
+        completions.update(completed_blocks=done_blocks)
+
+        # Lesson rỗng: Giữ nguyên trạng thái cũ (không ai hoàn thành mới, không tước hoàn thành cũ)
+        newly_done, newly_undone = [], []
+        if total_blocks > 0:
+            just_finished = completions.filter(is_completed=False, completed_blocks__gte=total_blocks)
+            newly_done = list(just_finished.values_list('enrollment_id', flat=True))
+            just_finished.update(is_completed=True, completed_at=now)
+
+            just_undone = completions.filter(is_completed=True, completed_blocks__lt=total_blocks)
+            newly_undone = list(just_undone.values_list('enrollment_id', flat=True))
+            just_undone.update(is_completed=False)
+
+        affected = newly_done + newly_undone
+        if affected:
+            _recount_module_completions(module.id, enrollment_ids=affected)
+
+    if affected:
+        recompute_enrollment_progress(module.course_id)
+
+    logger.info(
+        f"Re-evaluated lesson {lesson.id}: {len(newly_done)} enrollments completed it, "
+        f"{len(newly_undone)} no longer complete"
+    )
+    return len(newly_done)
+
+
+def reevaluate_module(module_id: uuid.UUID) -> int:
+    """
+    Sau khi XÓA lesson khỏi module (mẫu số cấp module giảm):
+    Học viên đã xong mọi lesson còn lại (trước đó chỉ thiếu đúng lesson vừa xóa) -> Module hoàn thành.
+    Sau đó tính lại % + trạng thái hoàn thành khóa học. Trả về số học viên đang hoàn thành module.
+    """
+    try:
+        module = Module.objects.get(id=module_id)
+    except Module.DoesNotExist:
+        return 0
+
+    with transaction.atomic():
+        _recount_module_completions(module.id)
+
+    recompute_enrollment_progress(module.course_id)
+    return ModuleCompletion.objects.filter(module_id=module.id, is_completed=True).count()
+
+
+# ==========================================
+# PUBLIC INTERFACE (REBUILD)
+# ==========================================
+
+def rebuild_course_counters(course_id: uuid.UUID) -> dict:
+    """
+    Reconciliation: Tính lại TOÀN BỘ counter tiến độ của 1 khóa học từ bảng gốc
+    (ContentBlock, Lesson, UserBlockProgress).
+    Dùng sau khi migrate lần đầu, hoặc khi nghi ngờ counter bị lệch.
+
+    Giao dịch: KHÔNG bọc toàn bộ trong 1 transaction.
+    - Mẫu số + LessonCompletion + ModuleCompletion: 1 transaction (reset về 0 rồi upsert phải đi cùng nhau).
+    - Enrollment: Từng chunk commit riêng (recompute_enrollment_progress). Chunk lỗi không rollback
+      các chunk trước; hàm idempotent nên chỉ cần chạy lại.
+    """
+    with transaction.atomic():
+        _rebuild_structure_totals(course_id)
+        lesson_rows = _rebuild_lesson_counters(course_id)
+        module_rows = _rebuild_module_counters(course_id)
+
+    enrollment_rows = recompute_enrollment_progress(course_id)
+
+    logger.info(
+        f"Rebuilt progress counters for course {course_id}: "
+        f"{lesson_rows} lessons, {module_rows} modules, {enrollment_rows} enrollments"
+    )
+
+    return {
+        'lesson_completions': lesson_rows,
+        'module_completions': module_rows,
+        'enrollments': enrollment_rows,
+    }
@@ -1,5 +1,8 @@
+import json
 import uuid
-from typing import Dict, Any, List
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional
 from django.db import transaction
 from django.conf import settings
 from django.db.models import Case, When, Prefetch
@@ -9,162 +12,28 @@ import random
 from core.exceptions import DomainError
 from core.services.media_service import recursive_inject_cdn_url
 from quiz.models import Quiz, Question
+from quiz.domains.answer_key_domain import AnswerKeyDomain
+from quiz.services import answer_key_service
 from progress.models import QuizAttempt, QuestionAnswer
-from progress.domains.question_content_domain import QuestionContentDomain
+from progress.services import answer_draft_service
+from progress.domains.question_content_domain import QuestionContentDomain, AttemptQuestionSetDomain
 from progress.domains.question_result_domain import QuizItemResultDomain
 
 
 
+logger = logging.getLogger(__name__)
+
 # ==========================================
 # PUBLIC INTERFACE (HELPER)
 # ==========================================
 
 def evaluate_answer(question: Question, user_answer_data: Dict[str, Any]) -> tuple[float, bool, str]:
     """
-    Core Logic chấm điểm.
+    Core Logic chấm điểm (1 câu).
+    Logic đúng/sai từng loại câu hỏi nằm ở AnswerKeyDomain (dùng chung với batch grader khi nộp bài).
     Returns: (score, is_correct, feedback)
     """
-    # Lấy điểm tối đa của câu hỏi (Giả sử bạn có field score trên model Question, nếu không thì default 1)
-    max_score = getattr(question, 'score', 1.0)
-    
-    # Lấy cấu hình đáp án đúng từ DB
-    payload = question.answer_payload
-    explanation = payload.get('explanation', '')
-
-    score = 0.0
-    is_correct = False
-    feedback = ""
-
-    # --- CASE 1: Single Choice / True False ---
-    if question.type in ['multiple_choice_single']:
-        # User send: { "selected_id": "A" } -> Validator đảm bảo có key này
-        user_val = str(user_answer_data.get('selected_id', ''))
-    
-        # Payload: { "correct_id": "A" } -> Validator đảm bảo có key này
-        correct_val = str(payload.get('correct_id', ''))
-
-        if not correct_val:
-            return 0.0, False, "Câu hỏi lỗi (chưa có đáp án)."
-
-        if user_val == correct_val:
-            score = max_score
-            is_correct = True
-            feedback = "Chính xác!"
-        else:
-            feedback = "Sai rồi."
-
-    # --- CASE 2: Multi Choice (Có điểm thành phần) ---
-    elif question.type == 'multiple_choice_multi':
-        # User send: { "selected_ids": ["A", "B"] }
-        user_ids = set(str(x) for x in user_answer_data.get('selected_ids', []))
-        
-        # Payload: { "correct_ids": ["A", "B"] }
-        correct_ids = set(str(x) for x in payload.get('correct_ids', []))
-        
-        if not correct_ids:
-            return 0.0, False, "Câu hỏi lỗi (chưa có đáp án)."
-
-        if user_ids == correct_ids:
-            score = max_score
-            is_correct = True
-            feedback = "Chính xác hoàn toàn!"
-        else:
-            # Logic Moodle: Chọn sai bị trừ điểm, hoặc chỉ tính % câu đúng.
-            # Ở đây dùng logic an toàn: Đúng hết mới được điểm (Strict)
-            # Hoặc Partial:
-            if payload.get('allow_partial', False) and correct_ids:
-                # Số ý đúng user chọn được
-                correct_hits = len(user_ids & correct_ids)
-                # Số ý sai user chọn nhầm
-                wrong_hits = len(user_ids - correct_ids)
-                
-                # Điểm = (Đúng - Sai) / Tổng số đúng
-                ratio = max(0, (correct_hits - wrong_hits) / len(correct_ids))
-                score = round(ratio * max_score, 2)
-                is_correct = (ratio == 1.0)
-                feedback = f"Bạn trả lời đúng một phần ({int(ratio*100)}%)."
-            else:
-                feedback = "Chưa chính xác."
-
-    # --- CASE 3: True/False ---
-    elif question.type == 'true_false':
-        # User send: { "selected_value": true } (Ưu tiên) hoặc "selected_id"
-        u_val = user_answer_data.get('selected_value')
-        if u_val is None: u_val = user_answer_data.get('selected_id') # Fallback
-
-        # Payload: { "correct_value": true }
-        c_val = payload.get('correct_value')
-
-        if c_val is None:
-            return 0.0, False, "Câu hỏi lỗi (Chưa có đáp án)."
-
-        # Convert to string to compare safely ('True' vs True)
-        if str(u_val).lower() == str(c_val).lower():
-            score = max_score
-            is_correct = True
-            feedback = "Chính xác!"
-        else:
-            feedback = "Sai rồi."
-
-    # --- CASE 4: Fill in blank / Short Answer ---
-    elif question.type in ['short_answer', 'fill_in_the_blank']:
-        user_text = str(user_answer_data.get('text', '')).strip()
-        accepted_texts = payload.get('accepted_texts', [])
-        
-        if not accepted_texts:
-            return 0.0, False, "Câu hỏi chưa cấu hình đáp án."
-
-        # Moodle logic: Case sensitivity settings
-        case_sensitive = payload.get('case_sensitive', False)
-        if not case_sensitive:
-            user_text = user_text.lower()
-            accepted_texts = [t.lower() for t in accepted_texts]
-            
-        if user_text in accepted_texts:
-            score = max_score
-            is_correct = True
-            feedback = "Chính xác!"
-        else:
-            feedback = "Sai rồi."
-
-    # --- CASE 5: Matching / Ordering ---
-    elif question.type == 'matching':
-        # Matching thì nên tính partial credit
-        # Payload: { "matches": {"A": "1", "B": "2"} }
-        correct_map = payload.get('matches', {})
-        # User: { "matches": {"A": "1", "B": "3"} }
-        user_map = user_answer_data.get('matches', {}) 
-        
-        total_pairs = len(correct_map)
-        if total_pairs > 0:
-            correct_count = 0
-            for k, v in correct_map.items():
-                if str(user_map.get(k)) == str(v):
-                    correct_count += 1
-            
-            score = round((correct_count / total_pairs) * max_score, 2)
-            is_correct = (correct_count == total_pairs)
-            feedback = f"Bạn ghép đúng {correct_count}/{total_pairs} cặp."
-
-    # --- CASE 6: Essay (Tự luận) ---
-    elif question.type == 'essay':
-        # Logic: Có chữ là có điểm
-        user_text = str(user_answer_data.get('text', '')).strip()
-        
-        if len(user_text) > 0:
-            score = max_score
-            is_correct = True
-            feedback = "Đã ghi nhận câu trả lời."
-        else:
-            score = 0.0
-            is_correct = False
-            feedback = "Bạn chưa nhập nội dung."
-
-    # Ghép explanation chung vào feedback
-    if explanation:
-        feedback += f" \nGiải thích: {explanation}"
-
-    return score, is_correct, feedback
+    return AnswerKeyDomain.from_model(question).grade(user_answer_data)
 
 
 def get_correct_answer_for_display(question: Question) -> Dict[str, Any]:
@@ -228,53 +97,37 @@ def get_correct_answer_for_display(question: Question) -> Dict[str, Any]:
     return recursive_inject_cdn_url(raw_display_data)
 
 
-# ==========================================
-# PUBLIC INTERFACE (GET)
-# ==========================================
-
-def get_question_in_attempt(attempt_id: uuid.UUID, question_id: uuid.UUID, user) -> QuestionContentDomain:
+def _render_prompt(question: Question, attempt_id: uuid.UUID) -> Dict[str, Any]:
     """
-    Lấy nội dung 1 câu hỏi cụ thể trong ngữ cảnh attempt.
-    Xử lý Shuffle Options (Câu trả lời) tại đây.
+    Prompt đã gắn link CDN + options đã shuffle theo seed (attempt, question).
+    Dùng random.Random riêng: không reseed generator toàn cục của process (an toàn khi chạy đa luồng).
     """
-    # Validate xem question_id có nằm trong attempt này không
-    try:
-        attempt = QuizAttempt.objects.get(id=attempt_id, user=user)
-    except QuizAttempt.DoesNotExist:
-        raise DomainError("Không tìm thấy bài làm.")
-    
-    if str(question_id) not in attempt.questions_order:
-        raise DomainError("Câu hỏi không thuộc bài làm này")
-
-    question = Question.objects.get(id=question_id)
-
     # Phải biến đổi toàn bộ JSON thô thành JSON có link CDN xịn ngay từ đầu.
-    # Hàm này sẽ đệ quy vào cả 'options', 'image', 'text' để gắn link.
-    processed_prompt = recursive_inject_cdn_url(question.prompt)
+    # Hàm này sẽ đệ quy vào cả 'options', 'image', 'text' để gắn link (trả về bản copy, không sửa data gốc).
+    processed_prompt = recursive_inject_cdn_url(question.prompt or {})
 
     # Lúc này các item trong list này đã có field 'url' (nếu là ảnh)
     options = processed_prompt.get('options', [])
     if options and isinstance(options, list):
-        # Clone để không ảnh hưởng data gốc
+        # Cùng seed với bản cũ -> Thứ tự options của các attempt đang làm dở không đổi
         shuffled_options = options.copy()
-        
-        # Seed random
-        seed_val = str(attempt.id) + str(question.id)
-        random.seed(seed_val)
-        random.shuffle(shuffled_options)
-        
-        # Gán ngược lại vào prompt để trả về
+        random.Random(str(attempt_id) + str(question.id)).shuffle(shuffled_options)
         processed_prompt['options'] = shuffled_options
 
-    # 2. --- LOGIC MỚI: TÌM CÂU TRẢ LỜI CŨ (RESUME) ---
-    # Tìm xem user đã từng trả lời câu này chưa
-    # Dùng filter().first() để tránh lỗi nếu chưa có record
-    existing_answer = QuestionAnswer.objects.filter(
-        attempt=attempt, 
-        question=question
-    ).first()
+    return processed_prompt
+
 
+def _build_question_content(
+    attempt: QuizAttempt,
+    question: Question,
+    existing_answer: Optional[QuestionAnswer],
+    draft_data: Optional[dict]
+) -> QuestionContentDomain:
     saved_answer_data = existing_answer.answer_data if existing_answer else {}
+
+    # Nháp autosave chưa flush (Redis) mới hơn dòng trong DB
+    if draft_data is not None and not (existing_answer and existing_answer.is_graded):
+        saved_answer_data = draft_data
     saved_flag_status = existing_answer.is_flagged if existing_answer else False
     
     # Thêm 2 trường này để Frontend biết câu này đã chấm chưa
@@ -296,7 +149,7 @@ def get_question_in_attempt(attempt_id: uuid.UUID, question_id: uuid.UUID, user)
         id=question.id,
         type=question.type,
 
-        prompt=processed_prompt,
+        prompt=_render_prompt(question, attempt.id),
 
         current_answer=saved_answer_data, 
         is_flagged=saved_flag_status,
@@ -304,11 +157,115 @@ def get_question_in_attempt(attempt_id: uuid.UUID, question_id: uuid.UUID, user)
     )
 
 
+def _question_set_etag(attempt: QuizAttempt, version: int, window: List[str], answers: Dict, drafts: Dict) -> str:
+    """
+    Fingerprint của bộ câu hỏi trả về: version bộ câu hỏi + trạng thái attempt + câu trả lời (DB & nháp).
+    Tính được TRƯỚC khi render -> Client có bản mới nhất thì bỏ qua toàn bộ bước CDN/shuffle/serialize.
+    """
+    state = {
+        'version': version,
+        'status': attempt.status,
+        'mode': attempt.attempt_mode,
+        'window': window,
+        'answers': sorted(
+            [str(q_id), a.answer_data, a.is_flagged, a.is_graded, a.score, a.is_correct, a.feedback]
+            for q_id, a in answers.items()
+        ),
+        'drafts': sorted([str(q_id), data] for q_id, data in drafts.items()),
+    }
+    digest = hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+# ==========================================
+# PUBLIC INTERFACE (GET)
+# ==========================================
+
+def get_question_in_attempt(attempt_id: uuid.UUID, question_id: uuid.UUID, user) -> QuestionContentDomain:
+    """
+    Lấy nội dung 1 câu hỏi cụ thể trong ngữ cảnh attempt.
+    Xử lý Shuffle Options (Câu trả lời) tại đây.
+    Exam player nên dùng get_attempt_questions (lấy cả đề trong 1 request).
+    """
+    # Validate xem question_id có nằm trong attempt này không
+    try:
+        attempt = QuizAttempt.objects.get(id=attempt_id, user=user)
+    except QuizAttempt.DoesNotExist:
+        raise DomainError("Không tìm thấy bài làm.")
+    
+    if str(question_id) not in attempt.questions_order:
+        raise DomainError("Câu hỏi không thuộc bài làm này")
+
+    question = Question.objects.get(id=question_id)
+
+    # --- TÌM CÂU TRẢ LỜI CŨ (RESUME) ---
+    # Dùng filter().first() để tránh lỗi nếu chưa có record
+    existing_answer = QuestionAnswer.objects.filter(
+        attempt=attempt, 
+        question=question
+    ).first()
+
+    draft_data = answer_draft_service.get_draft(attempt.id, question.id)
+    return _build_question_content(attempt, question, existing_answer, draft_data)
+
+
+def get_attempt_questions(
+    attempt_id: uuid.UUID,
+    user,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    if_none_match: Optional[str] = None
+) -> AttemptQuestionSetDomain:
+    """
+    Lấy TOÀN BỘ câu hỏi của attempt (hoặc 1 cửa sổ offset/limit theo questions_order) trong 1 lần:
+    - Question lấy từ bộ đáp án đã cache (answer_key_service) -> 0 query Question.
+    - Câu trả lời: 1 query QuestionAnswer + 1 HGETALL nháp.
+    - CDN injection + shuffle (random.Random theo seed) làm theo batch trong RAM.
+    - if_none_match khớp ETag hiện tại -> Trả về not_modified, không render.
+    """
+    try:
+        attempt = QuizAttempt.objects.get(id=attempt_id, user=user)
+    except QuizAttempt.DoesNotExist:
+        raise DomainError("Không tìm thấy bài làm.")
+
+    total = len(attempt.questions_order)
+    end = total if limit is None else offset + limit
+    window = attempt.questions_order[offset:end]
+
+    answer_keys = answer_key_service.get_answer_keys(attempt.quiz_id)
+    question_ids = [uuid.UUID(q_id) for q_id in window]
+    # Câu đã bị xóa khỏi quiz sau khi bắt đầu làm bài -> Bỏ qua (giống lúc chấm)
+    question_ids = [q_id for q_id in question_ids if q_id in answer_keys.questions]
+
+    answers = {
+        a.question_id: a
+        for a in QuestionAnswer.objects.filter(attempt=attempt, question_id__in=question_ids)
+    }
+    wanted = set(question_ids)
+    drafts = {q_id: data for q_id, data in answer_draft_service.get_drafts(attempt.id).items() if q_id in wanted}
+
+    etag = _question_set_etag(attempt, answer_keys.version, window, answers, drafts)
+    base = {
+        'attempt_id': attempt.id,
+        'status': attempt.status,
+        'total': total,
+        'offset': offset,
+        'etag': etag,
+    }
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return AttemptQuestionSetDomain(**base, items=[], not_modified=True)
+
+    items = [
+        _build_question_content(attempt, answer_keys.questions[q_id], answers.get(q_id), drafts.get(q_id))
+        for q_id in question_ids
+    ]
+    return AttemptQuestionSetDomain(**base, items=items)
+
+
 # ==========================================
 # PUBLIC INTERFACE (DRAFT)
 # ==========================================
 
-@transaction.atomic
 def save_question_draft(
     attempt_id: uuid.UUID, 
     question_id: uuid.UUID,
@@ -318,7 +275,56 @@ def save_question_draft(
     """
     AUTOSAVE: Chỉ lưu trạng thái trả lời của user, KHÔNG chấm điểm.
     Dùng khi user tích vào ô checkbox, hoặc gõ text (debounce).
+    Write-behind: Không lock attempt, không ghi DB. Nháp được gom vào Redis hash của attempt,
+    flush xuống QuestionAnswer định kỳ, khi submit câu và khi nộp bài (answer_draft_service).
     """
+    if not answer_draft_service.is_enabled():
+        return _save_question_draft_to_db(attempt_id, question_id, submission_data, user)
+
+    # 1. Validate Attempt (Đọc nhẹ, không lock)
+    attempt = QuizAttempt.objects.filter(id=attempt_id, user=user)\
+        .values('status', 'quiz_id', 'questions_order').first()
+    if not attempt:
+        raise DomainError("Không tìm thấy bài làm.")
+
+    if attempt['status'] != 'in_progress':
+        raise DomainError("Bài làm đã đóng, không thể lưu nháp.")
+
+    if str(question_id) not in attempt['questions_order']:
+        raise DomainError("Câu hỏi không thuộc bài làm này.")
+
+    # 2. Loại câu hỏi lấy từ bộ đáp án đã cache (không query Question)
+    answer_key = answer_key_service.get_answer_keys(attempt['quiz_id']).keys.get(question_id)
+    if not answer_key:
+        raise DomainError("Câu hỏi không tồn tại.")
+
+    # 3. [QUAN TRỌNG] Security Check: Type Matching
+    input_type = submission_data.get('question_type')
+    if input_type != answer_key.type:
+        raise DomainError(f"Loại câu hỏi không khớp. DB: {answer_key.type}, Input: {input_type}")
+
+    # 4. NẾU ĐÃ CHẤM RỒI -> CHẶN LUÔN (flush cũng bỏ qua câu đã chấm nếu bị race với submit)
+    if QuestionAnswer.objects.filter(attempt_id=attempt_id, question_id=question_id, is_graded=True).exists():
+        raise DomainError("Câu hỏi này đã nộp, không thể sửa lại.")
+
+    # 5. Ghi nháp vào Redis
+    try:
+        answer_draft_service.stage(attempt_id, question_id, answer_key.type, submission_data['answer_data'])
+    except Exception as e:
+        logger.error(f"⚠️ Draft buffer unavailable, ghi thẳng DB: {e}")
+        return _save_question_draft_to_db(attempt_id, question_id, submission_data, user)
+
+    return True
+
+
+@transaction.atomic
+def _save_question_draft_to_db(
+    attempt_id: uuid.UUID, 
+    question_id: uuid.UUID,
+    submission_data: dict,
+    user
+) -> bool:
+    """Lưu nháp thẳng xuống DB (khi tắt write-behind hoặc Redis lỗi)."""
     # 1. Validate Attempt (Giống hệt submit)
     try:
         attempt = QuizAttempt.objects.select_for_update().get(id=attempt_id, user=user)
@@ -334,31 +340,18 @@ def save_question_draft(
     try:
         question = Question.objects.get(id=question_id)
     except Question.DoesNotExist:
-        raise DomainError("Question not found.")
+        raise DomainError("Câu hỏi không tồn tại.")
 
-    # 3. [QUAN TRỌNG] Security Check: Type Matching
-    # Đảm bảo frontend không gửi type='essay' cho câu hỏi 'multiple_choice' để hack
+    # Security Check: Type Matching
     input_type = submission_data.get('question_type')
     if input_type != question.type:
         raise DomainError(f"Loại câu hỏi không khớp. DB: {question.type}, Input: {input_type}")
 
-    # 2. Check trạng thái câu hỏi hiện tại (Logic mới thêm)
-    # Tìm xem câu này đã từng được trả lời chưa
-    existing_ans = QuestionAnswer.objects.filter(
-        attempt=attempt, 
-        question_id=question_id
-    ).first()
-
     # NẾU ĐÃ CHẤM RỒI -> CHẶN LUÔN
-    if existing_ans and existing_ans.is_graded:
+    if QuestionAnswer.objects.filter(attempt=attempt, question_id=question_id, is_graded=True).exists():
         raise DomainError("Câu hỏi này đã nộp, không thể sửa lại.")
 
-    try:
-        question = Question.objects.get(id=question_id)
-    except Question.DoesNotExist:
-        raise DomainError("Câu hỏi không tồn tại.")
-
-    # 2. Lưu nháp (Update or Create)
+    # Lưu nháp (Update or Create)
     # Lưu ý: Không set score, không set is_correct, không set feedback
     QuestionAnswer.objects.update_or_create(
         attempt=attempt,
@@ -366,9 +359,8 @@ def save_question_draft(
         defaults={
             'question_type': question.type,
             'answer_data': submission_data['answer_data'],
-            # Giữ nguyên các trường chấm điểm là mặc định (hoặc 0)
             # Nếu bản ghi đã tồn tại và đã được chấm điểm trước đó (trong practice mode),
-            # việc user sửa lại đáp án sẽ làm kết quả cũ không còn giá trị -> Có thể reset score về 0.
+            # việc user sửa lại đáp án sẽ làm kết quả cũ không còn giá trị -> Reset score về 0.
             'score': 0.0,
             'is_graded': False,
             'is_correct': False,
@@ -392,8 +384,11 @@ def submit_question(
 ) -> QuizItemResultDomain:
     
     # 1. Validate Attempt
+    # Row lock: Serialize với flush nháp (answer_draft_service) và finish_quiz_attempt
     try:
-        attempt = QuizAttempt.objects.select_related('quiz').get(id=attempt_id, user=user)
+        attempt = QuizAttempt.objects.select_for_update(of=('self',))\
+            .select_related('quiz')\
+            .get(id=attempt_id, user=user)
     except QuizAttempt.DoesNotExist:
         raise DomainError("Không tìm thấy bài làm.")
 
@@ -402,6 +397,9 @@ def submit_question(
 
     if str(question_id) not in attempt.questions_order:
         raise DomainError("Câu hỏi không thuộc bài làm này.")
+
+    # Đẩy nháp đang chờ trong Redis xuống DB trước khi chấm
+    answer_draft_service.flush_attempt(attempt.id)
     
     # Check trạng thái câu hỏi (Logic mới thêm)
     existing_ans = QuestionAnswer.objects.filter(
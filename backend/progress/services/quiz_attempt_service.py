@@ -9,10 +9,12 @@ from typing import Optional
 from core.exceptions import DomainError
 from content.models import Enrollment
 from quiz.models import Quiz, Question
+from quiz.domains.answer_key_domain import QuizAnswerKeyDomain
+from quiz.services import answer_key_service, exam_context_service
 from progress.models import QuizAttempt, QuestionAnswer
 from progress.domains.quiz_attempt_domain import QuizAttemptDomain
 from progress.domains.question_result_domain import QuizItemResultDomain
-from progress.services.question_attempt_service import evaluate_answer
+from progress.services import quiz_regrade_service, answer_draft_service
 from progress.tasks import _safe_trigger_async_task
 from analytics.services.log_service import record_activity
 
@@ -24,9 +26,10 @@ logger = logging.getLogger(__name__)
 # PUBLIC INTERFACE (HELPER)
 # ==========================================
 
-def calculate_grades(attempt, all_questions_map, saved_answers_map):
+def calculate_grades(attempt, answer_keys: QuizAnswerKeyDomain, saved_answers_map):
     """
     Hàm thuần túy (Pure Function): Tính toán điểm số trong RAM.
+    answer_keys: Bộ đáp án đã biên dịch của quiz (answer_key_service.get_answer_keys).
     Trả về: (total_score, max_score, answers_to_update, answers_to_create, processed_list)
     """
     total_score = 0.0
@@ -36,60 +39,53 @@ def calculate_grades(attempt, all_questions_map, saved_answers_map):
     answers_to_create = []
     final_processed_list = []
 
-    # logger.error(f"====== DEBUG QUIZ {attempt.id} ======")
-    # logger.error(f"Order Length: {len(attempt.questions_order)}")
-    # logger.error(f"Processed Items: {len(final_processed_list)}")
+    # Duyệt theo thứ tự đề thi (questions_order), bỏ câu đã bị xóa khỏi quiz
+    ordered_ids = [uuid.UUID(q_id_str) for q_id_str in attempt.questions_order]
+    ordered_ids = [q_uuid for q_uuid in ordered_ids if q_uuid in answer_keys.keys]
 
-    # Duyệt theo thứ tự đề thi (questions_order)
-    for q_id_str in attempt.questions_order:
-        q_uuid = uuid.UUID(q_id_str)
-        question = all_questions_map.get(q_uuid)
-        
-        if not question: continue 
+    # Batch grader: Chấm tất cả câu Draft (chưa chấm) trong 1 lượt
+    drafts = {
+        q_uuid: saved_answers_map[q_uuid].answer_data
+        for q_uuid in ordered_ids
+        if q_uuid in saved_answers_map and not saved_answers_map[q_uuid].is_graded
+    }
+    graded = answer_keys.grade_many(drafts)
 
-        q_max = getattr(question, 'score', 1.0)
-        total_max_score += q_max
+    for q_uuid in ordered_ids:
+        key = answer_keys.keys[q_uuid]
+        total_max_score += key.max_score
 
         # Lấy câu trả lời user đã lưu (nếu có)
         answer_obj = saved_answers_map.get(q_uuid)
 
-        # Logic chấm điểm
         if answer_obj and answer_obj.is_graded:
             # Case 1: Đã chấm rồi (VD: user submit lẻ tẻ trước đó)
             total_score += answer_obj.score
             final_processed_list.append(answer_obj)
-        else:
-            # Case 2: Cần chấm (Draft hoặc chưa làm)
-            # Hàm evaluate_answer tách riêng để xử lý logic đúng/sai từng loại câu hỏi
-            user_data = answer_obj.answer_data if answer_obj else {}
-            score, is_correct, feedback = evaluate_answer(question, user_data)
-            
-            if answer_obj:
-                # Update Draft
-                answer_obj.score = score
-                answer_obj.is_correct = is_correct
-                answer_obj.feedback = feedback
-                answer_obj.is_graded = True
-                answers_to_update.append(answer_obj)
-                final_processed_list.append(answer_obj)
-            else:
-                # Create New (Skipped question)
-                new_ans = QuestionAnswer(
-                    attempt=attempt,
-                    question=question,
-                    question_id=question.id, # Gán ID trực tiếp để tối ưu
-                    question_type=question.type,
-                    answer_data={}, # Empty answer
-                    score=0.0,
-                    is_correct=False,
-                    is_graded=True,
-                    feedback="Chưa trả lời"
-                )
-                answers_to_create.append(new_ans)
-                final_processed_list.append(new_ans)
-
-            # logger.error(f" - Q: {question.id} | Score: {score}")
+        elif answer_obj:
+            # Case 2: Draft -> Lấy kết quả từ batch grader
+            score, is_correct, feedback = graded[q_uuid]
+            answer_obj.score = score
+            answer_obj.is_correct = is_correct
+            answer_obj.feedback = feedback
+            answer_obj.is_graded = True
+            answers_to_update.append(answer_obj)
+            final_processed_list.append(answer_obj)
             total_score += score
+        else:
+            # Case 3: Bỏ qua câu hỏi -> Tạo bản ghi 0 điểm
+            new_ans = QuestionAnswer(
+                attempt=attempt,
+                question_id=q_uuid, # Gán ID trực tiếp, không cần Question object
+                question_type=key.type,
+                answer_data={}, # Empty answer
+                score=0.0,
+                is_correct=False,
+                is_graded=True,
+                feedback="Chưa trả lời"
+            )
+            answers_to_create.append(new_ans)
+            final_processed_list.append(new_ans)
 
     return total_score, total_max_score, answers_to_update, answers_to_create, final_processed_list
 
@@ -139,36 +135,38 @@ def _build_return_domain(attempt) -> QuizAttemptDomain:
 
 @transaction.atomic
 def start_or_resume_attempt(quiz_id: uuid.UUID, user, course_id: Optional[uuid.UUID] = None):
+    """
+    Bắt đầu làm bài hoặc resume bài đang làm dở.
+    Surge mode (giờ mở đề): cấu hình quiz + pool câu hỏi lấy từ exam context đã cache
+    -> Tạo attempt mới chỉ tốn: 1 query tìm bài dở, 1 query enrollment, 1 INSERT.
+    """
     # 1. Tìm bài đang làm dở
     attempt = QuizAttempt.objects.filter(
         user=user, 
         quiz_id=quiz_id, 
         status='in_progress'
-    ).first()
+    ).select_related('quiz').first()
 
     if not attempt:
-        # 2. Nếu không có, tạo mới (New Attempt)
-        quiz = Quiz.objects.get(id=quiz_id)
+        # 2. Nếu không có, tạo mới (New Attempt) từ exam context (Quiz + pool ID câu hỏi)
+        context = exam_context_service.get_exam_context(quiz_id)
+        quiz = context.quiz
 
-        enrollment = None
+        enrollment_id = None
         if course_id:
             # Nếu có course_id, tìm enrollment tương ứng để link vào
-            enrollment = Enrollment.objects.filter(
+            enrollment_id = Enrollment.objects.filter(
                 user=user, 
                 course_id=course_id
-            ).first()
+            ).values_list('id', flat=True).first()
         else:
             # (Optional) Nếu không gửi course_id, có thể thử tìm enrollment gần nhất
             # chứa quiz này (dùng magic query của bạn) để auto-link.
             pass
 
         # --- LOGIC RANDOM CÂU HỎI TẠI ĐÂY ---
-        # Lấy tất cả ID câu hỏi của Quiz
-        all_q_ids = list(quiz.questions.values_list('id', flat=True))
-
-        # Lấy số lượng câu theo cấu hình
-        count = quiz.questions_count if 0 < quiz.questions_count < len(all_q_ids) else len(all_q_ids)
-        selected_ids = random.sample(all_q_ids, count)
+        # Pool ID câu hỏi đã nằm sẵn trong RAM, lấy số lượng câu theo cấu hình
+        selected_ids = random.sample(context.question_ids, context.pick_count)
 
         # Xử lý: Đảo vị trí (Shuffle)
         if quiz.shuffle_questions:
@@ -177,7 +175,7 @@ def start_or_resume_attempt(quiz_id: uuid.UUID, user, course_id: Optional[uuid.U
         attempt = QuizAttempt.objects.create(
             user=user, 
             quiz=quiz,
-            enrollment=enrollment,
+            enrollment_id=enrollment_id,
             questions_order=[str(uid) for uid in selected_ids], # Lưu cứng thứ tự
             attempt_mode=quiz.mode
         )
@@ -207,18 +205,19 @@ def finish_quiz_attempt(attempt_id: uuid.UUID, user) -> QuizAttemptDomain:
     if attempt.status == 'submitted':
         return _build_return_domain(attempt)
 
+    # Nháp autosave còn nằm trong Redis -> Ghi xuống DB trước khi chấm (đang giữ row lock)
+    answer_draft_service.flush_attempt(attempt.id)
+
     # 2. --- BATCH GRADING (Chấm điểm hàng loạt) ---
-    # Lấy danh sách ID câu hỏi trong đề thi này (theo thứ tự đã random)
-    question_ids = [uuid.UUID(i) for i in attempt.questions_order]
-    all_questions_map = Question.objects.in_bulk(question_ids)
+    # Bộ đáp án đã biên dịch của quiz (cache theo version bộ câu hỏi) -> Không query Question mỗi lần nộp
+    answer_keys = answer_key_service.get_answer_keys(attempt.quiz_id)
     
     # Lấy tất cả câu trả lời user đã lưu (Draft hoặc đã Submit lẻ)
-    # Dùng in_bulk để map ID -> Object cho nhanh
     saved_answers_qs = QuestionAnswer.objects.filter(attempt=attempt)
     saved_answers = {a.question_id: a for a in saved_answers_qs}
     
     total_score, max_score, to_update, to_create, final_list = calculate_grades(
-        attempt, all_questions_map, saved_answers
+        attempt, answer_keys, saved_answers
     )
 
     # 3. Bulk Update/Create (Chỉ tác động những câu draft/new)
@@ -268,8 +267,7 @@ def finish_quiz_attempt(attempt_id: uuid.UUID, user) -> QuizAttemptDomain:
     # Attach list question đã chấm vào attempt để helper function dùng luôn
     # Cần map lại object question vào answer để domain lấy được text câu hỏi
     for ans in final_list:
-        if not hasattr(ans, 'question'): 
-             ans.question = all_questions_map.get(ans.question_id)
+        ans.question = answer_keys.questions.get(ans.question_id)
              
     attempt._cached_graded_answers = final_list
     return _build_return_domain(attempt)
@@ -291,47 +289,40 @@ def regrade_quiz_attempt(attempt_id: uuid.UUID) -> QuizAttemptDomain:
     except QuizAttempt.DoesNotExist:
         raise DomainError("Không tìm thấy bài làm.")
 
-    # Lấy danh sách câu hỏi và câu trả lời
-    question_ids = attempt.questions_order
-    
     # Map Question ID -> Answer Object
     saved_answers = QuestionAnswer.objects.filter(attempt=attempt).in_bulk(field_name='question_id')
     
-    # Map Question ID -> Question Object (Dữ liệu MỚI NHẤT từ DB)
-    q_uuids = [uuid.UUID(q_id) for q_id in question_ids]
-    questions_map = Question.objects.filter(id__in=q_uuids).in_bulk()
+    # Bộ đáp án đã biên dịch theo version MỚI NHẤT (giáo viên sửa đáp án -> version bị bump sau commit)
+    answer_keys = answer_key_service.get_answer_keys(attempt.quiz_id)
+    q_uuids = [uuid.UUID(q_id) for q_id in attempt.questions_order]
+    q_uuids = [q_uuid for q_uuid in q_uuids if q_uuid in answer_keys.keys]
+
+    # 1. Tính lại Max Score (đề phòng giáo viên sửa thang điểm)
+    total_max_score = sum(answer_keys.keys[q_uuid].max_score for q_uuid in q_uuids)
+
+    # --- FORCE RE-EVALUATE --- Luôn luôn chấm lại (batch), không quan tâm is_graded cũ
+    # Nếu user chưa làm câu này thì vẫn là 0 điểm
+    graded = answer_keys.grade_many({
+        q_uuid: saved_answers[q_uuid].answer_data for q_uuid in q_uuids if q_uuid in saved_answers
+    })
 
     total_score = 0.0
-    total_max_score = 0.0
-    
     answers_to_update = []
 
-    for q_id_uuid, question in questions_map.items():
-        # 1. Tính lại Max Score (đề phòng giáo viên sửa thang điểm)
-        q_max = getattr(question, 'score', 1.0)
-        total_max_score += q_max
+    for q_uuid, (score, is_correct, feedback) in graded.items():
+        answer_obj = saved_answers[q_uuid]
 
-        answer_obj = saved_answers.get(q_id_uuid)
-
-        if answer_obj:
-            # --- FORCE RE-EVALUATE ---
-            # Luôn luôn chấm lại, không quan tâm is_graded cũ
-            score, is_correct, feedback = evaluate_answer(question, answer_obj.answer_data)
-            
-            # Chỉ update nếu có sự thay đổi (Optimization nhỏ)
-            if (answer_obj.score != score or 
-                answer_obj.is_correct != is_correct):
-                
-                answer_obj.score = score
-                answer_obj.is_correct = is_correct
-                answer_obj.feedback = feedback
-                answer_obj.is_graded = True
-                answers_to_update.append(answer_obj)
+        # Chỉ update nếu có sự thay đổi (Optimization nhỏ)
+        if (answer_obj.score != score or 
+            answer_obj.is_correct != is_correct):
             
-            total_score += score
-        else:
-            # Nếu user chưa làm câu này thì vẫn là 0 điểm
-            pass
+            answer_obj.score = score
+            answer_obj.is_correct = is_correct
+            answer_obj.feedback = feedback
+            answer_obj.is_graded = True
+            answers_to_update.append(answer_obj)
+        
+        total_score += score
 
     # 2. Bulk Update
     if answers_to_update:
@@ -352,20 +343,6 @@ def regrade_quiz_attempt(attempt_id: uuid.UUID) -> QuizAttemptDomain:
 def regrade_all_attempts_in_quiz(quiz_id: uuid.UUID):
     """
     Chạy Batch Job để chấm lại toàn bộ bài thi của 1 Quiz.
+    Job chạy ngầm trên Celery theo chunk (quiz_regrade_service), trả về trạng thái job để theo dõi tiến độ.
     """
-    # Lấy tất cả bài đã nộp của quiz này
-    attempts = QuizAttempt.objects.filter(
-        quiz_id=quiz_id, 
-        status='submitted' # Chỉ chấm lại bài đã nộp
-    ).values_list('id', flat=True)
-
-    count = 0
-    for attempt_id in attempts:
-        try:
-            regrade_quiz_attempt(attempt_id)
-            count += 1
-        except Exception as e:
-            # Log error nhưng không dừng loop
-            logger.error(f"Failed to regrade attempt {attempt_id}: {e}")
-
-    return {"detail": f"Đã chấm lại thành công {count} bài thi."}
\ No newline at end of file
+    return quiz_regrade_service.start_regrade_job(quiz_id)
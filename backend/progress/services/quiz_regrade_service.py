@@ -0,0 +1,299 @@
+import time
+import uuid
+import logging
+from typing import Dict, Any, List, Optional
+from django.db import connection, transaction
+from django_redis import get_redis_connection
+
+from core.exceptions import DomainError
+from core.services import bulk_update_service
+from quiz.models import Quiz
+from quiz.services import answer_key_service
+from progress.models import QuizAttempt, QuestionAnswer
+from progress.domains.regrade_job_domain import RegradeJobDomain
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'progress:regrade'
+
+# Số attempt / 1 Celery task (mọi câu trả lời của 1 attempt luôn nằm cùng 1 chunk -> tính lại tổng điểm được)
+ATTEMPTS_PER_CHUNK = 200
+
+# Số QuestionAnswer đọc mỗi trang (keyset theo id) trong 1 chunk
+ANSWER_PAGE_SIZE = 2000
+
+JOB_TTL_SECONDS = 24 * 60 * 60
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _get_redis():
+    return get_redis_connection('default')
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _job_key(job_id: str) -> str:
+    return f'{KEY_PREFIX}:job:{job_id}'
+
+
+def _active_key(quiz_id) -> str:
+    return f'{KEY_PREFIX}:quiz:{quiz_id}:active'
+
+
+def _last_key(quiz_id) -> str:
+    return f'{KEY_PREFIX}:quiz:{quiz_id}:last'
+
+
+def _settled_key(job_id: str) -> str:
+    # Set các chunk đã xong/hỏng hẳn -> Task bị giao lại (retry, redelivery) không bị đếm 2 lần
+    return f'{KEY_PREFIX}:job:{job_id}:settled'
+
+
+def _read_job(redis_conn, job_id: str) -> Dict[str, str]:
+    return {_decode(k): _decode(v) for k, v in redis_conn.hgetall(_job_key(job_id)).items()}
+
+
+def _finish_job(redis_conn, job_id: str, quiz_id, status: str, error: Optional[str] = None) -> None:
+    mapping = {'status': status, 'finished_at': time.time()}
+    if error:
+        mapping['error'] = error[:2000]
+    redis_conn.hset(_job_key(job_id), mapping=mapping)
+    if _decode(redis_conn.get(_active_key(quiz_id))) == job_id:
+        redis_conn.delete(_active_key(quiz_id))
+
+
+# ==========================================
+# PUBLIC INTERFACE (START)
+# ==========================================
+
+def start_regrade_job(quiz_id: uuid.UUID) -> RegradeJobDomain:
+    """
+    Tạo job chấm lại toàn bộ bài đã nộp của quiz và đẩy sang Celery.
+    Mỗi quiz chỉ chạy 1 job tại 1 thời điểm: gọi lại khi đang chạy -> Trả về job hiện tại.
+    """
+    from progress.tasks import plan_quiz_regrade
+
+    if not Quiz.objects.filter(id=quiz_id).exists():
+        raise DomainError("Không tìm thấy bài trắc nghiệm.")
+
+    redis_conn = _get_redis()
+    job_id = uuid.uuid4().hex
+
+    if not redis_conn.set(_active_key(quiz_id), job_id, nx=True, ex=JOB_TTL_SECONDS):
+        running_id = _decode(redis_conn.get(_active_key(quiz_id)))
+        job = get_job(running_id)
+        if job:
+            return job
+        # Hash của job cũ đã hết hạn nhưng lock còn -> Chiếm lại lock
+        redis_conn.set(_active_key(quiz_id), job_id, ex=JOB_TTL_SECONDS)
+
+    pipe = redis_conn.pipeline()
+    pipe.hset(_job_key(job_id), mapping={
+        'quiz_id': str(quiz_id),
+        'status': 'pending',
+        'started_at': time.time(),
+    })
+    pipe.expire(_job_key(job_id), JOB_TTL_SECONDS)
+    pipe.set(_last_key(quiz_id), job_id, ex=JOB_TTL_SECONDS)
+    pipe.execute()
+
+    transaction.on_commit(lambda: plan_quiz_regrade.delay(job_id, str(quiz_id)))
+    return get_job(job_id)
+
+
+def chunk_attempt_ids(quiz_id: uuid.UUID, chunk_size: int = ATTEMPTS_PER_CHUNK) -> List[List[str]]:
+    """Chia các attempt đã nộp thành chunk (keyset theo id, không OFFSET)."""
+    chunks: List[List[str]] = []
+
+    attempts = QuizAttempt.objects.filter(quiz_id=quiz_id, status='submitted').order_by('id')
+    last_id = None
+    while True:
+        page = attempts.filter(id__gt=last_id) if last_id else attempts
+        ids = list(page.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        chunks.append([str(i) for i in ids])
+        last_id = ids[-1]
+
+    return chunks
+
+
+def plan_job(job_id: str, quiz_id: uuid.UUID) -> List[List[str]]:
+    """
+    Chia chunk rồi ghi tổng số attempt/chunk vào job TRƯỚC khi dispatch
+    để chunk cuối cùng được settle biết mình là cuối.
+    """
+    redis_conn = _get_redis()
+    chunks = chunk_attempt_ids(quiz_id)
+
+    redis_conn.hset(_job_key(job_id), mapping={
+        'status': 'running' if chunks else 'done',
+        'total_attempts': sum(len(c) for c in chunks),
+        'chunks_total': len(chunks),
+        'started_at': time.time(),
+    })
+    if not chunks:
+        _finish_job(redis_conn, job_id, quiz_id, 'done')
+
+    return chunks
+
+
+# ==========================================
+# PUBLIC INTERFACE (CHUNK)
+# ==========================================
+
+def regrade_attempts(quiz_id: uuid.UUID, attempt_ids: List[str]) -> Dict[str, int]:
+    """
+    Chấm lại 1 chunk attempt trong RAM:
+    - Bộ đáp án đã biên dịch load 1 lần (answer_key_service, cache theo version).
+    - QuestionAnswer đọc theo trang keyset (id > last_id), chỉ lấy cột cần thiết.
+    - Ghi lại câu thay đổi + tổng điểm attempt bằng UPDATE ... FROM (VALUES ...), 1 transaction / chunk.
+    Chạy lại cùng chunk cho cùng kết quả (điểm tính lại từ đầu) -> Retry an toàn.
+    """
+    answer_keys = answer_key_service.get_answer_keys(quiz_id)
+    pass_score = Quiz.objects.filter(id=quiz_id).values_list('pass_score', flat=True).first()
+
+    attempts = {
+        str(a['id']): set(a['questions_order'])
+        for a in QuizAttempt.objects.filter(id__in=attempt_ids).values('id', 'questions_order')
+    }
+    totals = {attempt_id: 0.0 for attempt_id in attempts}
+
+    changed_rows = []
+    processed = 0
+    answers = QuestionAnswer.objects.filter(attempt_id__in=attempt_ids) \
+        .only('id', 'attempt_id', 'question_id', 'answer_data', 'score', 'is_correct') \
+        .order_by('id')
+
+    last_id = None
+    while True:
+        page = list((answers.filter(id__gt=last_id) if last_id else answers)[:ANSWER_PAGE_SIZE])
+        if not page:
+            break
+        last_id = page[-1].id
+
+        for answer in page:
+            # Chỉ chấm câu còn nằm trong đề của attempt và còn tồn tại trong quiz
+            if answer.question_id not in answer_keys.keys or str(answer.question_id) not in attempts.get(str(answer.attempt_id), set()):
+                continue
+            score, is_correct, feedback = answer_keys.keys[answer.question_id].grade(answer.answer_data)
+            totals[str(answer.attempt_id)] += score
+            processed += 1
+            if answer.score != score or answer.is_correct != is_correct:
+                changed_rows.append((answer.id, score, is_correct, feedback, True))
+
+    attempt_rows = []
+    for attempt_id, questions_order in attempts.items():
+        max_score = sum(
+            answer_keys.keys[q_uuid].max_score
+            for q_uuid in (uuid.UUID(q) for q in questions_order)
+            if q_uuid in answer_keys.keys
+        )
+        pass_threshold = float(pass_score) if pass_score else max_score * 0.5
+        attempt_rows.append((attempt_id, totals[attempt_id], max_score, totals[attempt_id] >= pass_threshold))
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            bulk_update_service.update_from_values(
+                QuestionAnswer, [('id', QuestionAnswer._meta.pk.db_type(connection))],
+                [('score', 'float8'), ('is_correct', 'boolean'), ('feedback', 'text'), ('is_graded', 'boolean')],
+                changed_rows
+            )
+            bulk_update_service.update_from_values(
+                QuizAttempt, [('id', QuizAttempt._meta.pk.db_type(connection))],
+                [('score', 'float8'), ('max_score', 'float8'), ('is_passed', 'boolean')],
+                attempt_rows
+            )
+        else:
+            # Fallback (SQLite khi dev/test)
+            QuestionAnswer.objects.bulk_update(
+                [QuestionAnswer(id=r[0], score=r[1], is_correct=r[2], feedback=r[3], is_graded=r[4]) for r in changed_rows],
+                ['score', 'is_correct', 'feedback', 'is_graded']
+            )
+            QuizAttempt.objects.bulk_update(
+                [QuizAttempt(id=r[0], score=r[1], max_score=r[2], is_passed=r[3]) for r in attempt_rows],
+                ['score', 'max_score', 'is_passed']
+            )
+
+    return {'attempts': len(attempts), 'answers': processed, 'changed': len(changed_rows)}
+
+
+def regrade_chunk(job_id: str, quiz_id: uuid.UUID, attempt_ids: List[str]) -> Dict[str, int]:
+    """Chấm lại 1 chunk rồi settle chunk đó vào tiến độ job."""
+    stats = regrade_attempts(quiz_id, attempt_ids)
+    _settle_chunk(job_id, quiz_id, attempt_ids, stats=stats)
+    return stats
+
+
+def fail_chunk(job_id: str, quiz_id, attempt_ids: List[str], error: str) -> None:
+    """
+    Chunk đã hết lượt retry: Ghi nhận lỗi nhưng KHÔNG kết thúc job ngay -
+    các chunk khác vẫn đang ghi, job chỉ kết thúc (và nhả lock) khi mọi chunk đã settle.
+    """
+    _settle_chunk(job_id, quiz_id, attempt_ids, error=error)
+
+
+def _settle_chunk(job_id: str, quiz_id, attempt_ids: List[str], stats: Optional[Dict[str, int]] = None,
+                  error: Optional[str] = None) -> None:
+    """
+    Đánh dấu 1 chunk đã xong (stats) hoặc hỏng hẳn (error), mỗi chunk chỉ 1 lần.
+    Chunk cuối cùng settle -> Kết thúc job: 'done' nếu không chunk nào hỏng, ngược lại 'failed'.
+    """
+    redis_conn = _get_redis()
+    chunk_id = attempt_ids[0] if attempt_ids else ''
+
+    if not redis_conn.sadd(_settled_key(job_id), chunk_id):
+        logger.info(f"Regrade job {job_id}: chunk {chunk_id} đã được tính, bỏ qua")
+        return
+
+    pipe = redis_conn.pipeline()
+    pipe.expire(_settled_key(job_id), JOB_TTL_SECONDS)
+    if error is None:
+        pipe.hincrby(_job_key(job_id), 'processed_attempts', stats['attempts'])
+        pipe.hincrby(_job_key(job_id), 'processed_answers', stats['answers'])
+        pipe.hincrby(_job_key(job_id), 'changed_answers', stats['changed'])
+        pipe.hincrby(_job_key(job_id), 'chunks_done', 1)
+    else:
+        pipe.hset(_job_key(job_id), 'error', error[:2000])
+        pipe.hincrby(_job_key(job_id), 'chunks_failed', 1)
+    pipe.hmget(_job_key(job_id), ['chunks_done', 'chunks_failed', 'chunks_total'])
+    done, failed, total = (int(_decode(v) or 0) for v in pipe.execute()[-1])
+
+    if done + failed >= total:
+        status = 'failed' if failed else 'done'
+        _finish_job(redis_conn, job_id, quiz_id, status, _read_job(redis_conn, job_id).get('error'))
+        logger.info(f"Regrade job {job_id} (quiz {quiz_id}) {status}: {done}/{total} chunks ok")
+
+
+def fail_job(job_id: str, quiz_id, error: str) -> None:
+    """Job hỏng trước khi dispatch chunk nào (bước plan) -> Kết thúc ngay."""
+    _finish_job(_get_redis(), job_id, quiz_id, 'failed', error)
+
+
+# ==========================================
+# PUBLIC INTERFACE (STATUS)
+# ==========================================
+
+def get_job(job_id: str) -> Optional[RegradeJobDomain]:
+    if not job_id:
+        return None
+    data = _read_job(_get_redis(), job_id)
+    if not data:
+        return None
+    return RegradeJobDomain.from_hash(job_id, data)
+
+
+def get_latest_job(quiz_id: uuid.UUID) -> Optional[RegradeJobDomain]:
+    """Job gần nhất của quiz (đang chạy hoặc vừa xong trong 24h)."""
+    return get_job(_decode(_get_redis().get(_last_key(quiz_id))))
@@ -1,13 +1,15 @@
 import logging
 from celery import shared_task
+from django.db import transaction
 from django.db.models import F
-from django.db.models.functions import Round 
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 from custom_account.models import UserModel
 from content.models import ContentBlock, Enrollment, Lesson
 from progress.models import QuizAttempt, UserBlockProgress, LessonCompletion, ModuleCompletion
 from analytics.services.log_service import record_activity
+from progress.services import progress_counter_service
 
 
 
@@ -16,90 +18,147 @@ logger = logging.getLogger(__name__)
 @shared_task
 def calculate_aggregation(enrollment_id: str, lesson_id: str):
     """
-    Hàm này chạy NẶNG, chuyên để tính toán Domino:
-    Block Done -> Check Lesson -> Check Module -> Check Course
+    Hàm này tính toán Domino bằng COUNTER (không COUNT lại toàn bộ khóa học):
+    Block Done -> Đếm lại LessonCompletion.completed_blocks (chỉ trong 1 lesson, idempotent)
+               -> (đủ block) +1 ModuleCompletion.completed_lessons
+               -> (đủ block) +1 Enrollment.cached_completed_lessons
+    Mẫu số lấy từ Lesson.cached_total_blocks / Module.cached_total_lessons / Enrollment.cached_total_lessons.
+    Nếu counter bị lệch (sửa/xóa nội dung...) -> chạy `manage.py rebuild_progress_counters`.
     """
     try:
-        enrollment = Enrollment.objects.get(id=enrollment_id)
-        lesson = Lesson.objects.get(id=lesson_id)
-        module = lesson.module
-        course = module.course
-    except (Enrollment.DoesNotExist, Lesson.DoesNotExist):
+        lesson = Lesson.objects.select_related('module').get(id=lesson_id)
+    except Lesson.DoesNotExist:
         return
 
-    # --- 1. DOMINO CẤP LESSON ---
-    # Đếm số block đã xong trong lesson này
-    total_blocks = ContentBlock.objects.filter(lesson=lesson).count()
-    completed_blocks = UserBlockProgress.objects.filter(
-        enrollment=enrollment, 
-        block__lesson=lesson, 
-        is_completed=True
-    ).count()
+    module = lesson.module
+    now = timezone.now()
 
-    is_lesson_just_finished = False
-    
-    if total_blocks > 0 and completed_blocks >= total_blocks:
-        # Upsert LessonCompletion
-        obj, created = LessonCompletion.objects.update_or_create(
+    with transaction.atomic():
+        # Lock enrollment trước: Serialize các event hoàn thành của cùng 1 học viên
+        try:
+            enrollment = Enrollment.objects.select_for_update().get(id=enrollment_id)
+        except Enrollment.DoesNotExist:
+            return
+
+        # --- 1. DOMINO CẤP LESSON ---
+        total_blocks = _ensure_total(lesson, 'cached_total_blocks', ContentBlock.objects.filter(lesson=lesson))
+
+        lesson_progress, _ = LessonCompletion.objects.select_for_update().get_or_create(
             enrollment=enrollment,
             lesson=lesson,
-            defaults={'is_completed': True, 'completed_at': timezone.now()}
         )
-        if created or not obj.is_completed:
-            is_lesson_just_finished = True
+        # Đếm lại block đã xong của lesson (1 COUNT trên vài chục dòng) thay vì +1:
+        # Task bị retry / 2 event cùng 1 block không bị cộng 2 lần -> Idempotent
+        done_blocks = UserBlockProgress.objects.filter(
+            enrollment=enrollment, block__lesson=lesson, is_completed=True
+        ).count()
+        lesson_progress.completed_blocks = min(done_blocks, total_blocks)
+
+        is_lesson_just_finished = (
+            not lesson_progress.is_completed
+            and total_blocks > 0
+            and lesson_progress.completed_blocks >= total_blocks
+        )
+        if is_lesson_just_finished:
+            lesson_progress.is_completed = True
+            lesson_progress.completed_at = now
 
-    if not is_lesson_just_finished:
-        return
+        lesson_progress.save(update_fields=['completed_blocks', 'is_completed', 'completed_at'])
 
-    # --- 2. DOMINO CẤP COURSE (Chỉ chạy nếu lesson vừa xong hoặc định kỳ) ---
-    # Để tối ưu, chỉ tính lại % course nếu lesson có sự thay đổi, 
-    # hoặc bạn có thể chọn luôn tính lại để đảm bảo chính xác.
-    total_lessons_in_module = Lesson.objects.filter(module=module).count()
+        if not is_lesson_just_finished:
+            return
 
-    completed_lessons_in_module = LessonCompletion.objects.filter(
-        enrollment=enrollment,
-        lesson__module=module,
-        is_completed=True
-    ).count()
+        # --- 2. DOMINO CẤP MODULE ---
+        total_lessons_in_module = _ensure_total(module, 'cached_total_lessons', Lesson.objects.filter(module=module))
 
-    if total_lessons_in_module > 0 and completed_lessons_in_module == total_lessons_in_module:
-        # Đánh dấu Module đã xong
-        ModuleCompletion.objects.get_or_create(
+        module_progress, _ = ModuleCompletion.objects.select_for_update().get_or_create(
             enrollment=enrollment,
             module=module,
-            defaults={'is_completed': True, 'completed_at': timezone.now()}
         )
-        # TODO: Tại đây có thể trigger sự kiện "Unlock Module Tiếp Theo" nếu có logic đó.
-    
-    # Query tổng lesson
-    total_lessons_course = Lesson.objects.filter(module__course=course).count()
-    
-    # Query lesson đã xong
-    completed_lessons_course = LessonCompletion.objects.filter(
-        enrollment=enrollment, is_completed=True
-    ).count()
+        module_progress.completed_lessons = min(module_progress.completed_lessons + 1, total_lessons_in_module)
 
-    enrollment.cached_total_lessons = total_lessons_course
-    enrollment.cached_completed_lessons = completed_lessons_course
+        if not module_progress.is_completed and module_progress.completed_lessons >= total_lessons_in_module:
+            # Đánh dấu Module đã xong
+            module_progress.is_completed = True
+            module_progress.completed_at = now
+            # TODO: Tại đây có thể trigger sự kiện "Unlock Module Tiếp Theo" nếu có logic đó.
 
-    if total_lessons_course > 0:
-        new_percent = round((completed_lessons_course / total_lessons_course) * 100, 2)
-        new_percent = min(100.0, new_percent)
+        module_progress.save(update_fields=['completed_lessons', 'is_completed', 'completed_at'])
 
-        # Update Enrollment (Dùng update_fields cho nhẹ)
-        if enrollment.percent_completed != new_percent:
-            enrollment.percent_completed = new_percent
-            if new_percent == 100:
+        # --- 3. DOMINO CẤP COURSE ---
+        total_lessons_course = _ensure_total(
+            enrollment, 'cached_total_lessons', Lesson.objects.filter(module__course_id=module.course_id), save=False
+        )
+        enrollment.cached_completed_lessons = min(enrollment.cached_completed_lessons + 1, total_lessons_course)
+
+        if total_lessons_course > 0:
+            new_percent = round((enrollment.cached_completed_lessons / total_lessons_course) * 100, 2)
+            enrollment.percent_completed = min(100.0, new_percent)
+
+            if enrollment.percent_completed == 100 and not enrollment.is_completed:
                 enrollment.is_completed = True
-                enrollment.completed_at = timezone.now()
-            
-            enrollment.save(update_fields=[
-                'percent_completed', 
-                'cached_total_lessons', 
-                'cached_completed_lessons',
-                'is_completed', 
-                'completed_at'
-            ])
+                enrollment.completed_at = now
+
+        # Update Enrollment (Dùng update_fields cho nhẹ)
+        enrollment.save(update_fields=[
+            'percent_completed',
+            'cached_total_lessons',
+            'cached_completed_lessons',
+            'is_completed',
+            'completed_at'
+        ])
+
+
+def _ensure_total(obj, field: str, source_qs, save: bool = True) -> int:
+    """
+    Lấy mẫu số đã cache. Nếu = 0 (dữ liệu cũ chưa backfill) thì đếm 1 lần rồi lưu lại.
+    Một block/lesson vừa hoàn thành thì mẫu số chắc chắn > 0, nên 0 nghĩa là cache chưa có.
+    """
+    total = getattr(obj, field)
+    if total > 0:
+        return total
+
+    total = source_qs.count()
+    setattr(obj, field, total)
+    if save:
+        obj.save(update_fields=[field])
+    return total
+
+
+@shared_task
+def flush_heartbeat_buffer():
+    """
+    Chạy định kỳ (Celery Beat, mỗi 30s).
+    Đẩy các heartbeat đang nằm trong Redis xuống UserBlockProgress bằng batched upsert.
+    """
+    from progress.services import heartbeat_buffer_service
+
+    if not heartbeat_buffer_service.is_enabled():
+        return 0
+
+    try:
+        return heartbeat_buffer_service.flush()
+    except Exception as e:
+        logger.error(f"Error flushing heartbeat buffer: {e}")
+        return 0
+
+
+@shared_task
+def flush_quiz_draft_buffer():
+    """
+    Chạy định kỳ (Celery Beat, mỗi 15s).
+    Đẩy nháp autosave đang nằm trong Redis xuống QuestionAnswer theo batch.
+    """
+    from progress.services import answer_draft_service
+
+    if not answer_draft_service.is_enabled():
+        return 0
+
+    try:
+        return answer_draft_service.flush()
+    except Exception as e:
+        logger.error(f"Error flushing quiz draft buffer: {e}")
+        return 0
 
 
 def _safe_trigger_async_task(attempt_id, user_id, course_id):
@@ -192,7 +251,6 @@ def process_content_addition_impact(lesson_id):
     )
     
     affected_enrollment_ids = list(affected_lesson_completions.values_list('enrollment_id', flat=True))
-    logger.info(f"helooooooooooooooooooooooooooo {len(affected_enrollment_ids)}")
 
     if not affected_enrollment_ids:
         return # Không có ai bị ảnh hưởng
@@ -203,71 +261,91 @@ def process_content_addition_impact(lesson_id):
     # Chuyển lesson về chưa hoàn thành
     affected_lesson_completions.update(is_completed=False, completed_at=None)
 
+    # Module chứa lesson này cũng mất 1 lesson đã xong (giữ counter đồng bộ)
+    ModuleCompletion.objects.filter(
+        enrollment_id__in=affected_enrollment_ids,
+        module_id=lesson.module_id
+    ).update(
+        completed_lessons=Greatest(F('completed_lessons') - 1, 0),
+        is_completed=False
+    )
+
     # -------------------------------------------------------
-    # 3. CẬP NHẬT ENROLLMENT (Bulk Update - Rất quan trọng để tối ưu)
+    # 3. CẬP NHẬT ENROLLMENT (Set-based, chunk theo id)
     # -------------------------------------------------------
-    # Logic:
-    # - cached_completed_lessons: Giảm đi 1 (do lesson này vừa bị đánh dấu chưa xong)
-    # - is_completed: Chắc chắn False (vì ít nhất 1 lesson chưa xong)
-    # - percent_completed: Tính lại.
-    
-    # Lưu ý: Việc tính lại chính xác % cho hàng nghìn user bằng 1 câu lệnh SQL
-    # hơi phức tạp nếu số lesson khác nhau (dynamic). 
-    # Cách an toàn và nhanh nhất ở đây là dùng F expression để giảm count,
-    # sau đó tính tương đối hoặc trigger tính lại.
-    
-    # Ở đây tôi chọn cách update count và reset flag trước (nhanh nhất).
-    # Việc tính lại % chính xác tuyệt đối có thể để User tự trigger khi họ vào học tiếp,
-    # HOẶC tính toán ngay tại đây nếu cần hiển thị đúng ngay lập tức.
-    
-    # Lấy tổng số lesson hiện tại của Course
-    total_lessons = Lesson.objects.filter(module__course=course).count()
-    logger.info(f"tổng số lesson hiện tại của Course {total_lessons}")
-    
-    if total_lessons > 0:
-        # Giảm số lesson đã hoàn thành đi 1 cho tất cả user bị ảnh hưởng
-        Enrollment.objects.filter(id__in=affected_enrollment_ids).update(
-            cached_completed_lessons=F('cached_completed_lessons') - 1,
-            is_completed=False,
-            completed_at=None
-            # percent_completed: Tạm thời chưa update ngay để tránh lock bảng quá lâu
-            # hoặc update bằng công thức SQL bên dưới
-        )
+    # Tính lại từ bảng gốc cho TOÀN BỘ enrollment của khóa học thay vì trừ counter bằng F():
+    # vừa cập nhật người bị ảnh hưởng, vừa sửa luôn các counter đã lệch từ trước.
+    progress_counter_service.recompute_enrollment_progress(course.id)
 
-        # (Optional) Update Percent ngay lập tức bằng SQL Expression
-        # percent = (cached_completed_lessons / total_lessons) * 100
-        Enrollment.objects.filter(id__in=affected_enrollment_ids).update(
-            percent_completed=Round(
-                (F('cached_completed_lessons') * 100.0) / total_lessons, 
-                2
-            )
-        )
+
+@shared_task
+def process_content_removal_impact(lesson_id):
+    """
+    Chạy ngầm khi giáo viên xóa hoặc đổi loại ContentBlock (đối xứng với process_content_addition_impact).
+    Mẫu số / tử số của lesson đổi -> Đánh giá lại hoàn thành lesson (kéo theo Module + % khóa học).
+    """
+    try:
+        progress_counter_service.reevaluate_lesson(lesson_id)
+    except Exception as e:
+        logger.error(f"Error re-evaluating lesson {lesson_id} after block removal: {e}")
+        raise
 
 
 @shared_task
 def process_lesson_addition_impact(course_id):
     """
     Chạy ngầm khi giáo viên tạo Lesson mới.
-    Logic:
-    1. Update lại cached_total_lessons cho toàn bộ Enrollment.
-    2. Reset trạng thái is_completed = False (vì vừa mọc ra bài mới chưa học).
-    3. Tính lại % hoàn thành dựa trên mẫu số mới.
+    Tính lại cached_total_lessons / cached_completed_lessons / percent_completed / is_completed
+    cho toàn bộ Enrollment của khóa học (set-based, chunk theo id).
+    Lưu ý: Lúc này transaction bên ngoài đã commit, nên count sẽ bao gồm bài vừa tạo.
     """
-    # Lấy chính xác tổng số lesson hiện tại trong DB
-    # Lưu ý: Lúc này transaction bên ngoài đã commit, nên count sẽ bao gồm bài vừa tạo.
-    new_total_lessons = Lesson.objects.filter(module__course_id=course_id).count()
+    progress_counter_service.recompute_enrollment_progress(course_id)
 
-    if new_total_lessons == 0:
+
+@shared_task
+def recompute_course_progress(course_id, module_id=None):
+    """
+    Chạy ngầm sau khi xóa Lesson/Module: mẫu số giảm -> % và trạng thái hoàn thành thay đổi.
+    module_id: Module vừa bị xóa bớt lesson -> Đánh giá lại hoàn thành module trước (đã gồm tính lại %).
+    """
+    if module_id:
+        progress_counter_service.reevaluate_module(module_id)
         return
+    progress_counter_service.recompute_enrollment_progress(course_id)
 
-    # BULK UPDATE: Cực nhanh, xử lý hàng nghìn user trong tích tắc
-    # Công thức: percent = (đã_học / tổng_mới) * 100
-    Enrollment.objects.filter(course_id=course_id).update(
-        cached_total_lessons=new_total_lessons,
-        is_completed=False,  # Chắc chắn chưa xong vì có bài mới
-        completed_at=None,   # Reset ngày hoàn thành
-        percent_completed=Round(
-            (F('cached_completed_lessons') * 100.0) / new_total_lessons, 
-            2
-        )
-    )
\ No newline at end of file
+
+@shared_task
+def plan_quiz_regrade(job_id: str, quiz_id: str):
+    """
+    Bước 1 của job chấm lại: Chia attempt đã nộp thành chunk, mỗi chunk 1 task chạy song song trên worker.
+    """
+    from progress.services import quiz_regrade_service
+
+    try:
+        chunks = quiz_regrade_service.plan_job(job_id, quiz_id)
+    except Exception as e:
+        logger.error(f"Regrade job {job_id} planning failed: {e}", exc_info=True)
+        quiz_regrade_service.fail_job(job_id, quiz_id, str(e))
+        return
+
+    for attempt_ids in chunks:
+        regrade_attempt_chunk.delay(job_id, quiz_id, attempt_ids)
+
+
+@shared_task(bind=True, max_retries=3)
+def regrade_attempt_chunk(self, job_id: str, quiz_id: str, attempt_ids: list):
+    """
+    Bước 2: Chấm lại 1 chunk attempt (set-based update) + cập nhật tiến độ job.
+    Lỗi -> Retry (chấm lại chunk là idempotent). Hết lượt retry -> Ghi nhận chunk hỏng,
+    job chỉ kết thúc khi mọi chunk đã xong hoặc hỏng hẳn.
+    """
+    from progress.services import quiz_regrade_service
+
+    try:
+        return quiz_regrade_service.regrade_chunk(job_id, quiz_id, attempt_ids)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            logger.warning(f"Regrade job {job_id} chunk failed, retry {self.request.retries + 1}: {e}")
+            raise self.retry(exc=e, countdown=10 * 2 ** self.request.retries)
+        logger.error(f"Regrade job {job_id} chunk failed after retries: {e}", exc_info=True)
+        quiz_regrade_service.fail_chunk(job_id, quiz_id, attempt_ids, str(e))
@@ -0,0 +1,12 @@
+# progress/tests/factories.py
+from content.models import ContentBlock, Enrollment
+from content.tests.factories import (  # noqa: F401 (re-export cho test progress)
+    UserFactory, CourseFactory, ModuleFactory, LessonFactory, ContentBlockFactory, EnrollmentFactory,
+)
+from progress.models import UserBlockProgress
+
+
+def complete_block(enrollment: Enrollment, block: ContentBlock) -> UserBlockProgress:
+    return UserBlockProgress.objects.create(
+        enrollment=enrollment, user=enrollment.user, block=block, is_completed=True
+    )
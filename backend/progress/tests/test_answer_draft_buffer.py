@@ -0,0 +1,139 @@
+# progress/tests/test_answer_draft_buffer.py
+"""
+Flush nháp bài làm (answer_draft_service.flush) với Redis giả lập trong bộ nhớ:
+- Nháp chỉ bị xóa khỏi Redis SAU KHI ghi DB commit
+- Ghi DB lỗi (rollback) -> Nháp còn nguyên, attempt được đánh dấu dirty lại
+- Nháp mới đến trong lúc flush không bị xóa nhầm
+"""
+import json
+
+import pytest
+
+from quiz.models import Quiz, Question
+from progress.models import QuizAttempt, QuestionAnswer
+from progress.services import answer_draft_service
+from progress.tests.factories import UserFactory
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args) for name, args in self.calls]
+
+
+class _FakeRedis:
+    """Chỉ các lệnh answer_draft_service dùng (hash + set + script xóa có điều kiện)."""
+    def __init__(self):
+        self.hashes = {}
+        self.sets = {}
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = value.encode()
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def expire(self, key, seconds):
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(str(m) for m in members)
+
+    def spop(self, key, count):
+        members = self.sets.get(key, set())
+        return [members.pop() for _ in range(min(count, len(members)))]
+
+    def eval(self, script, numkeys, key, *args):
+        assert script == answer_draft_service._DELETE_IF_UNCHANGED_LUA
+        fields = self.hashes.get(key, {})
+        for field, value in zip(args[0::2], args[1::2]):
+            if fields.get(field) == value:
+                del fields[field]
+        if not fields:
+            self.hashes.pop(key, None)
+        return 1
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(answer_draft_service, '_get_redis', lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def attempt(db):
+    quiz = Quiz.objects.create(title='Luyện tập', owner=UserFactory(role='instructor'))
+    question = Question.objects.create(quiz=quiz, position=0, type='multiple_choice_single')
+    return QuizAttempt.objects.create(
+        user=UserFactory(), quiz=quiz, status='in_progress', questions_order=[str(question.id)]
+    )
+
+
+def _question_id(attempt):
+    return attempt.quiz.questions.get().id
+
+
+def _draft(redis, attempt) -> dict:
+    raw = redis.hgetall(answer_draft_service._draft_key(attempt.id))
+    return {k.decode(): json.loads(v)['answer_data'] for k, v in raw.items()}
+
+
+def test_drafts_are_deleted_only_after_commit(redis, attempt, django_capture_on_commit_callbacks):
+    question_id = _question_id(attempt)
+    answer_draft_service.stage(attempt.id, question_id, 'multiple_choice_single', {'selected_id': 'A'})
+
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        assert answer_draft_service.flush() == 1
+    # DB đã ghi nhưng chưa commit -> Nháp vẫn còn trong Redis
+    assert _draft(redis, attempt) == {str(question_id): {'selected_id': 'A'}}
+    assert QuestionAnswer.objects.get(attempt=attempt).answer_data == {'selected_id': 'A'}
+
+    for callback in callbacks:
+        callback()
+    assert _draft(redis, attempt) == {}
+
+
+def test_failed_write_keeps_drafts_and_marks_dirty(redis, attempt, monkeypatch, django_capture_on_commit_callbacks):
+    question_id = _question_id(attempt)
+    answer_draft_service.stage(attempt.id, question_id, 'multiple_choice_single', {'selected_id': 'B'})
+
+    def _boom(drafts_by_attempt):
+        raise RuntimeError('DB down')
+    monkeypatch.setattr(answer_draft_service, 'write_drafts', _boom)
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        with pytest.raises(RuntimeError):
+            answer_draft_service.flush()
+
+    assert callbacks == []
+    assert _draft(redis, attempt) == {str(question_id): {'selected_id': 'B'}}
+    assert redis.sets[answer_draft_service.DIRTY_SET_KEY] == {str(attempt.id)}
+
+
+def test_newer_draft_during_flush_survives_cleanup(redis, attempt, django_capture_on_commit_callbacks):
+    question_id = _question_id(attempt)
+    answer_draft_service.stage(attempt.id, question_id, 'multiple_choice_single', {'selected_id': 'A'})
+
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        answer_draft_service.flush()
+    # Học viên đổi đáp án trước khi flush commit xong
+    answer_draft_service.stage(attempt.id, question_id, 'multiple_choice_single', {'selected_id': 'C'})
+
+    for callback in callbacks:
+        callback()
+    assert _draft(redis, attempt) == {str(question_id): {'selected_id': 'C'}}
+    assert redis.sets[answer_draft_service.DIRTY_SET_KEY] == {str(attempt.id)}
@@ -0,0 +1,173 @@
+# progress/tests/test_completion_counters.py
+"""
+Counter hoàn thành (LessonCompletion / ModuleCompletion / Enrollment):
+- calculate_aggregation idempotent (retry / 2 event cùng 1 block không cộng 2 lần)
+- Xóa block -> Học viên chỉ còn thiếu block đó được đánh dấu hoàn thành lesson
+- Xóa lesson/module, đổi loại block -> Đánh giá lại hoàn thành lesson + module + khóa học
+- Migration backfill: Counter của tiến độ học dở có từ trước được điền lại từ bảng gốc
+"""
+import importlib
+
+import pytest
+from django.apps import apps
+
+from content.services import content_block_service, lesson_service, module_service
+from progress.models import LessonCompletion, ModuleCompletion
+from progress.services import progress_counter_service
+from progress.tasks import calculate_aggregation, recompute_course_progress, process_content_removal_impact
+from progress.tests.factories import ModuleFactory, LessonFactory, ContentBlockFactory, EnrollmentFactory, complete_block
+
+
+@pytest.fixture
+def lesson_setup(db):
+    lesson = LessonFactory()
+    blocks = [ContentBlockFactory(lesson=lesson, position=i) for i in range(3)]
+    lesson.cached_total_blocks = 3
+    lesson.save(update_fields=['cached_total_blocks'])
+    lesson.module.cached_total_lessons = 1
+    lesson.module.save(update_fields=['cached_total_lessons'])
+    enrollment = EnrollmentFactory(course=lesson.module.course)
+    return lesson, blocks, enrollment
+
+
+def _progress(enrollment, lesson) -> LessonCompletion:
+    return LessonCompletion.objects.get(enrollment=enrollment, lesson=lesson)
+
+
+def test_retried_aggregation_does_not_double_count(lesson_setup):
+    lesson, blocks, enrollment = lesson_setup
+
+    complete_block(enrollment, blocks[0])
+    for _ in range(3):  # Task retry / event trùng của cùng 1 block
+        calculate_aggregation(str(enrollment.id), str(lesson.id))
+
+    progress = _progress(enrollment, lesson)
+    assert progress.completed_blocks == 1
+    assert progress.is_completed is False
+
+    complete_block(enrollment, blocks[1])
+    calculate_aggregation(str(enrollment.id), str(lesson.id))
+    calculate_aggregation(str(enrollment.id), str(lesson.id))
+    assert _progress(enrollment, lesson).is_completed is False
+
+    complete_block(enrollment, blocks[2])
+    calculate_aggregation(str(enrollment.id), str(lesson.id))
+    calculate_aggregation(str(enrollment.id), str(lesson.id))
+
+    progress = _progress(enrollment, lesson)
+    assert (progress.completed_blocks, progress.is_completed) == (3, True)
+    enrollment.refresh_from_db()
+    assert (enrollment.cached_completed_lessons, enrollment.percent_completed, enrollment.is_completed) == (1, 100.0, True)
+
+
+def test_deleting_last_missing_block_completes_lesson(lesson_setup, django_capture_on_commit_callbacks):
+    lesson, blocks, enrollment = lesson_setup
+    for block in blocks[:2]:
+        complete_block(enrollment, block)
+    calculate_aggregation(str(enrollment.id), str(lesson.id))
+    assert _progress(enrollment, lesson).is_completed is False
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        content_block_service.delete_content_block(blocks[2].id)
+    assert callbacks  # process_content_removal_impact được lên lịch sau commit
+
+    assert progress_counter_service.reevaluate_lesson(lesson.id) == 1
+    progress = _progress(enrollment, lesson)
+    assert (progress.completed_blocks, progress.is_completed) == (2, True)
+    assert ModuleCompletion.objects.get(enrollment=enrollment, module=lesson.module).is_completed is True
+    enrollment.refresh_from_db()
+    assert (enrollment.percent_completed, enrollment.is_completed) == (100.0, True)
+
+    # Idempotent: Chạy lại không hoàn thành thêm ai
+    assert progress_counter_service.reevaluate_lesson(lesson.id) == 0
+
+
+def test_migration_backfills_partial_progress(lesson_setup):
+    lesson, blocks, enrollment = lesson_setup
+    module = lesson.module
+    other = LessonFactory(module=module)
+    module.cached_total_lessons = 2
+    module.save(update_fields=['cached_total_lessons'])
+
+    # Dữ liệu trước migration: Counter = 0, ModuleCompletion chưa có dòng cho module đang học dở
+    for block in blocks[:2]:
+        complete_block(enrollment, block)
+    LessonCompletion.objects.create(enrollment=enrollment, lesson=lesson)
+    LessonCompletion.objects.create(enrollment=enrollment, lesson=other, is_completed=True)
+
+    migration = importlib.import_module('progress.migrations.0007_backfill_completion_counters')
+    migration.backfill_counters(apps, None)
+
+    assert _progress(enrollment, lesson).completed_blocks == 2
+    module_progress = ModuleCompletion.objects.get(enrollment=enrollment, module=module)
+    assert (module_progress.completed_lessons, module_progress.is_completed) == (1, False)
+
+    # Block cuối xong -> Domino +1 từ counter đã backfill, module hoàn thành
+    complete_block(enrollment, blocks[2])
+    calculate_aggregation(str(enrollment.id), str(lesson.id))
+    module_progress.refresh_from_db()
+    assert (module_progress.completed_lessons, module_progress.is_completed) == (2, True)
+
+
+def _finish_lesson(enrollment, lesson, blocks):
+    for block in blocks:
+        complete_block(enrollment, block)
+    calculate_aggregation(str(enrollment.id), str(lesson.id))
+
+
+def test_deleting_last_unfinished_lesson_completes_module(lesson_setup, django_capture_on_commit_callbacks):
+    lesson, blocks, enrollment = lesson_setup
+    module = lesson.module
+    unfinished = LessonFactory(module=module)
+    ContentBlockFactory(lesson=unfinished)
+    module.cached_total_lessons = 2
+    module.save(update_fields=['cached_total_lessons'])
+
+    _finish_lesson(enrollment, lesson, blocks)
+    assert ModuleCompletion.objects.get(enrollment=enrollment, module=module).is_completed is False
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        lesson_service.delete_lesson(unfinished.id)
+    assert callbacks
+    recompute_course_progress(str(module.course_id), module_id=str(module.id))
+
+    module_progress = ModuleCompletion.objects.get(enrollment=enrollment, module=module)
+    assert (module_progress.completed_lessons, module_progress.is_completed) == (1, True)
+    enrollment.refresh_from_db()
+    assert (enrollment.percent_completed, enrollment.is_completed) == (100.0, True)
+
+
+def test_deleting_unfinished_module_completes_course(lesson_setup, django_capture_on_commit_callbacks):
+    lesson, blocks, enrollment = lesson_setup
+    other_module = ModuleFactory(course=lesson.module.course)
+    ContentBlockFactory(lesson=LessonFactory(module=other_module))
+
+    _finish_lesson(enrollment, lesson, blocks)
+    enrollment.refresh_from_db()
+    assert enrollment.is_completed is False
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        module_service.delete_module(other_module.id)
+    assert callbacks
+    recompute_course_progress(str(lesson.module.course_id))
+
+    enrollment.refresh_from_db()
+    assert (enrollment.percent_completed, enrollment.is_completed) == (100.0, True)
+
+
+def test_converting_completed_block_reopens_lesson_and_module(lesson_setup, django_capture_on_commit_callbacks):
+    lesson, blocks, enrollment = lesson_setup
+    _finish_lesson(enrollment, lesson, blocks)
+    assert ModuleCompletion.objects.get(enrollment=enrollment, module=lesson.module).is_completed is True
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        content_block_service.convert_content_block(blocks[0].id, 'video', actor=lesson.module.course.owner)
+    assert callbacks
+    process_content_removal_impact(str(lesson.id))
+
+    progress = _progress(enrollment, lesson)
+    assert (progress.completed_blocks, progress.is_completed) == (2, False)
+    module_progress = ModuleCompletion.objects.get(enrollment=enrollment, module=lesson.module)
+    assert (module_progress.completed_lessons, module_progress.is_completed) == (0, False)
+    enrollment.refresh_from_db()
+    assert (enrollment.percent_completed, enrollment.is_completed) == (0.0, False)
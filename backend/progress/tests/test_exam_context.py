@@ -0,0 +1,81 @@
+# progress/tests/test_exam_context.py
+"""
+Exam context (cấu hình quiz + pool câu hỏi) dùng khi mở đề (xem loadtest_exam_start):
+Lần đầu dựng từ DB, các lần sau lấy từ cache (LRU trong process / Redis) không query quiz.
+Sửa cấu hình quiz hoặc thêm câu hỏi -> Version mới -> Context dựng lại, không trả bản cũ.
+"""
+import pytest
+from django.core.cache import cache
+
+from quiz.models import Quiz, Question
+from quiz.services import exam_context_service, answer_key_service, quiz_course_service, question_service
+from progress.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    cache.clear()
+    exam_context_service._local_cache.clear()
+    answer_key_service._local_cache.clear()
+    yield
+    cache.clear()
+    exam_context_service._local_cache.clear()
+    answer_key_service._local_cache.clear()
+
+
+@pytest.fixture
+def quiz(db):
+    quiz = Quiz.objects.create(
+        title='Kiểm tra giữa kỳ', mode='exam', questions_count=2, owner=UserFactory(role='instructor')
+    )
+    for position in range(3):
+        Question.objects.create(quiz=quiz, position=position, type='multiple_choice_single')
+    return quiz
+
+
+@pytest.mark.django_db
+def test_cached_context_is_served_without_db(quiz, django_assert_num_queries):
+    first = exam_context_service.get_exam_context(quiz.id)
+    assert first.question_ids == tuple(quiz.questions.order_by('position', 'id').values_list('id', flat=True))
+    assert first.pick_count == 2
+
+    # LRU trong process
+    with django_assert_num_queries(0):
+        assert exam_context_service.get_exam_context(quiz.id) is first
+
+    # Process khác (LRU rỗng) -> Lấy từ cache dùng chung, vẫn không query DB
+    exam_context_service._local_cache.clear()
+    with django_assert_num_queries(0):
+        shared = exam_context_service.get_exam_context(quiz.id)
+    assert shared.version == first.version
+    assert shared.question_ids == first.question_ids
+
+
+@pytest.mark.django_db
+def test_quiz_edit_invalidates_cached_context(quiz, django_capture_on_commit_callbacks):
+    before = exam_context_service.get_exam_context(quiz.id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        quiz_course_service.update_quiz(quiz.id, {'questions_count': 0, 'shuffle_questions': False})
+
+    after = exam_context_service.get_exam_context(quiz.id)
+    assert after.version != before.version
+    assert after.quiz.questions_count == 0
+    assert after.quiz.shuffle_questions is False
+    assert after.pick_count == 3
+
+
+@pytest.mark.django_db
+def test_new_question_joins_pool_after_commit(quiz, django_capture_on_commit_callbacks):
+    before = exam_context_service.get_exam_context(quiz.id)
+
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        created = question_service.create_question(quiz.id, {'type': 'multiple_choice_single'})
+    # Chưa commit -> Version chưa đổi, vẫn là context cũ
+    assert exam_context_service.get_exam_context(quiz.id) is before
+
+    for callback in callbacks:
+        callback()
+    after = exam_context_service.get_exam_context(quiz.id)
+    assert len(after.question_ids) == 4
+    assert str(after.question_ids[-1]) == str(created.id)
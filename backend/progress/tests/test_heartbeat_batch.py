@@ -0,0 +1,53 @@
+# progress/tests/test_heartbeat_batch.py
+"""
+Heartbeat batch (sync_heartbeat_batch): Thời gian học cộng cho 1 block trong 1 request bị chặn
+ở MAX_TIME_SPENT_PER_REQUEST, dù batch chứa nhiều beat cùng block.
+"""
+import pytest
+
+from progress.models import UserBlockProgress
+from progress.serializers import BlockHeartbeatSerializer
+from progress.services import course_tracking_service
+from progress.tests.factories import ContentBlockFactory, EnrollmentFactory
+
+
+@pytest.fixture(autouse=True)
+def _db_mode(settings, monkeypatch):
+    # Ghi thẳng DB, không cần Redis (buffer heartbeat + activity log)
+    settings.HEARTBEAT_WRITE_BEHIND = False
+    monkeypatch.setattr(course_tracking_service, 'record_activity', lambda user, data: None)
+
+
+@pytest.fixture
+def enrollment_blocks(db):
+    first = ContentBlockFactory(type='video', duration=3600)
+    second = ContentBlockFactory(type='video', duration=3600, lesson=first.lesson)
+    enrollment = EnrollmentFactory(course=first.lesson.module.course)
+    return enrollment, {first.id: first, second.id: second}
+
+
+def _time_spent(enrollment, block) -> int:
+    return UserBlockProgress.objects.get(enrollment=enrollment, block=block).time_spent_seconds
+
+
+def test_repeated_beats_of_one_block_are_capped_per_request(enrollment_blocks):
+    enrollment, blocks = enrollment_blocks
+    first, second = blocks.values()
+    beats = [{'block_id': first.id, 'time_spent_add': 300} for _ in range(200)]
+    beats.append({'block_id': second.id, 'time_spent_add': 40})
+
+    course_tracking_service.sync_heartbeat_batch(enrollment.user, blocks, beats)
+
+    assert _time_spent(enrollment, first) == course_tracking_service.MAX_TIME_SPENT_PER_REQUEST
+    assert _time_spent(enrollment, second) == 40
+
+    # Request sau có hạn mức mới
+    course_tracking_service.sync_heartbeat_batch(enrollment.user, blocks, [
+        {'block_id': first.id, 'time_spent_add': 200}, {'block_id': first.id, 'time_spent_add': 200},
+    ])
+    assert _time_spent(enrollment, first) == 600
+
+
+def test_serializer_rejects_beat_over_five_minutes():
+    assert not BlockHeartbeatSerializer(data={'time_spent_add': 301}).is_valid()
+    assert BlockHeartbeatSerializer(data={'time_spent_add': 300}).is_valid()
@@ -0,0 +1,60 @@
+# progress/tests/test_heartbeat_buffer.py
+"""
+Flush của heartbeat buffer (phần ghi DB, không cần Redis):
+- Ghi đúng last_accessed của beat thay vì giờ flush (auto_now)
+- Snapshot cũ đến sau không đè lên bản mới hơn (2 lần flush chạy chồng nhau)
+"""
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from progress.models import UserBlockProgress
+from progress.services import heartbeat_buffer_service
+from progress.tests.factories import ContentBlockFactory, EnrollmentFactory
+
+
+@pytest.fixture
+def enrollment_block(db):
+    block = ContentBlockFactory()
+    enrollment = EnrollmentFactory(course=block.lesson.module.course)
+    return enrollment, block
+
+
+def _snapshot(enrollment, block, seconds: int, accessed_at) -> UserBlockProgress:
+    return UserBlockProgress(
+        user=enrollment.user, enrollment=enrollment, block=block,
+        time_spent_seconds=seconds, interaction_data={'timestamp': seconds},
+        last_accessed=accessed_at,
+    )
+
+
+def test_flush_keeps_buffered_access_time(enrollment_block):
+    enrollment, block = enrollment_block
+    accessed_at = timezone.now() - timedelta(minutes=10)
+
+    heartbeat_buffer_service._upsert_snapshots([_snapshot(enrollment, block, 30, accessed_at)])
+
+    row = UserBlockProgress.objects.get(enrollment=enrollment, block=block)
+    assert row.last_accessed == accessed_at
+    assert row.time_spent_seconds == 30
+    assert row.interaction_data == {'timestamp': 30}
+
+
+def test_stale_snapshot_does_not_overwrite_newer_row(enrollment_block):
+    enrollment, block = enrollment_block
+    now = timezone.now()
+    older = _snapshot(enrollment, block, 30, now - timedelta(seconds=30))
+    newer = _snapshot(enrollment, block, 60, now)
+
+    # Worker B flush bản mới xong trước, worker A (bản cũ) ghi sau
+    heartbeat_buffer_service._upsert_snapshots([newer])
+    heartbeat_buffer_service._upsert_snapshots([older])
+
+    row = UserBlockProgress.objects.get(enrollment=enrollment, block=block)
+    assert row.time_spent_seconds == 60
+    assert row.last_accessed == now
+
+    # Beat tiếp theo vẫn được ghi bình thường
+    heartbeat_buffer_service._upsert_snapshots([_snapshot(enrollment, block, 90, now + timedelta(seconds=30))])
+    assert UserBlockProgress.objects.get(pk=row.pk).time_spent_seconds == 90
@@ -0,0 +1,77 @@
+# progress/tests/test_quiz_regrade.py
+"""
+Chấm lại toàn bộ bài của Quiz (quiz_regrade_service), phần DB - không cần Redis:
+- Chia chunk theo keyset: đủ mọi attempt đã nộp, không trùng, bỏ bài đang làm
+- Tính lại điểm câu + tổng điểm/đậu rớt của attempt, chạy lại (retry) không đổi kết quả
+"""
+import pytest
+
+from quiz.models import Quiz, Question
+from progress.models import QuizAttempt, QuestionAnswer
+from progress.services import quiz_regrade_service
+from progress.tests.factories import UserFactory
+
+
+@pytest.fixture
+def quiz(db):
+    quiz = Quiz.objects.create(title='Kiểm tra 15 phút', owner=UserFactory(role='instructor'))
+    for position, correct_id in enumerate(['A', 'B']):
+        Question.objects.create(
+            quiz=quiz, position=position, type='multiple_choice_single',
+            prompt={'text': f'Câu {position + 1}'}, answer_payload={'correct_id': correct_id},
+        )
+    return quiz
+
+
+def _attempt(quiz, selected: list, status: str = 'submitted', stale_score: float = 0.0) -> QuizAttempt:
+    questions = list(quiz.questions.order_by('position'))
+    attempt = QuizAttempt.objects.create(
+        user=UserFactory(), quiz=quiz, status=status, score=stale_score,
+        questions_order=[str(q.id) for q in questions],
+    )
+    for question, selected_id in zip(questions, selected):
+        # Điểm cũ cố ý sai (chấm theo đáp án trước khi giáo viên sửa)
+        QuestionAnswer.objects.create(
+            attempt=attempt, question=question, question_type=question.type,
+            answer_data={'selected_id': selected_id}, score=0.0, is_correct=False, is_graded=True,
+        )
+    return attempt
+
+
+def test_chunking_covers_every_submitted_attempt_once(quiz):
+    submitted = [_attempt(quiz, ['A', 'B']) for _ in range(5)]
+    _attempt(quiz, ['A', 'B'], status='in_progress')
+
+    chunks = quiz_regrade_service.chunk_attempt_ids(quiz.id, chunk_size=2)
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    flat = [attempt_id for chunk in chunks for attempt_id in chunk]
+    assert flat == sorted(flat)
+    assert set(flat) == {str(a.id) for a in submitted}
+
+
+def test_regrade_recomputes_answer_and_attempt_scores(quiz):
+    full = _attempt(quiz, ['A', 'B'])
+    half = _attempt(quiz, ['A', 'C'], stale_score=2.0)
+
+    stats = quiz_regrade_service.regrade_attempts(quiz.id, [str(full.id), str(half.id)])
+
+    assert stats == {'attempts': 2, 'answers': 4, 'changed': 3}
+    full.refresh_from_db()
+    half.refresh_from_db()
+    assert (full.score, full.max_score, full.is_passed) == (2.0, 2.0, True)
+    assert (half.score, half.max_score, half.is_passed) == (1.0, 2.0, True)  # Ngưỡng mặc định 50%
+    assert QuestionAnswer.objects.filter(attempt=half, is_correct=True).count() == 1
+
+
+def test_regrade_is_idempotent_for_retried_chunks(quiz):
+    quiz.pass_score = 2
+    quiz.save(update_fields=['pass_score'])
+    attempt = _attempt(quiz, ['A', 'C'])
+
+    quiz_regrade_service.regrade_attempts(quiz.id, [str(attempt.id)])
+    retry = quiz_regrade_service.regrade_attempts(quiz.id, [str(attempt.id)])
+
+    assert retry['changed'] == 0
+    attempt.refresh_from_db()
+    assert (attempt.score, attempt.is_passed) == (1.0, False)
@@ -0,0 +1,174 @@
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, FrozenSet, Tuple
+
+from quiz.models import Question
+
+
+
+GradeResult = Tuple[float, bool, str]   # (score, is_correct, feedback)
+
+
+@dataclass(frozen=True)
+class AnswerKeyDomain:
+    """
+    Đáp án ĐÃ BIÊN DỊCH của 1 câu hỏi: parse answer_payload 1 lần,
+    dựng sẵn frozenset / text đã chuẩn hóa / map ghép cặp -> Chấm mỗi bài chỉ còn so sánh.
+    """
+    question_id: uuid.UUID
+    type: str
+    max_score: float
+    explanation: str = ''
+
+    # Lỗi cấu hình đáp án (câu hỏi chưa có đáp án) -> Chấm 0 điểm kèm thông báo này
+    config_error: Optional[str] = None
+
+    correct_id: str = ''                                    # multiple_choice_single
+    correct_ids: FrozenSet[str] = frozenset()               # multiple_choice_multi
+    allow_partial: bool = False
+    correct_value: str = ''                                 # true_false (đã lower)
+    accepted_texts: FrozenSet[str] = frozenset()            # short_answer / fill_in_the_blank
+    case_sensitive: bool = False
+    matches: Dict[str, str] = field(default_factory=dict)   # matching
+
+    @classmethod
+    def from_model(cls, question: "Question") -> "AnswerKeyDomain":
+        payload = question.answer_payload or {}
+        q_type = question.type
+        base = {
+            'question_id': question.id,
+            'type': q_type,
+            'max_score': getattr(question, 'score', 1.0),
+            'explanation': payload.get('explanation', ''),
+        }
+
+        if q_type == 'multiple_choice_single':
+            correct_id = str(payload.get('correct_id', ''))
+            if not correct_id:
+                return cls(**base, config_error="Câu hỏi lỗi (chưa có đáp án).")
+            return cls(**base, correct_id=correct_id)
+
+        if q_type == 'multiple_choice_multi':
+            correct_ids = frozenset(str(x) for x in payload.get('correct_ids', []))
+            if not correct_ids:
+                return cls(**base, config_error="Câu hỏi lỗi (chưa có đáp án).")
+            return cls(**base, correct_ids=correct_ids, allow_partial=payload.get('allow_partial', False))
+
+        if q_type == 'true_false':
+            c_val = payload.get('correct_value')
+            if c_val is None:
+                return cls(**base, config_error="Câu hỏi lỗi (Chưa có đáp án).")
+            return cls(**base, correct_value=str(c_val).lower())
+
+        if q_type in ['short_answer', 'fill_in_the_blank']:
+            accepted_texts = payload.get('accepted_texts', [])
+            if not accepted_texts:
+                return cls(**base, config_error="Câu hỏi chưa cấu hình đáp án.")
+            case_sensitive = payload.get('case_sensitive', False)
+            if not case_sensitive:
+                accepted_texts = [t.lower() for t in accepted_texts]
+            return cls(**base, accepted_texts=frozenset(accepted_texts), case_sensitive=case_sensitive)
+
+        if q_type == 'matching':
+            return cls(**base, matches={k: str(v) for k, v in payload.get('matches', {}).items()})
+
+        return cls(**base)
+
+    def grade(self, user_answer_data: Dict[str, Any]) -> GradeResult:
+        """Chấm 1 câu trả lời. Kết quả giống hệt evaluate_answer."""
+        if self.config_error:
+            return 0.0, False, self.config_error
+
+        user_answer_data = user_answer_data or {}
+        max_score = self.max_score
+        score = 0.0
+        is_correct = False
+        feedback = ""
+
+        if self.type == 'multiple_choice_single':
+            if str(user_answer_data.get('selected_id', '')) == self.correct_id:
+                score, is_correct, feedback = max_score, True, "Chính xác!"
+            else:
+                feedback = "Sai rồi."
+
+        elif self.type == 'multiple_choice_multi':
+            user_ids = {str(x) for x in user_answer_data.get('selected_ids', [])}
+            if user_ids == self.correct_ids:
+                score, is_correct, feedback = max_score, True, "Chính xác hoàn toàn!"
+            elif self.allow_partial:
+                correct_hits = len(user_ids & self.correct_ids)
+                wrong_hits = len(user_ids - self.correct_ids)
+                ratio = max(0, (correct_hits - wrong_hits) / len(self.correct_ids))
+                score = round(ratio * max_score, 2)
+                is_correct = (ratio == 1.0)
+                feedback = f"Bạn trả lời đúng một phần ({int(ratio*100)}%)."
+            else:
+                feedback = "Chưa chính xác."
+
+        elif self.type == 'true_false':
+            u_val = user_answer_data.get('selected_value')
+            if u_val is None: u_val = user_answer_data.get('selected_id')
+            if str(u_val).lower() == self.correct_value:
+                score, is_correct, feedback = max_score, True, "Chính xác!"
+            else:
+                feedback = "Sai rồi."
+
+        elif self.type in ['short_answer', 'fill_in_the_blank']:
+            user_text = str(user_answer_data.get('text', '')).strip()
+            if not self.case_sensitive:
+                user_text = user_text.lower()
+            if user_text in self.accepted_texts:
+                score, is_correct, feedback = max_score, True, "Chính xác!"
+            else:
+                feedback = "Sai rồi."
+
+        elif self.type == 'matching':
+            total_pairs = len(self.matches)
+            if total_pairs > 0:
+                user_map = user_answer_data.get('matches', {})
+                correct_count = sum(1 for k, v in self.matches.items() if str(user_map.get(k)) == v)
+                score = round((correct_count / total_pairs) * max_score, 2)
+                is_correct = (correct_count == total_pairs)
+                feedback = f"Bạn ghép đúng {correct_count}/{total_pairs} cặp."
+
+        elif self.type == 'essay':
+            if len(str(user_answer_data.get('text', '')).strip()) > 0:
+                score, is_correct, feedback = max_score, True, "Đã ghi nhận câu trả lời."
+            else:
+                feedback = "Bạn chưa nhập nội dung."
+
+        if self.explanation:
+            feedback += f" \nGiải thích: {self.explanation}"
+
+        return score, is_correct, feedback
+
+
+@dataclass
+class QuizAnswerKeyDomain:
+    """
+    Bộ đáp án đã biên dịch của cả 1 Quiz (theo version của bộ câu hỏi).
+    Giữ kèm Question instance để dựng kết quả (prompt/options) mà không cần query lại.
+    Dùng chung giữa các request: KHÔNG được sửa trực tiếp.
+    """
+    quiz_id: uuid.UUID
+    version: int
+    keys: Dict[uuid.UUID, AnswerKeyDomain]
+    questions: Dict[uuid.UUID, "Question"]
+
+    @classmethod
+    def from_questions(cls, quiz_id: uuid.UUID, version: int, questions) -> "QuizAnswerKeyDomain":
+        questions_map = {q.id: q for q in questions}
+        return cls(
+            quiz_id=quiz_id,
+            version=version,
+            keys={q_id: AnswerKeyDomain.from_model(q) for q_id, q in questions_map.items()},
+            questions=questions_map,
+        )
+
+    def grade_many(self, answers: Dict[uuid.UUID, Dict[str, Any]]) -> Dict[uuid.UUID, GradeResult]:
+        """Batch grader: Chấm toàn bộ {question_id: answer_data} trong 1 lượt. Câu không có trong đề bị bỏ qua."""
+        return {
+            q_id: self.keys[q_id].grade(answer_data)
+            for q_id, answer_data in answers.items()
+            if q_id in self.keys
+        }
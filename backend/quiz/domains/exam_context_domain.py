@@ -0,0 +1,27 @@
+import uuid
+from dataclasses import dataclass
+from typing import Tuple
+
+from quiz.models import Quiz
+
+
+
+@dataclass(frozen=True)
+class ExamContextDomain:
+    """
+    Ngữ cảnh dựng sẵn để tạo attempt khi mở đề (surge lúc giờ thi bắt đầu):
+    cấu hình Quiz + pool ID câu hỏi. Dùng chung giữa các request: KHÔNG được sửa trực tiếp.
+    """
+    quiz: "Quiz"                          # Instance đầy đủ field (gắn thẳng vào attempt, không query lại)
+    version: int
+    question_ids: Tuple[uuid.UUID, ...]
+
+    @property
+    def quiz_id(self) -> uuid.UUID:
+        return self.quiz.id
+
+    @property
+    def pick_count(self) -> int:
+        """Số câu mỗi attempt (0 hoặc vượt pool -> lấy hết)."""
+        total = len(self.question_ids)
+        return self.quiz.questions_count if 0 < self.quiz.questions_count < total else total
@@ -0,0 +1,140 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from django.core.cache import cache
+from django.db import transaction
+
+from quiz.models import Question
+from quiz.domains.answer_key_domain import QuizAnswerKeyDomain
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'quiz:answer_key'
+
+# Bộ đáp án khóa theo version -> Không bao giờ stale, TTL chỉ để dọn rác các version cũ
+ANSWER_KEY_TTL_SECONDS = 24 * 60 * 60
+
+# LRU trong RAM của từng process: 1 kỳ thi chỉ có vài quiz "nóng"
+LOCAL_CACHE_MAX_SIZE = 128
+
+_local_cache: "OrderedDict[tuple, QuizAnswerKeyDomain]" = OrderedDict()
+_local_lock = threading.Lock()
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _version_key(quiz_id) -> str:
+    return f'{KEY_PREFIX}:{quiz_id}:version'
+
+
+def _answer_key_key(quiz_id, version: int) -> str:
+    return f'{KEY_PREFIX}:{quiz_id}:v{version}'
+
+
+def _new_version() -> int:
+    # Timestamp (ms): key version bị evict thì version mới vẫn không trùng bản cũ trong LRU
+    return int(time.time() * 1000)
+
+
+def _local_get(key: tuple):
+    with _local_lock:
+        value = _local_cache.get(key)
+        if value is not None:
+            _local_cache.move_to_end(key)
+        return value
+
+
+def _local_set(key: tuple, value) -> None:
+    with _local_lock:
+        _local_cache[key] = value
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > LOCAL_CACHE_MAX_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def _build(quiz_id, version: int) -> QuizAnswerKeyDomain:
+    # Lấy đủ field (không dùng only) để instance dùng chung không phát sinh query lazy-load về sau
+    questions = Question.objects.filter(quiz_id=quiz_id)
+    return QuizAnswerKeyDomain.from_questions(quiz_id, version, questions)
+
+
+# ==========================================
+# PUBLIC INTERFACE (VERSION)
+# ==========================================
+
+def get_version(quiz_id) -> int:
+    key = _version_key(quiz_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_now(quiz_id) -> None:
+    key = _version_key(quiz_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+    except Exception as e:
+        logger.error(f"⚠️ Không bump được answer key version của quiz {quiz_id}: {e}")
+
+
+def bump_version(quiz_id) -> None:
+    """
+    Đánh dấu bộ câu hỏi/đáp án của quiz đã thay đổi (create/update/delete Question, sửa cấu hình Quiz).
+    Version này dùng chung cho exam_context_service.
+    Chạy SAU KHI commit để không ai biên dịch lại từ dữ liệu chưa commit.
+    """
+    if not quiz_id:
+        return
+    transaction.on_commit(lambda: _bump_now(quiz_id))
+
+
+# ==========================================
+# PUBLIC INTERFACE (READ)
+# ==========================================
+
+def get_answer_keys(quiz_id: uuid.UUID) -> QuizAnswerKeyDomain:
+    """
+    Lấy bộ đáp án đã biên dịch của quiz.
+    Thứ tự tra cứu: LRU trong process -> Redis -> DB (biên dịch 1 lần cho mỗi version).
+    """
+    try:
+        version = get_version(quiz_id)
+    except Exception as e:
+        logger.error(f"⚠️ Answer key cache unavailable: {e}")
+        return _build(quiz_id, 0)
+
+    local_key = (str(quiz_id), version)
+    compiled = _local_get(local_key)
+    if compiled is not None:
+        return compiled
+
+    redis_key = _answer_key_key(quiz_id, version)
+    try:
+        compiled = cache.get(redis_key)
+    except Exception as e:
+        logger.error(f"⚠️ Answer key cache unavailable: {e}")
+        compiled = None
+
+    if compiled is None:
+        compiled = _build(quiz_id, version)
+        try:
+            cache.set(redis_key, compiled, timeout=ANSWER_KEY_TTL_SECONDS)
+        except Exception as e:
+            logger.error(f"⚠️ Không ghi được answer key cache {redis_key}: {e}")
+
+    _local_set(local_key, compiled)
+    return compiled
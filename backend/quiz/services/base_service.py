@@ -7,7 +7,8 @@ from django.utils import timezone
 from quiz.types import ExamFilter, ExamFetchStrategy
 from quiz.models import Quiz, Question
 from quiz.domains.exam_domain import ExamDomain 
-from media.services import file_service
+from media.services import file_service, file_reference_service
+from quiz.services import answer_key_service
 
 
 
@@ -132,6 +133,10 @@ def _bulk_create_questions(quiz, questions_data: List[Dict]):
             for q_instance, q_data_original in zip(created_questions, questions_data):
                 _commit_files_for_question(q_instance, q_data_original)
 
+            # Index file đang dùng (cleanup_files không được xóa ảnh/media của câu hỏi)
+            file_reference_service.sync_questions(created_questions)
+            answer_key_service.bump_version(quiz.id)
+
         except Exception as e:
             # Nếu bulk_create lỗi (ví dụ lỗi JSON không hợp lệ), raise lên trên
             raise ValueError(f"Lỗi khi lưu danh sách câu hỏi: {str(e)}")
@@ -145,6 +150,9 @@ def _process_nested_questions(quiz, questions_data: list):
     # A. Danh sách ID các câu hỏi ĐANG CÓ trong DB
     existing_ids = set(quiz.questions.values_list('id', flat=True))
     
+    # Bộ câu hỏi/đáp án sẽ thay đổi -> Bộ đáp án đã biên dịch hết hiệu lực (sau commit)
+    answer_key_service.bump_version(quiz.id)
+
     # B. Danh sách ID các câu hỏi ĐƯỢC GỬI LÊN
     incoming_ids = set()
     for q in questions_data:
@@ -200,6 +208,7 @@ def _process_nested_questions(quiz, questions_data: list):
     # Thực thi DB
     if to_create:
         created_objs = Question.objects.bulk_create(to_create)
+        file_reference_service.sync_questions(created_objs)
         # Map lại với data gốc để commit file
         # Lưu ý: to_create là list Question object, cần map lại với dict gốc
         # (Logic này hơi phức tạp nếu dùng bulk, nên đơn giản nhất là loop)
@@ -210,6 +219,7 @@ def _process_nested_questions(quiz, questions_data: list):
     if to_update:
         # Bulk update các trường cần thiết
         Question.objects.bulk_update(to_update, ['type', 'prompt', 'answer_payload', 'hint', 'position'])
+        file_reference_service.sync_questions(to_update)
 
         # Commit file cho các câu vừa update (có thể user mới up ảnh mới)
         for q_obj in to_update:
@@ -0,0 +1,134 @@
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import List
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.exceptions import DomainError
+from quiz.models import Quiz
+from quiz.domains.exam_context_domain import ExamContextDomain
+from quiz.services import answer_key_service
+
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONFIG
+# ==========================================
+
+KEY_PREFIX = 'quiz:exam_context'
+
+# Dùng chung version với bộ đáp án (answer_key_service): đổi câu hỏi hoặc cấu hình quiz -> version mới
+CONTEXT_TTL_SECONDS = 6 * 60 * 60
+
+# Pre-warm các đề sắp mở trong N phút tới (Celery Beat)
+PREWARM_WINDOW_MINUTES = 10
+
+LOCAL_CACHE_MAX_SIZE = 128
+
+_local_cache: "OrderedDict[tuple, ExamContextDomain]" = OrderedDict()
+_local_lock = threading.Lock()
+
+
+# ==========================================
+# PUBLIC INTERFACE (HELPER)
+# ==========================================
+
+def _context_key(quiz_id, version: int) -> str:
+    return f'{KEY_PREFIX}:{quiz_id}:v{version}'
+
+
+def _local_get(key: tuple):
+    with _local_lock:
+        value = _local_cache.get(key)
+        if value is not None:
+            _local_cache.move_to_end(key)
+        return value
+
+
+def _local_set(key: tuple, value) -> None:
+    with _local_lock:
+        _local_cache[key] = value
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > LOCAL_CACHE_MAX_SIZE:
+            _local_cache.popitem(last=False)
+
+
+def _build(quiz_id, version: int) -> ExamContextDomain:
+    try:
+        quiz = Quiz.objects.get(id=quiz_id)
+    except Quiz.DoesNotExist:
+        raise DomainError("Không tìm thấy bài trắc nghiệm.")
+
+    # Sắp theo position để pool ổn định giữa các lần build
+    question_ids = tuple(quiz.questions.order_by('position', 'id').values_list('id', flat=True))
+    return ExamContextDomain(quiz=quiz, version=version, question_ids=question_ids)
+
+
+# ==========================================
+# PUBLIC INTERFACE (READ)
+# ==========================================
+
+def get_exam_context(quiz_id: uuid.UUID) -> ExamContextDomain:
+    """
+    Lấy cấu hình quiz + pool câu hỏi để tạo attempt.
+    Thứ tự tra cứu: LRU trong process -> Redis -> DB.
+    """
+    try:
+        version = answer_key_service.get_version(quiz_id)
+    except Exception as e:
+        logger.error(f"⚠️ Exam context cache unavailable: {e}")
+        return _build(quiz_id, 0)
+
+    local_key = (str(quiz_id), version)
+    context = _local_get(local_key)
+    if context is not None:
+        return context
+
+    redis_key = _context_key(quiz_id, version)
+    try:
+        context = cache.get(redis_key)
+    except Exception as e:
+        logger.error(f"⚠️ Exam context cache unavailable: {e}")
+        context = None
+
+    if context is None:
+        context = _build(quiz_id, version)
+        try:
+            cache.set(redis_key, context, timeout=CONTEXT_TTL_SECONDS)
+        except Exception as e:
+            logger.error(f"⚠️ Không ghi được exam context cache {redis_key}: {e}")
+
+    _local_set(local_key, context)
+    return context
+
+
+# ==========================================
+# PUBLIC INTERFACE (PRE-WARM)
+# ==========================================
+
+def prewarm_upcoming_exams(window_minutes: int = PREWARM_WINDOW_MINUTES) -> List[str]:
+    """
+    Celery Beat: Dựng sẵn exam context + bộ đáp án cho các đề sắp mở,
+    để request đầu tiên lúc mở đề không phải query DB.
+    """
+    now = timezone.now()
+    quiz_ids = Quiz.objects.filter(
+        time_open__gte=now - timedelta(minutes=1),
+        time_open__lte=now + timedelta(minutes=window_minutes),
+    ).values_list('id', flat=True)
+
+    warmed = []
+    for quiz_id in quiz_ids:
+        try:
+            get_exam_context(quiz_id)
+            answer_key_service.get_answer_keys(quiz_id)
+            warmed.append(str(quiz_id))
+        except Exception as e:
+            logger.error(f"⚠️ Pre-warm exam {quiz_id} failed: {e}")
+
+    return warmed
@@ -7,6 +7,7 @@ from core.exceptions import DomainError
 from quiz.types import ExamFilter, ExamFetchStrategy
 from quiz.models import Quiz
 from quiz.services.base_service import _build_queryset, _map_to_domain, _bulk_create_questions, _process_nested_questions
+from quiz.services import answer_key_service
 
 
 
@@ -145,6 +146,7 @@ def patch_quiz(
         if hasattr(quiz, field):
             setattr(quiz, field, value)
     quiz.save()
+    answer_key_service.bump_version(quiz.id) # Cấu hình đổi -> exam context đã cache hết hiệu lực
 
     # Diff Questions
     if questions_data is not None:
@@ -9,7 +9,9 @@ from quiz.domains.question_domain import QuestionDomain
 from core.exceptions import DomainError
 from media.services.cloud_service import s3_copy_object
 from media.models import UploadedFile, FileStatus
+from media.services import file_reference_service
 from quiz.models import Quiz, Question
+from quiz.services import answer_key_service
 
 
 
@@ -154,6 +156,7 @@ def create_question(quiz_id: uuid.UUID, data: Dict[str, Any]) -> QuestionDomain:
         answer_payload={},
         hint={}
     )
+    answer_key_service.bump_version(quiz.id)
     
     return QuestionDomain.from_model(new_q)
 
@@ -213,6 +216,9 @@ def update_question(question_id: uuid.UUID, data: Dict[str, Any]) -> QuestionDom
     
     # 3. Save
     q_to_update.save()
+    # Index file đang dùng (cleanup_files không được xóa ảnh/media của câu hỏi)
+    file_reference_service.sync_questions([q_to_update])
+    answer_key_service.bump_version(q_to_update.quiz_id)
     
     return QuestionDomain.from_model(q_to_update)
 
@@ -229,6 +235,7 @@ def delete_question(question_id: uuid.UUID):
     try:
         q_to_delete = Question.objects.get(id=question_id)
         q_to_delete.delete()
+        answer_key_service.bump_version(q_to_delete.quiz_id)
     except Question.DoesNotExist:
         # Bỏ qua nếu câu hỏi đã bị xóa
         pass
@@ -15,6 +15,7 @@ from quiz.domains.quiz_attempt_domain import QuizAttemptDomain
 from progress.domains.question_content_domain import QuestionContentDomain
 from quiz.services.question_service import create_question, update_question, delete_question
 from quiz.models import Question
+from quiz.services import answer_key_service
 
 
 
@@ -76,6 +77,7 @@ def update_quiz(quiz_id: uuid.UUID, data: Dict[str, Any]) -> QuizDomain:
     if has_changes:
         quiz.save() # Django tự động chỉ update các field bị thay đổi nếu dùng logic thông minh, 
                     # hoặc dùng update_fields nếu muốn tối ưu cực đại.
+        answer_key_service.bump_version(quiz.id) # Exam context (cấu hình + pool câu hỏi) hết hiệu lực
     
     return QuizDomain.from_model(quiz)
 
@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from quiz.services import exam_context_service
+
+
+
+@shared_task
+def prewarm_upcoming_exams():
+    """
+    Celery Beat (mỗi phút): Nạp sẵn pool câu hỏi + cấu hình + đáp án của các đề sắp mở vào cache.
+    """
+    return exam_context_service.prewarm_upcoming_exams()